@@ -1,7 +1,8 @@
-import requests
 import dotenv
 import os
 
+from src.competitor.utils.http_client import HTTPRequest, get_provider_client
+
 dotenv.load_dotenv()
 
 RAPID_API_KEY = os.getenv("RAPID_API_KEY")
@@ -15,11 +16,19 @@ UNWRANGLE_REVIEWS_URL = "https://data.unwrangle.com/api/getter/"
 SCRAPINGDOG_PRODUCT_URL = "https://api.scrapingdog.com/amazon/product"
 RAINFOREST_API_URL = "https://api.rainforestapi.com/request"
 AMAZON_COOKIE = os.getenv("AMAZON_COOKIE")
+
+# One pooled client per provider (keep-alive, timeouts, retries, HTTP_QPS_<PROVIDER> pacing)
+RAPIDAPI_CLIENT = get_provider_client("rapidapi")
+UNWRANGLE_CLIENT = get_provider_client("unwrangle")
+SCRAPINGDOG_CLIENT = get_provider_client("scrapingdog")
+RAINFOREST_CLIENT = get_provider_client("rainforest")
+
 AMAZON_BEST_SELLERS_URL_DICT = {
     "Dimmer Switches": "https://www.amazon.com/Best-Sellers-Tools-Home-Improvement-Dimmer-Switches/zgbs/hi/507840/ref=zg_bs_nav_hi_4_6291358011",
     "Light Switches": "https://www.amazon.com/Best-Sellers-Tools-Home-Improvement-Electrical-Light-Switches/zgbs/hi/6291359011/ref=zg_bs_nav_hi_4_507840"
 }
 
+@RAPIDAPI_CLIENT.endpoint
 def amazon_best_sellers_list(category, page=1):
     """
     Get Amazon best sellers list using Axesso API. Documentation: https://axesso.developer.azure-api.net/api-details#api=axesso-amazon-data-service&operation=best-seller
@@ -52,10 +61,9 @@ def amazon_best_sellers_list(category, page=1):
         "x-rapidapi-host": "axesso-axesso-amazon-data-service-v1.p.rapidapi.com"
     }
     
-    response = requests.get(AMAZON_BEST_SELLERS_URL, headers=headers, params=querystring)
-    response.raise_for_status()
-    return response.json()
+    return HTTPRequest(AMAZON_BEST_SELLERS_URL, params=querystring, headers=headers)
 
+@UNWRANGLE_CLIENT.endpoint
 def get_amazon_reviews(asin=None, url=None, country_code="US", page=1, max_pages=1, 
                       filter_by_star=None, sort_by=None, media_type=None, 
                       format_type=None, filter_by_keyword=None, reviewer_type=None,
@@ -209,13 +217,9 @@ def get_amazon_reviews(asin=None, url=None, country_code="US", page=1, max_pages
         # Fall back to environment variable cookie
         params["cookie"] = AMAZON_COOKIE
     
-    try:
-        response = requests.get(UNWRANGLE_REVIEWS_URL, params=params)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"Failed to fetch Amazon reviews: {str(e)}")
+    return HTTPRequest(UNWRANGLE_REVIEWS_URL, params=params)
 
+@SCRAPINGDOG_CLIENT.endpoint
 def get_amazon_product(asin, domain="com", country="us", postal_code=None, language=None):
     """
     Get Amazon product details using ScrapingDog API. Documentation: https://docs.scrapingdog.com/amazon-scraper-api/amazon-product-scraper
@@ -291,10 +295,9 @@ def get_amazon_product(asin, domain="com", country="us", postal_code=None, langu
     if language:
         params["language"] = language
     
-    response = requests.get(SCRAPINGDOG_PRODUCT_URL, params=params)
-    response.raise_for_status()
-    return response.json()
+    return HTTPRequest(SCRAPINGDOG_PRODUCT_URL, params=params)
 
+@RAINFOREST_CLIENT.endpoint
 def amazon_search(search_term=None, amazon_domain="amazon.com", number_of_results=None, fields=None,
                   include_products_count=None, refinements=None, category_id=None, sort_by=None,
                   exclude_sponsored=False, page=1, max_page=None, url=None, direct_search=False):
@@ -390,7 +393,9 @@ def amazon_search(search_term=None, amazon_domain="amazon.com", number_of_result
     if direct_search:
         params["direct_search"] = "true"
     
-    response = requests.get(RAINFOREST_API_URL, params=params)
-    response.raise_for_status()
-    return response.json()
+    return HTTPRequest(RAINFOREST_API_URL, params=params)
 
+amazon_best_sellers_list_async = amazon_best_sellers_list.call_async
+get_amazon_reviews_async = get_amazon_reviews.call_async
+get_amazon_product_async = get_amazon_product.call_async
+amazon_search_async = amazon_search.call_async
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Adaptive Rate Control Benchmark
+
+Run OpenRouterManager against the local FakeLLMProvider, whose real limit is
+unknown to the client, and compare static limits with the AIMD controller.
+
+Two starting points are exercised:
+- limits guessed too high: static limits keep hitting 429s
+- limits guessed too low: static limits leave provider capacity unused
+
+Usage:
+    python3 benchmark_adaptive_rate_control.py [--calls 150]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict
+
+from utils.rate_limiter import RateLimiter
+from utils.openrouter_utils import OpenRouterManager
+from utils.fake_llm_provider import FakeLLMProvider
+
+
+async def run_scenario(provider: FakeLLMProvider, adaptive: bool, calls: int,
+                       start_requests_per_window: int, start_concurrency: int,
+                       window_seconds: float, max_attempts: int = 5) -> Dict[str, float]:
+    """Drive calls through one manager and report throughput and throttling"""
+    limiter = RateLimiter(
+        max_requests_per_minute=start_requests_per_window,
+        max_input_tokens_per_minute=10_000_000,
+        max_output_tokens_per_minute=10_000_000,
+        max_concurrent_requests=start_concurrency,
+        window_seconds=window_seconds
+    )
+    manager = OpenRouterManager(
+        model_name="fake/model",
+        rate_limiter=limiter,
+        adaptive_rate_control=adaptive,
+        base_url=provider.url,
+        api_key="offline"
+    )
+    failed = 0
+
+    async def one_call(i: int):
+        nonlocal failed
+        for _ in range(max_attempts):
+            try:
+                await manager.safe_call(f"prompt {i}")
+                return
+            except Exception:
+                continue
+        failed += 1
+
+    before = dict(provider.stats)
+    start = time.perf_counter()
+    await asyncio.gather(*(one_call(i) for i in range(calls)))
+    wall_time = time.perf_counter() - start
+
+    result = {
+        "wall_time_s": wall_time,
+        "completed_per_s": (calls - failed) / wall_time,
+        "rate_limited": provider.stats["rate_limited"] - before["rate_limited"],
+        "failed": failed,
+        "final_requests_per_window": limiter.max_requests_per_minute,
+        "final_concurrency": limiter.max_concurrent_requests,
+    }
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark static vs adaptive rate limits against a throttling fake provider")
+    parser.add_argument("--calls", type=int, default=150, help="Number of calls per scenario")
+    parser.add_argument("--provider-limit", type=int, default=40, help="Requests the fake provider accepts per window")
+    parser.add_argument("--window", type=float, default=2.0, help="Provider window in seconds")
+    args = parser.parse_args()
+
+    scenarios = [
+        ("guessed too high", args.provider_limit * 5, 20),
+        ("guessed too low", max(1, args.provider_limit // 4), 2),
+    ]
+
+    for label, start_rpw, start_concurrency in scenarios:
+        print(f"\n=== Starting limits {label}: {start_rpw} requests/window, {start_concurrency} concurrent "
+              f"(provider allows {args.provider_limit}/{args.window}s) ===")
+        for adaptive in (False, True):
+            async with FakeLLMProvider(requests_per_window=args.provider_limit,
+                                       window_seconds=args.window,
+                                       retry_after_seconds=args.window / 2) as provider:
+                stats = await run_scenario(provider, adaptive, args.calls, start_rpw,
+                                           start_concurrency, args.window)
+            name = "adaptive" if adaptive else "static"
+            print(f"{name:>9}: wall {stats['wall_time_s']:.2f}s | {stats['completed_per_s']:.1f} calls/s | "
+                  f"429s {stats['rate_limited']} | failed {stats['failed']} | "
+                  f"final limits {stats['final_requests_per_window']}/window, {stats['final_concurrency']} concurrent")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+LLM Cache Backend Benchmark
+
+Compare warm-run lookup throughput and disk use of the json backend (one
+file per entry) against the sqlite backend (one WAL-mode file, compressed
+values). Both caches are filled with the same prompts and responses in a
+temporary directory, then every prompt is looked up again; the best of
+--passes warm passes is reported, which keeps noise from other work on the
+machine out of the comparison.
+
+The workload is synthetic, or with --source the real LLMCache entries
+(llm_<key>.json files) found under a directory, e.g. old run outputs.
+
+Usage:
+    python3 benchmark_cache_backends.py [--entries 20000] [--response-chars 3000] [--passes 3]
+    python3 benchmark_cache_backends.py --source ../../data/result/process_review
+"""
+
+import argparse
+import json
+import random
+import string
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from utils.cache_utils import LLMCache
+
+
+def make_prompts(num_entries: int, response_chars: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Synthetic prompt/response pairs of realistic size"""
+    rng = random.Random(seed)
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(500)]
+
+    def text(chars: int) -> str:
+        # Average word plus separator is ~7 characters
+        return " ".join(rng.choices(words, k=chars // 7))
+
+    return [{"prompt": f"[{i}] " + text(response_chars * 2), "response": text(response_chars), "context": None}
+            for i in range(num_entries)]
+
+
+def load_prompts(source: Path) -> List[Dict[str, Any]]:
+    """Prompt/response/context of every LLMCache JSON entry under a directory (one per distinct request)"""
+    pairs = {}
+    for path in sorted(source.rglob("llm_*.json")):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cache_data = json.load(f)
+            data = cache_data["data"]
+            pair = {"prompt": data["prompt"], "response": data["response"], "context": cache_data.get("metadata") or None}
+        except (OSError, ValueError, KeyError, TypeError):
+            continue
+        pairs[json.dumps([pair["prompt"], pair["context"]], sort_keys=True)] = pair
+    return list(pairs.values())
+
+
+def directory_size(directory: Path) -> int:
+    """Bytes allocated on disk, so the block rounding of many small files counts too"""
+    return sum(path.stat().st_blocks * 512 for path in directory.rglob("*") if path.is_file())
+
+
+def run_backend(backend: str, pairs: List[Dict[str, Any]], cache_dir: Path, passes: int = 3) -> Dict[str, float]:
+    """Fill a cache, then time warm passes over every prompt"""
+    cache = LLMCache(cache_dir, backend=backend)
+
+    start = time.perf_counter()
+    for pair in pairs:
+        cache.save_llm_response(pair["prompt"], pair["response"], pair["context"])
+    write_time = time.perf_counter() - start
+
+    read_time = float("inf")
+    for _ in range(passes):
+        start = time.perf_counter()
+        hits = sum(cache.load_llm_response(pair["prompt"], pair["context"]) is not None for pair in pairs)
+        read_time = min(read_time, time.perf_counter() - start)
+
+    if cache.store is not None:
+        cache.store.checkpoint()  # Measure the database file, not pages still waiting in the write-ahead log
+    return {
+        "writes_per_s": len(pairs) / write_time,
+        "lookups_per_s": len(pairs) / read_time,
+        "hits": hits,
+        "files": sum(1 for path in cache_dir.iterdir() if path.is_file()),
+        "disk_mb": directory_size(cache_dir) / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark warm-run LLM cache lookups per backend")
+    parser.add_argument("--entries", type=int, default=20000, help="Number of cached prompts")
+    parser.add_argument("--response-chars", type=int, default=3000, help="Approximate response length")
+    parser.add_argument("--passes", type=int, default=3, help="Warm lookup passes per backend (best is reported)")
+    parser.add_argument("--source", type=Path, help="Use the real LLMCache entries under this directory instead")
+    args = parser.parse_args()
+
+    if args.source:
+        pairs = load_prompts(args.source)
+        average_chars = sum(len(pair["prompt"]) + len(pair["response"]) for pair in pairs) / max(len(pairs), 1)
+        print(f"Workload: {len(pairs)} cached prompts from {args.source}, ~{average_chars:.0f} characters each\n")
+    else:
+        pairs = make_prompts(args.entries, args.response_chars)
+        print(f"Workload: {args.entries} cached prompts, ~{args.response_chars} character responses\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in ("json", "sqlite"):
+            stats = run_backend(backend, pairs, Path(tmp) / backend, args.passes)
+            print(f"{backend:>7}: {stats['lookups_per_s']:.0f} lookups/s | {stats['writes_per_s']:.0f} writes/s | "
+                  f"{stats['hits']}/{len(pairs)} hits | {stats['files']} files, {stats['disk_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Provider HTTP Client Benchmark
+
+Send a batch of amazon_search requests to a local stub of the Rainforest API
+and report the per-request overhead of each HTTP stack:
+
+- direct: previous behaviour, one requests.get per call (new connection every time)
+- pooled: amazon_search on the pooled, retrying provider client
+- async:  amazon_search_async on the client's aiohttp session
+
+The stub speaks HTTP/1.1 keep-alive. --handshake-ms delays every new
+connection to stand in for the TCP + TLS setup a real provider costs,
+--error-rate answers that share of requests with 503 + Retry-After: 0 to
+show the retries. Pacing is disabled and --backoff-base shortens the
+backoff so the numbers measure connection reuse, not waiting.
+
+Usage:
+    python -m src.competitor.benchmark_http_client [--requests 200] [--handshake-ms 30] [--error-rate 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+import requests
+
+from src.competitor import amazon_api
+from src.competitor.utils import http_client
+
+
+class StubProviderServer:
+    """In-process keep-alive HTTP server answering provider GET requests with a small JSON body"""
+
+    def __init__(self, handshake_seconds: float, response_seconds: float, error_rate: float, seed: int = 0):
+        self.handshake_seconds = handshake_seconds
+        self.response_seconds = response_seconds
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.stats = {"connections": 0, "requests": 0, "errors": 0}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self) -> None:
+        with self.lock:
+            self.stats = {key: 0 for key in self.stats}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # headers and body are separate writes; avoid delayed-ACK stalls
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with stub.lock:
+                    stub.stats["connections"] += 1
+                time.sleep(stub.handshake_seconds)
+
+            def send_json(self, payload, status: int = 200, headers: Dict[str, str] = None) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.stats["requests"] += 1
+                    fail = stub.random.random() < stub.error_rate
+                    if fail:
+                        stub.stats["errors"] += 1
+                time.sleep(stub.response_seconds)
+                if fail:
+                    return self.send_json({"error": "stub overloaded"}, 503, headers={"Retry-After": "0"})
+                self.send_json({
+                    "request_info": {"success": True},
+                    "search_results": [{"asin": f"BSTUB{i:05d}", "title": "Stub dimmer switch"} for i in range(10)],
+                })
+
+        return Handler
+
+
+def direct_search(search_term: str):
+    """Previous amazon_search transport: one requests.get per call"""
+    params = {"api_key": amazon_api.RAINFOREST_API_KEY, "type": "search", "amazon_domain": "amazon.com",
+              "page": 1, "search_term": search_term}
+    response = requests.get(amazon_api.RAINFOREST_API_URL, params=params)
+    response.raise_for_status()
+    return response.json()
+
+
+def run_sync(call, count: int, concurrency: int) -> int:
+    """Run count calls on a thread pool, return the number that succeeded"""
+    def attempt(i):
+        try:
+            call(f"dimmer switch {i}")
+            return True
+        except Exception:
+            return False
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sum(pool.map(attempt, range(count)))
+
+
+async def run_async(count: int, concurrency: int) -> int:
+    """Run count amazon_search_async calls, at most concurrency at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def attempt(i):
+        async with semaphore:
+            try:
+                await amazon_api.amazon_search_async(search_term=f"dimmer switch {i}")
+                return True
+            except Exception:
+                return False
+
+    try:
+        return sum(await asyncio.gather(*[attempt(i) for i in range(count)]))
+    finally:
+        await amazon_api.RAINFOREST_CLIENT.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pooled provider HTTP client against a local stub API")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per variant")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight at once")
+    parser.add_argument("--handshake-ms", type=float, default=30.0, help="Simulated setup cost of a new connection")
+    parser.add_argument("--response-ms", type=float, default=0.0, help="Simulated server time per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 503")
+    parser.add_argument("--backoff-base", type=float, default=0.01, help="BACKOFF_BASE_SECONDS during the run")
+    parser.add_argument("--variants", nargs="+", default=["direct", "pooled", "async"],
+                        choices=["direct", "pooled", "async"], help="HTTP stacks to compare")
+    args = parser.parse_args()
+
+    stub = StubProviderServer(args.handshake_ms / 1000, args.response_ms / 1000, args.error_rate)
+    stub.start()
+    amazon_api.RAINFOREST_API_KEY = "stub-key"
+    amazon_api.RAINFOREST_API_URL = f"{stub.url}/request"
+    amazon_api.RAINFOREST_CLIENT.limiter = http_client.QPSLimiter(None)
+    http_client.BACKOFF_BASE_SECONDS = args.backoff_base
+
+    rows = []
+    try:
+        for variant in args.variants:
+            stub.reset_stats()
+            client_stats = dict(amazon_api.RAINFOREST_CLIENT.stats)
+            start = time.perf_counter()
+            if variant == "direct":
+                successful = run_sync(direct_search, args.requests, args.concurrency)
+            elif variant == "pooled":
+                successful = run_sync(lambda term: amazon_api.amazon_search(search_term=term),
+                                      args.requests, args.concurrency)
+            else:
+                successful = asyncio.run(run_async(args.requests, args.concurrency))
+            elapsed = time.perf_counter() - start
+            retries = amazon_api.RAINFOREST_CLIENT.stats["retries"] - client_stats["retries"]
+            rows.append((variant, elapsed, successful, retries, dict(stub.stats)))
+    finally:
+        stub.stop()
+
+    print(f"\n📊 {args.requests} requests, concurrency {args.concurrency}, {args.handshake_ms:.0f} ms per new "
+          f"connection, {args.error_rate:.0%} 503s\n")
+    print(f"{'variant':<8} {'wall s':>8} {'ms/req':>8} {'conns':>6} {'retries':>8} {'ok':>5}")
+    for variant, elapsed, successful, retries, stats in rows:
+        print(f"{variant:<8} {elapsed:>8.2f} {elapsed / args.requests * 1000:>8.2f} {stats['connections']:>6} "
+              f"{retries:>8} {successful:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+LLM Router Benchmark
+
+Run calls against two local FakeLLMProvider stubs and compare a single
+provider with the latency-aware LLMRouter spreading traffic across both.
+
+Scenarios:
+- one provider throttled: the throttled stub alone vs. the router over both stubs
+- outage: the router over both stubs while one of them starts answering 503 mid-run
+
+Usage:
+    python3 benchmark_llm_router.py [--calls 200]
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Dict, List
+
+from utils.rate_limiter import RateLimiter
+from utils.openrouter_utils import OpenRouterManager
+from utils.llm_router import LLMRouter
+from utils.fake_llm_provider import FakeLLMProvider
+
+
+def build_manager(provider: FakeLLMProvider, model_name: str, window_seconds: float) -> OpenRouterManager:
+    """OpenRouterManager pointed at a stub, with generous limits the stub may undercut"""
+    limiter = RateLimiter(
+        max_requests_per_minute=1000,
+        max_input_tokens_per_minute=10_000_000,
+        max_output_tokens_per_minute=10_000_000,
+        max_concurrent_requests=20,
+        window_seconds=window_seconds
+    )
+    return OpenRouterManager(
+        model_name=model_name,
+        rate_limiter=limiter,
+        base_url=provider.url,
+        api_key="offline",
+        coalesce_requests=False
+    )
+
+
+async def run_calls(manager, calls: int, workers: int = 20, max_attempts: int = 5,
+                    on_progress=None) -> Dict[str, float]:
+    """Drive calls through a manager or router from a fixed pool of workers and report throughput"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(calls):
+        queue.put_nowait(i)
+    failed = 0
+    done = 0
+
+    async def worker():
+        nonlocal failed, done
+        while not queue.empty():
+            i = queue.get_nowait()
+            for _ in range(max_attempts):
+                try:
+                    await manager.safe_call(f"prompt {i}")
+                    break
+                except Exception:
+                    continue
+            else:
+                failed += 1
+            done += 1
+            if on_progress:
+                on_progress(done)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    wall_time = time.perf_counter() - start
+    return {
+        "wall_time_s": wall_time,
+        "completed_per_s": (calls - failed) / wall_time,
+        "failed": failed,
+    }
+
+
+def print_result(label: str, result: Dict[str, float], stubs: List[FakeLLMProvider]) -> None:
+    served = ", ".join(f"stub {i} served {stub.stats['completed']}" for i, stub in enumerate(stubs))
+    print(f"{label:>22}: wall {result['wall_time_s']:.2f}s | {result['completed_per_s']:.1f} calls/s | "
+          f"failed {result['failed']} | {served}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-provider calls vs. the multi-provider router")
+    parser.add_argument("--calls", type=int, default=200, help="Number of calls per scenario")
+    parser.add_argument("--throttled-limit", type=int, default=20, help="Requests the throttled stub accepts per window")
+    parser.add_argument("--healthy-limit", type=int, default=200, help="Requests the healthy stub accepts per window")
+    parser.add_argument("--window", type=float, default=2.0, help="Stub window in seconds")
+    args = parser.parse_args()
+
+    def stubs():
+        throttled = FakeLLMProvider(requests_per_window=args.throttled_limit, window_seconds=args.window,
+                                    retry_after_seconds=args.window / 2, latency_seconds=0.05)
+        healthy = FakeLLMProvider(requests_per_window=args.healthy_limit, window_seconds=args.window,
+                                  latency_seconds=0.15)
+        return throttled, healthy
+
+    print(f"\n=== One provider throttled ({args.throttled_limit}/{args.window}s) ===")
+    throttled, healthy = stubs()
+    async with throttled, healthy:
+        async with build_manager(throttled, "stub/throttled", args.window) as manager:
+            result = await run_calls(manager, args.calls)
+        print_result("throttled stub alone", result, [throttled, healthy])
+
+    throttled, healthy = stubs()
+    async with throttled, healthy:
+        router = LLMRouter({
+            "throttled": build_manager(throttled, "stub/throttled", args.window),
+            "healthy": build_manager(healthy, "stub/healthy", args.window),
+        })
+        result = await run_calls(router, args.calls)
+        await router.close()
+        print_result("router over both", result, [throttled, healthy])
+        router.print_provider_stats()
+
+    print(f"\n=== Outage: second stub answers 503 after {args.calls // 4} calls ===")
+    first, second = FakeLLMProvider(latency_seconds=0.1, requests_per_window=10_000), \
+        FakeLLMProvider(latency_seconds=0.05, requests_per_window=10_000)
+    async with first, second:
+        router = LLMRouter({
+            "first": build_manager(first, "stub/first", args.window),
+            "second": build_manager(second, "stub/second", args.window),
+        }, cooldown_seconds=5.0)
+
+        def start_outage(done: int):
+            if done == args.calls // 4:
+                second.outage = True
+
+        result = await run_calls(router, args.calls, max_attempts=1, on_progress=start_outage)
+        await router.close()
+        print_result("router over both", result, [first, second])
+        print(f"   failovers {router.failovers}, 503s from second stub {second.stats['outage_errors']}")
+        router.print_provider_stats()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
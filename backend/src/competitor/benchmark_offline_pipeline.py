@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Offline Pipeline Benchmark
+
+Run a pipeline script end to end against the mock LLM backend, so the
+non-LLM overhead (prompt building, validation, caching, file IO) can be
+measured without network access or API spend.
+
+The script's own input files and output directories are used unchanged;
+only the LLM is replaced (see utils/mock_llm.py).
+
+Usage:
+    python3 benchmark_offline_pipeline.py process_reviews --mode synthetic --latency 0.2
+    python3 benchmark_offline_pipeline.py categorize_review_aspects --mode replay
+"""
+
+import argparse
+import asyncio
+import importlib
+import os
+import time
+
+PIPELINE_SCRIPTS = (
+    "segment_products",
+    "process_reviews",
+    "categorize_review_aspects",
+    "final_assign_aspects_only",
+)
+
+
+async def run_script(module_name: str) -> float:
+    """Import a pipeline script (which builds its LLM at import time) and time its main()"""
+    module = importlib.import_module(module_name)
+    start = time.perf_counter()
+    await module.main()
+    wall_time = time.perf_counter() - start
+
+    stats = module.llm_manager.mock.stats
+    print(f"\n=== {module_name} ({os.environ['LLM_BACKEND']}) ===")
+    print(f"wall {wall_time:.2f}s | {stats['calls']} LLM calls | {stats['calls'] / wall_time:.1f} calls/s")
+    print(f"replayed {stats['replayed']} | synthesized {stats['synthesized']} | "
+          f"replay misses {stats['replay_misses']} | injected failures {stats['failures_injected']}")
+    latency = module.llm_manager.latency_control.snapshot()
+    if latency['latency']['count']:
+        print(f"LLM latency p50 {latency['latency']['p50']:.2f}s, p95 {latency['latency']['p95']:.2f}s")
+    return wall_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a pipeline script against the offline LLM backend")
+    parser.add_argument("script", choices=PIPELINE_SCRIPTS, help="Pipeline script to run")
+    parser.add_argument("--mode", choices=("synthetic", "replay"), default="synthetic", help="Mock backend mode")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean simulated LLM latency in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of calls answered with a 529")
+    args = parser.parse_args()
+
+    # The scripts read these when their config is created at import time
+    os.environ["LLM_BACKEND"] = args.mode
+    os.environ["MOCK_LLM_LATENCY"] = str(args.latency)
+    os.environ["MOCK_LLM_FAILURE_RATE"] = str(args.failure_rate)
+    asyncio.run(run_script(args.script))
+
+
+if __name__ == "__main__":
+    main()
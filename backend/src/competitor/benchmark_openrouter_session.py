@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+OpenRouter Session Microbenchmark
+
+Compare per-call overhead of OpenRouterManager with one aiohttp session per
+request (previous behaviour) against the pooled keep-alive session.
+
+Runs against a local FakeLLMProvider with zero simulated latency, so the
+measured time is almost entirely client/connection overhead. Real runs also
+pay a TLS handshake per new connection, which this local benchmark does not
+include - the gap against openrouter.ai is larger.
+
+Usage:
+    python3 benchmark_openrouter_session.py [--requests 500] [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+import aiohttp
+
+from utils.fake_llm_provider import FakeLLMProvider
+from utils.openrouter_utils import OpenRouterAPIError, OpenRouterManager
+from utils.rate_limiter import RateLimiter
+
+
+class PerCallSessionManager(OpenRouterManager):
+    """Previous behaviour: a new ClientSession (and TCP connection) for every request"""
+
+    async def _post_chat_completion(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(
+                self.base_url,
+                headers=self.headers,
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=60)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise OpenRouterAPIError(response.status, error_text, dict(response.headers))
+                return await response.json(), dict(response.headers)
+
+
+def build_manager(manager_class, url: str, concurrency: int) -> OpenRouterManager:
+    """Create a manager with a private, effectively unlimited rate limiter"""
+    limiter = RateLimiter(
+        max_requests_per_minute=10 ** 6,
+        max_input_tokens_per_minute=10 ** 9,
+        max_output_tokens_per_minute=10 ** 9,
+        max_concurrent_requests=concurrency
+    )
+    return manager_class(
+        model_name="fake-model",
+        rate_limiter=limiter,
+        adaptive_rate_control=False,
+        base_url=url,
+        api_key="benchmark"
+    )
+
+
+async def run_workload(manager: OpenRouterManager, num_requests: int, concurrency: int) -> Dict[str, float]:
+    """Issue num_requests calls from `concurrency` workers and time each call"""
+    latencies: List[float] = []
+    remaining = iter(range(num_requests))
+
+    async def worker():
+        for i in remaining:
+            start = time.perf_counter()
+            await manager.safe_call(f"benchmark prompt {i}", estimated_input_tokens=10)
+            latencies.append(time.perf_counter() - start)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - wall_start
+    await manager.close()
+
+    latencies.sort()
+    return {
+        "wall_time_s": wall_time,
+        "throughput_rps": num_requests / wall_time,
+        "mean_call_ms": statistics.mean(latencies) * 1000,
+        "p95_call_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark OpenRouterManager session reuse")
+    parser.add_argument("--requests", type=int, default=500, help="Number of calls")
+    parser.add_argument("--concurrency", type=int, default=20, help="Max concurrent requests")
+    args = parser.parse_args()
+
+    async with FakeLLMProvider(requests_per_window=10 ** 6, latency_seconds=0) as provider:
+        print(f"Workload: {args.requests} calls, {args.concurrency} concurrent, local stub at {provider.url}\n")
+
+        # Sequential calls expose pure per-call overhead; concurrent calls show throughput
+        for label, concurrency in [("sequential", 1), ("concurrent", args.concurrency)]:
+            for name, manager_class in [("per-call session (previous)", PerCallSessionManager),
+                                        ("pooled keep-alive session", OpenRouterManager)]:
+                manager = build_manager(manager_class, provider.url, concurrency)
+                stats = await run_workload(manager, args.requests, concurrency)
+                print(f"{label:>10} | {name:>28}: wall {stats['wall_time_s']:.2f}s | "
+                      f"{stats['throughput_rps']:.0f} calls/s | "
+                      f"mean {stats['mean_call_ms']:.2f}ms, p95 {stats['p95_call_ms']:.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
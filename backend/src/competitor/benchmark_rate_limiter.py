@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+RateLimiter Microbenchmark
+
+Compare acquire latency and throughput of the event-driven RateLimiter
+against the previous polling implementation (1 s minimum sleep per check).
+
+The window is shrunk to a couple of seconds so a full run finishes quickly;
+both limiters see the same workload and the same limits.
+
+Usage:
+    python3 benchmark_rate_limiter.py [--requests 200] [--concurrency 20]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+from utils.rate_limiter import RateLimiter
+
+
+class PollingRateLimiter:
+    """Previous RateLimiter algorithm: sum three deques and sleep at least 1 s per check"""
+
+    def __init__(self, max_requests_per_minute: int, max_input_tokens_per_minute: int,
+                 max_output_tokens_per_minute: int, max_concurrent_requests: int,
+                 model_max_tokens: int = 4096, window_seconds: float = 60.0):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_input_tokens_per_minute = max_input_tokens_per_minute
+        self.max_output_tokens_per_minute = max_output_tokens_per_minute
+        self.model_max_tokens = model_max_tokens
+        self.window_seconds = window_seconds
+        self.request_times = deque()
+        self.input_token_times = deque()
+        self.output_token_times = deque()
+        self.semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+    def _get_current_usage(self, deque_obj: deque) -> int:
+        current_time = time.time()
+        while deque_obj and deque_obj[0][0] < current_time - self.window_seconds:
+            deque_obj.popleft()
+        return sum(entry[1] for entry in deque_obj)
+
+    async def acquire(self, estimated_input_tokens: int, estimated_output_tokens: Optional[int] = None) -> None:
+        if estimated_output_tokens is None:
+            estimated_output_tokens = self.model_max_tokens // 2
+        await self.semaphore.acquire()
+        while True:
+            current_time = time.time()
+            requests_remaining = self.max_requests_per_minute - self._get_current_usage(self.request_times)
+            input_remaining = self.max_input_tokens_per_minute - self._get_current_usage(self.input_token_times)
+            output_remaining = self.max_output_tokens_per_minute - self._get_current_usage(self.output_token_times)
+            if (requests_remaining >= 1 and input_remaining >= estimated_input_tokens
+                    and output_remaining >= estimated_output_tokens):
+                self.request_times.append((current_time, 1))
+                self.input_token_times.append((current_time, estimated_input_tokens))
+                self.output_token_times.append((current_time, estimated_output_tokens))
+                break
+            request_wait = 60.0 / self.max_requests_per_minute if requests_remaining < 1 else 0
+            token_wait = 2.0 if (input_remaining < estimated_input_tokens or
+                                 output_remaining < estimated_output_tokens) else 0
+            await asyncio.sleep(max(request_wait, token_wait, 1.0))
+
+    def release(self, reservation=None, actual_input_tokens: Optional[int] = None,
+                actual_output_tokens: Optional[int] = None):
+        self.semaphore.release()
+
+
+async def run_workload(limiter, num_requests: int, call_seconds: float,
+                       input_tokens: int, output_tokens: int) -> Dict[str, float]:
+    """Push num_requests simulated LLM calls through the limiter and time them"""
+    latencies: List[float] = []
+
+    async def one_call():
+        start = time.perf_counter()
+        reservation = await limiter.acquire(input_tokens, output_tokens)
+        latencies.append(time.perf_counter() - start)
+        try:
+            await asyncio.sleep(call_seconds)
+        finally:
+            limiter.release(reservation, input_tokens, output_tokens)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one_call() for _ in range(num_requests)))
+    wall_time = time.perf_counter() - wall_start
+
+    latencies.sort()
+    return {
+        "wall_time_s": wall_time,
+        "throughput_rps": num_requests / wall_time,
+        "mean_acquire_ms": statistics.mean(latencies) * 1000,
+        "p95_acquire_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max_acquire_ms": latencies[-1] * 1000,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark RateLimiter acquire latency")
+    parser.add_argument("--requests", type=int, default=200, help="Number of simulated calls")
+    parser.add_argument("--concurrency", type=int, default=20, help="Max concurrent requests")
+    parser.add_argument("--window", type=float, default=1.3, help="Rate limit window in seconds")
+    parser.add_argument("--requests-per-window", type=int, default=60, help="Request limit per window")
+    parser.add_argument("--call-ms", type=float, default=20.0, help="Simulated LLM call duration")
+    args = parser.parse_args()
+
+    limits = dict(
+        max_requests_per_minute=args.requests_per_window,
+        max_input_tokens_per_minute=args.requests_per_window * 1000,
+        max_output_tokens_per_minute=args.requests_per_window * 500,
+        max_concurrent_requests=args.concurrency,
+        window_seconds=args.window,
+    )
+
+    print(f"Workload: {args.requests} calls, {args.concurrency} concurrent, "
+          f"{args.requests_per_window} requests per {args.window}s window, {args.call_ms}ms per call\n")
+
+    for name, limiter in [("polling (previous)", PollingRateLimiter(**limits)),
+                          ("event-driven", RateLimiter(**limits))]:
+        stats = await run_workload(limiter, args.requests, args.call_ms / 1000, 1000, 500)
+        print(f"{name:>20}: wall {stats['wall_time_s']:.2f}s | "
+              f"{stats['throughput_rps']:.1f} req/s | "
+              f"acquire mean {stats['mean_acquire_ms']:.1f}ms, "
+              f"p95 {stats['p95_acquire_ms']:.1f}ms, max {stats['max_acquire_ms']:.1f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Review Scraping Concurrency Benchmark
+
+Scrape a batch of ASINs against a local stub of the Apify actor API and
+report wall-clock time per concurrency level. The stub answers the same
+endpoints the Apify client uses (start run, wait for finish, list dataset
+items) and keeps every run busy for --actor-seconds, so the numbers show
+how well actor runs overlap:
+
+- blocking: previous behaviour, the synchronous client called inside the coroutine
+- thread:   synchronous client offloaded to a bounded thread pool
+- async:    ApifyClientAsync
+
+With N ASINs and concurrency C the ideal wall time is ceil(N / C) * actor-seconds;
+the blocking variant stays at N * actor-seconds whatever C is.
+
+Usage:
+    python3 benchmark_scrape_reviews.py [--asins 32] [--actor-seconds 1.0] [--concurrency 1 4 16 32]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+import scrape_reviews
+
+
+class StubActorServer:
+    """In-process HTTP server imitating the Apify endpoints used by the review scraper"""
+
+    def __init__(self, actor_seconds: float, reviews_per_run: int = 50):
+        self.actor_seconds = actor_seconds
+        self.reviews_per_run = reviews_per_run
+        self.runs: Dict[str, float] = {}  # run id -> finish time
+        self.run_pages: Dict[str, int] = {}  # run id -> maxPages of its input
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_object(self, run_id: str) -> Dict:
+        finished = time.time() >= self.runs[run_id]
+        return {
+            "id": run_id,
+            "actId": "stub-actor",
+            "userId": "stub-user",
+            "startedAt": "2025-01-01T00:00:00.000Z",
+            "finishedAt": "2025-01-01T00:00:01.000Z" if finished else None,
+            "status": "SUCCEEDED" if finished else "RUNNING",
+            "meta": {"origin": "API"},
+            "stats": {},
+            "options": {"build": "latest", "timeoutSecs": 300, "memoryMbytes": 1024, "diskMbytes": 2048},
+            "buildId": "stub-build",
+            "buildNumber": "0.0.1",
+            "defaultDatasetId": f"dataset-{run_id}",
+            "defaultKeyValueStoreId": f"store-{run_id}",
+            "defaultRequestQueueId": f"queue-{run_id}",
+            "containerUrl": "http://localhost",
+        }
+
+    def dataset_items(self, run_id: str) -> List[Dict]:
+        """Reviews of a run: reviews_per_run, cut to the requested maxPages at 10 reviews per page"""
+        max_pages = self.run_pages.get(run_id)
+        count = min(self.reviews_per_run, max_pages * 10) if max_pages else self.reviews_per_run
+        return [
+            {
+                "reviewId": f"R{i}",
+                "text": "Works as expected, easy install.",
+                "rating": "5.0 out of 5 stars",
+                "date": "Reviewed in the United States on May 23, 2025",
+                "currentPage": i // 10 + 1,
+            }
+            for i in range(count)
+        ]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, payload, status: int = 200, headers: Dict[str, str] = None) -> None:
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not urlparse(self.path).path.endswith("/runs"):
+                    return self.send_json({"error": {"message": "not found"}}, 404)
+                run_id = uuid.uuid4().hex[:17]
+                try:
+                    max_pages = json.loads(body)["input"][0]["maxPages"]
+                except (ValueError, KeyError, IndexError, TypeError):
+                    max_pages = None
+                with stub.lock:
+                    stub.runs[run_id] = time.time() + stub.actor_seconds
+                    stub.run_pages[run_id] = max_pages
+                self.send_json({"data": stub.run_object(run_id)}, 201)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                parts = url.path.strip("/").split("/")
+
+                if len(parts) == 3 and parts[1] == "actor-runs" and parts[2] in stub.runs:
+                    # waitForFinish blocks like the real API, capped at the requested seconds
+                    wait_seconds = float(query.get("waitForFinish", ["0"])[0])
+                    remaining = stub.runs[parts[2]] - time.time()
+                    if remaining > 0:
+                        time.sleep(min(remaining, wait_seconds))
+                    return self.send_json({"data": stub.run_object(parts[2])})
+
+                if len(parts) == 4 and parts[1] == "datasets" and parts[3] == "items":
+                    items = stub.dataset_items(parts[2][len("dataset-"):])
+                    offset = int(query.get("offset", ["0"])[0])
+                    limit = int(query.get("limit", [str(len(items))])[0])
+                    page = items[offset:offset + limit]
+                    return self.send_json(page, headers={
+                        "X-Apify-Pagination-Total": str(len(items)),
+                        "X-Apify-Pagination-Offset": str(offset),
+                        "X-Apify-Pagination-Limit": str(limit),
+                        "X-Apify-Pagination-Count": str(len(page)),
+                        "X-Apify-Pagination-Desc": "false",
+                    })
+
+                self.send_json({"error": {"message": "not found"}}, 404)
+
+        return Handler
+
+
+class BlockingProvider:
+    """Previous behaviour: the synchronous client runs on the event loop thread"""
+
+    def __init__(self, max_concurrent_runs: int):
+        self.max_concurrent_runs = max_concurrent_runs
+
+    async def get_reviews(self, asin, max_pages=None):
+        return scrape_reviews.get_amazon_reviews_apify(asin, max_pages=max_pages)
+
+    def close(self):
+        pass
+
+
+async def run_scrape(asins: List[str], variant: str, concurrency: int, api_url: str) -> Dict[str, float]:
+    """Scrape all ASINs into a fresh directory and time the batch"""
+    with tempfile.TemporaryDirectory() as review_dir:
+        scrape_reviews.AMAZON_REVIEW_DIR = review_dir
+        semaphore = asyncio.Semaphore(concurrency)
+        if variant == "blocking":
+            provider = BlockingProvider(concurrency)
+        else:
+            provider = scrape_reviews.ApifyReviewProvider(backend=variant, max_concurrent_runs=concurrency,
+                                                          api_url=api_url)
+
+        start = time.perf_counter()
+        try:
+            results = await asyncio.gather(*[
+                scrape_reviews.scrape_product_reviews(asin, semaphore, scrape_reviews.DEFAULT_COVERAGE_MONTHS, provider)
+                for asin in asins
+            ])
+        finally:
+            provider.close()
+        elapsed = time.perf_counter() - start
+
+    return {
+        "seconds": elapsed,
+        "successful": sum(1 for r in results if r.get("status") == "success"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark review scraping concurrency against a stub Apify actor")
+    parser.add_argument("--asins", type=int, default=32, help="Number of ASINs to scrape per run")
+    parser.add_argument("--actor-seconds", type=float, default=1.0, help="Simulated duration of one actor run")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32],
+                        help="MAX_CONCURRENT_REQUESTS values to measure")
+    parser.add_argument("--variants", nargs="+", default=["blocking", "thread", "async"],
+                        choices=["blocking", "thread", "async"], help="Scraping variants to compare")
+    args = parser.parse_args()
+
+    stub = StubActorServer(args.actor_seconds)
+    stub.start()
+    scrape_reviews.APIFY_API_TOKEN = "stub-token"
+    scrape_reviews.APIFY_API_URL = stub.url
+
+    asins = [f"BSTUB{i:05d}" for i in range(args.asins)]
+    rows = []
+    try:
+        for concurrency in args.concurrency:
+            for variant in args.variants:
+                result = asyncio.run(run_scrape(asins, variant, concurrency, stub.url))
+                rows.append((variant, concurrency, result))
+    finally:
+        stub.stop()
+
+    print(f"\n📊 {args.asins} ASINs, {args.actor_seconds:.2f} s per actor run\n")
+    print(f"{'variant':<10} {'concurrency':>11} {'wall s':>8} {'ideal s':>8} {'ok':>4}")
+    for variant, concurrency, result in rows:
+        ideal = math.ceil(args.asins / concurrency) * args.actor_seconds
+        print(f"{variant:<10} {concurrency:>11} {result['seconds']:>8.2f} {ideal:>8.2f} {result['successful']:>4}")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,11 +21,14 @@ import asyncio
 
 # Import utility modules
 from utils.config import get_process_review_config
-from utils.llm_utils import initialize_global_llm, safe_llm_call
-from utils.prompt_utils import load_prompt
+from utils.llm_utils import initialize_global_llm, safe_llm_call, safe_llm_stream_call
+from utils.llm_router import LLMRouter
+from utils.prompt_utils import load_prompt, compile_prompt, count_tokens
 from utils.json_utils import extract_json_from_response
 from utils.cache_utils import LLMCache
-from utils.rate_limiter import RateLimiter
+from utils.write_behind import get_write_behind_writer
+from utils.rate_limit_registry import get_shared_rate_limiter
+from utils.streaming_json import IncrementalJSONValidator, StreamValidationError
 
 # === CONFIGURATION ===
 config = get_process_review_config()
@@ -36,16 +39,9 @@ PRODUCTS_CSV_PATH = config.get_data_path("result", "product_segment", "combined_
 # Categorization batch size - number of aspects to process in each LLM call
 CATEGORIZATION_BATCH_SIZE = 150
 
-# Initialize LLM with configuration
-llm_manager = initialize_global_llm(
-    model_name=config.MODEL_NAME,
-    temperature=config.MODEL_TEMPERATURE,
-    max_tokens=config.MODEL_MAX_TOKENS
-)
-
-# Initialize cache and rate limiter
-cache_manager = LLMCache(config.CACHE_DIR)
-rate_limiter = RateLimiter(
+# Rate limiter draws from the host-wide budget for this model, shared with other scripts
+rate_limiter = get_shared_rate_limiter(
+    config.MODEL_NAME,
     max_requests_per_minute=config.MAX_REQUESTS_PER_MINUTE,
     max_input_tokens_per_minute=config.MAX_INPUT_TOKENS_PER_MINUTE,
     max_output_tokens_per_minute=config.MAX_OUTPUT_TOKENS_PER_MINUTE,
@@ -53,14 +49,33 @@ rate_limiter = RateLimiter(
     model_max_tokens=config.MODEL_MAX_TOKENS
 )
 
+# Initialize LLM with configuration
+llm_manager = initialize_global_llm(
+    model_name=config.MODEL_NAME,
+    temperature=config.MODEL_TEMPERATURE,
+    max_tokens=config.MODEL_MAX_TOKENS,
+    rate_limiter=rate_limiter,
+    call_timeout=config.LLM_CALL_TIMEOUT,
+    hedge_percentile=config.LLM_HEDGE_PERCENTILE,
+    providers=config.LLM_PROVIDERS,
+    backend=config.LLM_BACKEND,
+    mock_options=config.get_mock_llm_options(),
+    trace_path=config.LLM_TRACE_PATH
+)
+
+# Initialize cache; cache and result writes are persisted on a background thread, off the event loop
+write_behind = get_write_behind_writer()
+cache_manager = LLMCache(config.CACHE_DIR, telemetry=llm_manager.telemetry, backend=config.CACHE_BACKEND,
+                         model_name=config.MODEL_NAME, writer=write_behind)
+
 # Load categorization prompt template
-CATEGORIZE_PROMPT_TEMPLATE = load_prompt("categorize_review_aspects_prompt_v0.txt", config.PROMPT_DIR)
+CATEGORIZE_PROMPT = compile_prompt("categorize_review_aspects_prompt_v0.txt", config.PROMPT_DIR, style="format")
 
 # Load consolidation prompt template
-CONSOLIDATE_PROMPT_TEMPLATE = load_prompt("consolidate_aspect_categories_prompt_v0.txt", config.PROMPT_DIR)
+CONSOLIDATE_PROMPT = compile_prompt("consolidate_aspect_categories_prompt_v0.txt", config.PROMPT_DIR, style="format")
 
 # Load final assignment prompt template
-FINAL_ASSIGN_PROMPT_TEMPLATE = load_prompt("final_assign_aspects_prompt_v0.txt", config.PROMPT_DIR)
+FINAL_ASSIGN_PROMPT = compile_prompt("final_assign_aspects_prompt_v0.txt", config.PROMPT_DIR, style="format")
 
 # Load shared retry prompt template  
 SHARED_RETRY_PROMPT_TEMPLATE = load_prompt("shared_retry_prompt_v0.txt", config.PROMPT_DIR / "product_segment")
@@ -172,6 +187,30 @@ def extract_use_aspects(use_data: Dict[str, Any]) -> List[Tuple[str, str, str]]:
     
     return aspects
 
+class CategorizationStreamValidator(IncrementalJSONValidator):
+    """
+    Streaming shape check for categorization output:
+    {"<category>": {"definition": "...", "ids": [...]}, ...}
+    
+    Aborts as soon as a category is not an object or the nesting goes
+    deeper than the ids array.
+    """
+    
+    def __init__(self):
+        super().__init__(max_depth=3)
+    
+    def check_container(self, path, kind):
+        if len(path) == 1 and kind != '{':
+            return f"Category '{path[0]}' must be an object with 'definition' and 'ids' fields"
+        if len(path) == 2 and (path[1] != "ids" or kind != '['):
+            return f"Unexpected {'array' if kind == '[' else 'object'} for '{path[1]}' in category '{path[0]}'"
+        return None
+    
+    def check_value(self, path, value):
+        if len(path) == 1:
+            return f"Category '{path[0]}' must be an object with 'definition' and 'ids' fields"
+        return None
+
 def format_aspects_for_prompt(aspects: List[Tuple[str, str]]) -> str:
     """Format aspects for the categorization prompt"""
     formatted_lines = []
@@ -423,6 +462,11 @@ def parse_and_validate_categorization_response(response_text: str, expected_ids:
     
     return False, retry_context
 
+# Stored with parsed results in the cache; bump whenever the categorize JSON parsing,
+# parse_and_validate_consolidate_response or parse_and_validate_final_categorization_response
+# change, so results cached by older rules are parsed and validated again
+VALIDATOR_VERSION = "1"
+
 def parse_and_validate_consolidate_response(response_text: str, expected_a_ids: set, 
                                           expected_b_ids: set, aspect_type: str) -> Tuple[bool, Any]:
     """
@@ -608,13 +652,15 @@ async def categorize_aspects_batch(aspects: List[Tuple[str, str]], aspect_type:
         category_context += f"\nConsider how {aspect_type} aspects relate to customer needs across these {len(product_categories)} product categories."
     
     # Build prompt with template substitution
-    prompt = CATEGORIZE_PROMPT_TEMPLATE.format(
+    prompt, prompt_tokens = CATEGORIZE_PROMPT.render_with_estimate(dict(
         aspect_type=aspect_type,
         aspect_context=aspect_context,
         input_description=input_description
-    )
+    ))
     
-    full_prompt = prompt + category_context + "\n\n**INPUT:**\n" + formatted_aspects
+    input_section = category_context + "\n\n**INPUT:**\n" + formatted_aspects
+    full_prompt = prompt + input_section
+    full_prompt_tokens = prompt_tokens + count_tokens(input_section)
     
     # Create cache context
     cache_context = {
@@ -624,58 +670,74 @@ async def categorize_aspects_batch(aspects: List[Tuple[str, str]], aspect_type:
         "model": config.MODEL_NAME
     }
     
-    # Check cache first
-    cached_response = cache_manager.load_llm_response(full_prompt, cache_context)
+    # Check cache first; a stored parsed result needs no JSON extraction
+    cached_response, cached_result = cache_manager.load_llm_result(full_prompt, cache_context, VALIDATOR_VERSION)
+    if cached_result is not None:
+        print(f"✓ Using parsed cached result for {aspect_type} categorization")
+        return cached_result
     if cached_response:
         print(f"✓ Using cached response for {aspect_type} categorization")
         try:
             json_text = extract_json_from_response(cached_response)
             result = json.loads(json_text)
             print(f"✓ Cached result loaded for {aspect_type}")
+            cache_manager.save_llm_response(full_prompt, cached_response, cache_context,
+                                            parsed=result, validator_version=VALIDATOR_VERSION)
             return result
         except Exception as e:
             print(f"⚠️ Error parsing cached result for {aspect_type}: {e}, re-processing")
     
-    # Process with retry logic and rate limiting
-    base_prompt = prompt + category_context + "\n\n**INPUT:**\n" + formatted_aspects
-    current_prompt = full_prompt
+    # Process with retry logic and rate limiting; the rendered instructions are
+    # the cacheable system prefix, the aspect list is the per-call user message
+    base_prompt = full_prompt
+    current_prompt = input_section
+    current_system_prompt = prompt
+    current_prompt_tokens = full_prompt_tokens
     
     for attempt in range(max_retries):
         try:
             print(f"   Attempt {attempt + 1}/{max_retries} for {aspect_type} categorization")
             
-            # Estimate tokens and acquire rate limit permission
-            estimated_input_tokens = rate_limiter.estimate_tokens(current_prompt)
-            await rate_limiter.acquire(estimated_input_tokens)
-            
+            # Rate limiting happens inside safe_llm_call (shared budget)
             try:
-                response_text = await safe_llm_call(current_prompt)
+                if config.STREAM_VALIDATION:
+                    # Stream and abort as soon as the JSON structure breaks
+                    response_text = await safe_llm_stream_call(
+                        current_prompt, CategorizationStreamValidator(),
+                        context={"interaction": "categorize", "attempt": attempt},
+                        estimated_input_tokens=current_prompt_tokens, system_prompt=current_system_prompt
+                    )
+                else:
+                    response_text = await safe_llm_call(current_prompt, {"interaction": "categorize", "attempt": attempt},
+                                                        estimated_input_tokens=current_prompt_tokens,
+                                                        system_prompt=current_system_prompt)
                 
-                # Release rate limiter
-                actual_output_tokens = rate_limiter.estimate_tokens(response_text)
-                rate_limiter.release(estimated_input_tokens, actual_output_tokens)
+                # Parse JSON response (only JSON validation, no other validation)
+                try:
+                    json_text = extract_json_from_response(response_text)
+                    result = json.loads(json_text)
+                except (json.JSONDecodeError, ValueError):
+                    # Save to cache even when the response does not parse
+                    cache_manager.save_llm_response(full_prompt, response_text, cache_context)
+                    raise
                 
-            except Exception as e:
-                # Always release on error
-                rate_limiter.release()
-                raise e
-            
-            # Save to cache
-            cache_manager.save_llm_response(full_prompt, response_text, cache_context)
-            
-            # Parse JSON response (only JSON validation, no other validation)
-            try:
-                json_text = extract_json_from_response(response_text)
-                result = json.loads(json_text)
+                # Save to cache with the parsed result
+                cache_manager.save_llm_response(full_prompt, response_text, cache_context,
+                                                parsed=result, validator_version=VALIDATOR_VERSION)
                 print(f"✓ {aspect_type} categorization complete")
                 return result
-            except (json.JSONDecodeError, ValueError) as e:
-                print(f"✗ JSON parsing failed for {aspect_type} (attempt {attempt + 1}): {e}")
+            except (json.JSONDecodeError, ValueError, StreamValidationError) as e:
+                if isinstance(e, StreamValidationError):
+                    response_text = e.partial_text
+                    format_error = f"Response aborted while streaming: {e.reason}"
+                else:
+                    format_error = f"Could not extract valid JSON: {e}"
+                print(f"✗ JSON parsing failed for {aspect_type} (attempt {attempt + 1}): {format_error}")
                 
                 if attempt < max_retries - 1:
                     # Create retry context for JSON error only
                     error_categories = {
-                        "format_errors": [f"Could not extract valid JSON: {e}"],
+                        "format_errors": [format_error],
                         "validation_errors": [],
                         "completeness_errors": []
                     }
@@ -698,6 +760,8 @@ async def categorize_aspects_batch(aspects: List[Tuple[str, str]], aspect_type:
                     )
                     
                     current_prompt = retry_prompt
+                    current_system_prompt = None
+                    current_prompt_tokens = None
                     print(f"   Built JSON retry prompt for {aspect_type}")
                 
         except Exception as e:
@@ -811,14 +875,15 @@ async def consolidate_taxonomies(taxonomy_a: Dict[str, Dict[str, Any]], taxonomy
         product_context += f"\n\n**PRODUCT CATEGORIES IN DATASET:** {', '.join(sorted(product_categories))}"
         product_context += f"\nConsider how {aspect_type} aspects relate to customer needs across these {len(product_categories)} product categories."
     
-    base_prompt = CONSOLIDATE_PROMPT_TEMPLATE.format(
+    base_prompt, base_prompt_tokens = CONSOLIDATE_PROMPT.render_with_estimate(dict(
         aspect_type=aspect_type,
         aspect_context=aspect_context,
         taxonomy_a=json.dumps(taxonomy_a_with_ids, indent=2),
         taxonomy_b=json.dumps(taxonomy_b_with_ids, indent=2),
         product_context=product_context
-    )
+    ))
     prompt = base_prompt
+    prompt_tokens = base_prompt_tokens
     
     # Expected IDs for validation
     expected_a_ids = {f"A_{i}" for i in range(len(taxonomy_a))}
@@ -832,13 +897,18 @@ async def consolidate_taxonomies(taxonomy_a: Dict[str, Dict[str, Any]], taxonomy
         "script_type": "aspect_consolidation"
     }
     
-    # Check cache first
-    cached_response = cache_manager.load_llm_response(prompt, cache_context)
+    # Check cache first; a stored validated result needs no JSON extraction
+    cached_response, cached_result = cache_manager.load_llm_result(prompt, cache_context, VALIDATOR_VERSION)
+    if cached_result is not None:
+        print("✓ Using validated cached consolidation result")
+        return cached_result
     if cached_response:
         print("✓ Using cached consolidation result")
         try:
             json_text = extract_json_from_response(cached_response)
             result = json.loads(json_text)
+            cache_manager.save_llm_response(prompt, cached_response, cache_context,
+                                            parsed=result, validator_version=VALIDATOR_VERSION)
             return result
         except Exception as e:
             print(f"⚠️ Error parsing cached consolidation result: {e}, re-processing")
@@ -849,30 +919,20 @@ async def consolidate_taxonomies(taxonomy_a: Dict[str, Dict[str, Any]], taxonomy
         try:
             print(f"Consolidation attempt {attempt + 1}/{max_tries}")
             
-            # Estimate tokens and acquire rate limit permission
-            estimated_input_tokens = rate_limiter.estimate_tokens(prompt)
-            await rate_limiter.acquire(estimated_input_tokens)
-            
-            try:
-                response_text = await safe_llm_call(prompt)
-                
-                # Release rate limiter
-                actual_output_tokens = rate_limiter.estimate_tokens(response_text)
-                rate_limiter.release(estimated_input_tokens, actual_output_tokens)
-                
-            except Exception as e:
-                # Always release on error
-                rate_limiter.release()
-                raise e
-            
-            # Save to cache
-            cache_manager.save_llm_response(prompt, response_text, cache_context)
+            # Rate limiting happens inside safe_llm_call (shared budget)
+            response_text = await safe_llm_call(prompt, {"interaction": "consolidate", "attempt": attempt},
+                                                estimated_input_tokens=prompt_tokens)
             
             # Validate consolidation response
             is_valid, result = parse_and_validate_consolidate_response(
                 response_text, expected_a_ids, expected_b_ids, aspect_type
             )
             
+            # Save to cache; a valid result is stored parsed too
+            cache_manager.save_llm_response(prompt, response_text, cache_context,
+                                            parsed=result if is_valid else None,
+                                            validator_version=VALIDATOR_VERSION)
+            
             if is_valid:
                 consolidated_structure = result
                 print(f"✓ {aspect_type} taxonomies consolidated successfully into {len(consolidated_structure)} categories")
@@ -889,6 +949,7 @@ async def consolidate_taxonomies(taxonomy_a: Dict[str, Dict[str, Any]], taxonomy
                     )
                     
                     prompt = retry_prompt
+                    prompt_tokens = None
                     print(f"Built consolidation retry prompt")
                 
         except Exception as e:
@@ -1066,14 +1127,16 @@ async def final_categorize_aspects_batch(aspects: List[Tuple[str, str]], consoli
     # Format aspects for this batch
     formatted_aspects = format_aspects_for_prompt(aspects)
     
-    # Build final categorization prompt using template
-    base_prompt = FINAL_ASSIGN_PROMPT_TEMPLATE.format(
+    # Build final categorization prompt using template, split before the per-batch
+    # input so instructions and taxonomy form a cacheable system prefix
+    system_prompt, user_prompt, base_prompt_tokens = FINAL_ASSIGN_PROMPT.render_parts(dict(
         aspect_type=aspect_type,
         aspect_context=aspect_context,
         categories_section=categories_section,
         product_context=category_context,
         formatted_aspects=formatted_aspects
-    )
+    ), boundary="product_context")
+    base_prompt = system_prompt + user_prompt
     
     # Expected IDs for validation
     expected_ids = set(aspect_id for aspect_id, _ in aspects)
@@ -1088,13 +1151,18 @@ async def final_categorize_aspects_batch(aspects: List[Tuple[str, str]], consoli
         "model": config.MODEL_NAME
     }
     
-    # Check cache first
-    cached_response = cache_manager.load_llm_response(base_prompt, cache_context)
+    # Check cache first; stored validated assignments need no JSON extraction
+    cached_response, cached_result = cache_manager.load_llm_result(base_prompt, cache_context, VALIDATOR_VERSION)
     if cached_response:
         print(f"✓ Using cached final categorization batch for {aspect_type}")
         try:
-            json_text = extract_json_from_response(cached_response)
-            result = json.loads(json_text)
+            if cached_result is not None:
+                result = cached_result
+            else:
+                json_text = extract_json_from_response(cached_response)
+                result = json.loads(json_text)
+                cache_manager.save_llm_response(base_prompt, cached_response, cache_context,
+                                                parsed=result, validator_version=VALIDATOR_VERSION)
             # Convert category IDs back to category names
             final_assignments = {}
             for aspect_id, cat_id in result.items():
@@ -1107,36 +1175,29 @@ async def final_categorize_aspects_batch(aspects: List[Tuple[str, str]], consoli
             print(f"⚠️ Error parsing cached final categorization batch: {e}, re-processing")
     
     # Process with validation and retry logic
-    current_prompt = base_prompt
+    current_prompt = user_prompt
+    current_system_prompt = system_prompt
+    current_prompt_tokens = base_prompt_tokens
     
     for attempt in range(max_retries):
         try:
             print(f"   Final categorization attempt {attempt + 1}/{max_retries}")
             
-            # Estimate tokens and acquire rate limit permission
-            estimated_input_tokens = rate_limiter.estimate_tokens(current_prompt)
-            await rate_limiter.acquire(estimated_input_tokens)
-            
-            try:
-                response_text = await safe_llm_call(current_prompt)
-                
-                # Release rate limiter
-                actual_output_tokens = rate_limiter.estimate_tokens(response_text)
-                rate_limiter.release(estimated_input_tokens, actual_output_tokens)
-                
-            except Exception as e:
-                # Always release on error
-                rate_limiter.release()
-                raise e
-            
-            # Save to cache
-            cache_manager.save_llm_response(base_prompt, response_text, cache_context)
+            # Rate limiting happens inside safe_llm_call (shared budget)
+            response_text = await safe_llm_call(current_prompt, {"interaction": "final_assign", "attempt": attempt},
+                                                estimated_input_tokens=current_prompt_tokens,
+                                                system_prompt=current_system_prompt)
             
             # Validate final categorization response
             is_valid, result = parse_and_validate_final_categorization_response(
                 response_text, expected_ids, valid_category_ids, aspect_type
             )
             
+            # Save to cache; valid assignments are stored parsed too
+            cache_manager.save_llm_response(base_prompt, response_text, cache_context,
+                                            parsed=result if is_valid else None,
+                                            validator_version=VALIDATOR_VERSION)
+            
             if is_valid:
                 assignments = result
                 # Convert category IDs back to category names
@@ -1161,6 +1222,8 @@ async def final_categorize_aspects_batch(aspects: List[Tuple[str, str]], consoli
                     )
                     
                     current_prompt = retry_prompt
+                    current_system_prompt = None
+                    current_prompt_tokens = None
                     print(f"Built final categorization retry prompt")
                 
         except Exception as e:
@@ -1902,6 +1965,18 @@ async def process_all_products():
         print(f"✓ Category definitions saved to: aspect_category_definitions.json")
         print(f"✓ Categorization results saved to: consolidated_aspect_categorization.json")
         print(f"✓ Results saved to {config.OUTPUT_ROOT_DIR}")
+        if llm_manager.single_flight:
+            print(f"✓ Coalesced {llm_manager.single_flight.stats['coalesced']} of {llm_manager.single_flight.stats['calls']} LLM calls onto identical in-flight requests")
+        latency = llm_manager.latency_control.snapshot()
+        if latency['latency']['count']:
+            print(f"✓ LLM latency p50 {latency['latency']['p50']:.1f}s, p95 {latency['latency']['p95']:.1f}s; "
+                  f"{latency['hedges']} hedged ({latency['hedges_won']} won), {latency['deadline_exceeded']} past deadline")
+        if isinstance(llm_manager, LLMRouter):
+            print(f"✓ Provider routing ({llm_manager.failovers} failovers):")
+            llm_manager.print_provider_stats()
+        print(f"✓ LLM calls by interaction (trace: {config.LLM_TRACE_PATH}):")
+        llm_manager.telemetry.print_summary()
+        llm_manager.telemetry.write_prometheus(config.LLM_METRICS_PATH)
     else:
         print("\n❌ No categorization results generated")
 
@@ -1913,6 +1988,12 @@ async def main():
     except Exception as e:
         print(f"Error during categorization: {e}")
         raise
+    finally:
+        # Persist queued writes and apply the cache limits even when the run fails or finds nothing
+        write_behind.flush()
+        config.prune_cache()
+        if hasattr(llm_manager, "close"):
+            await llm_manager.close()  # Pooled HTTP sessions (OpenRouter)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
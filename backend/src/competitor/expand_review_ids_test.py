@@ -12,24 +12,27 @@ from datetime import datetime
 
 # Import utility modules
 from utils.config import get_process_review_config
+from utils.review_manifest import get_review_manifest
+from utils.review_store import ReviewStore, select_review_file
 
 # === CONFIGURATION ===
 config = get_process_review_config()
 
 # Data paths
 REVIEW_DATA_DIR = config.get_data_path("scraped", "amazon", "review")
+REVIEW_STORE_DIR = config.get_data_path("scraped", "amazon", "review_store")
 CONSOLIDATED_RESULTS_PATH = config.get_data_path("result", "process_review", "20250609_01", "consolidated_review_results.json")
 
 def load_review_file(asin: str) -> Dict[str, Any]:
     """Load the original review file for a given ASIN"""
-    review_files = list(REVIEW_DATA_DIR.glob(f"{asin}_*_reviews.json"))
+    review_file = select_review_file(asin, get_review_manifest(REVIEW_DATA_DIR), ReviewStore(REVIEW_STORE_DIR))
     
-    if not review_files:
+    if not review_file:
         print(f"⚠️ No review file found for ASIN {asin}")
         return {}
     
     try:
-        with open(review_files[0], 'r', encoding='utf-8') as f:
+        with open(review_file, 'r', encoding='utf-8') as f:
             data = json.load(f)
         
         reviews = data.get('reviews_data', {}).get('reviews', [])
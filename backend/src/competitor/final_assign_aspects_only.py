@@ -24,24 +24,18 @@ import asyncio
 # Import utility modules
 from utils.config import get_process_review_config
 from utils.llm_utils import initialize_global_llm, safe_llm_call
-from utils.prompt_utils import load_prompt
+from utils.prompt_utils import compile_prompt
 from utils.json_utils import extract_json_from_response
 from utils.cache_utils import LLMCache
-from utils.rate_limiter import RateLimiter
+from utils.write_behind import get_write_behind_writer
+from utils.rate_limit_registry import get_shared_rate_limiter
 
 # === CONFIGURATION ===
 config = get_process_review_config()
 
-# Initialize LLM with configuration
-llm_manager = initialize_global_llm(
-    model_name=config.MODEL_NAME,
-    temperature=config.MODEL_TEMPERATURE,
-    max_tokens=config.MODEL_MAX_TOKENS
-)
-
-# Initialize cache and rate limiter
-cache_manager = LLMCache(config.CACHE_DIR)
-rate_limiter = RateLimiter(
+# Rate limiter draws from the host-wide budget for this model, shared with other scripts
+rate_limiter = get_shared_rate_limiter(
+    config.MODEL_NAME,
     max_requests_per_minute=config.MAX_REQUESTS_PER_MINUTE,
     max_input_tokens_per_minute=config.MAX_INPUT_TOKENS_PER_MINUTE,
     max_output_tokens_per_minute=config.MAX_OUTPUT_TOKENS_PER_MINUTE,
@@ -49,8 +43,27 @@ rate_limiter = RateLimiter(
     model_max_tokens=config.MODEL_MAX_TOKENS
 )
 
+# Initialize LLM with configuration
+llm_manager = initialize_global_llm(
+    model_name=config.MODEL_NAME,
+    temperature=config.MODEL_TEMPERATURE,
+    max_tokens=config.MODEL_MAX_TOKENS,
+    rate_limiter=rate_limiter,
+    call_timeout=config.LLM_CALL_TIMEOUT,
+    hedge_percentile=config.LLM_HEDGE_PERCENTILE,
+    providers=config.LLM_PROVIDERS,
+    backend=config.LLM_BACKEND,
+    mock_options=config.get_mock_llm_options(),
+    trace_path=config.LLM_TRACE_PATH
+)
+
+# Initialize cache; cache and result writes are persisted on a background thread, off the event loop
+write_behind = get_write_behind_writer()
+cache_manager = LLMCache(config.CACHE_DIR, telemetry=llm_manager.telemetry, backend=config.CACHE_BACKEND,
+                         model_name=config.MODEL_NAME, writer=write_behind)
+
 # Load final assignment prompt template
-FINAL_ASSIGN_PROMPT_TEMPLATE = load_prompt("final_assign_aspects_prompt_v0.txt", config.PROMPT_DIR)
+FINAL_ASSIGN_PROMPT = compile_prompt("final_assign_aspects_prompt_v0.txt", config.PROMPT_DIR, style="format")
 
 # Batch size for final assignment
 FINAL_ASSIGNMENT_BATCH_SIZE = 150
@@ -222,35 +235,23 @@ async def final_categorize_aspects_batch(aspects: List[Tuple[str, str]], consoli
     
     categories_formatted = "\n".join(categories_text)
     
-    # Prepare prompt
-    prompt = FINAL_ASSIGN_PROMPT_TEMPLATE.format(
+    # Prepare prompt: instructions and taxonomy are the cacheable prefix shared by every batch
+    system_prompt, prompt, prompt_tokens = FINAL_ASSIGN_PROMPT.render_parts(dict(
         aspect_type=aspect_type,
         aspect_context=aspect_context,
         categories_section=categories_formatted,
         formatted_aspects=aspects_text,
         product_context=f"**PRODUCT CONTEXT:** {', '.join(sorted(product_categories))}" if product_categories else ""
-    )
+    ), boundary="product_context")
     
     expected_ids = {aspect_id for aspect_id, _ in aspects}
     valid_category_ids = set(consolidated_categories.keys())
     
     for attempt in range(max_retries):
         try:
-            # Estimate tokens and acquire rate limit permission
-            estimated_input_tokens = rate_limiter.estimate_tokens(prompt)
-            await rate_limiter.acquire(estimated_input_tokens)
-            
-            try:
-                response = await safe_llm_call(prompt)
-                
-                # Release rate limiter
-                actual_output_tokens = rate_limiter.estimate_tokens(response)
-                rate_limiter.release(estimated_input_tokens, actual_output_tokens)
-                
-            except Exception as e:
-                # Always release on error
-                rate_limiter.release()
-                raise e
+            # Rate limiting happens inside safe_llm_call (shared budget)
+            response = await safe_llm_call(prompt, {"interaction": "final_assign", "attempt": attempt},
+                                           estimated_input_tokens=prompt_tokens, system_prompt=system_prompt)
             
             if not response or not response.strip():
                 print(f"  空响应，重试 {attempt + 1}/{max_retries}")
@@ -349,138 +350,148 @@ async def main():
     """
     print("=== 开始执行第5.4步：最终方面分配 ===")
     
-    # Get the latest process review directory
-    process_review_dir = config.get_data_path("result", "process_review")
-    if not process_review_dir.exists():
-        print(f"错误: 未找到process_review目录: {process_review_dir}")
-        return
-    
-    # Find the latest directory (should be from step 4)
-    date_dirs = [d for d in process_review_dir.iterdir() if d.is_dir() and d.name.startswith('202')]
-    if not date_dirs:
-        print(f"错误: 未找到任何日期目录在 {process_review_dir}")
-        return
-    
-    latest_dir = max(date_dirs, key=lambda x: x.name)
-    print(f"使用最新的结果目录: {latest_dir}")
-    
-    # Load expanded review results (from step 4)
-    expanded_results_path = latest_dir / "expanded_review_results.json"
-    if not expanded_results_path.exists():
-        print(f"错误: 未找到expanded_review_results.json在 {expanded_results_path}")
-        return
-    
-    print(f"加载评论结果: {expanded_results_path}")
-    with open(expanded_results_path, 'r', encoding='utf-8') as f:
-        review_results = json.load(f)
-    
-    print(f"加载了 {len(review_results)} 个产品的评论数据")
-    
-    # Load existing aspect category definitions
-    aspect_definitions_path = latest_dir / "aspect_category_definitions.json"
-    if not aspect_definitions_path.exists():
-        print(f"错误: 未找到aspect_category_definitions.json在 {aspect_definitions_path}")
-        return
-    
-    print(f"加载分类定义: {aspect_definitions_path}")
-    with open(aspect_definitions_path, 'r', encoding='utf-8') as f:
-        aspect_definitions = json.load(f)
-    
-    # Extract category definitions by type
-    category_definitions = aspect_definitions.get('category_definitions', {})
-    phy_categories = category_definitions.get('physical_categories', {})
-    perf_categories = category_definitions.get('performance_categories', {})
-    use_categories = category_definitions.get('use_categories', {})
-    
-    print(f"加载的分类数量:")
-    print(f"  物理分类: {len(phy_categories)}")
-    print(f"  性能分类: {len(perf_categories)}")
-    print(f"  使用分类: {len(use_categories)}")
-    
-    # Load product categories
-    product_categories = load_product_categories_from_csv()
-    
-    # Extract all aspects from review results
-    print("\n=== 提取所有方面问题 ===")
-    all_aspects = extract_aspects_from_review_results(review_results)
-    
-    # Separate by type
-    phy_aspects = [(aid, atype, cat, desc) for aid, atype, cat, desc in all_aspects if atype == 'phy']
-    perf_aspects = [(aid, atype, cat, desc) for aid, atype, cat, desc in all_aspects if atype == 'perf']
-    use_aspects = [(aid, atype, cat, desc) for aid, atype, cat, desc in all_aspects if atype == 'use']
-    
-    print(f"按类型分组:")
-    print(f"  物理方面: {len(phy_aspects)}")
-    print(f"  性能方面: {len(perf_aspects)}")
-    print(f"  使用方面: {len(use_aspects)}")
-    
-    # Process each type
-    final_assignments = {}
-    
-    # Process physical aspects
-    if phy_aspects and phy_categories:
-        print(f"\n=== 处理物理方面 ===")
-        unique_phy, phy_mapping, _, _, phy_unified_map = deduplicate_aspects(phy_aspects)
+    try:
+        # Get the latest process review directory
+        process_review_dir = config.get_data_path("result", "process_review")
+        if not process_review_dir.exists():
+            print(f"错误: 未找到process_review目录: {process_review_dir}")
+            return
+    
+        # Find the latest directory (should be from step 4)
+        date_dirs = [d for d in process_review_dir.iterdir() if d.is_dir() and d.name.startswith('202')]
+        if not date_dirs:
+            print(f"错误: 未找到任何日期目录在 {process_review_dir}")
+            return
+    
+        latest_dir = max(date_dirs, key=lambda x: x.name)
+        print(f"使用最新的结果目录: {latest_dir}")
+    
+        # Load expanded review results (from step 4)
+        expanded_results_path = latest_dir / "expanded_review_results.json"
+        if not expanded_results_path.exists():
+            print(f"错误: 未找到expanded_review_results.json在 {expanded_results_path}")
+            return
+    
+        print(f"加载评论结果: {expanded_results_path}")
+        with open(expanded_results_path, 'r', encoding='utf-8') as f:
+            review_results = json.load(f)
+    
+        print(f"加载了 {len(review_results)} 个产品的评论数据")
+    
+        # Load existing aspect category definitions
+        aspect_definitions_path = latest_dir / "aspect_category_definitions.json"
+        if not aspect_definitions_path.exists():
+            print(f"错误: 未找到aspect_category_definitions.json在 {aspect_definitions_path}")
+            return
+    
+        print(f"加载分类定义: {aspect_definitions_path}")
+        with open(aspect_definitions_path, 'r', encoding='utf-8') as f:
+            aspect_definitions = json.load(f)
+    
+        # Extract category definitions by type
+        category_definitions = aspect_definitions.get('category_definitions', {})
+        phy_categories = category_definitions.get('physical_categories', {})
+        perf_categories = category_definitions.get('performance_categories', {})
+        use_categories = category_definitions.get('use_categories', {})
+    
+        print(f"加载的分类数量:")
+        print(f"  物理分类: {len(phy_categories)}")
+        print(f"  性能分类: {len(perf_categories)}")
+        print(f"  使用分类: {len(use_categories)}")
+    
+        # Load product categories
+        product_categories = load_product_categories_from_csv()
+    
+        # Extract all aspects from review results
+        print("\n=== 提取所有方面问题 ===")
+        all_aspects = extract_aspects_from_review_results(review_results)
+    
+        # Separate by type
+        phy_aspects = [(aid, atype, cat, desc) for aid, atype, cat, desc in all_aspects if atype == 'phy']
+        perf_aspects = [(aid, atype, cat, desc) for aid, atype, cat, desc in all_aspects if atype == 'perf']
+        use_aspects = [(aid, atype, cat, desc) for aid, atype, cat, desc in all_aspects if atype == 'use']
+    
+        print(f"按类型分组:")
+        print(f"  物理方面: {len(phy_aspects)}")
+        print(f"  性能方面: {len(perf_aspects)}")
+        print(f"  使用方面: {len(use_aspects)}")
+    
+        # Process each type
+        final_assignments = {}
+    
+        # Process physical aspects
+        if phy_aspects and phy_categories:
+            print(f"\n=== 处理物理方面 ===")
+            unique_phy, phy_mapping, _, _, phy_unified_map = deduplicate_aspects(phy_aspects)
         
-        phy_assignments = await final_categorize_aspects(
-            unique_phy, phy_categories, "physical", "physical aspects", product_categories
-        )
+            phy_assignments = await final_categorize_aspects(
+                unique_phy, phy_categories, "physical", "physical aspects", product_categories
+            )
         
-        expanded_phy = expand_final_assignments_to_original_aspects(
-            phy_assignments, phy_unified_map, phy_aspects
-        )
-        final_assignments.update(expanded_phy)
+            expanded_phy = expand_final_assignments_to_original_aspects(
+                phy_assignments, phy_unified_map, phy_aspects
+            )
+            final_assignments.update(expanded_phy)
     
-    # Process performance aspects
-    if perf_aspects and perf_categories:
-        print(f"\n=== 处理性能方面 ===")
-        unique_perf, perf_mapping, _, _, perf_unified_map = deduplicate_aspects(perf_aspects)
+        # Process performance aspects
+        if perf_aspects and perf_categories:
+            print(f"\n=== 处理性能方面 ===")
+            unique_perf, perf_mapping, _, _, perf_unified_map = deduplicate_aspects(perf_aspects)
         
-        perf_assignments = await final_categorize_aspects(
-            unique_perf, perf_categories, "performance", "performance aspects", product_categories
-        )
+            perf_assignments = await final_categorize_aspects(
+                unique_perf, perf_categories, "performance", "performance aspects", product_categories
+            )
         
-        expanded_perf = expand_final_assignments_to_original_aspects(
-            perf_assignments, perf_unified_map, perf_aspects
-        )
-        final_assignments.update(expanded_perf)
+            expanded_perf = expand_final_assignments_to_original_aspects(
+                perf_assignments, perf_unified_map, perf_aspects
+            )
+            final_assignments.update(expanded_perf)
     
-    # Process use aspects
-    if use_aspects and use_categories:
-        print(f"\n=== 处理使用方面 ===")
-        unique_use, use_mapping, _, _, use_unified_map = deduplicate_aspects(use_aspects)
+        # Process use aspects
+        if use_aspects and use_categories:
+            print(f"\n=== 处理使用方面 ===")
+            unique_use, use_mapping, _, _, use_unified_map = deduplicate_aspects(use_aspects)
         
-        use_assignments = await final_categorize_aspects(
-            unique_use, use_categories, "use", "use case aspects", product_categories
-        )
+            use_assignments = await final_categorize_aspects(
+                unique_use, use_categories, "use", "use case aspects", product_categories
+            )
         
-        expanded_use = expand_final_assignments_to_original_aspects(
-            use_assignments, use_unified_map, use_aspects
-        )
-        final_assignments.update(expanded_use)
-    
-    # Save results
-    print(f"\n=== 保存结果 ===")
-    output_path = latest_dir / "consolidated_aspect_categorization.json"
-    
-    # Create the final result structure
-    result = {
-        "metadata": {
-            "timestamp": datetime.now().isoformat(),
-            "total_aspects": len(final_assignments),
-            "physical_categories": len(phy_categories),
-            "performance_categories": len(perf_categories),
-            "use_categories": len(use_categories)
-        },
-        "assignments": final_assignments
-    }
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    
-    print(f"结果已保存到: {output_path}")
-    print(f"总共分配了 {len(final_assignments)} 个方面问题到分类")
-    print("\n=== 第5.4步完成！===")
+            expanded_use = expand_final_assignments_to_original_aspects(
+                use_assignments, use_unified_map, use_aspects
+            )
+            final_assignments.update(expanded_use)
+    
+        # Save results
+        print(f"\n=== 保存结果 ===")
+        output_path = latest_dir / "consolidated_aspect_categorization.json"
+    
+        # Create the final result structure
+        result = {
+            "metadata": {
+                "timestamp": datetime.now().isoformat(),
+                "total_aspects": len(final_assignments),
+                "physical_categories": len(phy_categories),
+                "performance_categories": len(perf_categories),
+                "use_categories": len(use_categories)
+            },
+            "assignments": final_assignments
+        }
+    
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    
+        print(f"结果已保存到: {output_path}")
+        print(f"总共分配了 {len(final_assignments)} 个方面问题到分类")
+        print(f"LLM调用统计（逐次记录: {config.LLM_TRACE_PATH}）:")
+        llm_manager.telemetry.print_summary()
+        llm_manager.telemetry.write_prometheus(config.LLM_METRICS_PATH)
+        print("\n=== 第5.4步完成！===")
+    finally:
+        # Persist queued writes and apply the cache limits even when the run fails or finds nothing
+        write_behind.flush()
+        config.prune_cache()
+        if hasattr(llm_manager, "close"):
+            await llm_manager.close()  # Pooled HTTP sessions (OpenRouter)
 
 if __name__ == "__main__":
     asyncio.run(main()) 
\ No newline at end of file
@@ -1,14 +1,22 @@
-from serpapi import GoogleSearch
 import json
 import dotenv
 import os
-import requests
+
+from src.competitor.utils.http_client import HTTPRequest, get_provider_client
 
 dotenv.load_dotenv()
 
 SERP_API_KEY = os.getenv("SERP_API_KEY")
 BIGBOX_API_KEY = os.getenv("BIGBOX_API_KEY")
 
+SERPAPI_SEARCH_URL = "https://serpapi.com/search"
+BIGBOX_API_URL = "https://api.bigboxapi.com/request"
+
+# One pooled client per provider (keep-alive, timeouts, retries, HTTP_QPS_<PROVIDER> pacing)
+SERPAPI_CLIENT = get_provider_client("serpapi")
+BIGBOX_CLIENT = get_provider_client("bigbox")
+
+@SERPAPI_CLIENT.endpoint
 def home_depot_search(query, page=1, sort_by="top_sellers", hd_filter_tokens=None, delivery_zip=None, 
                      store_id=None, nao=None, ps=48, lowerbound=None, upperbound=None, 
                      no_cache=False, async_search=False, zero_trace=False, output="json"):
@@ -64,9 +72,9 @@ def home_depot_search(query, page=1, sort_by="top_sellers", hd_filter_tokens=Non
     if zero_trace:
         params["zero_trace"] = "true"
     
-    search = GoogleSearch(params)
-    results = search.get_dict()
-    return results
+    # Same endpoint serpapi.GoogleSearch calls, on the pooled session; like get_dict(),
+    # error responses return their {"error": ...} body instead of raising
+    return HTTPRequest(SERPAPI_SEARCH_URL, params=params, raise_for_status=False)
 
 def home_depot_best_sellers(query, page=1, hd_filter_tokens=None, delivery_zip=None, 
                            store_id=None, nao=None, ps=24, lowerbound=None, upperbound=None):
@@ -100,6 +108,7 @@ def home_depot_best_sellers(query, page=1, hd_filter_tokens=None, delivery_zip=N
         upperbound=upperbound
     )
 
+@BIGBOX_CLIENT.endpoint
 def home_depot_product_reviews(item_id=None, gtin=None, url=None, sort_by="most_helpful", 
                               search_term=None, reviewer_type="verified_purchase", 
                               five_star=None, four_star=None, three_star=None, 
@@ -163,7 +172,9 @@ def home_depot_product_reviews(item_id=None, gtin=None, url=None, sort_by="most_
     if max_page is not None:
         params['max_page'] = max_page
     
-    # Make the HTTP GET request to BigBox API
-    api_result = requests.get('https://api.bigboxapi.com/request', params)
-    return api_result.json()
-    
\ No newline at end of file
+    # BigBox error responses carry their details in the JSON body, which is returned as before
+    return HTTPRequest(BIGBOX_API_URL, params=params, raise_for_status=False)
+
+
+home_depot_search_async = home_depot_search.call_async
+home_depot_product_reviews_async = home_depot_product_reviews.call_async
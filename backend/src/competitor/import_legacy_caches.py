@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Import Legacy Per-Run Caches
+
+Before the persistent cache root, every run cached under its hourly output
+directory (data/result/<script>/[<subdirectory>/][<YYYYMMDD_HH>/]llm_cache
+and result_cache), with keys that did not include the model. The scripts
+no longer look there, so this imports those caches into the cache root
+(data/cache, or LLM_CACHE_ROOT):
+
+- LLMCache entries (llm_<key>.json files or a cache.sqlite3 store) are
+  re-keyed with the model and written to llm/ through the configured
+  backend (LLM_CACHE_BACKEND). The model is the "model" recorded in the
+  entry's context, or --model when there is none.
+- segment_products responses (<interaction>_..._<key>_<YYYYMMDD_HH>.json)
+  are re-keyed with their recorded model_name and written to llm/.
+- ResultCache entries and segment_products result files keep their keys
+  and go to result/<script>/.
+
+Only entries whose stored prompt and context reproduce their old key are
+imported. Entries the cache root already holds are kept, and when several
+runs cached the same request the newest wins. The legacy directories are
+not deleted.
+
+Usage:
+    python3 import_legacy_caches.py
+    python3 import_legacy_caches.py ../../data/result/process_review --backend sqlite
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from utils.cache_utils import (CACHE_BACKENDS, CACHE_DB_FILENAME, LLMCache, ResultCache,
+                               get_sqlite_cache_store, prompt_cache_key)
+from utils.config import DEFAULT_MODEL_NAME
+from utils.write_behind import atomic_write_text
+
+DATA_DIR = Path(__file__).parent.parent.parent / "data"
+LEGACY_CACHE_DIRS = ("llm_cache", "result_cache")
+# segment_products files: <interaction>[_cat_<category>][_batch<n>]_<key>_<YYYYMMDD_HH><suffix>
+SEGMENT_FILE_PATTERN = re.compile(
+    r"^(?P<prefix>.+_)(?P<key>[0-9a-f]{16})_(?P<hour>\d{8}_\d{2})(?P<suffix>\.json|_results\.csv|_taxonomies\.json)$"
+)
+
+
+def script_name_of(directory: Path) -> Optional[str]:
+    """Script a legacy cache directory belongs to: the directory right below data/result"""
+    parts = directory.resolve().parts
+    for index in range(len(parts) - 2, -1, -1):
+        if parts[index] == "result":
+            return parts[index + 1]
+    return None
+
+
+def read_entries(directory: Path, cache_type: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """(old key, entry) of every CacheManager entry in a legacy directory, from its store and JSON files"""
+    db_path = directory / CACHE_DB_FILENAME
+    if db_path.exists():
+        for _, key, cache_data in get_sqlite_cache_store(db_path).iter_entries(cache_type):
+            yield key, cache_data
+    for path in directory.glob(f"{cache_type}_*.json"):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cache_data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(cache_data, dict) and cache_data.get("cache_type") == cache_type:
+            yield path.stem[len(cache_type) + 1:], cache_data
+
+
+class LegacyCacheImporter:
+    """Imports legacy cache directories into one cache root"""
+
+    def __init__(self, cache_root: Path, backend: str, default_model: str):
+        """
+        Initialize importer
+
+        Args:
+            cache_root: Persistent cache root to import into
+            backend: Cache backend the pipeline scripts use
+            default_model: Model of LLMCache entries whose context records none
+        """
+        self.cache_root = cache_root
+        self.backend = backend
+        self.default_model = default_model
+        self.llm_dir = cache_root / "llm"
+        self._llm_caches: Dict[Optional[str], LLMCache] = {}
+
+    def llm_cache(self, model_name: Optional[str]) -> LLMCache:
+        """LLMCache of the cache root keyed by a model (None: the legacy keys without model)"""
+        if model_name not in self._llm_caches:
+            self._llm_caches[model_name] = LLMCache(self.llm_dir, backend=self.backend, model_name=model_name)
+        return self._llm_caches[model_name]
+
+    def rekey_llm_entry(self, legacy_key: str, cache_data: Dict[str, Any]) -> Optional[str]:
+        """Current key of a legacy LLMCache entry, or None if its prompt and context don't give its old key"""
+        data = cache_data.get("data")
+        if not isinstance(data, dict) or not isinstance(data.get("prompt"), str):
+            return None
+        context = cache_data.get("metadata") or None
+        if self.llm_cache(None).generate_cache_key(data["prompt"], context) != legacy_key:
+            return None
+        model_name = (context or {}).get("model") or self.default_model
+        return self.llm_cache(model_name).generate_cache_key(data["prompt"], context)
+
+    def import_cache_entries(self, directory: Path, script_name: str) -> Tuple[int, int, int]:
+        """
+        Import the LLMCache and ResultCache entries of a legacy directory
+
+        Returns:
+            (entries imported, entries already cached, entries skipped)
+        """
+        rekeyed, skipped = [], 0
+        for legacy_key, cache_data in read_entries(directory, "llm"):
+            key = self.rekey_llm_entry(legacy_key, cache_data)
+            if key is None:
+                skipped += 1
+            else:
+                rekeyed.append((key, cache_data))
+        imported = self.llm_cache(None).import_entries(rekeyed)
+        found = len(rekeyed)
+
+        results = list(read_entries(directory, "result"))
+        if results:
+            result_cache = ResultCache(self.cache_root / "result" / script_name, backend=self.backend)
+            imported += result_cache.import_entries(results)
+            found += len(results)
+        return imported, found - imported, skipped
+
+    def import_segment_files(self, directory: Path, script_name: str) -> Tuple[int, int, int]:
+        """
+        Import the segment_products response and result files of a legacy directory
+
+        Returns:
+            (files imported, files already cached, files skipped)
+        """
+        matches = [(path, SEGMENT_FILE_PATTERN.match(path.name)) for path in directory.iterdir()]
+        matches = sorted(((path, match) for path, match in matches if match),
+                         key=lambda item: item[1]["hour"], reverse=True)
+        imported, existing, skipped = 0, 0, 0
+        for path, match in matches:
+            if directory.name == "result_cache":
+                target = self.cache_root / "result" / script_name / f"{match['prefix']}{match['key']}{match['suffix']}"
+                if target.exists():
+                    existing += 1
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copyfile(path, target)  # Fresh mtime: imported files count as used now
+                imported += 1
+                continue
+
+            if match["suffix"] != ".json":
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    cache_data = json.load(f)
+            except (OSError, ValueError):
+                skipped += 1
+                continue
+            base_prompt = cache_data.get("base_prompt", cache_data.get("prompt"))
+            context = cache_data.get("context")
+            if (not isinstance(base_prompt, str) or "response" not in cache_data or
+                    prompt_cache_key(base_prompt, context) != match["key"]):
+                skipped += 1
+                continue
+            model_name = cache_data.get("model_name") or self.default_model
+            key = prompt_cache_key(base_prompt, context, model_name)
+            target = self.llm_dir / f"{match['prefix']}{key}.json"
+            if target.exists():
+                existing += 1
+                continue
+            cache_data.update(cache_key=key, base_prompt=base_prompt, model_name=model_name)
+            atomic_write_text(target, json.dumps(cache_data, ensure_ascii=False))
+            imported += 1
+        return imported, existing, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import per-run LLM and result caches into the persistent cache root")
+    parser.add_argument("roots", nargs="*", type=Path, default=[DATA_DIR / "result"],
+                        help="Trees containing legacy llm_cache / result_cache directories (default: data/result)")
+    parser.add_argument("--cache-root", type=Path, default=Path(os.getenv("LLM_CACHE_ROOT", DATA_DIR / "cache")),
+                        help="Cache root to import into")
+    parser.add_argument("--backend", choices=CACHE_BACKENDS, default=os.getenv("LLM_CACHE_BACKEND", "json"),
+                        help="Cache backend the scripts use (LLM_CACHE_BACKEND)")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME,
+                        help="Model of LLMCache entries whose context does not record one")
+    args = parser.parse_args()
+
+    importer = LegacyCacheImporter(args.cache_root, args.backend, args.model)
+    totals = [0, 0, 0]
+    for root in args.roots:
+        # Newest hourly directories first, so their entries win over older copies of the same request
+        directories = sorted({path for name in LEGACY_CACHE_DIRS for path in root.rglob(name) if path.is_dir()},
+                             reverse=True)
+        for directory in directories:
+            script_name = script_name_of(directory)
+            if script_name is None:
+                print(f"⚠️  {directory}: not below a data/result directory, skipped")
+                continue
+            counts = [a + b for a, b in zip(importer.import_cache_entries(directory, script_name),
+                                            importer.import_segment_files(directory, script_name))]
+            totals = [a + b for a, b in zip(totals, counts)]
+            print(f"📦 {directory}: {counts[0]} imported, {counts[1]} already cached, {counts[2]} skipped")
+
+    print(f"✅ Imported {totals[0]} cache entries into {args.cache_root} "
+          f"({totals[1]} already cached, {totals[2]} skipped)")
+
+
+if __name__ == "__main__":
+    main()
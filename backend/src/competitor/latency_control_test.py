@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Regression check for tail-latency control
+
+Latency samples and the hedge delay must run from request send: time an
+attempt spends queued for the rate limiter is not slowness a hedge can fix,
+so it must neither inflate the percentiles nor fire hedges.
+
+Usage:
+    python3 latency_control_test.py
+"""
+
+import asyncio
+import time
+
+from utils.latency_control import LatencyController, mark_request_sent
+from utils.mock_llm import MockLLMManager
+
+
+class SpareCapacity:
+    """Rate limiter stand-in that always has room for a hedge"""
+
+    def has_capacity(self, estimated_input_tokens: int) -> bool:
+        return True
+
+
+def request(queue_seconds: float, service_seconds: float):
+    """Coroutine function of an attempt that waits for the limiter, then for the response"""
+    async def call() -> str:
+        await asyncio.sleep(queue_seconds)
+        mark_request_sent()
+        await asyncio.sleep(service_seconds)
+        return "ok"
+    return call
+
+
+def hedging_controller() -> LatencyController:
+    return LatencyController(SpareCapacity(), hedge_percentile=0.95, hedge_min_samples=3, min_hedge_delay=0.05)
+
+
+async def run_checks():
+    checks = []
+
+    # Six calls through a one-slot limiter: each waits for the ones before it, but is only 50 ms once sent
+    manager = MockLLMManager("synthetic", max_concurrent_requests=1, latency_seconds=0.05, latency_jitter=0.0,
+                             coalesce_requests=False)
+    start = time.monotonic()
+    await asyncio.gather(*(manager.safe_call(f"prompt {i}") for i in range(6)))
+    elapsed = time.monotonic() - start
+    slowest = max(manager.latency_control.histogram.recent)
+    checks.append((f"queue time excluded from latency samples (slowest {slowest:.3f}s of {elapsed:.3f}s)",
+                   elapsed > 0.25 and slowest < 0.1))
+
+    controller = hedging_controller()
+    for _ in range(3):
+        await controller.run(request(0.0, 0.01))
+    await controller.run(request(0.3, 0.01))
+    checks.append(("no hedge for an attempt that is only queued", controller.stats["hedges"] == 0))
+    checks.append(("queued attempt recorded at its send-to-response latency",
+                   controller.histogram.recent[-1] < 0.1))
+
+    await controller.run(request(0.0, 0.3))
+    checks.append(("hedge for an attempt that is slow after send", controller.stats["hedges"] == 1))
+
+    # A router's attempt wraps the provider manager's attempt; both clocks start at the same send
+    outer, inner = LatencyController(SpareCapacity()), LatencyController(SpareCapacity())
+    await outer.run(lambda: inner.run(request(0.2, 0.02)))
+    checks.append(("nested controllers both exclude queue time",
+                   outer.histogram.recent[-1] < 0.1 and inner.histogram.recent[-1] < 0.1))
+
+    # Attempts that never report a send (e.g. answered without a request) count from their start
+    bare = LatencyController(SpareCapacity())
+    await bare.run(lambda: asyncio.sleep(0.1))
+    checks.append(("attempts without a send are timed from their start", bare.histogram.recent[-1] >= 0.1))
+    return checks
+
+
+def main():
+    failures = 0
+    for name, ok in asyncio.run(run_checks()):
+        print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+    if failures:
+        raise SystemExit(f"{failures} latency control checks failed")
+    print("\nAll latency control checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Persistent LLM Cache Management
+
+Show what is cached under the persistent cache root (data/cache, or
+LLM_CACHE_ROOT) and evict least recently used entries by size and age.
+The pipeline scripts apply the configured limits (LLM_CACHE_MAX_GB,
+LLM_CACHE_MAX_AGE_DAYS) automatically at the end of each run.
+
+Usage:
+    python3 manage_llm_cache.py stats
+    python3 manage_llm_cache.py prune --max-gb 5 --max-age-days 30 [--dry-run]
+"""
+
+import argparse
+import os
+from datetime import datetime
+from pathlib import Path
+
+from utils.cache_utils import cache_root_stats, prune_cache_root
+
+DEFAULT_CACHE_ROOT = Path(__file__).parent.parent.parent / "data" / "cache"
+
+
+def format_time(timestamp) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M") if timestamp else "-"
+
+
+def print_stats(cache_root: Path) -> None:
+    stats = cache_root_stats(cache_root)
+    if not stats:
+        print(f"No cache entries under {cache_root}")
+        return
+
+    print(f"Cache root: {cache_root}\n")
+    print(f"{'directory':<40} {'entries':>9} {'MB':>9}  {'oldest access':<17} {'newest access':<17}")
+    for name, entry in sorted(stats.items()):
+        print(f"{name:<40} {entry['entries']:>9} {entry['bytes'] / 1e6:>9.1f}  "
+              f"{format_time(entry['oldest_access']):<17} {format_time(entry['newest_access']):<17}")
+    total_entries = sum(entry['entries'] for entry in stats.values())
+    total_bytes = sum(entry['bytes'] for entry in stats.values())
+    print(f"{'total':<40} {total_entries:>9} {total_bytes / 1e6:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune the persistent LLM cache")
+    parser.add_argument("--cache-root", type=Path,
+                        default=Path(os.getenv("LLM_CACHE_ROOT", DEFAULT_CACHE_ROOT)), help="Cache root directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Entries, size and access range per cache directory")
+    prune_parser = subparsers.add_parser("prune", help="Evict least recently used entries")
+    prune_parser.add_argument("--max-gb", type=float, help="Keep at most this many GB of entries")
+    prune_parser.add_argument("--max-age-days", type=float, help="Remove entries not used for this many days")
+    prune_parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print_stats(args.cache_root)
+        return
+
+    if args.max_gb is None and args.max_age_days is None:
+        parser.error("prune needs --max-gb and/or --max-age-days")
+    max_bytes = int(args.max_gb * 1e9) if args.max_gb is not None else None
+    stats = prune_cache_root(args.cache_root, max_bytes, args.max_age_days, dry_run=args.dry_run)
+    action = "Would evict" if args.dry_run else "Evicted"
+    print(f"🧹 {action} {stats['removed_entries']} entries ({stats['removed_bytes'] / 1e6:.1f} MB); "
+          f"{stats['kept_entries']} kept ({stats['kept_bytes'] / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Migrate JSON Caches to SQLite
+
+Import the one-file-per-entry LLMCache / ResultCache JSON files
+("llm_<key>.json", "result_<key>.json") of each cache directory into that
+directory's cache.sqlite3 store, which is what the sqlite backend reads.
+Use it on the persistent cache root (data/cache, or LLM_CACHE_ROOT) when
+switching LLM_CACHE_BACKEND from json to sqlite. Directories are searched
+recursively, so the whole root can be migrated at once.
+
+Unmigrated files still work (the sqlite backend imports them on first
+lookup); migrating up front just avoids the per-file reads on warm runs.
+Caches of the old per-run output directories (data/result/.../llm_cache)
+are keyed differently; import them with import_legacy_caches.py first.
+
+Usage:
+    python3 migrate_cache_to_sqlite.py ../../data/cache
+    python3 migrate_cache_to_sqlite.py ../../data/cache/llm --delete-json
+"""
+
+import argparse
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from utils.cache_utils import CACHE_DB_FILENAME, get_sqlite_cache_store
+
+CACHE_TYPES = ("llm", "result")
+BATCH_SIZE = 500
+
+
+def find_cache_files(root: Path) -> Dict[Path, List[Tuple[str, Path]]]:
+    """Map each cache directory under root to its (cache_type, file) entries"""
+    by_directory = defaultdict(list)
+    for cache_type in CACHE_TYPES:
+        for path in root.rglob(f"{cache_type}_*.json"):
+            by_directory[path.parent].append((cache_type, path))
+    return by_directory
+
+
+def migrate_directory(directory: Path, files: List[Tuple[str, Path]], delete_json: bool) -> Tuple[int, int]:
+    """
+    Import one directory's JSON entries into its SQLite store
+
+    Returns:
+        (entries imported, files skipped)
+    """
+    store = get_sqlite_cache_store(directory / CACHE_DB_FILENAME)
+    imported, skipped = 0, 0
+    for cache_type in CACHE_TYPES:
+        paths = [path for file_type, path in files if file_type == cache_type]
+        for start in range(0, len(paths), BATCH_SIZE):
+            batch = []
+            for path in paths[start:start + BATCH_SIZE]:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        cache_data = json.load(f)
+                except (OSError, ValueError):
+                    skipped += 1
+                    continue
+                # Only files written by CacheManager ({"cache_type", "data", ...}) are cache entries
+                if not isinstance(cache_data, dict) or cache_data.get("cache_type") != cache_type:
+                    skipped += 1
+                    continue
+                batch.append((path.stem[len(cache_type) + 1:], cache_data, path))
+
+            store.put_many(cache_type, [(key, cache_data) for key, cache_data, _ in batch])
+            imported += len(batch)
+            if delete_json:
+                for _, _, path in batch:
+                    path.unlink()
+    store.checkpoint()  # Leave the imported pages in the database file, not in a large write-ahead log
+    return imported, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import JSON cache files into SQLite cache stores")
+    parser.add_argument("roots", nargs="+", type=Path, help="Cache directories or trees containing them")
+    parser.add_argument("--delete-json", action="store_true", help="Remove each JSON file once imported")
+    args = parser.parse_args()
+
+    total_imported, total_skipped = 0, 0
+    for root in args.roots:
+        for directory, files in sorted(find_cache_files(root).items()):
+            imported, skipped = migrate_directory(directory, files, args.delete_json)
+            total_imported += imported
+            total_skipped += skipped
+            print(f"📦 {directory}: {imported} entries imported, {skipped} files skipped")
+
+    print(f"✅ Migrated {total_imported} cache entries ({total_skipped} files skipped)")
+
+
+if __name__ == "__main__":
+    main()
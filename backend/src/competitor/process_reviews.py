@@ -12,6 +12,7 @@ This script uses shared utilities for:
 - JSON processing
 - Prompt management
 - Caching
+- Offline Message Batches execution (set USE_BATCH_API=true)
 """
 
 import json
@@ -24,29 +25,28 @@ import re
 
 # Import utility modules
 from utils.config import get_process_review_config
-from utils.llm_utils import initialize_global_llm, safe_llm_call
-from utils.prompt_utils import load_prompt
+from utils.llm_utils import initialize_global_llm, safe_llm_call, safe_llm_stream_call
+from utils.llm_router import LLMRouter
+from utils.prompt_utils import load_prompt, compile_prompt
 from utils.json_utils import extract_json_from_response
 from utils.cache_utils import LLMCache
-from utils.rate_limiter import RateLimiter
+from utils.review_manifest import get_review_manifest
+from utils.review_store import ReviewStore, select_review_files
+from utils.write_behind import get_write_behind_writer
+from utils.rate_limit_registry import get_shared_rate_limiter
+from utils.streaming_json import IncrementalJSONValidator, StreamValidationError
 
 # === CONFIGURATION ===
 config = get_process_review_config()
 
 # Data paths
 REVIEW_DATA_DIR = config.get_data_path("scraped", "amazon", "review")
+REVIEW_STORE_DIR = config.get_data_path("scraped", "amazon", "review_store")
 PRODUCTS_CSV_PATH = config.get_data_path("result", "product_segment", "combined_products_cleaned", "combined_products_with_final_categories.csv")
 
-# Initialize LLM with configuration
-llm_manager = initialize_global_llm(
-    model_name=config.MODEL_NAME,
-    temperature=config.MODEL_TEMPERATURE,
-    max_tokens=config.MODEL_MAX_TOKENS
-)
-
-# Initialize cache and rate limiter
-cache_manager = LLMCache(config.CACHE_DIR)
-rate_limiter = RateLimiter(
+# Rate limiter draws from the host-wide budget for this model, shared with other scripts
+rate_limiter = get_shared_rate_limiter(
+    config.MODEL_NAME,
     max_requests_per_minute=config.MAX_REQUESTS_PER_MINUTE,
     max_input_tokens_per_minute=config.MAX_INPUT_TOKENS_PER_MINUTE,
     max_output_tokens_per_minute=config.MAX_OUTPUT_TOKENS_PER_MINUTE,
@@ -54,8 +54,27 @@ rate_limiter = RateLimiter(
     model_max_tokens=config.MODEL_MAX_TOKENS
 )
 
-# Load extraction prompt
-EXTRACT_PROMPT_TEMPLATE = load_prompt("extract_review_hierarchy_v0.txt", config.PROMPT_DIR)
+# Initialize LLM with configuration
+llm_manager = initialize_global_llm(
+    model_name=config.MODEL_NAME,
+    temperature=config.MODEL_TEMPERATURE,
+    max_tokens=config.MODEL_MAX_TOKENS,
+    rate_limiter=rate_limiter,
+    call_timeout=config.LLM_CALL_TIMEOUT,
+    hedge_percentile=config.LLM_HEDGE_PERCENTILE,
+    providers=config.LLM_PROVIDERS,
+    backend=config.LLM_BACKEND,
+    mock_options=config.get_mock_llm_options(),
+    trace_path=config.LLM_TRACE_PATH
+)
+
+# Initialize cache; cache and result writes are persisted on a background thread, off the event loop
+write_behind = get_write_behind_writer()
+cache_manager = LLMCache(config.CACHE_DIR, telemetry=llm_manager.telemetry, backend=config.CACHE_BACKEND,
+                         model_name=config.MODEL_NAME, writer=write_behind)
+
+# Load extraction prompt (compiled once; static segments are pre-tokenized)
+EXTRACT_PROMPT = compile_prompt("extract_review_hierarchy_v0.txt", config.PROMPT_DIR)
 
 # Load shared retry prompt template
 SHARED_RETRY_PROMPT_TEMPLATE = load_prompt("shared_retry_prompt_v0.txt", config.PROMPT_DIR / "product_segment")
@@ -393,6 +412,96 @@ def validate_hierarchy_structure(result: Dict[str, Any], expected_review_ids: Se
     
     return len(errors) == 0, errors
 
+class ReviewHierarchyStreamValidator(IncrementalJSONValidator):
+    """
+    Streaming counterpart of validate_hierarchy_structure.
+    
+    Rejects the response as soon as it nests at the wrong level, uses a
+    malformed PID/perf_id/sentiment/reason key, or cites a review ID that was
+    not in the input. Cross-section sentiment consistency still needs the
+    full response and is checked afterwards.
+    """
+    
+    # Path length of the review ID arrays in each section
+    LEAF_DEPTH = {'phy': 4, 'perf': 5, 'use': 4}
+    
+    def __init__(self, expected_review_ids: Set[int]):
+        super().__init__()
+        self.expected_review_ids = expected_review_ids
+    
+    def check_container(self, path, kind):
+        if not path or path[0] not in self.LEAF_DEPTH:
+            return None if (path or kind == '{') else "Response must be a JSON object"
+        
+        leaf_depth = self.LEAF_DEPTH[path[0]]
+        if len(path) < leaf_depth and kind != '{':
+            return f"Expected a JSON object at {path}, got an array"
+        if len(path) == leaf_depth and kind != '[':
+            return f"Expected a review ID array at {path}, got an object"
+        if len(path) > leaf_depth:
+            return f"Unexpected nesting inside review ID array at {path}"
+        return None
+    
+    def check_key(self, path, key):
+        if not path or path[0] not in self.LEAF_DEPTH:
+            return None
+        
+        section, depth = path[0], len(path)
+        if section in ('phy', 'perf') and depth == 2:
+            id_type = 'PID' if section == 'phy' else 'perf_id'
+            if '@' not in key or not validate_id_format(key.split('@', 1)[0], id_type):
+                return f"Invalid {id_type}@DETAIL key '{key}' in {path}"
+        elif (section in ('phy', 'perf') and depth == 3) or (section == 'use' and depth == 2):
+            if not validate_sentiment(key):
+                return f"Invalid sentiment '{key}' in {path} - must be '+' or '-'"
+        elif (section == 'perf' and depth == 4) or (section == 'use' and depth == 3):
+            if key != "?":
+                reason_parts = [r.strip() for r in key.split(',') if r.strip()]
+                if not all(validate_id_format(part, 'PID') or validate_id_format(part, 'perf_id') for part in reason_parts):
+                    return f"Invalid reason format '{key}' in {path}"
+        return None
+    
+    def check_value(self, path, value):
+        if not path or path[0] not in self.LEAF_DEPTH:
+            return None
+        
+        if len(path) != self.LEAF_DEPTH[path[0]] + 1:
+            return f"Unexpected value {value!r} at {path} - expected a JSON object"
+        try:
+            review_id = int(value)
+        except (ValueError, TypeError):
+            return f"Invalid review ID {value!r} at {path[:-1]}"
+        if review_id not in self.expected_review_ids:
+            return f"Unknown review ID {review_id} at {path[:-1]}"
+        return None
+
+
+def create_stream_abort_retry_context(error: StreamValidationError, expected_review_ids: Set[int],
+                                      product_title: str, asin: str) -> Dict[str, Any]:
+    """Build a retry context for a response that was aborted mid-stream"""
+    partial_text = error.partial_text
+    return create_retry_context(
+        error_categories={
+            "format_errors": [],
+            "validation_errors": [f"Response aborted while streaming: {error.reason}"],
+            "completeness_errors": []
+        },
+        content_sections={
+            "previous_attempt": {
+                "title": "YOUR PREVIOUS (ABORTED) RESPONSE",
+                "content": "..." + partial_text[-500:] if len(partial_text) > 500 else partial_text
+            },
+            "product_context": {
+                "title": "PRODUCT CONTEXT",
+                "content": f"ASIN: {asin}\nProduct: {product_title}\nExpected Review IDs: {sorted(list(expected_review_ids))}"
+            }
+        }
+    )
+
+# Stored with validated results in the cache; bump whenever parse_and_validate_response or
+# validate_hierarchy_structure change, so results cached by older rules are validated again
+EXTRACTION_VALIDATOR_VERSION = "1"
+
 def parse_and_validate_response(response_text: str, expected_review_ids: Set[int], 
                                product_title: str, asin: str) -> Tuple[bool, Any]:
     """
@@ -504,12 +613,11 @@ def load_products_mapping() -> Tuple[Dict[str, str], Dict[str, str]]:
 
 
 def get_review_files() -> List[Path]:
-    """Get all review JSON files from the review directory"""
+    """Get one review file per ASIN: its canonical review store if it has one, else its latest snapshot"""
     if not REVIEW_DATA_DIR.exists():
         raise FileNotFoundError(f"Review directory not found: {REVIEW_DATA_DIR}")
     
-    review_files = [f for f in REVIEW_DATA_DIR.glob("*.json") 
-                   if not f.name.startswith("scrape_summary")]
+    review_files = select_review_files(get_review_manifest(REVIEW_DATA_DIR), ReviewStore(REVIEW_STORE_DIR))
     
     print(f"Found {len(review_files)} review files")
     return review_files
@@ -578,6 +686,80 @@ def create_cache_context(asin: str, product_category: str, review_count: int) ->
         "model": config.MODEL_NAME
     }
 
+def build_extraction_request(asin: str, product_category: str,
+                             reviews: List[Dict[str, Any]]) -> Tuple[str, str, int, Dict[str, Any]]:
+    """
+    Build the extraction prompt for one product
+    
+    Args:
+        asin: Product ASIN
+        product_category: Product category (from product_segment column)
+        reviews: List of review dictionaries
+    
+    Returns:
+        (static instruction prefix, review payload, estimated prompt tokens, cache context);
+        prefix + payload is the full prompt used as the cache key
+    """
+    cache_context = create_cache_context(asin, product_category, len(reviews))
+    
+    # Build prompt using product category instead of title, split at {{INPUT}}
+    # so the instruction block can be sent as a cacheable system prefix
+    formatted_reviews = format_reviews_for_prompt(reviews)
+    system_prompt, user_prompt, full_prompt_tokens = EXTRACT_PROMPT.render_parts({
+        'PRODUCT': product_category,
+        'INPUT': formatted_reviews
+    }, boundary='INPUT')
+    return system_prompt, user_prompt, full_prompt_tokens, cache_context
+
+async def prefetch_with_batch_api(review_files: List[Path], asin_to_category: Dict[str, str]) -> None:
+    """
+    Run first-attempt extractions for all uncached products as one offline batch job
+    
+    Responses are written into the LLM cache, so the regular pipeline picks them
+    up as cache hits, validates them and only falls back to real-time calls for
+    invalid or failed responses. Job state is kept in config.BATCH_STATE_DIR, so
+    rerunning after an interruption resumes the submitted batch.
+    
+    Args:
+        review_files: Review files to process
+        asin_to_category: ASIN to product category mapping
+    """
+    prompts = {}
+    requests = {}
+    for review_file in review_files:
+        try:
+            asin, _, reviews = load_review_file(review_file)
+        except Exception as e:
+            print(f"⚠️ Skipping {review_file} in batch: {e}")
+            continue
+        if not reviews:
+            continue
+        
+        product_category = asin_to_category.get(asin, "Products")
+        system_prompt, user_prompt, _, cache_context = build_extraction_request(asin, product_category, reviews)
+        full_prompt = system_prompt + user_prompt
+        if cache_manager.load_llm_response(full_prompt, cache_context):
+            continue
+        
+        custom_id = cache_manager.generate_cache_key(full_prompt, cache_context)
+        prompts[custom_id] = full_prompt
+        requests[custom_id] = (full_prompt, cache_context)
+    
+    if not prompts:
+        print("✓ All extraction prompts already cached, skipping batch submission")
+        return
+    
+    print(f"📦 Submitting {len(prompts)} extraction prompts as an offline batch job...")
+    
+    def save_result(custom_id: str, response_text: str) -> None:
+        full_prompt, cache_context = requests[custom_id]
+        cache_manager.save_llm_response(full_prompt, response_text, cache_context)
+    
+    responses = await llm_manager.batch_call(prompts, config.BATCH_STATE_DIR, on_result=save_result,
+                                             poll_interval=config.BATCH_POLL_INTERVAL)
+    failed = sum(1 for response_text in responses.values() if response_text is None)
+    print(f"✓ Batch job complete: {len(responses) - failed} responses cached, {failed} left for real-time calls")
+
 async def process_reviews_with_retry(asin: str, product_category: str, reviews: List[Dict[str, Any]], 
                                    max_retries: int = 3) -> Dict[str, Any]:
     """
@@ -597,16 +779,15 @@ async def process_reviews_with_retry(asin: str, product_category: str, reviews:
     
     print(f"\nProcessing {len(reviews)} reviews for {asin} (category: {product_category})...")
     
-    # Create cache context
-    cache_context = create_cache_context(asin, product_category, len(reviews))
+    system_prompt, user_prompt, full_prompt_tokens, cache_context = build_extraction_request(asin, product_category, reviews)
+    full_prompt = system_prompt + user_prompt
     
-    # Build prompt using product category instead of title
-    formatted_reviews = format_reviews_for_prompt(reviews)
-    base_prompt = EXTRACT_PROMPT_TEMPLATE.replace('{{PRODUCT}}', product_category)
-    full_prompt = base_prompt.replace('{{INPUT}}', formatted_reviews)
-    
-    # Check cache first
-    cached_response = cache_manager.load_llm_response(full_prompt, cache_context)
+    # Check cache first; a result validated by the current rules needs no parsing at all
+    cached_response, cached_result = cache_manager.load_llm_result(full_prompt, cache_context,
+                                                                   EXTRACTION_VALIDATOR_VERSION)
+    if cached_result is not None:
+        print(f"✓ Using validated cached result for {asin}")
+        return cached_result
     if cached_response:
         print(f"✓ Using cached response for {asin}")
         try:
@@ -616,6 +797,8 @@ async def process_reviews_with_retry(asin: str, product_category: str, reviews:
             
             if is_valid:
                 print(f"✓ Cached result validated for {asin}")
+                cache_manager.save_llm_response(full_prompt, cached_response, cache_context,
+                                                parsed=result, validator_version=EXTRACTION_VALIDATOR_VERSION)
                 return result
             else:
                 print(f"⚠️ Cached result invalid for {asin}, re-processing")
@@ -624,33 +807,39 @@ async def process_reviews_with_retry(asin: str, product_category: str, reviews:
     
     # Process with unified retry logic and rate limiting
     expected_review_ids = set(range(len(reviews)))  # 0, 1, 2, ... based on review positions
-    prompt = full_prompt
+    prompt = user_prompt
+    prompt_system = system_prompt  # Cacheable instruction prefix, shared by every product in the category
+    prompt_tokens = full_prompt_tokens
     
     for attempt in range(max_retries):
         try:
             print(f"   Attempt {attempt + 1}/{max_retries} for {asin}")
             
-            # Estimate tokens and acquire rate limit permission
-            estimated_input_tokens = rate_limiter.estimate_tokens(prompt)
-            await rate_limiter.acquire(estimated_input_tokens)
+            # Rate limiting happens inside safe_llm_call (shared budget)
+            if config.STREAM_VALIDATION:
+                try:
+                    # Stream and abort as soon as the output goes off-schema
+                    response_text = await safe_llm_stream_call(
+                        prompt, ReviewHierarchyStreamValidator(expected_review_ids),
+                        context={"interaction": "extraction", "attempt": attempt},
+                        estimated_input_tokens=prompt_tokens, system_prompt=prompt_system
+                    )
+                except StreamValidationError as e:
+                    response_text = None
+                    is_valid, result = False, create_stream_abort_retry_context(e, expected_review_ids, product_category, asin)
+            else:
+                response_text = await safe_llm_call(prompt, {"interaction": "extraction", "attempt": attempt},
+                                                    estimated_input_tokens=prompt_tokens,
+                                                    system_prompt=prompt_system)
             
-            try:
-                response_text = await safe_llm_call(prompt)
-                
-                # Release rate limiter
-                actual_output_tokens = rate_limiter.estimate_tokens(response_text)
-                rate_limiter.release(estimated_input_tokens, actual_output_tokens)
+            if response_text is not None:
+                # Use unified validation and retry logic
+                is_valid, result = parse_and_validate_response(response_text, expected_review_ids, product_category, asin)
                 
-            except Exception as e:
-                # Always release on error
-                rate_limiter.release()
-                raise e
-            
-            # Save to cache regardless of validation outcome
-            cache_manager.save_llm_response(full_prompt, response_text, cache_context)
-            
-            # Use unified validation and retry logic
-            is_valid, result = parse_and_validate_response(response_text, expected_review_ids, product_category, asin)
+                # Save to cache regardless of validation outcome; a valid result is stored parsed too
+                cache_manager.save_llm_response(full_prompt, response_text, cache_context,
+                                                parsed=result if is_valid else None,
+                                                validator_version=EXTRACTION_VALIDATOR_VERSION)
             
             if is_valid:
                 print(f"✓ Analysis complete for {asin}")
@@ -661,13 +850,15 @@ async def process_reviews_with_retry(asin: str, product_category: str, reviews:
                 if attempt < max_retries - 1:
                     # Use unified retry prompt builder
                     retry_prompt = build_retry_prompt(
-                        original_prompt=base_prompt.replace('{{INPUT}}', formatted_reviews),
+                        original_prompt=full_prompt,
                         retry_context=result,
                         product_category=product_category,
                         asin=asin
                     )
                     
                     prompt = retry_prompt  # Replace prompt with retry version
+                    prompt_system = None  # Retry prompts embed the full original prompt
+                    prompt_tokens = None  # Retry prompts are not compiled; estimate on call
                     print(f"   Built comprehensive retry prompt with {len(result['error_categories']['format_errors'] + result['error_categories']['validation_errors'] + result['error_categories']['completeness_errors'])} detailed errors")
                 
         except Exception as e:
@@ -704,8 +895,7 @@ async def process_single_asin(review_file: Path, asin_to_category: Dict[str, str
             }
             
             individual_result_path = config.get_file_path(f"{asin}_review_analysis.json")
-            with open(individual_result_path, 'w', encoding='utf-8') as f:
-                json.dump(analysis_data, f, indent=2, ensure_ascii=False)
+            write_behind.write_json(individual_result_path, analysis_data)
             
             print(f"✓ Saved review analysis for {asin} (category: {product_category})")
             return asin, analysis_data
@@ -721,58 +911,81 @@ async def process_all_reviews():
     """Process all review files and generate hierarchical analyses (concurrent processing)"""
     print("Starting hierarchical review processing...")
     
-    asin_to_category, asin_to_title = load_products_mapping()
-    review_files = get_review_files()
+    try:
+        asin_to_category, asin_to_title = load_products_mapping()
+        review_files = get_review_files()
     
-    if not review_files:
-        print("No review files found!")
-        return
+        if not review_files:
+            print("No review files found!")
+            return
     
-    print(f"Processing {len(review_files)} review files concurrently...")
+        if config.USE_BATCH_API:
+            try:
+                await prefetch_with_batch_api(review_files, asin_to_category)
+            except Exception as e:
+                print(f"⚠️ Batch job failed, falling back to real-time calls: {e}")
     
-    # Process all ASINs concurrently
-    tasks = [
-        process_single_asin(review_file, asin_to_category, asin_to_title)
-        for review_file in review_files
-    ]
+        print(f"Processing {len(review_files)} review files concurrently...")
     
-    results_list = await asyncio.gather(*tasks, return_exceptions=True)
+        # Process all ASINs concurrently
+        tasks = [
+            process_single_asin(review_file, asin_to_category, asin_to_title)
+            for review_file in review_files
+        ]
     
-    # Collect successful results
-    results = {}
-    processed_count = 0
+        results_list = await asyncio.gather(*tasks, return_exceptions=True)
     
-    for result in results_list:
-        if isinstance(result, Exception):
-            print(f"⚠️ ASIN processing failed with exception: {result}")
-            continue
+        # Collect successful results
+        results = {}
+        processed_count = 0
+    
+        for result in results_list:
+            if isinstance(result, Exception):
+                print(f"⚠️ ASIN processing failed with exception: {result}")
+                continue
         
-        asin, analysis_data = result
-        if analysis_data:
-            results[asin] = analysis_data
-            processed_count += 1
-    
-    if results:
-        consolidated_path = config.get_file_path("consolidated_review_results.json")
-        consolidated_data = {
-            'processing_summary': {
-                'total_products_processed': processed_count,
-                'total_products_attempted': len(review_files),
-                'processing_date': datetime.now().isoformat(),
-                'model_used': config.MODEL_NAME,
-                'configuration': config.to_dict()
-            },
-            'results': results
-        }
+            asin, analysis_data = result
+            if analysis_data:
+                results[asin] = analysis_data
+                processed_count += 1
+    
+        if results:
+            consolidated_path = config.get_file_path("consolidated_review_results.json")
+            consolidated_data = {
+                'processing_summary': {
+                    'total_products_processed': processed_count,
+                    'total_products_attempted': len(review_files),
+                    'processing_date': datetime.now().isoformat(),
+                    'model_used': config.MODEL_NAME,
+                    'configuration': config.to_dict()
+                },
+                'results': results
+            }
         
-        with open(consolidated_path, 'w', encoding='utf-8') as f:
-            json.dump(consolidated_data, f, indent=2, ensure_ascii=False)
+            with open(consolidated_path, 'w', encoding='utf-8') as f:
+                json.dump(consolidated_data, f, indent=2, ensure_ascii=False)
         
-        print(f"\n✓ Processing complete!")
-        print(f"✓ Processed {processed_count} products concurrently")
-        print(f"✓ Results saved to {config.OUTPUT_ROOT_DIR}")
-    else:
-        print("\n❌ No results generated")
+            print(f"\n✓ Processing complete!")
+            print(f"✓ Processed {processed_count} products concurrently")
+            print(f"✓ Results saved to {config.OUTPUT_ROOT_DIR}")
+            latency = llm_manager.latency_control.snapshot()
+            if latency['latency']['count']:
+                print(f"✓ LLM latency p50 {latency['latency']['p50']:.1f}s, p95 {latency['latency']['p95']:.1f}s; "
+                      f"{latency['hedges']} hedged ({latency['hedges_won']} won), {latency['deadline_exceeded']} past deadline")
+            if isinstance(llm_manager, LLMRouter):
+                print(f"✓ Provider routing ({llm_manager.failovers} failovers):")
+                llm_manager.print_provider_stats()
+            print(f"✓ LLM calls by interaction (trace: {config.LLM_TRACE_PATH}):")
+            llm_manager.telemetry.print_summary()
+            llm_manager.telemetry.write_prometheus(config.LLM_METRICS_PATH)
+        else:
+            print("\n❌ No results generated")
+    finally:
+        # Persist queued writes and apply the cache limits even when the run fails or finds nothing
+        write_behind.flush()
+        config.prune_cache()
+        if hasattr(llm_manager, "close"):
+            await llm_manager.close()  # Pooled HTTP sessions (OpenRouter)
 
 # === MAIN EXECUTION ===
 async def main():
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Regression check for the event-driven RateLimiter
+
+Reservations: acquire() charges the window and takes a concurrency slot,
+release() returns the slot and corrects the request's own entry with its
+actual usage (refunding an over-estimate to queued callers right away).
+
+Usage:
+    python3 rate_limiter_test.py
+"""
+
+import asyncio
+import time
+
+from utils.rate_limiter import RateLimiter
+
+
+def make_limiter(**limits) -> RateLimiter:
+    settings = dict(max_requests_per_minute=100, max_input_tokens_per_minute=10000,
+                    max_output_tokens_per_minute=1000, max_concurrent_requests=4)
+    settings.update(limits)
+    return RateLimiter(**settings)
+
+
+async def run_checks():
+    checks = []
+
+    limiter = make_limiter()
+    reservation = await limiter.acquire(200, 800)
+    checks.append(("acquire charges the window and takes a slot",
+                   (limiter.requests_in_window, limiter.input_tokens_in_window, limiter.output_tokens_in_window)
+                   == (1, 200, 800) and limiter.semaphore._value == 3))
+    limiter.release(reservation, 150, 100)
+    checks.append(("release refunds the over-estimate and returns the slot",
+                   (limiter.input_tokens_in_window, limiter.output_tokens_in_window) == (150, 100) and
+                   (reservation.input_tokens, reservation.output_tokens) == (150, 100) and
+                   limiter.semaphore._value == 4))
+
+    limiter = make_limiter()
+    reservation = await limiter.acquire(200, 800)
+    limiter.release(reservation)
+    checks.append(("release without usage keeps the estimate",
+                   limiter.output_tokens_in_window == 800 and limiter.semaphore._value == 4))
+
+    # The second caller does not fit until the first refunds its unused output tokens
+    limiter = make_limiter()
+    first = await limiter.acquire(100, 800)
+    start = time.monotonic()
+    second = asyncio.ensure_future(limiter.acquire(100, 800))
+    await asyncio.sleep(0.05)
+    queued = not second.done()
+    limiter.release(first, 100, 100)
+    await asyncio.wait_for(second, timeout=1.0)
+    checks.append(("refund grants a queued caller immediately", queued and time.monotonic() - start < 0.5 and
+                   limiter.output_tokens_in_window == 900))
+    limiter.release(second.result())
+
+    # Without a refund the queued caller is woken when the first entry leaves the window
+    limiter = make_limiter(window_seconds=0.3)
+    await limiter.acquire(100, 800)
+    start = time.monotonic()
+    await asyncio.wait_for(limiter.acquire(100, 800), timeout=1.0)
+    waited = time.monotonic() - start
+    checks.append((f"queued caller granted when the window expires (waited {waited:.2f}s)", 0.25 < waited < 0.6))
+
+    limiter = make_limiter()
+    await limiter.acquire(100, 800)
+    waiter = asyncio.ensure_future(limiter.acquire(100, 800))
+    await asyncio.sleep(0.05)
+    waiter.cancel()
+    try:
+        await waiter
+    except asyncio.CancelledError:
+        pass
+    checks.append(("cancelled waiter returns its slot", limiter.semaphore._value == 3 and not limiter.waiters))
+
+    # Usage reported after the entry expired must not touch the counters of the current window
+    limiter = make_limiter(window_seconds=0.1)
+    stale = await limiter.acquire(100, 800)
+    await asyncio.sleep(0.15)
+    fresh = await limiter.acquire(100, 200)
+    limiter.release(stale, 50, 50)
+    checks.append(("release of an expired reservation leaves the window alone", stale.expired and
+                   (limiter.input_tokens_in_window, limiter.output_tokens_in_window) == (100, 200)))
+    limiter.release(fresh)
+    return checks
+
+
+def main():
+    failures = 0
+    for name, ok in asyncio.run(run_checks()):
+        print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+    if failures:
+        raise SystemExit(f"{failures} rate limiter checks failed")
+    print("\nAll rate limiter checks passed")
+
+
+if __name__ == "__main__":
+    main()
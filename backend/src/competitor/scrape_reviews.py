@@ -1,21 +1,28 @@
 import json
 import os
 import asyncio
+import inspect
 import aiofiles
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from apify_client import ApifyClient
+from apify_client import ApifyClient, ApifyClientAsync
+
+from utils.review_manifest import get_review_manifest
+from utils.review_store import ReviewStore, get_high_water_mark
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 DATA_DIR = os.path.join(ROOT_DIR, "data")
 OUTPUT_DIR = os.path.join(DATA_DIR, "scraped")
 AMAZON_REVIEW_DIR = os.path.join(OUTPUT_DIR, "amazon", "review")
+AMAZON_REVIEW_STORE_DIR = os.path.join(OUTPUT_DIR, "amazon", "review_store")  # Canonical per-ASIN stores (incremental mode)
 
 # Ensure directory exists
 os.makedirs(AMAZON_REVIEW_DIR, exist_ok=True)
 
 # Apify API Configuration
 APIFY_API_TOKEN = os.getenv("APIFY_API_TOKEN")
+APIFY_API_URL = os.getenv("APIFY_API_URL", "https://api.apify.com")  # Override to point at a stub actor endpoint
 AXESSO_ACTOR_ID = "ZebkvH3nVOrafqr5T"
 
 # Amazon Review Scraper Configuration (constant across all requests)
@@ -35,7 +42,14 @@ AMAZON_REVIEW_CONFIG = {
 
 # Configuration constants
 RATE_LIMIT_DELAY = 0.1  # seconds - 100ms delay between individual requests
-MAX_CONCURRENT_REQUESTS = 32  # Maximum concurrent API requests
+MAX_CONCURRENT_REQUESTS = int(os.getenv("SCRAPE_MAX_CONCURRENT_REQUESTS", "32"))  # Maximum ASINs processed concurrently
+APIFY_MAX_CONCURRENT_RUNS = int(os.getenv("APIFY_MAX_CONCURRENT_RUNS", str(MAX_CONCURRENT_REQUESTS)))  # Actor runs in flight (Apify plan limit)
+SCRAPE_BACKENDS = ("async", "thread")  # async: ApifyClientAsync; thread: blocking ApifyClient in a bounded thread pool
+SCRAPE_BACKEND = os.getenv("SCRAPE_BACKEND", "async")
+SCRAPE_MODES = ("snapshot", "incremental")  # snapshot: new timestamped file per scrape; incremental: delta into the review store
+SCRAPE_MODE = os.getenv("REVIEW_SCRAPE_MODE", "snapshot")
+INCREMENTAL_PAGE_STEPS = (1, MAX_PAGES_PER_ASIN)  # Pages requested per attempt until a stored review is reached
+REVIEW_STORE_REFRESH_DAYS = float(os.getenv("REVIEW_STORE_REFRESH_DAYS", "1"))  # Minimum days between refreshes of a store
 SCRAPE_RECENCY_DAYS = 30  # Days to consider a scrape "recent"
 DAYS_PER_MONTH = 30  # Approximation for months to days conversion
 DEFAULT_COVERAGE_MONTHS = 6  # Default months of review coverage required
@@ -46,26 +60,153 @@ MAX_REVIEW_YEAR = datetime.now().year  # Latest acceptable review year (current
 
 async def get_existing_review_files(asin):
     """
-    Get all existing review files for a given ASIN.
+    Get all existing review files for a given ASIN from the review manifest.
     
     Args:
         asin (str): Amazon ASIN
     
     Returns:
-        list: List of existing file paths for this ASIN
+        list: List of existing file paths for this ASIN, oldest scrape first
+    """
+    return [str(path) for path in get_review_manifest(AMAZON_REVIEW_DIR).get_files(asin)]
+
+def build_actor_run_input(asin, max_pages=None):
+    """
+    Build the Axesso actor input for one ASIN.
+    
+    Args:
+        asin (str): Amazon product ASIN
+        max_pages (int): Pages to request (default: MAX_PAGES_PER_ASIN)
+    
+    Returns:
+        dict: Actor run input
+    """
+    config = AMAZON_REVIEW_CONFIG.copy()
+    config["asin"] = asin
+    config["maxPages"] = max_pages or MAX_PAGES_PER_ASIN
+    return {"input": [config]}
+
+def get_default_dataset_id(run):
+    """
+    Get the default dataset ID of a finished actor run.
+    apify-client 1.x/2.x returns runs as dicts, 3.x as Run models.
+    
+    Args:
+        run: Run returned by the actor call
+    
+    Returns:
+        str: Dataset ID
+    """
+    if isinstance(run, dict):
+        return run["defaultDatasetId"]
+    return run.default_dataset_id
+
+def get_actor_call_kwargs(actor_client):
+    """
+    Extra arguments for actor_client.call().
+    apify-client >= 1.12 redirects the actor's log and status messages into ours
+    while waiting, which interleaves dozens of runs and delays each call by the
+    status poll interval; disable it where supported.
+    
+    Args:
+        actor_client: ActorClient or ActorClientAsync
+    
+    Returns:
+        dict: Keyword arguments for call()
+    """
+    if "logger" in inspect.signature(actor_client.call).parameters:
+        return {"logger": None}
+    return {}
+
+def summarize_actor_items(all_items, max_pages=None):
+    """
+    Turn the items of an actor run's dataset into processed reviews data.
+    
+    Args:
+        all_items (list): Dataset items from the actor run
+        max_pages (int): Pages requested from the actor (default: MAX_PAGES_PER_ASIN)
+    
+    Returns:
+        dict: Processed reviews data with actual page information
+    """
+    max_pages = max_pages or MAX_PAGES_PER_ASIN
+    if not all_items:
+        return {
+            "reviews": [],
+            "total_reviews": 0,
+            "max_pages_requested": max_pages,
+            "max_pages_reached": 0,
+            "fetched_all_available_reviews": True,  # No reviews means we've seen all (zero) reviews
+            "success": True
+        }
+    
+    # Extract reviews and determine actual pages reached
+    all_reviews = []
+    max_current_page = 0
+    has_current_page_info = False
+    
+    for item in all_items:
+        # Each item should have currentPage and be a review
+        if "currentPage" in item:
+            current_page = item.get("currentPage", 1)
+            max_current_page = max(max_current_page, current_page)
+            has_current_page_info = True
+        
+        # The item itself is a review if it has review fields
+        if "reviewId" in item or "text" in item:
+            all_reviews.append(item)
+    
+    # Determine if we've reached all available pages
+    if has_current_page_info:
+        # If we have page info, check if we reached max pages OR got fewer reviews than expected
+        fetched_all_available_reviews = (max_current_page >= max_pages or 
+                                       len(all_reviews) < max_pages * DEFAULT_REVIEWS_PER_PAGE)
+    else:
+        # If no page info, estimate based on total reviews vs expected
+        expected_reviews_for_max_pages = max_pages * DEFAULT_REVIEWS_PER_PAGE
+        fetched_all_available_reviews = len(all_reviews) < expected_reviews_for_max_pages
+        max_current_page = min(max_pages, max(1, len(all_reviews) // DEFAULT_REVIEWS_PER_PAGE))
+    
+    return {
+        "reviews": all_reviews,
+        "total_reviews": len(all_reviews),
+        "max_pages_requested": max_pages,
+        "max_pages_reached": max_current_page,
+        "fetched_all_available_reviews": fetched_all_available_reviews,
+        "success": True
+    }
+
+def apify_error_result(error, max_pages=None):
+    """
+    Build the reviews data returned when an actor run fails.
+    
+    Args:
+        error (Exception): Error raised by the Apify client
+        max_pages (int): Pages requested from the actor (default: MAX_PAGES_PER_ASIN)
+    
+    Returns:
+        dict: Empty reviews data flagged as unsuccessful
     """
-    existing_files = []
-    for filename in os.listdir(AMAZON_REVIEW_DIR):
-        if filename.startswith(f"{asin}_") and filename.endswith("_reviews.json"):
-            existing_files.append(os.path.join(AMAZON_REVIEW_DIR, filename))
-    return existing_files
+    print(f"   ❌ Apify API error: {str(error)}")
+    return {
+        "reviews": [],
+        "total_reviews": 0,
+        "max_pages_requested": max_pages or MAX_PAGES_PER_ASIN,
+        "max_pages_reached": 0,
+        "fetched_all_available_reviews": False,
+        "success": False,
+        "error": str(error)
+    }
 
-def get_amazon_reviews_apify(asin):
+def get_amazon_reviews_apify(asin, client=None, max_pages=None):
     """
     Get Amazon product reviews using Axesso Amazon Review Scraper via Apify API.
+    Blocks for the whole actor run; from async code use ApifyReviewProvider.
     
     Args:
         asin (str): Amazon product ASIN
+        client (ApifyClient): Client to reuse (a new one is created if None)
+        max_pages (int): Pages to request (default: MAX_PAGES_PER_ASIN)
     
     Returns:
         dict: Processed reviews data with actual page information
@@ -73,82 +214,99 @@ def get_amazon_reviews_apify(asin):
     if not APIFY_API_TOKEN:
         raise ValueError("APIFY_API_TOKEN environment variable is required")
     
-    # Initialize the ApifyClient
-    client = ApifyClient(APIFY_API_TOKEN)
-    
-    # Create the input configuration
-    config = AMAZON_REVIEW_CONFIG.copy()
-    config["asin"] = asin
-    
-    run_input = {"input": [config]}
+    client = client or ApifyClient(APIFY_API_TOKEN, api_url=APIFY_API_URL)
     
     try:
         # Run the Actor and wait for it to finish
-        print(f"   🔄 Starting Apify actor for ASIN {asin}, max_pages={MAX_PAGES_PER_ASIN}...")
-        run = client.actor(AXESSO_ACTOR_ID).call(run_input=run_input)
+        print(f"   🔄 Starting Apify actor for ASIN {asin}, max_pages={max_pages or MAX_PAGES_PER_ASIN}...")
+        actor_client = client.actor(AXESSO_ACTOR_ID)
+        run = actor_client.call(run_input=build_actor_run_input(asin, max_pages), **get_actor_call_kwargs(actor_client))
         
         # Fetch results from the run's dataset
-        all_items = []
-        for item in client.dataset(run["defaultDatasetId"]).iterate_items():
-            all_items.append(item)
+        all_items = list(client.dataset(get_default_dataset_id(run)).iterate_items())
+        return summarize_actor_items(all_items, max_pages)
         
-        if not all_items:
-            return {
-                "reviews": [],
-                "total_reviews": 0,
-                "max_pages_requested": MAX_PAGES_PER_ASIN,
-                "max_pages_reached": 0,
-                "fetched_all_available_reviews": True,  # No reviews means we've seen all (zero) reviews
-                "success": True
-            }
-        
-        # Extract reviews and determine actual pages reached
-        all_reviews = []
-        max_current_page = 0
-        has_current_page_info = False
+    except Exception as e:
+        return apify_error_result(e, max_pages)
+
+async def get_amazon_reviews_apify_async(asin, client=None, max_pages=None):
+    """
+    Async version of get_amazon_reviews_apify: waits for the actor run without blocking the event loop.
+    
+    Args:
+        asin (str): Amazon product ASIN
+        client (ApifyClientAsync): Client to reuse (a new one is created if None)
+        max_pages (int): Pages to request (default: MAX_PAGES_PER_ASIN)
+    
+    Returns:
+        dict: Processed reviews data with actual page information
+    """
+    if not APIFY_API_TOKEN:
+        raise ValueError("APIFY_API_TOKEN environment variable is required")
+    
+    client = client or ApifyClientAsync(APIFY_API_TOKEN, api_url=APIFY_API_URL)
+    
+    try:
+        print(f"   🔄 Starting Apify actor for ASIN {asin}, max_pages={max_pages or MAX_PAGES_PER_ASIN}...")
+        actor_client = client.actor(AXESSO_ACTOR_ID)
+        run = await actor_client.call(run_input=build_actor_run_input(asin, max_pages), **get_actor_call_kwargs(actor_client))
         
-        for item in all_items:
-            # Each item should have currentPage and be a review
-            if "currentPage" in item:
-                current_page = item.get("currentPage", 1)
-                max_current_page = max(max_current_page, current_page)
-                has_current_page_info = True
-            
-            # The item itself is a review if it has review fields
-            if "reviewId" in item or "text" in item:
-                all_reviews.append(item)
+        all_items = [item async for item in client.dataset(get_default_dataset_id(run)).iterate_items()]
+        return summarize_actor_items(all_items, max_pages)
         
-        # Determine if we've reached all available pages
-        if has_current_page_info:
-            # If we have page info, check if we reached max pages OR got fewer reviews than expected
-            fetched_all_available_reviews = (max_current_page >= MAX_PAGES_PER_ASIN or 
-                                           len(all_reviews) < MAX_PAGES_PER_ASIN * DEFAULT_REVIEWS_PER_PAGE)
+    except Exception as e:
+        return apify_error_result(e, max_pages)
+
+class ApifyReviewProvider:
+    """
+    Fetches reviews from the Apify actor with its own concurrency limit.
+    
+    The per-ASIN semaphore in scrape_all_amazon_reviews bounds how many ASINs
+    are worked on; this provider bounds how many actor runs are in flight, so
+    the Apify plan's concurrent-run limit can be set independently.
+    """
+    
+    def __init__(self, backend=SCRAPE_BACKEND, max_concurrent_runs=APIFY_MAX_CONCURRENT_RUNS, api_url=None):
+        """
+        Args:
+            backend (str): "async" (ApifyClientAsync) or "thread" (blocking ApifyClient in a bounded thread pool)
+            max_concurrent_runs (int): Maximum actor runs in flight
+            api_url (str): Apify API base URL (default: APIFY_API_URL)
+        """
+        api_url = api_url or APIFY_API_URL
+        if backend not in SCRAPE_BACKENDS:
+            raise ValueError(f"Unknown scrape backend '{backend}', expected one of {SCRAPE_BACKENDS}")
+        self.backend = backend
+        self.max_concurrent_runs = max_concurrent_runs
+        self.semaphore = asyncio.Semaphore(max_concurrent_runs)
+        self.executor = None
+        if backend == "async":
+            self.client = ApifyClientAsync(APIFY_API_TOKEN, api_url=api_url)
         else:
-            # If no page info, estimate based on total reviews vs expected
-            expected_reviews_for_max_pages = MAX_PAGES_PER_ASIN * DEFAULT_REVIEWS_PER_PAGE
-            fetched_all_available_reviews = len(all_reviews) < expected_reviews_for_max_pages
-            max_current_page = min(MAX_PAGES_PER_ASIN, max(1, len(all_reviews) // DEFAULT_REVIEWS_PER_PAGE))
+            self.client = ApifyClient(APIFY_API_TOKEN, api_url=api_url)
+            self.executor = ThreadPoolExecutor(max_workers=max_concurrent_runs, thread_name_prefix="apify")
+    
+    async def get_reviews(self, asin, max_pages=None):
+        """
+        Run the actor for one ASIN.
         
-        return {
-            "reviews": all_reviews,
-            "total_reviews": len(all_reviews),
-            "max_pages_requested": MAX_PAGES_PER_ASIN,
-            "max_pages_reached": max_current_page,
-            "fetched_all_available_reviews": fetched_all_available_reviews,
-            "success": True
-        }
+        Args:
+            asin (str): Amazon product ASIN
+            max_pages (int): Pages to request (default: MAX_PAGES_PER_ASIN)
         
-    except Exception as e:
-        print(f"   ❌ Apify API error: {str(e)}")
-        return {
-            "reviews": [],
-            "total_reviews": 0,
-            "max_pages_requested": MAX_PAGES_PER_ASIN,
-            "max_pages_reached": 0,
-            "fetched_all_available_reviews": False,
-            "success": False,
-            "error": str(e)
-        }
+        Returns:
+            dict: Processed reviews data with actual page information
+        """
+        async with self.semaphore:
+            if self.executor is None:
+                return await get_amazon_reviews_apify_async(asin, self.client, max_pages)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, get_amazon_reviews_apify, asin, self.client, max_pages)
+    
+    def close(self):
+        """Shut down the thread pool of the thread backend"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
 
 def parse_review_date(date_str):
     """
@@ -206,9 +364,10 @@ def is_valid_review_date(review_date_str):
     review_year = parsed_date.year
     return MIN_REVIEW_YEAR <= review_year <= MAX_REVIEW_YEAR
 
-async def analyze_all_existing_reviews(filepaths, review_coverage_months):
+def analyze_scrape_summary(summary, review_coverage_months):
     """
-    Analyze all existing review files to determine if we need to scrape again.
+    Decide from an ASIN's scrape summary (review manifest) whether we need to scrape again.
+    The summary is maintained when review files are saved, so no historical file is re-read here.
     
     Skip Conditions (ANY condition triggers skip):
     1. No recent scrape: Must have at least one file scraped within the last 30 days
@@ -217,49 +376,15 @@ async def analyze_all_existing_reviews(filepaths, review_coverage_months):
     4. Sufficient coverage: Combined reviews span at least the specified duration
     
     Args:
-        filepaths (list): List of file paths to analyze
+        summary (dict): Scrape summary from ReviewManifest.get_summary
         review_coverage_months (int): Required months of review coverage to skip
     
     Returns:
         dict: Analysis result with skip recommendation
     """
-    all_reviews = []
-    scrape_dates = []
-    earliest_reviews_fetched = False
-    max_pages_already_reached = False
-    
-    for filepath in filepaths:
-        try:
-            async with aiofiles.open(filepath, 'r', encoding='utf-8') as f:
-                content = await f.read()
-                data = json.loads(content)
-            
-            # Extract metadata
-            scrape_date_str = data.get("scrape_metadata", {}).get("scrape_date", "")
-            reviews = data.get("reviews_data", {}).get("reviews", [])
-            
-            # Check if earliest reviews were fetched in this scrape
-            scrape_metadata = data.get("scrape_metadata", {})
-            if scrape_metadata.get("earliest_reviews_fetched", False):
-                earliest_reviews_fetched = True
-            
-            # Check if we've already fetched all available reviews with current setting
-            if (scrape_metadata.get("fetched_all_available_reviews", False) and 
-                scrape_metadata.get("max_pages_requested", 0) == MAX_PAGES_PER_ASIN):
-                max_pages_already_reached = True
-            
-            # Add scrape date
-            if scrape_date_str:
-                scrape_date = datetime.fromisoformat(scrape_date_str.replace('Z', '+00:00'))
-                scrape_dates.append(scrape_date.replace(tzinfo=None))
-            
-            # Add all reviews
-            all_reviews.extend(reviews)
-            
-        except Exception:
-            continue  # Skip files that can't be parsed
+    total_reviews = summary.get("review_count", 0)
     
-    if not scrape_dates:
+    if not summary.get("latest_scrape_date"):
         return {
             "should_skip": False,
             "reason": "no_valid_scrapes",
@@ -267,7 +392,7 @@ async def analyze_all_existing_reviews(filepaths, review_coverage_months):
         }
     
     # Check if any scrape was within last month
-    most_recent_scrape = max(scrape_dates)
+    most_recent_scrape = datetime.fromisoformat(summary["latest_scrape_date"].replace('Z', '+00:00')).replace(tzinfo=None)
     days_since_recent_scrape = (datetime.now() - most_recent_scrape).days
     
     if days_since_recent_scrape > SCRAPE_RECENCY_DAYS:
@@ -278,29 +403,23 @@ async def analyze_all_existing_reviews(filepaths, review_coverage_months):
         }
     
     # If we've already fetched the earliest reviews, skip regardless of coverage
-    if earliest_reviews_fetched:
+    if summary.get("earliest_reviews_fetched"):
         return {
             "should_skip": True,
             "reason": "earliest_reviews_already_fetched",
-            "details": f"Earliest reviews already fetched in previous scrape, {len(all_reviews)} total reviews available"
+            "details": f"Earliest reviews already fetched in previous scrape, {total_reviews} total reviews available"
         }
     
     # If we've already fetched all available reviews with current setting, skip
-    if max_pages_already_reached:
+    if MAX_PAGES_PER_ASIN in summary.get("fetched_all_available_reviews_max_pages", []):
         return {
             "should_skip": True,
             "reason": "all_available_reviews_already_fetched",
-            "details": f"All available reviews already fetched with {MAX_PAGES_PER_ASIN} max pages in previous scrape, {len(all_reviews)} total reviews available"
+            "details": f"All available reviews already fetched with {MAX_PAGES_PER_ASIN} max pages in previous scrape, {total_reviews} total reviews available"
         }
     
     # Analyze combined review date coverage
-    review_dates = []
-    for review in all_reviews:
-        review_date = parse_review_date(review.get("date", ""))
-        if review_date:
-            review_dates.append(review_date)
-    
-    if not review_dates:
+    if not summary.get("earliest_review_date") or not summary.get("latest_review_date"):
         return {
             "should_skip": False,
             "reason": "no_valid_review_dates",
@@ -308,9 +427,8 @@ async def analyze_all_existing_reviews(filepaths, review_coverage_months):
         }
     
     # Check review coverage span
-    review_dates.sort()
-    oldest_review = review_dates[0]
-    newest_review = review_dates[-1]
+    oldest_review = datetime.fromisoformat(summary["earliest_review_date"])
+    newest_review = datetime.fromisoformat(summary["latest_review_date"])
     coverage_days = (newest_review - oldest_review).days
     required_days = review_coverage_months * DAYS_PER_MONTH
     
@@ -318,7 +436,7 @@ async def analyze_all_existing_reviews(filepaths, review_coverage_months):
         return {
             "should_skip": True,
             "reason": "sufficient_coverage",
-            "details": f"Recent scrape {days_since_recent_scrape} days ago, {len(all_reviews)} total reviews spanning {coverage_days} days (≥{required_days} days required)"
+            "details": f"Recent scrape {days_since_recent_scrape} days ago, {total_reviews} total reviews spanning {coverage_days} days (≥{required_days} days required)"
         }
     else:
         return {
@@ -332,9 +450,9 @@ async def determine_skip_action(asin, review_coverage_months):
     Determine if we should skip scraping for this ASIN based on all existing files.
     
     Skip Logic Documentation:
-    1. Get all existing review files for this ASIN
+    1. Get this ASIN's scrape summary from the review manifest
     2. If no files exist → DON'T SKIP (scrape)
-    3. If files exist → Analyze ALL files combined:
+    3. If files exist → Analyze the summary of ALL files combined:
        a. At least one file must have been scraped within last SCRAPE_RECENCY_DAYS days
        b. Combined reviews must span ≥specified months of coverage
        c. Both conditions must be met to SKIP
@@ -347,9 +465,10 @@ async def determine_skip_action(asin, review_coverage_months):
     Returns:
         dict: Skip decision with reasoning
     """
-    existing_files = await get_existing_review_files(asin)
+    manifest = get_review_manifest(AMAZON_REVIEW_DIR)
+    summary = manifest.get_summary(asin)
     
-    if not existing_files:
+    if not summary:
         return {
             "should_skip": False,
             "reason": "no_existing_files",
@@ -357,10 +476,10 @@ async def determine_skip_action(asin, review_coverage_months):
         }
     
     # Analyze all files combined
-    analysis = await analyze_all_existing_reviews(existing_files, review_coverage_months)
+    analysis = analyze_scrape_summary(summary, review_coverage_months)
     
-    analysis["total_existing_files"] = len(existing_files)
-    analysis["analyzed_files"] = [os.path.basename(f) for f in existing_files]
+    analysis["total_existing_files"] = summary["file_count"]
+    analysis["analyzed_files"] = [path.name for path in manifest.get_files(asin)]
     
     return analysis
 
@@ -389,7 +508,7 @@ async def generate_filename(asin):
 
 async def save_reviews_with_context(asin, reviews_data, filepath, earliest_reviews_fetched=False, max_pages_info=None):
     """
-    Save reviews data with product context information.
+    Save reviews data with product context information and record the file in the review manifest.
     
     Args:
         asin (str): Amazon product ASIN
@@ -420,10 +539,13 @@ async def save_reviews_with_context(asin, reviews_data, filepath, earliest_revie
         "reviews_data": reviews_data
     }
     
+    content = json.dumps(output_data, indent=2, ensure_ascii=False)
     async with aiofiles.open(filepath, 'w', encoding='utf-8') as f:
-        await f.write(json.dumps(output_data, indent=2, ensure_ascii=False))
+        await f.write(content)
+    
+    get_review_manifest(AMAZON_REVIEW_DIR).record(filepath, content)
 
-async def scrape_product_reviews(asin, semaphore, review_coverage_months):
+async def scrape_product_reviews(asin, semaphore, review_coverage_months, provider):
     """
     Scrape reviews for a single product using Axesso Amazon Review Scraper via Apify API.
     
@@ -433,6 +555,7 @@ async def scrape_product_reviews(asin, semaphore, review_coverage_months):
         asin (str): Amazon product ASIN
         semaphore: Asyncio semaphore for rate limiting
         review_coverage_months (int): Required months of review coverage to skip
+        provider (ApifyReviewProvider): Runs the actor without blocking the event loop
     """
     async with semaphore:
         title = f"Product {asin}"  # Simple title since we don't have product info
@@ -465,7 +588,7 @@ async def scrape_product_reviews(asin, semaphore, review_coverage_months):
             await asyncio.sleep(RATE_LIMIT_DELAY)
             
             # Get reviews using Apify API (single call gets up to MAX_PAGES_PER_ASIN pages)
-            reviews_data = get_amazon_reviews_apify(asin=asin)
+            reviews_data = await provider.get_reviews(asin)
             
             if not reviews_data or not reviews_data.get("success", False):
                 error_msg = reviews_data.get("error", "Unknown error") if reviews_data else "No response"
@@ -572,34 +695,99 @@ async def scrape_product_reviews(asin, semaphore, review_coverage_months):
             print(f"❌ Error scraping {asin} - {title[:50]}...: {error_msg}")
             return {"status": "error", "asin": asin, "error": error_msg}
 
-async def scrape_all_amazon_reviews(review_coverage_months=DEFAULT_COVERAGE_MONTHS):
+async def scrape_product_reviews_incremental(asin, semaphore, provider, store):
     """
-    Main function to scrape reviews for all non-out-of-scope Amazon products.
+    Refresh a product's canonical review store with the reviews posted since its last scrape.
     
-    Skip Logic (ALL conditions must be met to skip):
-    1. At least one existing file scraped within SCRAPE_RECENCY_DAYS days
-    2. Combined reviews from all files span ≥review_coverage_months of time coverage
+    Reviews are sorted by recent, so the actor is asked for INCREMENTAL_PAGE_STEPS pages in turn
+    and stops at the first request that reaches a review the store already has (or runs out of
+    reviews). An ASIN without a store is seeded from its snapshot files first; one with neither
+    gets a full MAX_PAGES_PER_ASIN scrape.
     
     Args:
-        review_coverage_months (int): Required months of review coverage to skip (default: DEFAULT_COVERAGE_MONTHS)
+        asin (str): Amazon product ASIN
+        semaphore: Asyncio semaphore for rate limiting
+        provider (ApifyReviewProvider): Runs the actor without blocking the event loop
+        store (ReviewStore): Canonical per-ASIN review store
     """
-    print("🚀 Starting Amazon reviews scraping...")
-    print("\n📋 Skip Logic (ANY condition will trigger skip):")
-    print(f"   • No recent scrape: Must have one file scraped within {SCRAPE_RECENCY_DAYS} days")
-    print(f"   • Earliest reviews already fetched in previous scrape")
-    print(f"   • All available reviews already fetched with current max pages ({MAX_PAGES_PER_ASIN}) setting")
-    print(f"   • Sufficient coverage: Combined reviews span ≥{review_coverage_months} months")
-    print("   • Always create timestamped files to avoid overwriting")
-    print(f"\n📄 API Logic:")
-    print(f"   • Single API call fetches up to {MAX_PAGES_PER_ASIN} pages of reviews per ASIN")
-    print(f"   • Uses Axesso Amazon Review Scraper via Apify API")
-    print(f"\n📅 Date filtering: Reviews from {MIN_REVIEW_YEAR} to {MAX_REVIEW_YEAR}\n")
+    async with semaphore:
+        try:
+            stored = store.load(asin)
+            if stored is None:
+                snapshot_files = get_review_manifest(AMAZON_REVIEW_DIR).get_files(asin)
+                if snapshot_files:
+                    stored = store.seed(asin, snapshot_files)
+                    if stored:
+                        print(f"🌱 Seeded review store for {asin} from {len(snapshot_files)} snapshot files "
+                              f"({stored['reviews_data']['total_reviews']} reviews)")
+            
+            if stored is not None:
+                last_refresh = datetime.fromisoformat(stored["store_metadata"]["updated"].replace('Z', '+00:00')).replace(tzinfo=None)
+                days_since_refresh = (datetime.now() - last_refresh).total_seconds() / 86400
+                if days_since_refresh < REVIEW_STORE_REFRESH_DAYS:
+                    details = f"Review store refreshed {days_since_refresh:.1f} days ago (<{REVIEW_STORE_REFRESH_DAYS} days)"
+                    print(f"⏩ Skipping {asin} ({details})")
+                    return {"status": "skipped", "asin": asin, "reason": "store_recently_refreshed", "details": details}
+            
+            page_steps = INCREMENTAL_PAGE_STEPS if stored else (MAX_PAGES_PER_ASIN,)
+            print(f"🔍 Refreshing review store for {asin}...")
+            
+            # Rate limiting
+            await asyncio.sleep(RATE_LIMIT_DELAY)
+            
+            pages_fetched = 0
+            for max_pages in page_steps:
+                reviews_data = await provider.get_reviews(asin, max_pages=max_pages)
+                if not reviews_data.get("success", False):
+                    error_msg = reviews_data.get("error", "Unknown error")
+                    print(f"   ❌ API error: {error_msg}")
+                    return {"status": "error", "asin": asin, "error": error_msg, "pages_scraped": pages_fetched}
+                
+                fetched_reviews = reviews_data.get("reviews", [])
+                pages_fetched += reviews_data.get("max_pages_reached", 0)
+                new_reviews, reached_known = store.split_new_reviews(asin, fetched_reviews)
+                no_more_reviews = len(fetched_reviews) < max_pages * DEFAULT_REVIEWS_PER_PAGE
+                if reached_known or no_more_reviews:
+                    break
+            
+            data = store.merge(asin, new_reviews, {
+                "scrape_date": datetime.now().isoformat(),
+                "high_water_mark": get_high_water_mark(fetched_reviews),
+                "pages_fetched": pages_fetched,
+                "max_pages_requested": max_pages,
+                "earliest_reviews_fetched": no_more_reviews
+            })
+            
+            review_count = data["reviews_data"]["total_reviews"]
+            print(f"✅ {asin}: {len(new_reviews)} new reviews from {pages_fetched} pages, {review_count} in store")
+            
+            return {
+                "status": "success",
+                "asin": asin,
+                "review_count": review_count,
+                "new_reviews": len(new_reviews),
+                "pages_scraped": pages_fetched,
+                "reached_stored_review": reached_known,
+                "filepath": str(store.path(asin))
+            }
+            
+        except Exception as e:
+            error_msg = str(e)
+            print(f"❌ Error refreshing review store for {asin}: {error_msg}")
+            return {"status": "error", "asin": asin, "error": error_msg}
+
+def load_asins_to_scrape():
+    """
+    Collect the ASINs of all non-out-of-scope Amazon products plus the manually tracked ones.
     
+    Returns:
+        tuple: (all_asins, csv_asins, additional_asins), or (None, None, None) if the product CSV is missing
+    """
     # Read the CSV file
     csv_path = os.path.join(DATA_DIR, "result", "product_segment", "combined_products_cleaned", "combined_products_with_final_categories.csv")
     if not os.path.exists(csv_path):
         print(f"❌ CSV file not found: {csv_path}")
-        return
+        return None, None, None
     
     print(f"📊 Reading products from: {csv_path}")
     df = pd.read_csv(csv_path)
@@ -628,41 +816,110 @@ async def scrape_all_amazon_reviews(review_coverage_months=DEFAULT_COVERAGE_MONT
     all_asins = list(csv_asins.union(additional_asins))
     
     print(f"📦 Found {len(csv_asins)} ASINs from CSV + {len(additional_asins)} additional ASINs")
+    return all_asins, csv_asins, additional_asins
+
+async def scrape_all_amazon_reviews(review_coverage_months=DEFAULT_COVERAGE_MONTHS, asins=None,
+                                    max_concurrent_requests=MAX_CONCURRENT_REQUESTS, backend=SCRAPE_BACKEND,
+                                    max_concurrent_runs=APIFY_MAX_CONCURRENT_RUNS, mode=SCRAPE_MODE):
+    """
+    Main function to scrape reviews for all non-out-of-scope Amazon products.
+    
+    Skip Logic (ALL conditions must be met to skip):
+    1. At least one existing file scraped within SCRAPE_RECENCY_DAYS days
+    2. Combined reviews from all files span ≥review_coverage_months of time coverage
+    
+    Args:
+        review_coverage_months (int): Required months of review coverage to skip (default: DEFAULT_COVERAGE_MONTHS)
+        asins (list): ASINs to scrape instead of the ones from the product CSV (default: None)
+        max_concurrent_requests (int): Maximum ASINs processed concurrently
+        backend (str): Apify scraping backend, one of SCRAPE_BACKENDS
+        max_concurrent_runs (int): Maximum Apify actor runs in flight
+        mode (str): "snapshot" (timestamped file per scrape, skip logic below) or
+            "incremental" (delta refresh of the canonical review stores)
+    
+    Returns:
+        dict: Summary data saved to the scrape summary file (None if nothing was scraped)
+    """
+    if mode not in SCRAPE_MODES:
+        raise ValueError(f"Unknown scrape mode '{mode}', expected one of {SCRAPE_MODES}")
+    
+    print(f"🚀 Starting Amazon reviews scraping ({mode} mode)...")
+    if mode == "incremental":
+        print("\n📋 Incremental Logic:")
+        print(f"   • One deduplicated review store per ASIN in {AMAZON_REVIEW_STORE_DIR}")
+        print(f"   • Stores refreshed less than {REVIEW_STORE_REFRESH_DAYS} days ago are skipped")
+        print(f"   • Pages requested per attempt: {' → '.join(str(pages) for pages in INCREMENTAL_PAGE_STEPS)}, stopping at the first stored review")
+    else:
+        print("\n📋 Skip Logic (ANY condition will trigger skip):")
+        print(f"   • No recent scrape: Must have one file scraped within {SCRAPE_RECENCY_DAYS} days")
+        print(f"   • Earliest reviews already fetched in previous scrape")
+        print(f"   • All available reviews already fetched with current max pages ({MAX_PAGES_PER_ASIN}) setting")
+        print(f"   • Sufficient coverage: Combined reviews span ≥{review_coverage_months} months")
+        print("   • Always create timestamped files to avoid overwriting")
+    print(f"\n📄 API Logic:")
+    print(f"   • Single API call fetches up to {MAX_PAGES_PER_ASIN} pages of reviews per ASIN")
+    print(f"   • Uses Axesso Amazon Review Scraper via Apify API ({backend} backend, max {max_concurrent_runs} concurrent actor runs)")
+    print(f"\n📅 Date filtering: Reviews from {MIN_REVIEW_YEAR} to {MAX_REVIEW_YEAR}\n")
+    
+    if asins is not None:
+        all_asins = list(dict.fromkeys(asins))
+        csv_asins, additional_asins = set(), set(all_asins)
+    else:
+        all_asins, csv_asins, additional_asins = load_asins_to_scrape()
+        if all_asins is None:
+            return None
+    
     print(f"📦 Total {len(all_asins)} unique ASINs to scrape")
     
     if len(all_asins) == 0:
         print("⚠️  No ASINs to scrape!")
-        return
+        return None
     
     # Create semaphore for rate limiting
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+    provider = ApifyReviewProvider(backend=backend, max_concurrent_runs=max_concurrent_runs)
     
     # Track results
     results = []
     
     # Create tasks for all ASINs - semaphore will control concurrency
-    print(f"\n📦 Processing {len(all_asins)} ASINs with max {MAX_CONCURRENT_REQUESTS} concurrent requests")
-    
-    tasks = [
-        scrape_product_reviews(asin, semaphore, review_coverage_months) 
-        for asin in all_asins
-    ]
+    print(f"\n📦 Processing {len(all_asins)} ASINs with max {max_concurrent_requests} concurrent requests")
+    
+    if mode == "incremental":
+        store = ReviewStore(AMAZON_REVIEW_STORE_DIR)
+        tasks = [
+            scrape_product_reviews_incremental(asin, semaphore, provider, store)
+            for asin in all_asins
+        ]
+    else:
+        tasks = [
+            scrape_product_reviews(asin, semaphore, review_coverage_months, provider) 
+            for asin in all_asins
+        ]
     
     # Execute all tasks with semaphore-controlled concurrency
-    results = await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        provider.close()
     
     # Generate summary
     successful = sum(1 for r in results if isinstance(r, dict) and r.get("status") == "success")
     skipped = sum(1 for r in results if isinstance(r, dict) and r.get("status") == "skipped")
     errors = sum(1 for r in results if isinstance(r, dict) and r.get("status") == "error")
     exceptions = sum(1 for r in results if not isinstance(r, dict))
+    pages_fetched = sum(r.get("pages_scraped", 0) for r in results if isinstance(r, dict))
     
     print("\n📊 Scraping Summary:")
     print(f"   ✅ Successful: {successful}")
     print(f"   ⏩ Skipped: {skipped}")
     print(f"   ❌ Errors: {errors}")
     print(f"   🚫 Exceptions: {exceptions}")
-    print(f"   📁 Files saved to: {AMAZON_REVIEW_DIR}")
+    print(f"   📄 Pages fetched: {pages_fetched}")
+    if mode == "incremental":
+        new_reviews = sum(r.get("new_reviews", 0) for r in results if isinstance(r, dict))
+        print(f"   🆕 New reviews stored: {new_reviews}")
+    print(f"   📁 Files saved to: {AMAZON_REVIEW_STORE_DIR if mode == 'incremental' else AMAZON_REVIEW_DIR}")
     
     # Save summary report
     summary_data = {
@@ -675,10 +932,14 @@ async def scrape_all_amazon_reviews(review_coverage_months=DEFAULT_COVERAGE_MONT
             "skipped": skipped,
             "errors": errors,
             "exceptions": exceptions,
+            "pages_fetched": pages_fetched,
+            "scrape_mode": mode,
             "review_coverage_months": review_coverage_months,
             "configuration": {
                 "rate_limit_delay": RATE_LIMIT_DELAY,
-                "max_concurrent_requests": MAX_CONCURRENT_REQUESTS,
+                "max_concurrent_requests": max_concurrent_requests,
+                "scrape_backend": backend,
+                "max_concurrent_actor_runs": max_concurrent_runs,
                 "scrape_recency_days": SCRAPE_RECENCY_DAYS,
                 "min_review_year": MIN_REVIEW_YEAR,
                 "max_review_year": MAX_REVIEW_YEAR
@@ -692,6 +953,7 @@ async def scrape_all_amazon_reviews(review_coverage_months=DEFAULT_COVERAGE_MONT
         await f.write(json.dumps(summary_data, indent=2, ensure_ascii=False))
     
     print(f"📄 Summary saved to: {summary_file}")
+    return summary_data
 
 if __name__ == "__main__":
     # Run the async scraper
@@ -7,15 +7,18 @@ from pathlib import Path
 from datetime import datetime
 import hashlib
 import asyncio
+import threading
 import time
 from collections import deque
 
 # Import shared utilities
 from utils.config import get_segment_config
-from utils.rate_limiter import RateLimiter
+from utils.rate_limit_registry import get_shared_rate_limiter
 from utils.llm_utils import initialize_global_llm, get_global_llm
 from utils.prompt_utils import PromptManager
 from utils.json_utils import extract_json_from_response
+from utils.cache_utils import prompt_cache_key, touch
+from utils.write_behind import get_write_behind_writer
 
 # === CONFIGURATION ===
 config = get_segment_config()
@@ -49,8 +52,9 @@ FINAL_OUTPUT_PATH = OUTPUT_ROOT_DIR / "combined_products_with_final_categories.c
 CACHE_DIR = config.CACHE_DIR
 RESULT_CACHE_DIR = config.RESULT_CACHE_DIR
 
-# Initialize shared utilities
-rate_limiter = RateLimiter(
+# Initialize shared utilities (rate limit budget is shared host-wide with other scripts)
+rate_limiter = get_shared_rate_limiter(
+    MODEL_NAME,
     max_requests_per_minute=MAX_REQUESTS_PER_MINUTE,
     max_input_tokens_per_minute=MAX_INPUT_TOKENS_PER_MINUTE,
     max_output_tokens_per_minute=MAX_OUTPUT_TOKENS_PER_MINUTE,
@@ -63,7 +67,13 @@ llm_manager = initialize_global_llm(
     model_name=MODEL_NAME,
     temperature=MODEL_TEMPERATURE,
     max_tokens=MODEL_MAX_TOKENS,
-    rate_limiter=rate_limiter
+    rate_limiter=rate_limiter,
+    call_timeout=config.LLM_CALL_TIMEOUT,
+    hedge_percentile=config.LLM_HEDGE_PERCENTILE,
+    providers=config.LLM_PROVIDERS,
+    backend=config.LLM_BACKEND,
+    mock_options=config.get_mock_llm_options(),
+    trace_path=config.LLM_TRACE_PATH
 )
 
 # Initialize prompt manager
@@ -100,33 +110,31 @@ def safe_llm_call_legacy(prompt: str, context: Optional[Dict[str, Any]] = None)
         # The shared utilities handle this automatically
         pass
     except Exception as e:
-        rate_limiter.release()  # Always release semaphore
+        rate_limiter.release(None)  # Always release semaphore
         print(f"❌ LLM call failed: {e}")
         raise
 
 # === CACHING SYSTEM ===
 
+# Cache and log files are written on a background thread, off the event loop
+write_behind = get_write_behind_writer()
+# Cache entries queued for writing, by (interaction_type, cache_key), so lookups see them right away
+pending_llm_cache: Dict[Tuple[str, str], Dict[str, Any]] = {}
+pending_llm_cache_lock = threading.Lock()  # on_done callbacks run on the writer thread
+
 def generate_cache_key(base_prompt: str, context: Dict[str, Any]) -> str:
-    """Generate a unique cache key based on base prompt and context"""
-    # Create a deterministic string from base prompt and context
-    context_str = json.dumps(context, sort_keys=True, ensure_ascii=False)
-    combined = f"{base_prompt}\n---CONTEXT---\n{context_str}"
-    
-    # Generate SHA256 hash
-    hash_obj = hashlib.sha256(combined.encode('utf-8'))
-    return hash_obj.hexdigest()[:16]  # Use first 16 characters for readability
+    """Generate a unique cache key based on model, base prompt and context"""
+    return prompt_cache_key(base_prompt, context, MODEL_NAME)
 
 def create_cache_filename(interaction_type: str, cache_key: str, 
                          batch_id: Optional[int] = None, category: Optional[str] = None) -> str:
-    """Create interpretable cache filename"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H")
-    
+    """Create interpretable cache filename (no timestamp, so later runs find the same file)"""
     parts = [interaction_type]
     if category:
         parts.append(f"cat_{category.replace(':', '_').replace(' ', '_')}")
     if batch_id is not None:
         parts.append(f"batch{batch_id}")
-    parts.extend([cache_key, timestamp])
+    parts.append(cache_key)
     
     return "_".join(parts) + ".json"
 
@@ -156,8 +164,16 @@ def save_llm_cache(prompt: str, response: str, interaction_type: str, context: D
     }
     
     cache_path = CACHE_DIR / filename
-    with open(cache_path, 'w', encoding='utf-8') as f:
-        json.dump(cache_data, f, indent=2, ensure_ascii=False)
+    pending_key = (interaction_type, cache_key)
+    with pending_llm_cache_lock:
+        pending_llm_cache[pending_key] = cache_data
+
+    def on_done():
+        with pending_llm_cache_lock:
+            if pending_llm_cache.get(pending_key) is cache_data:
+                del pending_llm_cache[pending_key]
+
+    write_behind.write_json(cache_path, cache_data, on_done=on_done)
     
     print(f"💾 Cached LLM response: {filename}")
     return str(cache_path)
@@ -172,8 +188,18 @@ def load_llm_cache(prompt: str, context: Dict[str, Any], interaction_type: str,
     cache_key_prompt = base_prompt if base_prompt is not None else prompt
     cache_key = generate_cache_key(cache_key_prompt, context)
     
+    # Entries still queued on the writer are not on disk yet
+    with pending_llm_cache_lock:
+        cache_data = pending_llm_cache.get((interaction_type, cache_key))
+    if (cache_data is not None and
+        cache_data.get("model_name") == MODEL_NAME and
+        cache_data.get("base_prompt") == cache_key_prompt and
+        cache_data.get("context") == context):
+        llm_manager.telemetry.record_cache_lookup(prompt, True)
+        return cache_data["response"]
+    
     # Search for matching cache files
-    for cache_file in CACHE_DIR.glob(f"{interaction_type}_*_{cache_key}_*.json"):
+    for cache_file in CACHE_DIR.glob(f"{interaction_type}_*{cache_key}.json"):
         try:
             with open(cache_file, 'r', encoding='utf-8') as f:
                 cache_data = json.load(f)
@@ -186,11 +212,14 @@ def load_llm_cache(prompt: str, context: Dict[str, Any], interaction_type: str,
                 cache_data.get("context") == context):
                 
                 print(f"🔄 Using cached response: {cache_file.name}")
+                touch(cache_file)  # Last access for LRU eviction
+                llm_manager.telemetry.record_cache_lookup(prompt, True)
                 return cache_data["response"]
                 
         except (json.JSONDecodeError, KeyError, FileNotFoundError):
             continue
     
+    llm_manager.telemetry.record_cache_lookup(prompt, False)
     return None
 
 # === RESULT CACHING SYSTEM ===
@@ -224,7 +253,6 @@ def save_result_cache(result_df: pd.DataFrame, taxonomies: Dict[str, Dict[str, A
     RESULT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
     
     cache_key = generate_result_cache_key(input_file_path, processing_params)
-    timestamp = datetime.now().strftime("%Y%m%d_%H")
     
     # Create cache data
     cache_data = {
@@ -247,13 +275,13 @@ def save_result_cache(result_df: pd.DataFrame, taxonomies: Dict[str, Dict[str, A
     }
     
     # Save cache metadata
-    cache_filename = f"{result_type}_{cache_key}_{timestamp}.json"
+    cache_filename = f"{result_type}_{cache_key}.json"
     cache_path = RESULT_CACHE_DIR / cache_filename
     with open(cache_path, 'w', encoding='utf-8') as f:
         json.dump(cache_data, f, indent=2, ensure_ascii=False)
     
     # Save result files with cache key prefix
-    result_prefix = f"{result_type}_{cache_key}_{timestamp}"
+    result_prefix = f"{result_type}_{cache_key}"
     
     # Save main result DataFrame
     result_csv_path = RESULT_CACHE_DIR / f"{result_prefix}_results.csv"
@@ -276,7 +304,7 @@ def load_result_cache(input_file_path: str, processing_params: Dict[str, Any],
     cache_key = generate_result_cache_key(input_file_path, processing_params)
     
     # Search for matching cache files
-    for cache_file in RESULT_CACHE_DIR.glob(f"{result_type}_{cache_key}_*.json"):
+    for cache_file in RESULT_CACHE_DIR.glob(f"{result_type}_{cache_key}.json"):
         try:
             with open(cache_file, 'r', encoding='utf-8') as f:
                 cache_data = json.load(f)
@@ -303,6 +331,8 @@ def load_result_cache(input_file_path: str, processing_params: Dict[str, Any],
                         taxonomies = json.load(f)
                     
                     print(f"🔄 Using cached results: {cache_file.name}")
+                    for path in (cache_file, result_csv_path, taxonomy_path):
+                        touch(path)  # Last access for LRU eviction
                     return result_df, taxonomies
                 
         except (json.JSONDecodeError, KeyError, FileNotFoundError, pd.errors.EmptyDataError):
@@ -329,12 +359,11 @@ def save_llm_interaction(prompt: str, response: str, interaction_type: str,
     LOG_DIR.mkdir(exist_ok=True)
     filename_base = create_log_filename(interaction_type, batch_id, attempt)
     
-    # Save files
+    # Save files (written in the background)
     files_created = {}
     for suffix, content in [("input.txt", prompt), ("response.txt", response)]:
         file_path = LOG_DIR / f"{filename_base}_{suffix}"
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+        write_behind.write_text(file_path, content)
         files_created[suffix.split('.')[0]] = str(file_path)
     
     
@@ -767,7 +796,7 @@ async def run_batch(batch: pd.DataFrame, batch_mapping: List[int], batch_id: int
     for attempt in range(max_tries):
         print(f"Debug - Sending prompt to LLM: {full_prompt}")
         
-        response_text = await safe_llm_call(full_prompt)
+        response_text = await safe_llm_call(full_prompt, {"interaction": "taxonomy", "attempt": attempt})
         
         print(f"Debug - LLM response (first 200 chars): {response_text[:200]}...")
         print(f"Debug - Full LLM response: {repr(response_text)}")
@@ -1074,7 +1103,7 @@ async def consolidate_taxonomies(taxonomy_a: Dict[str, Dict[str, Any]], taxonomy
     for attempt in range(max_tries):
         print(f"Debug - Consolidate attempt {attempt + 1}, prompt length: {len(prompt)}")
         
-        response_text = await safe_llm_call(prompt)
+        response_text = await safe_llm_call(prompt, {"interaction": "consolidate", "attempt": attempt})
         
         save_llm_interaction(
             prompt=prompt,
@@ -1960,7 +1989,7 @@ async def process_refinement_batch(full_prompt: str, batch_product_ids: set, val
     for attempt in range(max_tries):
         print(f"  Refinement attempt {attempt + 1}...")
         
-        response_text = await safe_llm_call(prompt)
+        response_text = await safe_llm_call(prompt, {"interaction": "refine", "attempt": attempt})
         
         save_llm_interaction(
             prompt=prompt,
@@ -2042,6 +2071,11 @@ async def main() -> None:
         print("✓ Final refined taxonomy saved!")
         
         print("✓ Processing complete!")
+        if llm_manager.single_flight:
+            print(f"✓ Coalesced {llm_manager.single_flight.stats['coalesced']} of {llm_manager.single_flight.stats['calls']} LLM calls onto identical in-flight requests")
+        print(f"✓ LLM calls by interaction (trace: {config.LLM_TRACE_PATH}):")
+        llm_manager.telemetry.print_summary()
+        llm_manager.telemetry.write_prometheus(config.LLM_METRICS_PATH)
         
     except FileNotFoundError as e:
         print(f"Error: {e}")
@@ -2050,6 +2084,12 @@ async def main() -> None:
     except Exception as e:
         print(f"Error during segmentation: {e}")
         exit(1)
+    finally:
+        # Persist queued writes and apply the cache limits even when the run fails
+        write_behind.flush()
+        config.prune_cache()
+        if hasattr(llm_manager, "close"):
+            await llm_manager.close()  # Pooled HTTP sessions (OpenRouter)
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Regression check for the host-wide shared rate limit budget
+
+Two worker processes draw from one SharedRateLimitStore: together they must
+stay under the per-window request limit, their actual usage must replace
+the estimates in the shared window, and a retry-after pause recorded by one
+process must hold back the others.
+
+Usage:
+    python3 shared_rate_limiter_test.py
+"""
+
+import asyncio
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from utils.rate_limit_registry import SharedRateLimiter, SharedRateLimitStore
+
+BUDGET = "test-model"
+REQUESTS_PER_WINDOW = 4
+WINDOW_SECONDS = 1.0
+
+
+def make_limiter(db_path: Path) -> SharedRateLimiter:
+    return SharedRateLimiter(BUDGET, SharedRateLimitStore(db_path), max_requests_per_minute=REQUESTS_PER_WINDOW,
+                             max_input_tokens_per_minute=10**6, max_output_tokens_per_minute=10**6,
+                             window_seconds=WINDOW_SECONDS)
+
+
+def worker(db_path: Path, requests: int, start_at: float, results) -> None:
+    """Acquire and release requests in a separate process, reporting each grant time"""
+    async def run():
+        limiter = make_limiter(db_path)
+        granted = []
+        for _ in range(requests):
+            reservation = await limiter.acquire(100, 50)
+            granted.append(time.time())
+            limiter.release(reservation, 60, 20)
+        limiter.store.executor.shutdown(wait=True)  # Usage updates are written in the background
+        return granted
+
+    time.sleep(max(0.0, start_at - time.time()))
+    results.put(asyncio.run(run()))
+
+
+def timed_acquire(db_path: Path, start_at: float, results) -> None:
+    """Seconds one acquire started at start_at waits in a separate process"""
+    async def run():
+        limiter = make_limiter(db_path)
+        start = time.monotonic()
+        limiter.release(await limiter.acquire(100, 50))
+        return time.monotonic() - start
+
+    time.sleep(max(0.0, start_at - time.time()))
+    results.put(asyncio.run(run()))
+
+
+def run_processes(context, target, args_list):
+    results = context.Queue()
+    processes = [context.Process(target=target, args=(*args, results)) for args in args_list]
+    for process in processes:
+        process.start()
+    outputs = [results.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+    return outputs
+
+
+def main():
+    context = multiprocessing.get_context("spawn")
+    checks = []
+
+    db_path = Path(tempfile.mkdtemp()) / "rate_limits.sqlite3"
+    start_at = time.time() + 3.0  # Both workers start together once their interpreters are up
+    grants = sorted(t for output in run_processes(context, worker, [(db_path, 4, start_at), (db_path, 4, start_at)])
+                    for t in output)
+    # Allow a little slack: grant times are taken just after the store's own timestamps
+    busiest = max(sum(t <= other < t + WINDOW_SECONDS - 0.05 for other in grants) for t in grants)
+    checks.append((f"two processes stay under the shared limit ({busiest} grants in the busiest window)",
+                   len(grants) == 8 and busiest <= REQUESTS_PER_WINDOW and grants[-1] - grants[0] >= WINDOW_SECONDS - 0.05))
+
+    usage = SharedRateLimitStore(db_path).get_usage(BUDGET, window_seconds=3600)
+    checks.append(("actual usage replaces the estimates host-wide", usage["requests"] > 0 and
+                   usage["input_tokens"] == 60 * usage["requests"] and
+                   usage["output_tokens"] == 20 * usage["requests"]))
+
+    db_path = Path(tempfile.mkdtemp()) / "rate_limits.sqlite3"
+    start_at = time.time() + 3.0  # After the worker interpreter is up
+    SharedRateLimitStore(db_path).pause(BUDGET, start_at + 1.0 - time.time())  # Ends 1s after the worker starts
+    waited = run_processes(context, timed_acquire, [(db_path, start_at)])[0]
+    checks.append((f"a pause recorded by one process holds back another (waited {waited:.2f}s)", waited >= 0.5))
+
+    failures = 0
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+    if failures:
+        raise SystemExit(f"{failures} shared rate limiter checks failed")
+    print("\nAll shared rate limiter checks passed")
+
+
+if __name__ == "__main__":
+    main()
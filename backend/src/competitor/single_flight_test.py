@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Regression check for single-flight request coalescing
+
+Identical concurrent calls must share one request and its result or error;
+a cancelled waiter must not cancel the shared request, and when the first
+caller is cancelled a waiter issues the request itself.
+
+Usage:
+    python3 single_flight_test.py
+"""
+
+import asyncio
+
+from utils.single_flight import SingleFlight, request_key
+
+
+class CountingCall:
+    """Coroutine function that counts how often the request is actually made"""
+
+    def __init__(self, result="answer", error=None, seconds=0.05):
+        self.result = result
+        self.error = error
+        self.seconds = seconds
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.seconds)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+async def run_checks():
+    checks = []
+
+    flight, call = SingleFlight(), CountingCall()
+    results = await asyncio.gather(*(flight.run("key", call) for _ in range(5)))
+    checks.append(("identical calls share one request", call.calls == 1 and results == ["answer"] * 5 and
+                   flight.stats == {"calls": 5, "coalesced": 4} and flight.in_flight == 0))
+
+    flight, first, second = SingleFlight(), CountingCall("first"), CountingCall("second")
+    results = await asyncio.gather(flight.run("a", first), flight.run("b", second))
+    checks.append(("different keys are not coalesced", results == ["first", "second"] and
+                   first.calls == second.calls == 1))
+
+    flight, call = SingleFlight(), CountingCall(error=ValueError("provider failed"))
+    results = await asyncio.gather(*(flight.run("key", call) for _ in range(3)), return_exceptions=True)
+    checks.append(("the request's error is raised for every caller", call.calls == 1 and
+                   all(isinstance(result, ValueError) and str(result) == "provider failed" for result in results)))
+
+    call.error = None
+    checks.append(("a failed request is not reused", await flight.run("key", call) == "answer" and call.calls == 2))
+
+    flight, call = SingleFlight(), CountingCall()
+    leader = asyncio.ensure_future(flight.run("key", call))
+    waiter = asyncio.ensure_future(flight.run("key", call))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    checks.append(("a cancelled waiter leaves the shared request running",
+                   await leader == "answer" and waiter.cancelled() and call.calls == 1))
+
+    flight, call = SingleFlight(), CountingCall()
+    leader = asyncio.ensure_future(flight.run("key", call))
+    waiter = asyncio.ensure_future(flight.run("key", call))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    checks.append(("a waiter reissues the request when the first caller is cancelled",
+                   await waiter == "answer" and call.calls == 2 and flight.stats["coalesced"] == 0))
+
+    checks.append(("request keys cover the system prompt and settings",
+                   request_key("p", "s", model="m") == request_key("p", "s", model="m") and
+                   len({request_key("p", "s", model="m"), request_key("p", None, model="m"),
+                        request_key("p", "s", model="n"), request_key("q", "s", model="m")}) == 4))
+    return checks
+
+
+def main():
+    failures = 0
+    for name, ok in asyncio.run(run_checks()):
+        print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+    if failures:
+        raise SystemExit(f"{failures} single-flight checks failed")
+    print("\nAll single-flight checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Regression check for the SQLite cache backend
+
+Entries must round-trip unchanged (small values as plain JSON, large ones
+compressed), JSON-backend files must still be found and imported, the
+migration script must move JSON caches into the store, and stores created
+before LRU eviction must be upgraded when opened.
+
+Usage:
+    python3 sqlite_cache_test.py
+"""
+
+import json
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from migrate_cache_to_sqlite import find_cache_files, migrate_directory
+from utils.cache_utils import CACHE_DB_FILENAME, LLMCache, ResultCache, SQLiteCacheStore, get_sqlite_cache_store
+
+
+def run_checks(tmp: Path):
+    checks = []
+
+    store = SQLiteCacheStore(tmp / "store" / CACHE_DB_FILENAME)
+    small = {"timestamp": "t", "cache_type": "llm", "data": {"response": "短い"}, "metadata": {}}
+    large = {"timestamp": "t", "cache_type": "llm", "data": {"response": "résumé " * 2000}, "metadata": {"n": 1}}
+    store.put_many("llm", [("small", small), ("large", large)])
+    values = dict(store.connection.execute("SELECT key, value FROM entries"))
+    checks.append(("small entries are stored as plain JSON, large ones compressed",
+                   values["small"][:1] == b"{" and values["large"][:1] != b"{" and
+                   len(values["large"]) < len(json.dumps(large, ensure_ascii=False).encode("utf-8")) // 5))
+    checks.append(("entries round-trip unchanged", store.get("llm", "small") == small and
+                   store.get("llm", "large") == large and store.get("llm", "missing") is None))
+
+    cache = LLMCache(tmp / "llm", backend="sqlite", model_name="model-a")
+    cache.save_llm_response("prompt", "response", {"interaction": "check"}, parsed={"ok": True},
+                            validator_version="v1")
+    reopened = LLMCache(tmp / "llm", backend="sqlite", model_name="model-a")
+    checks.append(("LLMCache round-trips through the store",
+                   reopened.load_llm_result("prompt", {"interaction": "check"}, "v1") == ("response", {"ok": True}) and
+                   reopened.load_llm_response("prompt", {"interaction": "other"}) is None and
+                   LLMCache(tmp / "llm", backend="sqlite", model_name="model-b").load_llm_response(
+                       "prompt", {"interaction": "check"}) is None))
+
+    results = ResultCache(tmp / "result", backend="sqlite")
+    results.save_processing_result({"asin": "A1"}, [1, 2, 3], {"version": 2})
+    checks.append(("ResultCache round-trips through the store",
+                   results.load_processing_result({"asin": "A1"}, {"version": 2}) == [1, 2, 3]))
+
+    # A directory written by the json backend, then read by the sqlite backend
+    json_cache = LLMCache(tmp / "mixed", backend="json")
+    json_cache.save_llm_response("old prompt", "old response")
+    sqlite_cache = LLMCache(tmp / "mixed", backend="sqlite")
+    key = sqlite_cache.generate_cache_key("old prompt")
+    checks.append(("JSON files are found and imported on first lookup",
+                   sqlite_cache.load_llm_response("old prompt") == "old response" and
+                   sqlite_cache.store.contains("llm", key)))
+
+    # migrate_cache_to_sqlite.py on a JSON cache tree
+    root = tmp / "migrate"
+    for name in ("a", "b"):
+        cache = LLMCache(root / name, backend="json")
+        for index in range(3):
+            cache.save_llm_response(f"{name} prompt {index}", f"{name} response {index}")
+    (root / "a" / "llm_notacache.json").write_text('{"unrelated": true}', encoding="utf-8")
+    (root / "b" / "llm_broken.json").write_text('{"cache_type": ', encoding="utf-8")
+    counts = [migrate_directory(directory, files, delete_json=True)
+              for directory, files in sorted(find_cache_files(root).items())]
+    migrated = LLMCache(root / "a", backend="sqlite")
+    checks.append((f"migration imports every entry and skips other files {counts}",
+                   counts == [(3, 1), (3, 1)] and migrated.load_llm_response("a prompt 2") == "a response 2" and
+                   sorted(path.name for path in (root / "a").glob("llm_*.json")) == ["llm_notacache.json"]))
+
+    # A store created before LRU eviction has no last_access column
+    old_path = tmp / "old" / CACHE_DB_FILENAME
+    old_path.parent.mkdir()
+    connection = sqlite3.connect(str(old_path))
+    connection.execute("CREATE TABLE entries (cache_type TEXT NOT NULL, key TEXT NOT NULL, timestamp TEXT NOT NULL, "
+                       "value BLOB NOT NULL, PRIMARY KEY (cache_type, key)) WITHOUT ROWID")
+    connection.execute("INSERT INTO entries VALUES ('llm', 'key', 't', ?)", (SQLiteCacheStore.encode(small),))
+    connection.commit()
+    connection.close()
+    upgraded = get_sqlite_cache_store(old_path)
+    last_access = upgraded.connection.execute("SELECT last_access FROM entries").fetchone()[0]
+    checks.append(("stores from before LRU eviction are upgraded", upgraded.get("llm", "key") == small and
+                   last_access > 0))
+    return checks
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        checks = run_checks(Path(tmp))
+    failures = 0
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+    if failures:
+        raise SystemExit(f"{failures} SQLite cache checks failed")
+    print("\nAll SQLite cache checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Regression check for streamed response validation
+
+The stream validator must validate the same JSON object the final parser
+(extract_json_from_response) extracts, so a response the parser accepts is
+never aborted mid-stream, while off-schema output still aborts early.
+
+Usage:
+    python3 streaming_json_test.py
+"""
+
+from utils.json_utils import extract_json_from_response
+from utils.streaming_json import IncrementalJSONValidator, StreamValidationError
+
+FENCED = '{"phy": {}, "perf": {}, "use": {}}'
+
+# (name, response, whether streaming validation should accept it)
+CASES = [
+    ("fenced object after braces in prose",
+     'Note: keys use the {PID}@{DETAIL} form.\n```json\n' + FENCED + '\n```', True),
+    ("bare fence", 'Here you go:\n```\n' + FENCED + '\n```', True),
+    ("no fence", 'Result: ' + FENCED + ' done.', True),
+    ("unfenced object before a fenced one", '{"draft": 1}\n```json\n' + FENCED + '\n```', True),
+    ("fenced object goes off-schema", '```json\n{"phy": [1,, 2]}\n```', False),
+    ("unfenced object goes off-schema after its first key", '{"phy": [1,, 2]}', False),
+]
+
+
+def stream(response: str, chunk_size: int = 7) -> IncrementalJSONValidator:
+    """Feed a response to a fresh validator in small chunks, like a stream"""
+    validator = IncrementalJSONValidator()
+    for start in range(0, len(response), chunk_size):
+        validator.feed(response[start:start + chunk_size])
+    return validator
+
+
+def main():
+    failures = 0
+    for name, response, should_pass in CASES:
+        try:
+            validator = stream(response)
+        except StreamValidationError as e:
+            ok = not should_pass
+            print(f"{'✅' if ok else '❌'} {name} (aborted: {e.reason})")
+        else:
+            # Accepted responses must have validated the object the final parser extracts
+            extracted = extract_json_from_response(response)
+            ok = should_pass and validator.complete and response.find(extracted) == validator.start_pos
+            print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+
+    if failures:
+        raise SystemExit(f"{failures} of {len(CASES)} streaming validation checks failed")
+    print(f"\nAll {len(CASES)} streaming validation checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -49,16 +49,26 @@ def monkey_patch_llm_utils():
         def patched_initialize_global_llm(model_name: str = "claude-sonnet-4-20250514",
                                         temperature: float = 0.15,
                                         max_tokens: int = 4096,
-                                        rate_limiter: Optional[Any] = None):
-            """替换的初始化函数"""
+                                        rate_limiter: Optional[Any] = None,
+                                        **manager_options):
+            """替换的初始化函数（截止时间、对冲、多提供商路由等选项不适用，忽略）"""
             print(f"🔀 使用OpenRouter初始化LLM: {model_name}")
             manager = CompatibleLLMManager(model_name, temperature, max_tokens, rate_limiter)
             llm_utils._global_llm_manager = manager
             return manager
         
-        async def patched_safe_llm_call(prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
-            """替换的安全调用函数"""
-            return await safe_llm_call_openrouter(prompt, context)
+        async def patched_safe_llm_call(prompt: str, context: Optional[Dict[str, Any]] = None,
+                                        estimated_input_tokens: Optional[int] = None,
+                                        system_prompt: Optional[str] = None) -> str:
+            """替换的安全调用函数（参数与llm_utils.safe_llm_call一致）
+
+            使用脚本初始化的全局管理器，调用与流式调用共享同一速率限制、会话和遥测；
+            尚未初始化时使用共享的OpenRouter管理器
+            """
+            if llm_utils._global_llm_manager is None:
+                return await safe_llm_call_openrouter(prompt, context, estimated_input_tokens, system_prompt)
+            return await llm_utils._global_llm_manager.safe_call(prompt, context, estimated_input_tokens,
+                                                                 system_prompt)
         
         # 执行替换
         llm_utils.initialize_global_llm = patched_initialize_global_llm
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Regression check for the OpenRouter switch
+
+Drive safe_llm_call through the monkey-patched OpenRouter path against a
+local stub of the chat completions API, with the keyword arguments every
+script passes (estimated_input_tokens, system_prompt), before and after the
+script initializes its global LLM manager.
+
+Usage:
+    python3 switch_to_openrouter_test.py
+"""
+
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+from aiohttp import web
+
+
+class StubOpenRouter:
+    """Local chat completions endpoint that records the requests it answers"""
+
+    def __init__(self):
+        self.requests = []
+        self.runner = None
+        self.url = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.requests.append(payload)
+        return web.json_response({
+            "choices": [{"message": {"content": f"stub answer {len(self.requests)}"}}],
+            "usage": {"prompt_tokens": 12, "completion_tokens": 3},
+        })
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/chat/completions", self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/chat/completions"
+
+    async def stop(self) -> None:
+        await self.runner.cleanup()
+
+
+async def run_checks(stub: StubOpenRouter):
+    import switch_to_openrouter  # Patches llm_utils on import
+    from utils import llm_utils
+
+    checks = []
+    assert llm_utils.safe_llm_call is not llm_utils._original_safe_llm_call, "OpenRouter switch did not patch"
+
+    # Before the script initializes its manager: the shared OpenRouter manager answers
+    response = await llm_utils.safe_llm_call("user part", {"interaction": "check"},
+                                             estimated_input_tokens=100, system_prompt="static prefix")
+    messages = stub.requests[-1]["messages"]
+    checks.append(("call before initialize_global_llm", response == "stub answer 1" and
+                   [message["role"] for message in messages] == ["system", "user"]))
+
+    # After initialization: the script's global manager answers, so its telemetry sees the call
+    manager = llm_utils.initialize_global_llm("claude-sonnet-4-20250514")
+    response = await llm_utils.safe_llm_call("another user part", {"interaction": "check"},
+                                             estimated_input_tokens=100, system_prompt="static prefix")
+    attempts = sum(stats.attempts for stats in manager.telemetry.interactions.values())
+    checks.append(("call through the initialized global manager", response == "stub answer 2" and attempts == 1))
+
+    # The end-of-run summaries of the scripts read these on whichever manager is active
+    checks.append(("manager exposes the summary attributes", manager.single_flight is not None and
+                   manager.latency_control.snapshot()["latency"]["count"] == 1))
+
+    await manager.close()
+    from utils import openrouter_utils
+    if openrouter_utils._openrouter_call_manager is not None:
+        await openrouter_utils._openrouter_call_manager.close()
+    return checks
+
+
+async def main_async() -> int:
+    stub = StubOpenRouter()
+    await stub.start()
+    os.environ.update({
+        "USE_OPENROUTER": "true",
+        "OPENROUTER_API_KEY": "stub-key",
+        "OPENROUTER_BASE_URL": stub.url,
+        "LLM_RATE_LIMIT_DB": str(Path(tempfile.mkdtemp()) / "rate_limits.sqlite3"),
+    })
+    try:
+        checks = await run_checks(stub)
+    finally:
+        await stub.stop()
+
+    failures = 0
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+    return failures
+
+
+def main():
+    failures = asyncio.run(main_async())
+    if failures:
+        raise SystemExit(f"{failures} OpenRouter switch checks failed")
+    print("\nAll OpenRouter switch checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,27 +3,71 @@ Utilities package for competitor analysis scripts.
 
 This package contains shared utilities for:
 - Rate limiting for LLM API calls
+- Host-wide shared rate limit budgets across scripts and processes
+- Adaptive (AIMD) rate control from 429s and provider headers
 - LLM model management and safe calling
+- Single-flight coalescing of identical in-flight requests
+- Per-call deadlines, hedged requests and latency histograms
+- Per-call telemetry by interaction type (JSONL trace, Prometheus summary)
+- Latency-aware routing and failover across several LLM providers
+- Offline Message Batches execution for bulk jobs
+- Offline replay/synthetic LLM backend for benchmarking
 - Prompt management and loading
-- Caching systems (LLM cache and result cache)
+- Caching systems (LLM cache and result cache, single-file SQLite or JSON files)
+- Write-behind persistence of cache entries, logs and results off the event loop
+- Manifest index of scraped review files per ASIN
+- Canonical deduplicated review store per ASIN for incremental scraping
+- Pooled, paced and retrying HTTP client for the scraping provider APIs
 - JSON processing utilities
+- Incremental JSON validation for streamed responses
 - Configuration management
 """
 
 from .rate_limiter import RateLimiter
+from .rate_limit_registry import SharedRateLimiter, get_shared_rate_limiter
+from .adaptive_rate_control import AdaptiveRateController
 from .llm_utils import LLMManager, safe_llm_call
+from .batch_utils import MessageBatchBackend
+from .single_flight import SingleFlight
+from .latency_control import LatencyController, LatencyHistogram
+from .llm_telemetry import LLMTelemetry
+from .llm_router import LLMRouter
+from .mock_llm import MockLLMManager
 from .prompt_utils import PromptManager
 from .cache_utils import CacheManager
+from .write_behind import WriteBehindWriter
+from .review_manifest import ReviewManifest
+from .review_store import ReviewStore
+from .http_client import ProviderHTTPClient, HTTPRequest, get_provider_client
 from .json_utils import extract_json_from_response, validate_json_structure
+from .streaming_json import IncrementalJSONValidator, StreamValidationError
 from .config import ConfigManager
 
 __all__ = [
     'RateLimiter',
+    'SharedRateLimiter',
+    'get_shared_rate_limiter',
+    'AdaptiveRateController',
     'LLMManager', 
     'safe_llm_call',
+    'MessageBatchBackend',
+    'SingleFlight',
+    'LatencyController',
+    'LatencyHistogram',
+    'LLMTelemetry',
+    'LLMRouter',
+    'MockLLMManager',
     'PromptManager',
     'CacheManager', 
+    'WriteBehindWriter',
+    'ReviewManifest',
+    'ReviewStore',
+    'ProviderHTTPClient',
+    'HTTPRequest',
+    'get_provider_client',
     'extract_json_from_response',
     'validate_json_structure',
+    'IncrementalJSONValidator',
+    'StreamValidationError',
     'ConfigManager'
 ] 
\ No newline at end of file
@@ -0,0 +1,299 @@
+"""
+Adaptive rate control for LLM API calls.
+
+Provides an AIMD (additive increase, multiplicative decrease) controller that
+tunes a RateLimiter from call outcomes instead of relying on static limits:
+- Additive growth of concurrency and token budgets while calls succeed
+- Multiplicative cuts on throttling (HTTP 429 / RateLimitError)
+- Honors retry-after by pausing the limiter
+- Learns the real account tier from anthropic-ratelimit-* response headers
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Mapping, Optional
+
+from .rate_limiter import RateLimiter
+
+
+# Provider limits for Claude Sonnet 4 - used as growth ceilings until headers report the real tier
+DEFAULT_PROVIDER_REQUESTS_PER_MINUTE = 2000
+DEFAULT_PROVIDER_INPUT_TOKENS_PER_MINUTE = 80000
+DEFAULT_PROVIDER_OUTPUT_TOKENS_PER_MINUTE = 32000
+
+
+def get_response_headers(obj: Any) -> Optional[Mapping[str, str]]:
+    """
+    Extract HTTP response headers from an SDK exception or response object
+
+    Args:
+        obj: anthropic APIStatusError, aiohttp response, LangChain message or None
+
+    Returns:
+        Header mapping or None if not available
+    """
+    if obj is None:
+        return None
+
+    headers = getattr(obj, "headers", None)
+    if headers is None:
+        headers = getattr(getattr(obj, "response", None), "headers", None)
+    if headers is None:
+        metadata = getattr(obj, "response_metadata", None) or {}
+        headers = metadata.get("headers")
+    return headers
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """Check whether an exception represents provider throttling (HTTP 429)"""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    return status_code == 429 or type(error).__name__ == "RateLimitError"
+
+
+def normalize_headers(headers: Optional[Mapping[str, str]]) -> Dict[str, str]:
+    """Lower-case header names so lookups work for httpx, aiohttp and plain dicts alike"""
+    if not headers:
+        return {}
+    return {str(name).lower(): value for name, value in headers.items()}
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    Parse retry-after-ms / retry-after headers into seconds
+
+    Args:
+        headers: Response headers
+
+    Returns:
+        Seconds to wait or None if no usable header is present
+    """
+    headers = normalize_headers(headers)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+    return None
+
+
+def _parse_reset_seconds(value: Optional[str]) -> Optional[float]:
+    """Convert an RFC 3339 anthropic-ratelimit-*-reset timestamp to seconds from now"""
+    if not value:
+        return None
+    try:
+        reset_at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (reset_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def _parse_int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    """Read an integer header, ignoring missing or malformed values"""
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+class AdaptiveRateController:
+    """AIMD controller that adjusts a RateLimiter from call outcomes and provider headers"""
+
+    def __init__(self,
+                 rate_limiter: RateLimiter,
+                 min_concurrent_requests: int = 1,
+                 max_concurrent_requests: int = 50,
+                 max_requests_per_minute: int = DEFAULT_PROVIDER_REQUESTS_PER_MINUTE,
+                 max_input_tokens_per_minute: int = DEFAULT_PROVIDER_INPUT_TOKENS_PER_MINUTE,
+                 max_output_tokens_per_minute: int = DEFAULT_PROVIDER_OUTPUT_TOKENS_PER_MINUTE,
+                 additive_increase: int = 1,
+                 token_increase_fraction: float = 0.05,
+                 decrease_factor: float = 0.5,
+                 min_budget_fraction: float = 0.1,
+                 header_safety_margin: float = 0.95,
+                 default_retry_after: float = 5.0):
+        """
+        Initialize adaptive controller around an existing rate limiter
+
+        Args:
+            rate_limiter: Limiter whose limits are tuned; its current limits are the starting point
+            min_concurrent_requests: Lower bound for concurrency after cuts
+            max_concurrent_requests: Upper bound for concurrency growth
+            max_requests_per_minute: Ceiling for request budget (replaced by header limits)
+            max_input_tokens_per_minute: Ceiling for input token budget (replaced by header limits)
+            max_output_tokens_per_minute: Ceiling for output token budget (replaced by header limits)
+            additive_increase: Concurrency slots added per successful round
+            token_increase_fraction: Fraction of the ceiling added to token budgets per successful round
+            decrease_factor: Multiplier applied to all limits on throttling
+            min_budget_fraction: Budgets never drop below this fraction of their ceiling
+            header_safety_margin: Fraction of provider-reported limits used as ceilings
+            default_retry_after: Pause applied on 429 when the provider sends no retry-after
+        """
+        self.rate_limiter = rate_limiter
+        self.min_concurrent_requests = min_concurrent_requests
+        self.max_concurrent_requests = max(max_concurrent_requests, rate_limiter.max_concurrent_requests)
+        self.ceilings = {
+            "requests": max(max_requests_per_minute, rate_limiter.max_requests_per_minute),
+            "input_tokens": max(max_input_tokens_per_minute, rate_limiter.max_input_tokens_per_minute),
+            "output_tokens": max(max_output_tokens_per_minute, rate_limiter.max_output_tokens_per_minute),
+        }
+        self.additive_increase = additive_increase
+        self.token_increase_fraction = token_increase_fraction
+        self.decrease_factor = decrease_factor
+        self.min_budget_fraction = min_budget_fraction
+        self.header_safety_margin = header_safety_margin
+        self.default_retry_after = default_retry_after
+
+        # Successes needed for one additive step: one per concurrency slot (~one round trip)
+        self._successes_since_increase = 0
+        self._last_decrease_time = 0.0
+        self._decrease_cooldown = 0.0
+
+        self.stats = {
+            "successes": 0,
+            "rate_limited": 0,
+            "increases": 0,
+            "decreases": 0,
+            "retry_after_pauses": 0,
+        }
+
+    def record_success(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        """
+        Record a successful call and grow limits additively once per round
+
+        Args:
+            headers: Optional response headers with anthropic-ratelimit-* fields
+        """
+        self.stats["successes"] += 1
+        headers = normalize_headers(headers)
+        if headers:
+            self._apply_headers(headers)
+
+        self._successes_since_increase += 1
+        if self._successes_since_increase < self.rate_limiter.max_concurrent_requests:
+            return
+        self._successes_since_increase = 0
+
+        limiter = self.rate_limiter
+        new_concurrency = min(self.max_concurrent_requests,
+                              limiter.max_concurrent_requests + self.additive_increase)
+        new_requests = min(self.ceilings["requests"],
+                           limiter.max_requests_per_minute + max(1, int(self.ceilings["requests"] * self.token_increase_fraction)))
+        new_input = min(self.ceilings["input_tokens"],
+                        limiter.max_input_tokens_per_minute + int(self.ceilings["input_tokens"] * self.token_increase_fraction))
+        new_output = min(self.ceilings["output_tokens"],
+                         limiter.max_output_tokens_per_minute + int(self.ceilings["output_tokens"] * self.token_increase_fraction))
+
+        if (new_concurrency, new_requests, new_input, new_output) != (
+                limiter.max_concurrent_requests, limiter.max_requests_per_minute,
+                limiter.max_input_tokens_per_minute, limiter.max_output_tokens_per_minute):
+            limiter.set_limits(
+                max_requests_per_minute=new_requests,
+                max_input_tokens_per_minute=new_input,
+                max_output_tokens_per_minute=new_output,
+                max_concurrent_requests=new_concurrency
+            )
+            self.stats["increases"] += 1
+
+    def record_rate_limited(self, headers: Optional[Mapping[str, str]] = None,
+                            retry_after: Optional[float] = None) -> None:
+        """
+        Record a throttled call: pause for retry-after and cut limits multiplicatively
+
+        A burst of 429s from the same congestion event only triggers one cut.
+
+        Args:
+            headers: Optional response headers (retry-after, anthropic-ratelimit-*)
+            retry_after: Explicit retry delay in seconds, overrides headers
+        """
+        self.stats["rate_limited"] += 1
+        headers = normalize_headers(headers)
+        if headers:
+            self._apply_headers(headers)
+
+        if retry_after is None:
+            retry_after = parse_retry_after(headers)
+        if retry_after is None:
+            retry_after = self.default_retry_after
+
+        self.rate_limiter.pause(retry_after)
+        self.stats["retry_after_pauses"] += 1
+        self._successes_since_increase = 0
+
+        now = time.monotonic()
+        if now - self._last_decrease_time < self._decrease_cooldown:
+            return
+        self._last_decrease_time = now
+        self._decrease_cooldown = max(1.0, retry_after)
+
+        limiter = self.rate_limiter
+        limiter.set_limits(
+            max_requests_per_minute=max(int(self.ceilings["requests"] * self.min_budget_fraction),
+                                        int(limiter.max_requests_per_minute * self.decrease_factor)),
+            max_input_tokens_per_minute=max(int(self.ceilings["input_tokens"] * self.min_budget_fraction),
+                                            int(limiter.max_input_tokens_per_minute * self.decrease_factor)),
+            max_output_tokens_per_minute=max(int(self.ceilings["output_tokens"] * self.min_budget_fraction),
+                                             int(limiter.max_output_tokens_per_minute * self.decrease_factor)),
+            max_concurrent_requests=max(self.min_concurrent_requests,
+                                        int(limiter.max_concurrent_requests * self.decrease_factor))
+        )
+        self.stats["decreases"] += 1
+
+    def _apply_headers(self, headers: Mapping[str, str]) -> None:
+        """Adopt provider-reported limits as ceilings and pause when a budget is exhausted"""
+        header_ceilings = {
+            "requests": _parse_int_header(headers, "anthropic-ratelimit-requests-limit"),
+            "input_tokens": _parse_int_header(headers, "anthropic-ratelimit-input-tokens-limit"),
+            "output_tokens": _parse_int_header(headers, "anthropic-ratelimit-output-tokens-limit"),
+        }
+        for name, limit in header_ceilings.items():
+            if limit:
+                self.ceilings[name] = max(1, int(limit * self.header_safety_margin))
+
+        # Clamp current budgets under freshly learned ceilings
+        limiter = self.rate_limiter
+        if (limiter.max_requests_per_minute > self.ceilings["requests"] or
+                limiter.max_input_tokens_per_minute > self.ceilings["input_tokens"] or
+                limiter.max_output_tokens_per_minute > self.ceilings["output_tokens"]):
+            limiter.set_limits(
+                max_requests_per_minute=min(limiter.max_requests_per_minute, self.ceilings["requests"]),
+                max_input_tokens_per_minute=min(limiter.max_input_tokens_per_minute, self.ceilings["input_tokens"]),
+                max_output_tokens_per_minute=min(limiter.max_output_tokens_per_minute, self.ceilings["output_tokens"])
+            )
+
+        for budget in ("requests", "input-tokens", "output-tokens"):
+            remaining = _parse_int_header(headers, f"anthropic-ratelimit-{budget}-remaining")
+            if remaining == 0:
+                reset_seconds = _parse_reset_seconds(headers.get(f"anthropic-ratelimit-{budget}-reset"))
+                if reset_seconds:
+                    limiter.pause(reset_seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return current limits, ceilings and counters for logging"""
+        limiter = self.rate_limiter
+        return {
+            "max_concurrent_requests": limiter.max_concurrent_requests,
+            "max_requests_per_minute": limiter.max_requests_per_minute,
+            "max_input_tokens_per_minute": limiter.max_input_tokens_per_minute,
+            "max_output_tokens_per_minute": limiter.max_output_tokens_per_minute,
+            "ceilings": dict(self.ceilings),
+            **self.stats,
+        }
@@ -0,0 +1,266 @@
+"""
+Message Batches execution mode for bulk LLM jobs.
+
+Submits a whole set of prompts as provider batch jobs (Anthropic Message
+Batches API) instead of real-time calls, which are not charged against the
+per-minute input/output token limits.
+
+Provides:
+- MessageBatchBackend: submit, poll and collect batch jobs
+- Job state persisted to disk, so an interrupted run resumes polling the
+  same batches instead of submitting (and paying for) them again
+- Results handed to a callback, typically LLMCache.save_llm_response
+
+Environment:
+    ANTHROPIC_API_KEY: API key
+    ANTHROPIC_BASE_URL: Optional API root (e.g. a local FakeLLMProvider)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import aiohttp
+
+
+ANTHROPIC_API_URL = "https://api.anthropic.com"
+ANTHROPIC_VERSION = "2023-06-01"
+MAX_REQUESTS_PER_BATCH = 100000
+CUSTOM_ID_PATTERN = re.compile(r'^[a-zA-Z0-9_-]{1,64}$')
+
+
+class BatchAPIError(Exception):
+    """Raised when the batch API returns a non-200 status"""
+
+    def __init__(self, status_code: int, error_text: str):
+        super().__init__(f"Batch API error {status_code}: {error_text}")
+        self.status_code = status_code
+
+
+def extract_message_text(message: Dict[str, Any]) -> str:
+    """Join the text blocks of a Messages API response"""
+    return "".join(
+        block.get("text", "") for block in message.get("content", [])
+        if block.get("type") == "text"
+    ).strip()
+
+
+class MessageBatchBackend:
+    """Run prompts through the Message Batches API with resumable on-disk job state"""
+
+    def __init__(self,
+                 model_name: str,
+                 temperature: float,
+                 max_tokens: int,
+                 state_dir: Path,
+                 base_url: Optional[str] = None,
+                 api_key: Optional[str] = None,
+                 poll_interval: float = 30.0,
+                 max_requests_per_batch: int = MAX_REQUESTS_PER_BATCH):
+        """
+        Initialize batch backend
+
+        Args:
+            model_name: Model used for every request
+            temperature: Sampling temperature
+            max_tokens: Max output tokens per request
+            state_dir: Directory for persisted job state (must survive restarts)
+            base_url: API root (default ANTHROPIC_BASE_URL env var or the official API)
+            api_key: API key (default ANTHROPIC_API_KEY env var)
+            poll_interval: Seconds between status polls
+            max_requests_per_batch: Requests per submitted batch; larger jobs are split
+        """
+        self.model_name = model_name
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.base_url = (base_url or os.getenv("ANTHROPIC_BASE_URL") or ANTHROPIC_API_URL).rstrip("/")
+        self.api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
+        if not self.api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable is not set")
+        self.poll_interval = poll_interval
+        self.max_requests_per_batch = max_requests_per_batch
+        self.headers = {
+            "x-api-key": self.api_key,
+            "anthropic-version": ANTHROPIC_VERSION,
+            "content-type": "application/json"
+        }
+
+    # === Job state ===
+
+    def get_job_key(self, prompts: Dict[str, str]) -> str:
+        """Stable key for a set of prompts, so the same job is found again after a restart"""
+        digest = hashlib.sha256(f"{self.model_name}|{self.temperature}|{self.max_tokens}".encode("utf-8"))
+        for custom_id in sorted(prompts):
+            prompt_hash = hashlib.sha256(prompts[custom_id].encode("utf-8")).hexdigest()
+            digest.update(f"|{custom_id}:{prompt_hash}".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def get_state_path(self, job_key: str) -> Path:
+        return self.state_dir / f"batch_job_{job_key}.json"
+
+    def load_state(self, job_key: str) -> Optional[Dict[str, Any]]:
+        """Load persisted job state or None if the job was never submitted"""
+        state_path = self.get_state_path(job_key)
+        if not state_path.exists():
+            return None
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"⚠️ Could not read batch job state {state_path}: {e}")
+            return None
+
+    def save_state(self, job_key: str, state: Dict[str, Any]) -> None:
+        """Persist job state atomically"""
+        state["updated_at"] = datetime.now().isoformat()
+        state_path = self.get_state_path(job_key)
+        tmp_path = state_path.with_suffix(".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, state_path)
+
+    # === API calls ===
+
+    async def _request(self, session: aiohttp.ClientSession, method: str, url: str,
+                       payload: Optional[Dict[str, Any]] = None) -> aiohttp.ClientResponse:
+        response = await session.request(method, url, json=payload)
+        if response.status != 200:
+            error_text = await response.text()
+            response.release()
+            raise BatchAPIError(response.status, error_text)
+        return response
+
+    def build_request(self, custom_id: str, prompt: str) -> Dict[str, Any]:
+        """Build one batch request entry"""
+        return {
+            "custom_id": custom_id,
+            "params": {
+                "model": self.model_name,
+                "max_tokens": self.max_tokens,
+                "temperature": self.temperature,
+                "messages": [{"role": "user", "content": prompt}]
+            }
+        }
+
+    async def submit(self, session: aiohttp.ClientSession, prompts: Dict[str, str]) -> Dict[str, Any]:
+        """Submit one batch and return the batch object"""
+        payload = {"requests": [self.build_request(custom_id, prompt) for custom_id, prompt in prompts.items()]}
+        response = await self._request(session, "POST", f"{self.base_url}/v1/messages/batches", payload)
+        async with response:
+            return await response.json()
+
+    async def retrieve(self, session: aiohttp.ClientSession, batch_id: str) -> Dict[str, Any]:
+        """Fetch the current batch object"""
+        response = await self._request(session, "GET", f"{self.base_url}/v1/messages/batches/{batch_id}")
+        async with response:
+            return await response.json()
+
+    async def fetch_results(self, session: aiohttp.ClientSession, batch: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Download the JSONL results of an ended batch, keyed by custom_id"""
+        results_url = batch.get("results_url") or f"{self.base_url}/v1/messages/batches/{batch['id']}/results"
+        response = await self._request(session, "GET", results_url)
+        results = {}
+        async with response:
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if line:
+                    entry = json.loads(line)
+                    results[entry["custom_id"]] = entry["result"]
+        return results
+
+    # === Orchestration ===
+
+    async def run(self, prompts: Dict[str, str],
+                  on_result: Optional[Callable[[str, str], None]] = None) -> Dict[str, Optional[str]]:
+        """
+        Run prompts as batch jobs, resuming a previously submitted job if one exists
+
+        Args:
+            prompts: custom_id -> prompt (custom_id: 1-64 chars of [a-zA-Z0-9_-])
+            on_result: Optional callback(custom_id, response_text) for each succeeded request
+
+        Returns:
+            custom_id -> response text, or None for errored/canceled/expired requests
+        """
+        invalid_ids = [custom_id for custom_id in prompts if not CUSTOM_ID_PATTERN.match(custom_id)]
+        if invalid_ids:
+            raise ValueError(f"Invalid batch custom_id(s): {invalid_ids[:5]}")
+        if not prompts:
+            return {}
+
+        job_key = self.get_job_key(prompts)
+        state = self.load_state(job_key)
+        if state:
+            print(f"🔁 Resuming batch job {job_key} ({len(state['batches'])} batches)")
+        else:
+            custom_ids = sorted(prompts)
+            chunks = [custom_ids[i:i + self.max_requests_per_batch]
+                      for i in range(0, len(custom_ids), self.max_requests_per_batch)]
+            state = {
+                "job_key": job_key,
+                "model": self.model_name,
+                "created_at": datetime.now().isoformat(),
+                "batches": [{"id": None, "custom_ids": chunk, "status": "pending"} for chunk in chunks]
+            }
+            self.save_state(job_key, state)
+
+        responses: Dict[str, Optional[str]] = {}
+        async with aiohttp.ClientSession(headers=self.headers) as session:
+            # Submit batches that were not submitted before the last interruption
+            for batch_state in state["batches"]:
+                if batch_state["id"] is None:
+                    batch = await self.submit(session, {custom_id: prompts[custom_id] for custom_id in batch_state["custom_ids"]})
+                    batch_state["id"] = batch["id"]
+                    batch_state["status"] = batch.get("processing_status", "in_progress")
+                    self.save_state(job_key, state)
+                    print(f"📤 Submitted batch {batch['id']} with {len(batch_state['custom_ids'])} requests")
+
+            # Poll until every batch has ended, delivering results as batches finish.
+            # Batches collected by an earlier run are fetched again: their results
+            # stay downloadable, and the caller's cache may not have survived the restart.
+            start_time = time.time()
+            delivered = set()
+            while len(delivered) < len(state["batches"]):
+                last_counts = {}
+                for batch_state in state["batches"]:
+                    if batch_state["id"] in delivered:
+                        continue
+                    batch = await self.retrieve(session, batch_state["id"])
+                    last_counts = batch.get("request_counts", {})
+                    if batch.get("processing_status") != "ended":
+                        batch_state["status"] = batch.get("processing_status", "in_progress")
+                        continue
+
+                    results = await self.fetch_results(session, batch)
+                    succeeded = 0
+                    for custom_id in batch_state["custom_ids"]:
+                        result = results.get(custom_id) or {"type": "missing"}
+                        if result.get("type") == "succeeded":
+                            text = extract_message_text(result.get("message", {}))
+                            responses[custom_id] = text
+                            succeeded += 1
+                            if on_result:
+                                on_result(custom_id, text)
+                        else:
+                            responses[custom_id] = None
+                    delivered.add(batch_state["id"])
+                    batch_state["status"] = "collected"
+                    batch_state["succeeded"] = succeeded
+                    batch_state["failed"] = len(batch_state["custom_ids"]) - succeeded
+                    self.save_state(job_key, state)
+                    print(f"📥 Batch {batch_state['id']} ended: {succeeded}/{len(batch_state['custom_ids'])} succeeded")
+
+                if len(delivered) < len(state["batches"]):
+                    print(f"⏳ Waiting for batches ({time.time() - start_time:.0f}s elapsed, "
+                          f"request counts: {last_counts})")
+                    await asyncio.sleep(self.poll_interval)
+
+        return responses
@@ -2,32 +2,388 @@
 Caching utilities for LLM responses and processing results.
 
 Provides:
-- Simple file-based caching for LLM responses
+- Simple file-based caching, one compact JSON file per entry ("json" backend, the default:
+  fastest lookups)
+- Single-file SQLite (WAL) key/value store, values compressed ("sqlite" backend: less than
+  half the disk space)
 - Result caching for expensive computations
 - Cache key generation
+- Size- and age-based LRU eviction and stats for a persistent cache root
+- Optional write-behind saves through a WriteBehindWriter (see write_behind.py)
+
+With the sqlite backend, entries the json backend left in the cache
+directory are read on a miss and imported, so switching backends keeps the
+cache warm (migrate_cache_to_sqlite.py imports them in one go). Caches of
+the per-run output directories, from before the persistent cache root, are
+imported and re-keyed by import_legacy_caches.py.
 """
 
 import json
 import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict
 from pathlib import Path
 from datetime import datetime
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .write_behind import WriteBehindWriter, atomic_write_text, restore, snapshot
+
+
+CACHE_BACKENDS = ("json", "sqlite")
+CACHE_DB_FILENAME = "cache.sqlite3"
+# Last-access times are only rewritten when older than this, so warm lookups stay read-only
+ACCESS_RESOLUTION_SECONDS = 3600
+# Values up to this size are stored as plain JSON, where compressing saves little; larger values
+# (nearly every LLM entry) are zlib-compressed at a fast level. decode() tells the two apart by the first byte.
+COMPRESS_MIN_BYTES = int(os.getenv("LLM_CACHE_COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = 1
+MMAP_SIZE_BYTES = 1 << 30
+PAGE_CACHE_KIB = 64 * 1024
+
+
+class SQLiteCacheStore:
+    """Single-file key/value store: SQLite in WAL mode, JSON values (zlib-compressed when large)"""
+
+    def __init__(self, db_path: Path):
+        """
+        Initialize store
+
+        Args:
+            db_path: SQLite database file, created if missing
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit mode; batched writes use explicit BEGIN IMMEDIATE transactions.
+        # WAL lets readers and writers from several processes share the file.
+        self.connection = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        # Warm lookups read pages through a memory map instead of read() calls into a small page cache
+        self.connection.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+        self.connection.execute(f"PRAGMA cache_size=-{PAGE_CACHE_KIB}")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                cache_type TEXT NOT NULL,
+                key TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (cache_type, key)
+            ) WITHOUT ROWID
+        """)
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(entries)")}
+        if "last_access" not in columns:
+            # Stores created before LRU eviction; treat existing entries as used now
+            self.connection.execute("ALTER TABLE entries ADD COLUMN last_access REAL NOT NULL DEFAULT 0")
+            self.connection.execute("UPDATE entries SET last_access = ?", (time.time(),))
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+
+    @staticmethod
+    def encode(cache_data: Dict[str, Any]) -> bytes:
+        value = json.dumps(cache_data, ensure_ascii=False).encode('utf-8')
+        if len(value) > COMPRESS_MIN_BYTES:
+            return zlib.compress(value, COMPRESS_LEVEL)
+        return value
+
+    @staticmethod
+    def decode(value: bytes) -> Dict[str, Any]:
+        # A JSON object starts with '{'; a zlib stream never does (its first byte is 0x78 or similar)
+        if value[:1] != b'{':
+            value = zlib.decompress(value)
+        return json.loads(value.decode('utf-8'))
+
+    def get(self, cache_type: str, key: str) -> Optional[Dict[str, Any]]:
+        """Stored entry ({"timestamp", "cache_type", "data", "metadata"}) or None"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value, last_access FROM entries WHERE cache_type = ? AND key = ?", (cache_type, key)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > ACCESS_RESOLUTION_SECONDS:
+                self.connection.execute("UPDATE entries SET last_access = ? WHERE cache_type = ? AND key = ?",
+                                        (now, cache_type, key))
+        return self.decode(row[0])
+
+    def contains(self, cache_type: str, key: str) -> bool:
+        """Whether an entry is stored, without reading it or refreshing its last access"""
+        with self._lock:
+            return self.connection.execute(
+                "SELECT 1 FROM entries WHERE cache_type = ? AND key = ?", (cache_type, key)
+            ).fetchone() is not None
+
+    def put(self, cache_type: str, key: str, cache_data: Dict[str, Any]) -> None:
+        """Insert or replace one entry"""
+        self.put_many(cache_type, [(key, cache_data)])
+
+    def put_many(self, cache_type: str, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Insert or replace entries in a single transaction
+
+        Returns:
+            Number of entries written
+        """
+        return self.put_rows(cache_type, [self.encode_row(key, cache_data) for key, cache_data in items])
+
+    def encode_row(self, key: str, cache_data: Dict[str, Any]) -> Tuple[str, str, bytes]:
+        """(key, timestamp, value) row of an entry for put_rows; encoding snapshots the entry"""
+        return key, str(cache_data.get("timestamp", "")), self.encode(cache_data)
+
+    def put_rows(self, cache_type: str, rows: Iterable[Tuple[str, str, bytes]]) -> int:
+        """
+        Insert or replace encoded entries (see encode_row) in a single transaction
+
+        Returns:
+            Number of entries written
+        """
+        now = time.time()
+        rows = [(cache_type, key, timestamp, value, now) for key, timestamp, value in rows]
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany(
+                    "INSERT OR REPLACE INTO entries (cache_type, key, timestamp, value, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)", rows
+                )
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def delete(self, cache_type: str) -> int:
+        """Remove every entry of a cache type; returns the number removed"""
+        with self._lock:
+            return self.connection.execute("DELETE FROM entries WHERE cache_type = ?", (cache_type,)).rowcount
+
+    def delete_keys(self, keys: Iterable[Tuple[str, str]]) -> int:
+        """Remove (cache_type, key) entries in a single transaction; returns the number removed"""
+        keys = list(keys)
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                cursor.executemany("DELETE FROM entries WHERE cache_type = ? AND key = ?", keys)
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        return len(keys)
+
+    def entry_sizes(self) -> List[Tuple[str, str, int, float]]:
+        """(cache_type, key, stored bytes, last access) of every entry"""
+        with self._lock:
+            return self.connection.execute(
+                "SELECT cache_type, key, LENGTH(value), last_access FROM entries"
+            ).fetchall()
+
+    def checkpoint(self) -> None:
+        """Move the write-ahead log into the database file and truncate the log"""
+        with self._lock:
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def compact(self) -> None:
+        """Return the space of deleted entries to the file system"""
+        self.checkpoint()
+        with self._lock:
+            self.connection.execute("VACUUM")
+
+    def count(self, cache_type: Optional[str] = None) -> int:
+        """Number of stored entries, optionally of one cache type"""
+        with self._lock:
+            if cache_type is None:
+                return self.connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM entries WHERE cache_type = ?", (cache_type,)
+            ).fetchone()[0]
+
+    def iter_entries(self, cache_type: Optional[str] = None) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """Yield (cache_type, key, entry) for every stored entry"""
+        with self._lock:
+            if cache_type is None:
+                rows = self.connection.execute("SELECT cache_type, key, value FROM entries").fetchall()
+            else:
+                rows = self.connection.execute(
+                    "SELECT cache_type, key, value FROM entries WHERE cache_type = ?", (cache_type,)
+                ).fetchall()
+        for row_type, key, value in rows:
+            yield row_type, key, self.decode(value)
+
+
+_stores: Dict[str, SQLiteCacheStore] = {}
+
+
+def get_sqlite_cache_store(db_path: Path) -> SQLiteCacheStore:
+    """Get the process-wide store for a database path"""
+    key = str(Path(db_path).resolve())
+    if key not in _stores:
+        _stores[key] = SQLiteCacheStore(Path(db_path))
+    return _stores[key]
+
+
+def prompt_cache_key(base_prompt: str, context: Any, model_name: Optional[str] = None) -> str:
+    """
+    Key of a segment_products response cache file
+
+    Args:
+        base_prompt: Prompt the key is built from
+        context: JSON-serializable request context
+        model_name: Model of the response; None gives the key used before the
+            persistent cache root, which did not include the model
+
+    Returns:
+        16-character cache key
+    """
+    context_str = json.dumps(context, sort_keys=True, ensure_ascii=False)
+    combined = f"{base_prompt}\n---CONTEXT---\n{context_str}"
+    if model_name is not None:
+        combined = f"{model_name}\n---PROMPT---\n{combined}"
+    return hashlib.sha256(combined.encode('utf-8')).hexdigest()[:16]
+
+
+def touch(path: Path) -> None:
+    """Mark a cache file as used now; plain files use their mtime as last access"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _is_store_file(path: Path) -> bool:
+    return path.name.startswith(CACHE_DB_FILENAME)  # Includes the -wal and -shm files
+
+
+def cache_root_stats(cache_root: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Summarize everything cached under a cache root
+
+    Args:
+        cache_root: Persistent cache directory (SQLite stores and plain cache files)
+
+    Returns:
+        Per directory (relative to the root): entries, bytes, oldest and newest access time
+    """
+    stats: Dict[str, Dict[str, Any]] = {}
+
+    def add(directory: Path, size: int, last_access: float) -> None:
+        name = str(directory.relative_to(cache_root)) if directory != cache_root else "."
+        entry = stats.setdefault(name, {"entries": 0, "bytes": 0, "oldest_access": None, "newest_access": None})
+        entry["entries"] += 1
+        entry["bytes"] += size
+        if entry["oldest_access"] is None or last_access < entry["oldest_access"]:
+            entry["oldest_access"] = last_access
+        if entry["newest_access"] is None or last_access > entry["newest_access"]:
+            entry["newest_access"] = last_access
+
+    if not cache_root.exists():
+        return stats
+    for path in cache_root.rglob("*"):
+        if not path.is_file():
+            continue
+        if path.name == CACHE_DB_FILENAME:
+            for _, _, size, last_access in get_sqlite_cache_store(path).entry_sizes():
+                add(path.parent, size, last_access)
+        elif not _is_store_file(path):
+            add(path.parent, path.stat().st_size, path.stat().st_mtime)
+    return stats
+
+
+def prune_cache_root(cache_root: Path, max_bytes: Optional[int] = None,
+                     max_age_days: Optional[float] = None, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Evict least recently used cache entries under a cache root
+
+    Entries not used for max_age_days are removed first; then the least recently
+    used entries are removed until the rest fit in max_bytes. SQLite store entries
+    are ranked by their last lookup, plain cache files by their mtime.
+
+    Args:
+        cache_root: Persistent cache directory
+        max_bytes: Size budget for all entries together (None: no size limit)
+        max_age_days: Remove entries not used for this many days (None: no age limit)
+        dry_run: Only report what would be removed
+
+    Returns:
+        Entries and bytes removed and kept
+    """
+    # (last_access, size, store or None, (cache_type, key) or file path)
+    candidates = []
+    if cache_root.exists():
+        for path in cache_root.rglob("*"):
+            if not path.is_file():
+                continue
+            if path.name == CACHE_DB_FILENAME:
+                store = get_sqlite_cache_store(path)
+                candidates.extend((last_access, size, store, (cache_type, key))
+                                  for cache_type, key, size, last_access in store.entry_sizes())
+            elif not _is_store_file(path):
+                stat = path.stat()
+                candidates.append((stat.st_mtime, stat.st_size, None, path))
+    candidates.sort(key=lambda candidate: candidate[0])
+
+    total_bytes = sum(candidate[1] for candidate in candidates)
+    cutoff = time.time() - max_age_days * 86400 if max_age_days is not None else None
+    evicted = []
+    for candidate in candidates:
+        too_old = cutoff is not None and candidate[0] < cutoff
+        too_big = max_bytes is not None and total_bytes > max_bytes
+        if not (too_old or too_big):
+            # Candidates are oldest first, so nothing after this is too old either
+            break
+        evicted.append(candidate)
+        total_bytes -= candidate[1]
+
+    if not dry_run:
+        keys_by_store = defaultdict(list)
+        for _, _, store, target in evicted:
+            if store is None:
+                target.unlink(missing_ok=True)
+            else:
+                keys_by_store[store].append(target)
+        for store, keys in keys_by_store.items():
+            store.delete_keys(keys)
+            store.compact()
+
+    return {
+        "removed_entries": len(evicted),
+        "removed_bytes": sum(candidate[1] for candidate in evicted),
+        "kept_entries": len(candidates) - len(evicted),
+        "kept_bytes": total_bytes,
+    }
 
 
 class CacheManager:
     """Simple file-based cache manager for LLM responses and results"""
     
-    def __init__(self, cache_dir: Path, cache_type: str = "llm"):
+    def __init__(self, cache_dir: Path, cache_type: str = "llm", backend: str = "json",
+                 writer: Optional[WriteBehindWriter] = None):
         """
         Initialize cache manager
         
         Args:
             cache_dir: Directory for cache files
             cache_type: Type of cache ("llm" or "result")
+            backend: "sqlite" (one cache.sqlite3 file per directory) or "json" (one file per entry)
+            writer: Persist saves on this background writer instead of blocking the caller
         """
+        if backend not in CACHE_BACKENDS:
+            raise ValueError(f"Unknown cache backend {backend!r}; expected one of {CACHE_BACKENDS}")
         self.cache_dir = cache_dir
         self.cache_type = cache_type
+        self.backend = backend
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.store = get_sqlite_cache_store(self.cache_dir / CACHE_DB_FILENAME) if backend == "sqlite" else None
+        self.writer = writer
+        # Snapshots of entries handed to the writer but not yet on disk, so lookups see them immediately
+        self._pending: Dict[str, bytes] = {}
+        self._pending_lock = threading.Lock()  # on_done callbacks run on the writer thread
     
     def generate_cache_key(self, content: str, context: Optional[Dict[str, Any]] = None) -> str:
         """
@@ -81,18 +437,69 @@ class CacheManager:
                 "metadata": metadata or {}
             }
             
-            filename = self.get_cache_filename(key)
-            filepath = self.cache_dir / filename
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, indent=2, ensure_ascii=False)
-            
+            filepath = self.cache_dir / self.get_cache_filename(key)
+            if self.writer is not None:
+                # Snapshot now: the writer thread and pending lookups must not see later changes to data.
+                # The writer thread does the JSON encoding (and compression), off the event loop
+                pending = snapshot(cache_data)
+                with self._pending_lock:
+                    self._pending[key] = pending
+
+                def on_done():
+                    # A newer save of the same key stays pending until its own write lands
+                    with self._pending_lock:
+                        if self._pending.get(key) is pending:
+                            del self._pending[key]
+
+                if self.store is not None:
+                    self.writer.put_cache_entry(self.store, self.cache_type, key, pending, on_done)
+                else:
+                    self.writer.write_json_snapshot(filepath, pending, indent=None, on_done=on_done)
+                return True
+
+            if self.store is not None:
+                self.store.put(self.cache_type, key, cache_data)
+                return True
+
+            atomic_write_text(filepath, json.dumps(cache_data, ensure_ascii=False))
             return True
             
         except Exception as e:
             print(f"Failed to save to cache: {e}")
             return False
     
+    def has_entry(self, key: str) -> bool:
+        """Whether the cache holds an entry for a key (pending, stored or as a JSON file)"""
+        with self._pending_lock:
+            if key in self._pending:
+                return True
+        if self.store is not None and self.store.contains(self.cache_type, key):
+            return True
+        return (self.cache_dir / self.get_cache_filename(key)).exists()
+
+    def import_entries(self, entries: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """
+        Store complete entries ({"timestamp", "cache_type", "data", "metadata"}) as they are
+
+        Keys the cache already holds are left alone, as is the entries' original timestamp.
+
+        Args:
+            entries: (key, entry) pairs
+
+        Returns:
+            Number of entries stored
+        """
+        new_entries = {}
+        for key, cache_data in entries:
+            if key not in new_entries and not self.has_entry(key):
+                new_entries[key] = cache_data
+        if self.store is not None:
+            return self.store.put_many(self.cache_type, new_entries.items())
+        for key, cache_data in new_entries.items():
+            atomic_write_text(self.cache_dir / self.get_cache_filename(key),
+                              json.dumps(cache_data, ensure_ascii=False))
+        return len(new_entries)
+
     def load_from_cache(self, key: str) -> Optional[Any]:
         """
         Load data from cache
@@ -104,6 +511,16 @@ class CacheManager:
             Cached data or None if not found
         """
         try:
+            with self._pending_lock:
+                pending = self._pending.get(key)
+            if pending is not None:
+                return restore(pending).get("data")  # A fresh copy per lookup, like a read from disk
+
+            if self.store is not None:
+                cache_data = self.store.get(self.cache_type, key)
+                if cache_data is not None:
+                    return cache_data.get("data")
+
             filename = self.get_cache_filename(key)
             filepath = self.cache_dir / filename
             
@@ -112,6 +529,12 @@ class CacheManager:
             
             with open(filepath, 'r', encoding='utf-8') as f:
                 cache_data = json.load(f)
+
+            if self.store is not None:
+                # Entry written by the json backend; import it so the next lookup skips the file
+                self.store.put(self.cache_type, key, cache_data)
+            else:
+                touch(filepath)  # Last access for LRU eviction
             
             return cache_data.get("data")
             
@@ -128,6 +551,8 @@ class CacheManager:
         """
         count = 0
         try:
+            if self.store is not None:
+                count += self.store.delete(self.cache_type)
             for cache_file in self.cache_dir.glob(f"{self.cache_type}_*.json"):
                 cache_file.unlink()
                 count += 1
@@ -140,11 +565,32 @@ class CacheManager:
 class LLMCache(CacheManager):
     """Specialized cache for LLM responses"""
     
-    def __init__(self, cache_dir: Path):
-        super().__init__(cache_dir, "llm")
+    def __init__(self, cache_dir: Path, telemetry: Optional[Any] = None, backend: str = "json",
+                 model_name: Optional[str] = None, writer: Optional[WriteBehindWriter] = None):
+        """
+        Initialize LLM cache
+        
+        Args:
+            cache_dir: Directory for cache files
+            telemetry: Optional LLMTelemetry that records every lookup as a hit or miss
+            backend: Storage backend ("sqlite" or "json")
+            model_name: Model the responses come from; part of every key, so a shared
+                cache directory never serves one model's response for another
+            writer: Optional background writer for saves
+        """
+        super().__init__(cache_dir, "llm", backend, writer)
+        self.telemetry = telemetry
+        self.model_name = model_name
+    
+    def generate_cache_key(self, content: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Cache key from model, prompt and context"""
+        if self.model_name:
+            content = f"{self.model_name}|||{content}"
+        return super().generate_cache_key(content, context)
     
     def save_llm_response(self, prompt: str, response: str, 
-                         context: Optional[Dict[str, Any]] = None) -> bool:
+                         context: Optional[Dict[str, Any]] = None,
+                         parsed: Optional[Any] = None, validator_version: Optional[str] = None) -> bool:
         """
         Save LLM response to cache
         
@@ -152,6 +598,9 @@ class LLMCache(CacheManager):
             prompt: Input prompt
             response: LLM response
             context: Optional context data
+            parsed: Validated structured result of the response (JSON-serializable), so
+                warm runs can skip parsing and validation
+            validator_version: Version of the parser/validator that produced parsed
             
         Returns:
             True if successful
@@ -164,6 +613,9 @@ class LLMCache(CacheManager):
             "prompt_length": len(prompt),
             "response_length": len(response)
         }
+        if parsed is not None:
+            llm_data["parsed"] = parsed
+            llm_data["validator_version"] = validator_version
         
         return self.save_to_cache(cache_key, llm_data, context)
     
@@ -179,20 +631,40 @@ class LLMCache(CacheManager):
         Returns:
             Cached response or None if not found
         """
+        return self.load_llm_result(prompt, context)[0]
+    
+    def load_llm_result(self, prompt: str, context: Optional[Dict[str, Any]] = None,
+                        validator_version: Optional[str] = None) -> Tuple[Optional[str], Optional[Any]]:
+        """
+        Load LLM response and, if stored, its validated result from cache
+        
+        Args:
+            prompt: Input prompt
+            context: Optional context data
+            validator_version: Current parser/validator version; a result stored by
+                another version is not returned (the raw response still is)
+            
+        Returns:
+            (cached response or None, validated result or None)
+        """
         cache_key = self.generate_cache_key(prompt, context)
         cached_data = self.load_from_cache(cache_key)
         
+        response, parsed = None, None
         if cached_data and isinstance(cached_data, dict):
-            return cached_data.get("response")
-        
-        return None
+            response = cached_data.get("response")
+            if validator_version is not None and cached_data.get("validator_version") == validator_version:
+                parsed = cached_data.get("parsed")
+        if self.telemetry is not None:
+            self.telemetry.record_cache_lookup(prompt, response is not None)
+        return response, parsed
 
 
 class ResultCache(CacheManager):
     """Specialized cache for processing results"""
     
-    def __init__(self, cache_dir: Path):
-        super().__init__(cache_dir, "result")
+    def __init__(self, cache_dir: Path, backend: str = "json", writer: Optional[WriteBehindWriter] = None):
+        super().__init__(cache_dir, "result", backend, writer)
     
     def save_processing_result(self, input_data: Any, result: Any, 
                              processing_params: Optional[Dict[str, Any]] = None) -> bool:
@@ -242,11 +714,11 @@ class ResultCache(CacheManager):
 
 
 # Convenience functions
-def create_llm_cache(cache_dir: Path) -> LLMCache:
+def create_llm_cache(cache_dir: Path, backend: str = "json") -> LLMCache:
     """Create LLM cache instance"""
-    return LLMCache(cache_dir)
+    return LLMCache(cache_dir, backend=backend)
 
 
-def create_result_cache(cache_dir: Path) -> ResultCache:
+def create_result_cache(cache_dir: Path, backend: str = "json") -> ResultCache:
     """Create result cache instance"""
-    return ResultCache(cache_dir) 
\ No newline at end of file
+    return ResultCache(cache_dir, backend=backend) 
\ No newline at end of file
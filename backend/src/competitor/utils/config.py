@@ -14,6 +14,10 @@ from pathlib import Path
 from datetime import datetime
 from typing import Dict, Any, Optional
 
+from .cache_utils import prune_cache_root
+
+DEFAULT_MODEL_NAME = "claude-sonnet-4-20250514"
+
 
 class ConfigManager:
     """Centralized configuration manager for competitor analysis scripts"""
@@ -47,8 +51,20 @@ class ConfigManager:
             self.OUTPUT_ROOT_DIR = self.DATA_DIR / "result" / self.script_name / timestamp
             
         self.LOG_DIR = self.DATA_DIR / "llm_log" / self.script_name / timestamp
-        self.CACHE_DIR = self.OUTPUT_ROOT_DIR / "llm_cache"
-        self.RESULT_CACHE_DIR = self.OUTPUT_ROOT_DIR / "result_cache"
+        # Caches persist across runs: entries are keyed by model, prompt and context, never by run time
+        self.CACHE_ROOT = Path(os.getenv("LLM_CACHE_ROOT", self.DATA_DIR / "cache"))
+        self.CACHE_DIR = self.CACHE_ROOT / "llm"
+        self.RESULT_CACHE_DIR = self.CACHE_ROOT / "result" / self.script_name
+        # LRU eviction limits for everything under CACHE_ROOT (see manage_llm_cache.py)
+        self.CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_GB", "10")) * 1e9)
+        self.CACHE_MAX_AGE_DAYS = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "90"))
+        # "json" writes one file per entry; "sqlite" keeps each cache in one WAL-mode file.
+        # json looks entries up about twice as fast; sqlite needs less than half the disk and a single file
+        # (benchmark_cache_backends.py)
+        self.CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "json")
+        # Per-call LLM telemetry: JSONL trace of every call and a Prometheus text summary of the run
+        self.LLM_TRACE_PATH = self.OUTPUT_ROOT_DIR / "llm_trace.jsonl"
+        self.LLM_METRICS_PATH = self.OUTPUT_ROOT_DIR / "llm_metrics.prom"
         
         # Create directories
         for directory in [self.OUTPUT_ROOT_DIR, self.LOG_DIR, self.CACHE_DIR, self.RESULT_CACHE_DIR]:
@@ -56,9 +72,31 @@ class ConfigManager:
     
     def _setup_model_config(self):
         """Setup LLM model configuration"""
-        self.MODEL_NAME = "claude-sonnet-4-20250514"
+        self.MODEL_NAME = DEFAULT_MODEL_NAME
         self.MODEL_TEMPERATURE = 0.15
         self.MODEL_MAX_TOKENS = 4096
+        self.STREAM_VALIDATION = True  # Stream responses and abort as soon as JSON output is invalid
+        # Submit bulk jobs through the offline Message Batches API instead of real-time calls
+        self.USE_BATCH_API = os.getenv("USE_BATCH_API", "false").lower() in ("true", "1", "yes")
+        self.BATCH_POLL_INTERVAL = 30.0
+        # Batch job state must survive restarts, so it lives outside the timestamped output dir
+        self.BATCH_STATE_DIR = self.DATA_DIR / "llm_batches" / self.script_name
+        # Tail-latency control: per-call deadline (seconds) and optional hedging past a latency quantile
+        self.LLM_CALL_TIMEOUT = 300.0
+        self.LLM_HEDGE_PERCENTILE = None  # e.g. 0.95 to hedge calls slower than p95
+        # Comma-separated providers to route across (e.g. "anthropic,openrouter"); empty uses the Anthropic API only
+        self.LLM_PROVIDERS = [name.strip() for name in os.getenv("LLM_PROVIDERS", "").split(",") if name.strip()]
+        # "live" calls the provider; "replay" / "synthetic" answer offline (see utils/mock_llm.py)
+        self.LLM_BACKEND = os.getenv("LLM_BACKEND", "live")
+        self.MOCK_LLM_LATENCY = float(os.getenv("MOCK_LLM_LATENCY", "0.5"))
+        self.MOCK_LLM_FAILURE_RATE = float(os.getenv("MOCK_LLM_FAILURE_RATE", "0.0"))
+        replay_dirs = os.getenv("MOCK_LLM_REPLAY_DIRS")
+        if replay_dirs:
+            self.MOCK_LLM_REPLAY_DIRS = [Path(path) for path in replay_dirs.split(os.pathsep) if path]
+        else:
+            self.MOCK_LLM_REPLAY_DIRS = [self.CACHE_ROOT,
+                                         self.DATA_DIR / "result" / self.script_name,
+                                         self.DATA_DIR / "llm_log" / self.script_name]
     
     def _setup_claude_sonnet_4_rate_limits(self):
         """Setup rate limiting configuration for Claude Sonnet 4"""
@@ -90,6 +128,23 @@ class ConfigManager:
             return self.PROMPT_DIR / subdirectory / filename
         return self.PROMPT_DIR / filename
     
+    def get_mock_llm_options(self) -> Dict[str, Any]:
+        """Options for the offline LLM backend (used when LLM_BACKEND is replay or synthetic)"""
+        return {
+            "replay_dirs": self.MOCK_LLM_REPLAY_DIRS,
+            "latency_seconds": self.MOCK_LLM_LATENCY,
+            "failure_rate": self.MOCK_LLM_FAILURE_RATE,
+            "seed": self.DEFAULT_SEED,
+        }
+    
+    def prune_cache(self) -> Dict[str, int]:
+        """Evict least recently used entries under CACHE_ROOT beyond the size and age limits"""
+        stats = prune_cache_root(self.CACHE_ROOT, self.CACHE_MAX_BYTES, self.CACHE_MAX_AGE_DAYS)
+        if stats["removed_entries"]:
+            print(f"🧹 Evicted {stats['removed_entries']} cache entries ({stats['removed_bytes'] / 1e6:.1f} MB); "
+                  f"{stats['kept_entries']} kept ({stats['kept_bytes'] / 1e6:.1f} MB)")
+        return stats
+    
     def to_dict(self) -> Dict[str, Any]:
         """Convert configuration to dictionary for logging/caching"""
         return {
@@ -97,6 +152,12 @@ class ConfigManager:
             "model_name": self.MODEL_NAME,
             "model_temperature": self.MODEL_TEMPERATURE,
             "model_max_tokens": self.MODEL_MAX_TOKENS,
+            "stream_validation": self.STREAM_VALIDATION,
+            "use_batch_api": self.USE_BATCH_API,
+            "llm_call_timeout": self.LLM_CALL_TIMEOUT,
+            "llm_hedge_percentile": self.LLM_HEDGE_PERCENTILE,
+            "llm_providers": self.LLM_PROVIDERS,
+            "llm_backend": self.LLM_BACKEND,
             "max_requests_per_minute": self.MAX_REQUESTS_PER_MINUTE,
             "max_input_tokens_per_minute": self.MAX_INPUT_TOKENS_PER_MINUTE,
             "max_output_tokens_per_minute": self.MAX_OUTPUT_TOKENS_PER_MINUTE,
@@ -0,0 +1,292 @@
+"""
+Local fake LLM provider for offline testing and benchmarking.
+
+Runs an aiohttp server that speaks the OpenAI-compatible chat completions
+protocol used by OpenRouterManager and enforces its own sliding-window
+request limit, answering with 429 + retry-after and anthropic-ratelimit-*
+headers once the limit is exceeded. Requests with "stream": true are answered
+as server-sent events, split into small chunks. A minimal Message Batches
+API (/v1/messages/batches) answers batch jobs after a simulated processing delay.
+Setting `outage` makes every chat completion fail with 503, to exercise failover.
+
+Usage:
+    async with FakeLLMProvider(requests_per_window=30, window_seconds=2) as provider:
+        manager = OpenRouterManager(base_url=provider.url, api_key="test")
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+
+class FakeLLMProvider:
+    """Throttling chat completions server bound to localhost"""
+
+    def __init__(self,
+                 requests_per_window: int = 60,
+                 window_seconds: float = 60.0,
+                 latency_seconds: float = 0.05,
+                 retry_after_seconds: float = 1.0,
+                 response_text: Any = '{"ok": true}',
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 stream_chunk_chars: int = 16,
+                 stream_chunk_delay: float = 0.0,
+                 batch_processing_seconds: float = 1.0,
+                 outage: bool = False):
+        """
+        Initialize fake provider
+
+        Args:
+            requests_per_window: Requests accepted per sliding window before returning 429
+            window_seconds: Length of the provider's rate limit window
+            latency_seconds: Simulated generation latency per accepted request
+            retry_after_seconds: Value sent in the retry-after header on 429
+            response_text: Completion text, or callable(prompt) -> text
+            host: Interface to bind
+            port: Port to bind (0 picks a free port)
+            stream_chunk_chars: Characters per streamed chunk
+            stream_chunk_delay: Simulated delay between streamed chunks
+            batch_processing_seconds: Time until a submitted batch reports processing_status "ended"
+            outage: Answer every chat completion with 503 (can be toggled while running)
+        """
+        self.requests_per_window = requests_per_window
+        self.window_seconds = window_seconds
+        self.latency_seconds = latency_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.response_text = response_text
+        self.host = host
+        self.port = port
+        self.stream_chunk_chars = stream_chunk_chars
+        self.stream_chunk_delay = stream_chunk_delay
+        self.batch_processing_seconds = batch_processing_seconds
+        self.outage = outage
+
+        self.request_times = deque()
+        self.in_flight = 0
+        self.stats = {
+            "requests": 0,
+            "completed": 0,
+            "rate_limited": 0,
+            "max_in_flight": 0,
+            "streamed_chars": 0,
+            "stream_disconnects": 0,
+            "batches_submitted": 0,
+            "batch_requests": 0,
+            "outage_errors": 0,
+        }
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        """Root URL of the running server"""
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def url(self) -> str:
+        """Chat completions endpoint URL"""
+        return f"{self.base_url}/v1/chat/completions"
+
+    def _rate_limit_headers(self, remaining: int) -> Dict[str, str]:
+        """Build anthropic-ratelimit-* headers describing the current window"""
+        return {
+            "anthropic-ratelimit-requests-limit": str(self.requests_per_window),
+            "anthropic-ratelimit-requests-remaining": str(max(0, remaining)),
+        }
+
+    def _render_response(self, prompt: str) -> str:
+        """Produce completion text for a prompt"""
+        if callable(self.response_text):
+            return self.response_text(prompt)
+        return self.response_text
+
+    async def handle_chat_completion(self, request: web.Request) -> web.Response:
+        """Serve one chat completion, or a 429 if the window is full"""
+        self.stats["requests"] += 1
+        payload = await request.json()
+
+        if self.outage:
+            self.stats["outage_errors"] += 1
+            return web.json_response(
+                {"error": {"type": "overloaded_error", "message": "Service unavailable"}},
+                status=503
+            )
+
+        now = time.monotonic()
+        while self.request_times and self.request_times[0] <= now - self.window_seconds:
+            self.request_times.popleft()
+
+        if len(self.request_times) >= self.requests_per_window:
+            self.stats["rate_limited"] += 1
+            headers = self._rate_limit_headers(0)
+            headers["retry-after"] = str(self.retry_after_seconds)
+            return web.json_response(
+                {"error": {"type": "rate_limit_error", "message": "Rate limit exceeded"}},
+                status=429,
+                headers=headers
+            )
+
+        self.request_times.append(now)
+        self.in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+        try:
+            await asyncio.sleep(self.latency_seconds)
+        finally:
+            self.in_flight -= 1
+
+        prompt = "".join(str(message.get("content", "")) for message in payload.get("messages", []))
+        text = self._render_response(prompt)
+
+        if payload.get("stream"):
+            return await self._stream_completion(request, payload, prompt, text)
+
+        self.stats["completed"] += 1
+
+        body = {
+            "id": f"fake-{self.stats['requests']}",
+            "model": payload.get("model", "fake-model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4},
+        }
+        return web.json_response(
+            body,
+            headers=self._rate_limit_headers(self.requests_per_window - len(self.request_times))
+        )
+
+    async def _stream_completion(self, request: web.Request, payload: Dict[str, Any],
+                                 prompt: str, text: str) -> web.StreamResponse:
+        """Send the completion as OpenAI-style server-sent events"""
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream",
+                     **self._rate_limit_headers(self.requests_per_window - len(self.request_times))}
+        )
+        await response.prepare(request)
+
+        def event(data: Dict[str, Any]) -> bytes:
+            return f"data: {json.dumps(data)}\n\n".encode("utf-8")
+
+        model = payload.get("model", "fake-model")
+        try:
+            for start in range(0, len(text), self.stream_chunk_chars):
+                chunk = text[start:start + self.stream_chunk_chars]
+                await response.write(event({
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": chunk}}],
+                }))
+                self.stats["streamed_chars"] += len(chunk)
+                if self.stream_chunk_delay:
+                    await asyncio.sleep(self.stream_chunk_delay)
+
+            await response.write(event({
+                "model": model,
+                "choices": [],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4},
+            }))
+            await response.write(b"data: [DONE]\n\n")
+            await response.write_eof()
+            self.stats["completed"] += 1
+        except ConnectionResetError:
+            # Client closed the stream early
+            self.stats["stream_disconnects"] += 1
+        except asyncio.CancelledError:
+            # aiohttp cancels the handler when the client disconnects mid-stream
+            self.stats["stream_disconnects"] += 1
+            raise
+        return response
+
+    def _batch_object(self, batch_id: str) -> Dict[str, Any]:
+        """Describe a batch the way the Message Batches API does"""
+        batch = self.batches[batch_id]
+        ended = time.monotonic() - batch["submitted_at"] >= self.batch_processing_seconds
+        count = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended else 0,
+                "errored": 0,
+                "canceled": 0,
+                "expired": 0,
+            },
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch_id}/results" if ended else None,
+        }
+
+    async def handle_create_batch(self, request: web.Request) -> web.Response:
+        """Accept a batch job"""
+        payload = await request.json()
+        batch_id = f"msgbatch_fake{len(self.batches) + 1:04d}"
+        self.batches[batch_id] = {"requests": payload.get("requests", []), "submitted_at": time.monotonic()}
+        self.stats["batches_submitted"] += 1
+        self.stats["batch_requests"] += len(payload.get("requests", []))
+        return web.json_response(self._batch_object(batch_id))
+
+    async def handle_get_batch(self, request: web.Request) -> web.Response:
+        """Report batch status"""
+        batch_id = request.match_info["batch_id"]
+        if batch_id not in self.batches:
+            return web.json_response({"error": {"type": "not_found_error", "message": batch_id}}, status=404)
+        return web.json_response(self._batch_object(batch_id))
+
+    async def handle_batch_results(self, request: web.Request) -> web.Response:
+        """Serve the JSONL results of an ended batch"""
+        batch_id = request.match_info["batch_id"]
+        if batch_id not in self.batches or self._batch_object(batch_id)["processing_status"] != "ended":
+            return web.json_response({"error": {"type": "not_found_error", "message": batch_id}}, status=404)
+
+        lines = []
+        for entry in self.batches[batch_id]["requests"]:
+            params = entry.get("params", {})
+            prompt = "".join(str(message.get("content", "")) for message in params.get("messages", []))
+            text = self._render_response(prompt)
+            lines.append(json.dumps({
+                "custom_id": entry["custom_id"],
+                "result": {
+                    "type": "succeeded",
+                    "message": {
+                        "type": "message",
+                        "role": "assistant",
+                        "model": params.get("model", "fake-model"),
+                        "content": [{"type": "text", "text": text}],
+                        "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+                    },
+                },
+            }))
+        return web.Response(text="\n".join(lines) + "\n", content_type="application/x-jsonl")
+
+    def build_app(self) -> web.Application:
+        """Create the aiohttp application with provider routes"""
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle_chat_completion)
+        app.router.add_post("/v1/messages/batches", self.handle_create_batch)
+        app.router.add_get("/v1/messages/batches/{batch_id}", self.handle_get_batch)
+        app.router.add_get("/v1/messages/batches/{batch_id}/results", self.handle_batch_results)
+        return app
+
+    async def start(self) -> "FakeLLMProvider":
+        """Start serving in the current event loop"""
+        self._runner = web.AppRunner(self.build_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the actual port when 0 was requested
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        """Shut the server down"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "FakeLLMProvider":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.stop()
@@ -0,0 +1,302 @@
+"""
+Pooled HTTP client for the scraping provider APIs.
+
+The provider wrappers (amazon_api, home_depot_api) used to call requests.get
+once per request: a new TCP/TLS connection every time, no timeout, no retry
+and no pacing. ProviderHTTPClient gives each provider one shared client:
+
+- keep-alive connection pooling: a requests.Session for sync callers and one
+  aiohttp.ClientSession per event loop for async callers
+- connect/read timeouts (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)
+- retries of the idempotent GET requests on connection errors, timeouts and
+  408/429/5xx responses, with full-jitter exponential backoff that honours
+  Retry-After (HTTP_MAX_ATTEMPTS attempts in total)
+- a request rate limit per provider (HTTP_QPS_<PROVIDER>, default
+  HTTP_DEFAULT_QPS, 0 for no limit) shared by all threads and event loops
+  of the process
+
+Usage:
+    client = get_provider_client("rainforest")
+
+    @client.endpoint
+    def search(term):
+        return HTTPRequest(url, params={"search_term": term})
+
+    search("dimmer switch")                          # sync
+    await search.call_async("dimmer switch")         # async
+    client.get_json(HTTPRequest(url, params=params)) # without an endpoint function
+"""
+
+import asyncio
+import functools
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from .adaptive_rate_control import parse_retry_after
+
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv("HTTP_READ_TIMEOUT_SECONDS", "120"))
+HTTP_MAX_ATTEMPTS = int(os.getenv("HTTP_MAX_ATTEMPTS", "4"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_DEFAULT_QPS = float(os.getenv("HTTP_DEFAULT_QPS", "5"))
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError)
+RETRYABLE_ASYNC_EXCEPTIONS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+
+
+class HTTPRequest(NamedTuple):
+    """GET request to a provider API"""
+    url: str
+    params: Optional[Dict[str, Any]] = None
+    headers: Optional[Dict[str, str]] = None
+    raise_for_status: bool = True  # False: return the JSON body of error responses too
+
+
+def prepare_params(params: Optional[Dict[str, Any]]) -> Optional[Dict[str, str]]:
+    """Query parameters both HTTP stacks encode the same way: None dropped, booleans as true/false"""
+    if params is None:
+        return None
+    return {
+        key: (str(value).lower() if isinstance(value, bool) else str(value))
+        for key, value in params.items() if value is not None
+    }
+
+
+def backoff_seconds(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff before the given retry, never shorter than retry-after"""
+    if retry_after is not None:
+        return min(retry_after, BACKOFF_MAX_SECONDS) + random.uniform(0, BACKOFF_BASE_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class QPSLimiter:
+    """Evenly spaced request slots, shared by the threads and event loops of a process"""
+
+    def __init__(self, qps: Optional[float]):
+        """
+        Initialize limiter
+
+        Args:
+            qps: Requests per second, None or 0 for no limit
+        """
+        self.interval = 1.0 / qps if qps else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Claim the next free slot and return the seconds to wait for it"""
+        if not self.interval:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        return slot - now
+
+
+class ProviderHTTPClient:
+    """Pooled, paced and retrying JSON-over-GET client of one provider API"""
+
+    def __init__(self, name: str, qps: Optional[float] = HTTP_DEFAULT_QPS,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT_SECONDS,
+                 read_timeout: float = HTTP_READ_TIMEOUT_SECONDS,
+                 max_attempts: int = HTTP_MAX_ATTEMPTS,
+                 pool_size: int = HTTP_POOL_SIZE):
+        """
+        Initialize client
+
+        Args:
+            name: Provider name used in log lines
+            qps: Requests per second across the process, None or 0 for no limit
+            connect_timeout: Seconds to establish a connection
+            read_timeout: Seconds to wait for response data
+            max_attempts: Attempts per request, including the first
+            pool_size: Keep-alive connections kept per host
+        """
+        self.name = name
+        self.limiter = QPSLimiter(qps)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_attempts = max(1, max_attempts)
+        self.pool_size = pool_size
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._async_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = \
+            weakref.WeakKeyDictionary()
+
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str) -> None:
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _log_retry(self, request: HTTPRequest, reason: str, attempt: int, delay: float) -> None:
+        self._count("retries")
+        print(f"🔁 {self.name}: {reason} from {request.url}, retry {attempt + 1}/{self.max_attempts - 1} "
+              f"in {delay:.1f}s")
+
+    # === SYNC ===
+
+    def get_json(self, request: HTTPRequest) -> Any:
+        """
+        Perform a GET request on the pooled session
+
+        Args:
+            request: Provider request
+
+        Returns:
+            Decoded JSON body
+
+        Raises:
+            requests.HTTPError: Error status after the last attempt (if request.raise_for_status)
+            requests.RequestException: Connection error or timeout after the last attempt
+        """
+        params = prepare_params(request.params)
+        for attempt in range(self.max_attempts):
+            last_attempt = attempt + 1 >= self.max_attempts
+            time.sleep(self.limiter.reserve())
+            self._count("requests")
+            try:
+                response = self.session.get(request.url, params=params, headers=request.headers,
+                                            timeout=(self.connect_timeout, self.read_timeout))
+            except RETRYABLE_EXCEPTIONS as e:
+                if last_attempt:
+                    self._count("failures")
+                    raise
+                reason, retry_after = type(e).__name__, None
+            else:
+                if last_attempt or response.status_code not in RETRYABLE_STATUS_CODES:
+                    if request.raise_for_status and not response.ok:
+                        self._count("failures")
+                        response.raise_for_status()
+                    return response.json()
+                reason, retry_after = f"HTTP {response.status_code}", parse_retry_after(response.headers)
+                response.close()
+
+            delay = backoff_seconds(attempt, retry_after)
+            self._log_retry(request, reason, attempt, delay)
+            time.sleep(delay)
+
+    def close(self) -> None:
+        """Close the pooled connections of sync callers"""
+        self.session.close()
+
+    # === ASYNC ===
+
+    def _get_async_session(self) -> aiohttp.ClientSession:
+        """Pooled session of the running event loop (aiohttp sessions are bound to one loop)"""
+        loop = asyncio.get_running_loop()
+        session = self._async_sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+            )
+            self._async_sessions[loop] = session
+        return session
+
+    async def aget_json(self, request: HTTPRequest) -> Any:
+        """
+        Perform a GET request on the pooled session of the running event loop
+
+        Args:
+            request: Provider request
+
+        Returns:
+            Decoded JSON body
+
+        Raises:
+            aiohttp.ClientResponseError: Error status after the last attempt (if request.raise_for_status)
+            aiohttp.ClientError, asyncio.TimeoutError: Connection error or timeout after the last attempt
+        """
+        session = self._get_async_session()
+        params = prepare_params(request.params)
+        for attempt in range(self.max_attempts):
+            last_attempt = attempt + 1 >= self.max_attempts
+            await asyncio.sleep(self.limiter.reserve())
+            self._count("requests")
+            try:
+                async with session.get(request.url, params=params, headers=request.headers) as response:
+                    if last_attempt or response.status not in RETRYABLE_STATUS_CODES:
+                        if request.raise_for_status and not response.ok:
+                            self._count("failures")
+                            response.raise_for_status()
+                        return await response.json(content_type=None)
+                    reason, retry_after = f"HTTP {response.status}", parse_retry_after(response.headers)
+            except RETRYABLE_ASYNC_EXCEPTIONS as e:
+                if last_attempt:
+                    self._count("failures")
+                    raise
+                reason, retry_after = type(e).__name__, None
+
+            delay = backoff_seconds(attempt, retry_after)
+            self._log_retry(request, reason, attempt, delay)
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        """Close the pooled connections of the running event loop"""
+        session = self._async_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None:
+            await session.close()
+
+    # === ENDPOINTS ===
+
+    def endpoint(self, build_request: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Turn a request builder into a provider call with sync and async entry points
+
+        The builder validates its arguments and returns an HTTPRequest; any other
+        return value (e.g. an error dict) is passed through without a request.
+
+        Args:
+            build_request: Function building the provider request
+
+        Returns:
+            Function performing the request synchronously; its call_async attribute
+            performs it on the running event loop
+        """
+        @functools.wraps(build_request)
+        def call(*args, **kwargs):
+            request = build_request(*args, **kwargs)
+            if not isinstance(request, HTTPRequest):
+                return request
+            return self.get_json(request)
+
+        async def call_async(*args, **kwargs):
+            request = build_request(*args, **kwargs)
+            if not isinstance(request, HTTPRequest):
+                return request
+            return await self.aget_json(request)
+
+        call_async.__name__ = f"{build_request.__name__}_async"
+        call_async.__doc__ = f"Async version of {build_request.__name__} (same arguments and result)"
+        call.call_async = call_async
+        return call
+
+
+_clients: Dict[str, ProviderHTTPClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_provider_client(name: str) -> ProviderHTTPClient:
+    """Process-wide client of a provider, paced at HTTP_QPS_<NAME> requests per second (default HTTP_DEFAULT_QPS)"""
+    with _clients_lock:
+        if name not in _clients:
+            qps = float(os.getenv(f"HTTP_QPS_{name.upper()}", HTTP_DEFAULT_QPS))
+            _clients[name] = ProviderHTTPClient(name, qps=qps)
+        return _clients[name]
@@ -0,0 +1,238 @@
+"""
+Tail-latency control for LLM API calls.
+
+Provides:
+- LatencyHistogram: cumulative latency buckets plus a rolling window for percentiles
+- LatencyController: per-call deadlines and hedged requests
+
+A hedged request is a duplicate fired once the original has been running
+longer than the observed p95 latency; whichever returns first wins and the
+other is cancelled. Hedges are only fired when the rate limiter has spare
+capacity right now, and every hedge acquires its own budget like any call.
+
+Latency is measured from request send, not from the start of the attempt:
+managers call mark_request_sent() once the rate limiter grants the request,
+so time queued for the limiter neither inflates the percentiles nor counts
+towards the hedge delay (a hedge would queue behind the same limiter).
+"""
+
+import asyncio
+import bisect
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from .rate_limiter import RateLimiter
+
+
+# Upper bounds (seconds) of the latency buckets, Prometheus style
+DEFAULT_LATENCY_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class AttemptClock:
+    """Start and request send time of one timed attempt"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.sent_at: Optional[float] = None
+        self.sent = asyncio.Event()
+
+    def latency(self) -> float:
+        """Seconds since request send (since the start for attempts that never reported one)"""
+        return time.monotonic() - (self.sent_at or self.started)
+
+
+# Clocks of the attempts being timed in the current task, outermost first: an LLMRouter attempt
+# wraps the attempt of the provider manager it routes to, and both start when that request is sent
+_attempt_clocks: ContextVar[Tuple[AttemptClock, ...]] = ContextVar("attempt_clocks", default=())
+
+
+def mark_request_sent() -> None:
+    """Start the latency clocks of the current attempts; call once the rate limiter granted the request"""
+    now = time.monotonic()
+    for clock in _attempt_clocks.get():
+        if clock.sent_at is None:
+            clock.sent_at = now
+            clock.sent.set()
+
+
+class LatencyHistogram:
+    """Latency histogram with cumulative buckets and a rolling window of recent samples"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS, window_size: int = 500):
+        """
+        Initialize histogram
+
+        Args:
+            buckets: Sorted bucket upper bounds in seconds
+            window_size: Recent samples kept for percentile estimates
+        """
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent: Deque[float] = deque(maxlen=window_size)
+
+    def observe(self, seconds: float) -> None:
+        """Record one latency sample"""
+        self.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Percentile of recent samples
+
+        Args:
+            q: Quantile between 0 and 1 (e.g. 0.95)
+
+        Returns:
+            Latency in seconds or None without samples
+        """
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return cumulative bucket counts and percentiles for logging"""
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], self.bucket_counts):
+            cumulative += bucket_count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "buckets": buckets,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class LatencyController:
+    """Apply per-call deadlines and p95 hedging to LLM calls"""
+
+    def __init__(self,
+                 rate_limiter: RateLimiter,
+                 call_timeout: Optional[float] = None,
+                 hedge_percentile: Optional[float] = None,
+                 hedge_min_samples: int = 20,
+                 min_hedge_delay: float = 1.0):
+        """
+        Initialize controller
+
+        Args:
+            rate_limiter: Limiter checked for spare capacity before hedging (anything with has_capacity, e.g. LLMRouter)
+            call_timeout: Deadline in seconds for a call including its hedge (None: no deadline)
+            hedge_percentile: Fire a hedge once a call is slower than this quantile (None: no hedging)
+            hedge_min_samples: Samples required before the percentile is trusted
+            min_hedge_delay: Never hedge earlier than this many seconds
+        """
+        self.rate_limiter = rate_limiter
+        self.call_timeout = call_timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.min_hedge_delay = min_hedge_delay
+        self.histogram = LatencyHistogram()
+        self.stats = {
+            "calls": 0,
+            "deadline_exceeded": 0,
+            "hedges": 0,
+            "hedges_won": 0,
+            "hedges_skipped": 0,
+        }
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call gets hedged, or None while hedging is off or uncalibrated"""
+        if self.hedge_percentile is None or len(self.histogram.recent) < self.hedge_min_samples:
+            return None
+        return max(self.min_hedge_delay, self.histogram.percentile(self.hedge_percentile))
+
+    async def _timed(self, call: Callable[[], Awaitable[Any]], clock: AttemptClock) -> Any:
+        """Run one attempt (in its own task) and record its latency from request send if it succeeds"""
+        _attempt_clocks.set(_attempt_clocks.get() + (clock,))
+        result = await call()
+        self.histogram.observe(clock.latency())
+        return result
+
+    async def _run_hedged(self, call: Callable[[], Awaitable[Any]],
+                          hedge_call: Callable[[], Awaitable[Any]],
+                          estimated_input_tokens: int) -> Any:
+        clock = AttemptClock()
+        primary = asyncio.ensure_future(self._timed(call, clock))
+        attempts = [primary]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None:
+                # The delay runs from request send; an attempt still queued for the limiter is not slow
+                sent = asyncio.ensure_future(clock.sent.wait())
+                try:
+                    await asyncio.wait({primary, sent}, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    sent.cancel()
+                if not primary.done():
+                    done, _ = await asyncio.wait({primary}, timeout=max(0.0, clock.sent_at + delay - time.monotonic()))
+                    if not done:
+                        if self.rate_limiter.has_capacity(estimated_input_tokens):
+                            self.stats["hedges"] += 1
+                            attempts.append(asyncio.ensure_future(self._timed(hedge_call, AttemptClock())))
+                        else:
+                            self.stats["hedges_skipped"] += 1
+
+            # First successful attempt wins; fail only once every attempt has failed
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not primary:
+                            self.stats["hedges_won"] += 1
+                        return attempt.result()
+            raise primary.exception()
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+
+    async def run(self, call: Callable[[], Awaitable[Any]],
+                  hedge_call: Optional[Callable[[], Awaitable[Any]]] = None,
+                  estimated_input_tokens: int = 0) -> Any:
+        """
+        Run a call under the deadline, hedging it if it runs past the percentile
+
+        Args:
+            call: Zero-argument coroutine function making the request
+            hedge_call: Coroutine function for the duplicate request (defaults to call)
+            estimated_input_tokens: Input size, used to check budget before hedging
+
+        Returns:
+            Result of the first successful attempt
+
+        Raises:
+            asyncio.TimeoutError: The deadline passed before any attempt returned
+        """
+        self.stats["calls"] += 1
+        try:
+            return await asyncio.wait_for(
+                self._run_hedged(call, hedge_call or call, estimated_input_tokens),
+                timeout=self.call_timeout
+            )
+        except asyncio.TimeoutError:
+            if self.call_timeout is not None:
+                self.stats["deadline_exceeded"] += 1
+                print(f"⏱️ LLM call exceeded {self.call_timeout:.0f}s deadline")
+            raise
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return latency histogram and hedging counters for logging"""
+        return {
+            "call_timeout": self.call_timeout,
+            "hedge_percentile": self.hedge_percentile,
+            "hedge_delay": self.hedge_delay(),
+            "latency": self.histogram.snapshot(),
+            **self.stats,
+        }
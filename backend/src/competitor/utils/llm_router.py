@@ -0,0 +1,401 @@
+"""
+Latency-aware routing across several LLM provider backends.
+
+LLMRouter holds one manager per provider (LLMManager for the Anthropic API,
+OpenRouterManager for OpenRouter, ...) behind the same safe_call /
+safe_stream_call interface the scripts already use. Each call goes to the
+provider with the lowest expected completion time, judged from:
+- rolling latency (EWMA of successful calls)
+- rolling error rate over the last calls
+- remaining quota (time until its rate limiter would grant the request)
+- current load relative to its concurrency limit
+
+Failed calls fail over to the next best provider. Repeated failures that are
+not throttling open a circuit breaker, so an outage takes the provider out of
+rotation for a cooldown instead of crashing the run.
+
+Provides:
+- ProviderStats: rolling per-provider latency, error rate and circuit state
+- LLMRouter: the router, a drop-in for LLMManager
+- create_llm_router: build a router from provider names ("anthropic", "openrouter")
+"""
+
+import copy
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+from .adaptive_rate_control import is_rate_limit_error
+from .latency_control import LatencyController
+from .llm_telemetry import LLMTelemetry
+from .rate_limiter import RateLimiter
+from .single_flight import SingleFlight, request_key
+from .streaming_json import IncrementalJSONValidator, StreamValidationError
+
+
+class ProviderStats:
+    """Rolling latency, error rate and circuit breaker state for one provider"""
+
+    def __init__(self, window_size: int = 50, latency_smoothing: float = 0.2):
+        """
+        Initialize stats
+
+        Args:
+            window_size: Recent call outcomes kept for the error rate
+            latency_smoothing: EWMA weight of the newest latency sample
+        """
+        self.outcomes: Deque[bool] = deque(maxlen=window_size)
+        self.latency_smoothing = latency_smoothing
+        self.latency_ewma: Optional[float] = None
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.counts = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "rate_limited": 0,
+            "circuit_opened": 0,
+        }
+
+    @property
+    def error_rate(self) -> float:
+        """Share of failed calls among the recent outcomes"""
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def is_available(self, now: float) -> bool:
+        """Whether the circuit is closed (or its cooldown has passed)"""
+        return self.open_until <= now
+
+    def record_success(self, latency: float) -> None:
+        """Record a successful call and its latency"""
+        self.counts["succeeded"] += 1
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += self.latency_smoothing * (latency - self.latency_ewma)
+
+    def record_failure(self, rate_limited: bool, failure_threshold: int, cooldown_seconds: float) -> bool:
+        """
+        Record a failed call
+
+        Throttling counts toward the error rate but never opens the circuit:
+        the provider's rate controller already pauses its limiter, which shows
+        up as a longer quota wait.
+
+        Returns:
+            True if this failure opened the circuit
+        """
+        self.counts["failed"] += 1
+        self.outcomes.append(False)
+        if rate_limited:
+            self.counts["rate_limited"] += 1
+            return False
+
+        self.consecutive_failures += 1
+        now = time.monotonic()
+        # Calls that were already in flight when the circuit opened do not reopen it
+        if self.consecutive_failures < failure_threshold or not self.is_available(now):
+            return False
+        self.open_until = now + cooldown_seconds
+        self.counts["circuit_opened"] += 1
+        return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return rolling stats for logging"""
+        return {
+            "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "in_flight": self.in_flight,
+            "circuit_open": not self.is_available(time.monotonic()),
+            **self.counts,
+        }
+
+
+class LLMRouter:
+    """Route LLM calls across provider backends by live latency, error rate and quota"""
+
+    def __init__(self,
+                 providers: Dict[str, Any],
+                 coalesce_requests: bool = True,
+                 hedge_percentile: Optional[float] = None,
+                 failure_threshold: int = 3,
+                 cooldown_seconds: float = 30.0,
+                 stats_window: int = 50,
+                 default_latency: float = 1.0):
+        """
+        Initialize router
+
+        Args:
+            providers: Provider name -> manager (LLMManager, OpenRouterManager, ...), in
+                order of preference; ties go to the earlier provider. Build the managers
+                with coalesce_requests=False, the router coalesces before routing.
+            coalesce_requests: Let identical concurrent calls share one routed request
+            hedge_percentile: Hedge calls slower than this latency quantile on another provider
+            failure_threshold: Consecutive non-throttling failures that open a provider's circuit
+            cooldown_seconds: How long an open circuit keeps the provider out of rotation
+            stats_window: Recent call outcomes kept per provider for the error rate
+            default_latency: Latency assumed for a provider before its first success
+        """
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+
+        self.providers = dict(providers)
+        self.provider_stats = {name: ProviderStats(stats_window) for name in self.providers}
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.default_latency = default_latency
+        self.failovers = 0
+
+        primary = next(iter(self.providers.values()))
+        self.model_name = primary.model_name
+        self.temperature = primary.temperature
+        self.max_tokens = primary.max_tokens
+        self.rate_limiter: RateLimiter = primary.rate_limiter
+        # Each provider traces its own attempts; create_llm_router gives them one shared telemetry
+        self.telemetry: LLMTelemetry = primary.telemetry
+        self.single_flight = SingleFlight() if coalesce_requests else None
+        # Deadlines are enforced per provider so a hung provider fails over;
+        # the router only hedges, and checks spare budget through has_capacity
+        self.latency_control = LatencyController(self, None, hedge_percentile)
+
+    @property
+    def llm(self):
+        """Underlying LLM object of the preferred provider (backward compatibility)"""
+        return getattr(next(iter(self.providers.values())), "llm", None)
+
+    def has_capacity(self, estimated_input_tokens: int, estimated_output_tokens: Optional[int] = None) -> bool:
+        """Whether any provider in rotation would grant a request right now"""
+        now = time.monotonic()
+        return any(
+            self.provider_stats[name].is_available(now)
+            and manager.rate_limiter.has_capacity(estimated_input_tokens, estimated_output_tokens)
+            for name, manager in self.providers.items()
+        )
+
+    def _expected_seconds(self, name: str, estimated_input_tokens: int) -> float:
+        """Expected time for a provider to complete a request, inflated by its error rate"""
+        stats = self.provider_stats[name]
+        limiter = self.providers[name].rate_limiter
+        quota_wait = limiter.estimated_wait(estimated_input_tokens)
+        latency = stats.latency_ewma if stats.latency_ewma is not None else self.default_latency
+        load = stats.in_flight / max(1, limiter.max_concurrent_requests)
+        return (quota_wait + latency * (1.0 + load)) / max(0.05, 1.0 - stats.error_rate)
+
+    def _pick_provider(self, estimated_input_tokens: int, exclude: Set[str]) -> Optional[str]:
+        """Choose the provider with the lowest expected completion time"""
+        now = time.monotonic()
+        candidates = [name for name in self.providers
+                      if name not in exclude and self.provider_stats[name].is_available(now)]
+        if not candidates:
+            # Every remaining circuit is open: probe the one that reopens first rather than fail the run
+            remaining = [name for name in self.providers if name not in exclude]
+            if not remaining:
+                return None
+            return min(remaining, key=lambda name: self.provider_stats[name].open_until)
+        return min(candidates, key=lambda name: self._expected_seconds(name, estimated_input_tokens))
+
+    async def _route(self, invoke: Callable[[Any], Awaitable[str]],
+                     estimated_input_tokens: int, tried: Set[str]) -> str:
+        """Run a call on the best provider, failing over to the others on error"""
+        last_error: Optional[Exception] = None
+        while True:
+            name = self._pick_provider(estimated_input_tokens, tried)
+            if name is None:
+                raise last_error or RuntimeError("No LLM provider left to try")
+            if last_error is not None:
+                self.failovers += 1
+                print(f"🔀 Failing over to {name}: {last_error}")
+            tried.add(name)
+
+            stats = self.provider_stats[name]
+            stats.counts["requests"] += 1
+            stats.in_flight += 1
+            start = time.monotonic()
+            try:
+                result = await invoke(self.providers[name])
+            except StreamValidationError:
+                # Invalid output is not a provider fault; let the caller's retry handle it
+                raise
+            except Exception as e:
+                if stats.record_failure(is_rate_limit_error(e), self.failure_threshold, self.cooldown_seconds):
+                    print(f"🚫 {name} failed {stats.consecutive_failures} times in a row, "
+                          f"out of rotation for {self.cooldown_seconds:.0f}s")
+                last_error = e
+                continue
+            else:
+                stats.record_success(time.monotonic() - start)
+                return result
+            finally:
+                stats.in_flight -= 1
+
+    def _request_key(self, prompt: str, system_prompt: Optional[str], mode: str) -> str:
+        """In-flight key covering every provider's model"""
+        return request_key(prompt, system_prompt, mode=mode,
+                           models=[manager.model_name for manager in self.providers.values()],
+                           temperature=self.temperature, max_tokens=self.max_tokens)
+
+    async def _run(self, invoke: Callable[[Any], Awaitable[str]], estimated_input_tokens: int) -> str:
+        """Route a call under the router's hedging policy; a hedge avoids providers already tried"""
+        tried: Set[str] = set()
+        return await self.latency_control.run(
+            lambda: self._route(invoke, estimated_input_tokens, tried),
+            hedge_call=lambda: self._route(invoke, estimated_input_tokens, set(tried)),
+            estimated_input_tokens=estimated_input_tokens
+        )
+
+    async def safe_call(self, prompt: str, context: Optional[Dict[str, Any]] = None,
+                        estimated_input_tokens: Optional[int] = None,
+                        system_prompt: Optional[str] = None) -> str:
+        """
+        Safe async LLM call routed to the best provider
+
+        Args:
+            prompt: The prompt to send to LLM (user message; the variable part when system_prompt is set)
+            context: Optional context for logging/caching
+            estimated_input_tokens: Precomputed estimate (e.g. from CompiledPrompt); skips tokenizing the prompt
+            system_prompt: Optional static instruction prefix, sent as a cacheable system message
+
+        Returns:
+            LLM response text
+        """
+        if estimated_input_tokens is None:
+            estimated_input_tokens = self.rate_limiter.estimate_tokens((system_prompt or "") + prompt)
+
+        def invoke(manager: Any) -> Awaitable[str]:
+            return manager.safe_call(prompt, context, estimated_input_tokens, system_prompt)
+
+        async def call() -> str:
+            return await self._run(invoke, estimated_input_tokens)
+
+        if self.single_flight is None:
+            return await call()
+        return await self.single_flight.run(self._request_key(prompt, system_prompt, "call"), call)
+
+    async def safe_stream_call(self, prompt: str, validator: IncrementalJSONValidator,
+                               context: Optional[Dict[str, Any]] = None,
+                               estimated_input_tokens: Optional[int] = None,
+                               system_prompt: Optional[str] = None) -> str:
+        """
+        Streaming, incrementally validated LLM call routed to the best provider
+
+        A failover or hedge streams into a fresh copy of the validator.
+
+        Args:
+            prompt: The prompt to send to LLM (user message; the variable part when system_prompt is set)
+            validator: Incremental validator fed with each streamed chunk
+            context: Optional context for logging/caching
+            estimated_input_tokens: Optional precomputed input token estimate
+            system_prompt: Optional static instruction prefix, sent as a cacheable system message
+
+        Returns:
+            LLM response text
+
+        Raises:
+            StreamValidationError: Output became invalid; the request was cancelled
+        """
+        if estimated_input_tokens is None:
+            estimated_input_tokens = self.rate_limiter.estimate_tokens((system_prompt or "") + prompt)
+
+        pristine = copy.deepcopy(validator)  # Copied before the first chunk is fed
+        unused = [validator]
+        issued = []
+
+        def invoke(manager: Any) -> Awaitable[str]:
+            attempt_validator = unused.pop() if unused else copy.deepcopy(pristine)
+            return manager.safe_stream_call(prompt, attempt_validator, context, estimated_input_tokens, system_prompt)
+
+        async def call() -> str:
+            issued.append(True)
+            return await self._run(invoke, estimated_input_tokens)
+
+        if self.single_flight is None:
+            return await call()
+        response_text = await self.single_flight.run(self._request_key(prompt, system_prompt, "stream"), call)
+        if not issued:
+            validator.feed(response_text)
+        return response_text
+
+    async def batch_call(self, prompts: Dict[str, str], state_dir: Path,
+                         on_result: Optional[Callable[[str, str], None]] = None,
+                         **backend_kwargs) -> Dict[str, Optional[str]]:
+        """Run an offline batch job on the first provider that supports the Message Batches API"""
+        for manager in self.providers.values():
+            if hasattr(manager, "batch_call"):
+                return await manager.batch_call(prompts, state_dir, on_result, **backend_kwargs)
+        raise ValueError("No provider in the router supports the Message Batches API")
+
+    async def close(self) -> None:
+        """Close connections held by the provider managers"""
+        for manager in self.providers.values():
+            if hasattr(manager, "close"):
+                await manager.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return per-provider rolling stats for logging"""
+        return {
+            "failovers": self.failovers,
+            "providers": {name: stats.snapshot() for name, stats in self.provider_stats.items()},
+        }
+
+    def print_provider_stats(self) -> None:
+        """Print one line of rolling stats per provider"""
+        for name, stats in self.snapshot()["providers"].items():
+            latency = f"{stats['latency_ewma']:.2f}s" if stats['latency_ewma'] is not None else "n/a"
+            state = "open" if stats['circuit_open'] else "closed"
+            print(f"   - {name}: {stats['succeeded']}/{stats['requests']} ok, latency {latency}, "
+                  f"error rate {stats['error_rate']:.0%}, {stats['rate_limited']} throttled, circuit {state}")
+
+
+def create_llm_router(providers: List[str],
+                      model_name: str = "claude-sonnet-4-20250514",
+                      temperature: float = 0.15,
+                      max_tokens: int = 4096,
+                      rate_limiter: Optional[RateLimiter] = None,
+                      adaptive_rate_control: bool = True,
+                      coalesce_requests: bool = True,
+                      call_timeout: Optional[float] = None,
+                      hedge_percentile: Optional[float] = None,
+                      telemetry: Optional[LLMTelemetry] = None) -> LLMRouter:
+    """
+    Build a router over the named providers
+
+    Args:
+        providers: Provider names in order of preference ("anthropic", "openrouter")
+        model_name: Claude model name; mapped to the OpenRouter name for "openrouter"
+        temperature: Model temperature setting
+        max_tokens: Maximum tokens per response
+        rate_limiter: Limiter for the "anthropic" provider (others use their model's shared limiter)
+        adaptive_rate_control: Tune each provider's limits from 429s and provider headers
+        coalesce_requests: Let identical concurrent calls share one routed request
+        call_timeout: Per-provider call deadline in seconds; a timeout fails over
+        hedge_percentile: Hedge calls slower than this latency quantile on another provider
+        telemetry: Telemetry shared by every provider (default: a new one)
+
+    Returns:
+        LLMRouter
+    """
+    from .llm_utils import LLMManager
+    from .openrouter_utils import OpenRouterManager, get_openrouter_model_mapping
+
+    telemetry = telemetry or LLMTelemetry()
+    managers: Dict[str, Any] = {}
+    for name in providers:
+        if name == "anthropic":
+            managers[name] = LLMManager(model_name, temperature, max_tokens, rate_limiter, adaptive_rate_control,
+                                        coalesce_requests=False, call_timeout=call_timeout, telemetry=telemetry)
+        elif name == "openrouter":
+            managers[name] = OpenRouterManager(get_openrouter_model_mapping(model_name), temperature, max_tokens,
+                                               adaptive_rate_control=adaptive_rate_control,
+                                               coalesce_requests=False, call_timeout=call_timeout,
+                                               telemetry=telemetry)
+        else:
+            raise ValueError(f"Unknown LLM provider: {name}")
+
+    print(f"🔀 Routing LLM calls across providers: {', '.join(managers)}")
+    return LLMRouter(managers, coalesce_requests=coalesce_requests, hedge_percentile=hedge_percentile)
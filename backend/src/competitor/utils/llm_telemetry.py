@@ -0,0 +1,406 @@
+"""
+Per-call telemetry for LLM API calls.
+
+Every safe_call / safe_stream_call is traced with its interaction type
+(extraction, categorize, consolidate, final_assign, refine, ...):
+- queue wait in the RateLimiter
+- time to first byte (first streamed text, or the whole response when not streaming)
+- total latency including queueing, hedges and coalescing
+- input/output tokens (with prompt-cache reads and writes)
+- retry count and attempts sent to the provider
+- LLMCache hit/miss
+- estimated cost in dollars
+
+Each call is appended to a JSONL trace as it finishes; per-interaction totals
+are written as a Prometheus text summary at the end of a run.
+"""
+
+import asyncio
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO, Tuple
+
+from .adaptive_rate_control import is_rate_limit_error
+from .latency_control import LatencyHistogram
+from .streaming_json import StreamValidationError
+
+
+# Detected by a phrase from each prompt template; checked in order, so the
+# more specific "review aspect categorization" comes before "aspect categorization"
+INTERACTION_MARKERS: List[Tuple[str, str]] = [
+    ("Extract comprehensive customer insights", "extraction"),
+    ("review aspect categorization specialist", "categorize"),
+    ("consolidation specialist", "consolidate"),
+    ("aspect categorization specialist", "final_assign"),
+    ("product taxonomy extraction specialist", "taxonomy"),
+    ("product taxonomy refinement specialist", "refine"),
+]
+
+# USD per million (input, output) tokens, matched as a substring of the model name.
+# Prompt-cache reads bill at 10% and cache writes at 125% of the input price.
+MODEL_PRICING: List[Tuple[str, Tuple[float, float]]] = [
+    ("claude-opus-4", (15.0, 75.0)),
+    ("claude-sonnet-4", (3.0, 15.0)),
+    ("claude-3-7-sonnet", (3.0, 15.0)),
+    ("claude-3.7-sonnet", (3.0, 15.0)),
+    ("claude-3-5-sonnet", (3.0, 15.0)),
+    ("claude-3.5-sonnet", (3.0, 15.0)),
+    ("claude-3-5-haiku", (0.8, 4.0)),
+    ("claude-3.5-haiku", (0.8, 4.0)),
+    ("gpt-4o", (2.5, 10.0)),
+    ("gpt-4-turbo", (10.0, 30.0)),
+]
+CACHE_READ_PRICE_FACTOR = 0.1
+CACHE_WRITE_PRICE_FACTOR = 1.25
+
+
+def detect_interaction_type(text: str) -> Optional[str]:
+    """Interaction type of a pipeline prompt, or None if it is not recognized"""
+    for marker, interaction_type in INTERACTION_MARKERS:
+        if marker in text:
+            return interaction_type
+    return None
+
+
+def estimate_cost(model_name: str, input_tokens: int, output_tokens: int,
+                  cache_read_tokens: int = 0, cache_creation_tokens: int = 0) -> Optional[float]:
+    """
+    Estimate the dollar cost of a call
+
+    Args:
+        model_name: Model name (Anthropic or OpenRouter format)
+        input_tokens: All input tokens, including cache reads and writes
+        output_tokens: Output tokens
+        cache_read_tokens: Input tokens read from the prompt cache
+        cache_creation_tokens: Input tokens written to the prompt cache
+
+    Returns:
+        Cost in USD, or None for models without known pricing
+    """
+    for pattern, (input_price, output_price) in MODEL_PRICING:
+        if pattern in model_name:
+            uncached_tokens = max(0, input_tokens - cache_read_tokens - cache_creation_tokens)
+            return (uncached_tokens * input_price
+                    + cache_read_tokens * input_price * CACHE_READ_PRICE_FACTOR
+                    + cache_creation_tokens * input_price * CACHE_WRITE_PRICE_FACTOR
+                    + output_tokens * output_price) / 1_000_000
+    return None
+
+
+def call_status(error: Optional[BaseException]) -> str:
+    """Outcome label of a finished call"""
+    if error is None:
+        return "ok"
+    if isinstance(error, StreamValidationError):
+        return "invalid"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, asyncio.CancelledError):
+        return "cancelled"
+    if is_rate_limit_error(error):
+        return "rate_limited"
+    return "error"
+
+
+class CallTrace:
+    """Measurements of one safe_call / safe_stream_call, filled in while it runs"""
+
+    def __init__(self, telemetry: "LLMTelemetry", interaction: str, mode: str, model: str, retries: int):
+        self.telemetry = telemetry
+        self.interaction = interaction
+        self.mode = mode
+        self.model = model
+        self.retries = retries
+        self.started = time.monotonic()
+        self.queue_wait: Optional[float] = None
+        self.ttfb: Optional[float] = None
+        self.attempts = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+
+    def request_sent(self, queued_at: float) -> float:
+        """
+        Mark an attempt granted by the rate limiter
+
+        Args:
+            queued_at: monotonic time the attempt started waiting for the limiter
+
+        Returns:
+            monotonic send time, to pass to first_byte
+        """
+        now = time.monotonic()
+        self.attempts += 1
+        if self.queue_wait is None:
+            self.queue_wait = now - queued_at
+        return now
+
+    def first_byte(self, sent_at: float) -> None:
+        """Mark the first response bytes of an attempt (only the earliest attempt counts)"""
+        if self.ttfb is None:
+            self.ttfb = time.monotonic() - sent_at
+
+    def record_usage(self, input_tokens: int, output_tokens: int,
+                     cache_read_tokens: int = 0, cache_creation_tokens: int = 0) -> None:
+        """Add the token usage of one attempt (hedged attempts are billed too)"""
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cache_read_tokens += cache_read_tokens
+        self.cache_creation_tokens += cache_creation_tokens
+
+    def __enter__(self) -> "CallTrace":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.telemetry.finish(self, exc)
+        return False
+
+
+class InteractionStats:
+    """Running totals for one interaction type"""
+
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.latency = LatencyHistogram()
+        self.ttfb = LatencyHistogram()
+        self.queue_wait = LatencyHistogram()
+        self.attempts = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+        self.cost = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        total_calls = sum(self.calls.values())
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "calls": dict(self.calls),
+            "total_calls": total_calls,
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "latency": self.latency.snapshot(),
+            "ttfb": self.ttfb.snapshot(),
+            "queue_wait": self.queue_wait.snapshot(),
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_read_input_tokens": self.cache_read_tokens,
+            "cache_creation_input_tokens": self.cache_creation_tokens,
+            "cost_usd": round(self.cost, 6),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else None,
+        }
+
+
+class LLMTelemetry:
+    """Collect per-call traces and per-interaction totals for a run"""
+
+    def __init__(self, trace_path: Optional[Path] = None):
+        """
+        Initialize telemetry
+
+        Args:
+            trace_path: JSONL file every finished call is appended to (None: keep totals only)
+        """
+        self.trace_path = Path(trace_path) if trace_path else None
+        self._trace_file: Optional[TextIO] = None
+        self.interactions: Dict[str, InteractionStats] = {}
+        self.started = time.monotonic()
+
+    def _stats(self, interaction: str) -> InteractionStats:
+        if interaction not in self.interactions:
+            self.interactions[interaction] = InteractionStats()
+        return self.interactions[interaction]
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self.trace_path is None:
+            return
+        if self._trace_file is None:
+            self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+            self._trace_file = open(self.trace_path, 'a', encoding='utf-8', buffering=1)
+        self._trace_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def track(self, prompt: str, system_prompt: Optional[str], mode: str, model: str,
+              context: Optional[Dict[str, Any]] = None) -> CallTrace:
+        """
+        Start tracing a call; use as a context manager around the whole call
+
+        The interaction type and retry number come from the call's context
+        ({"interaction": ..., "attempt": ...}); without them the interaction is
+        detected from the prompt text and the call counts as a first attempt.
+
+        Args:
+            prompt: User prompt
+            system_prompt: Optional static prefix
+            mode: "call" or "stream"
+            model: Model name used for pricing
+            context: Optional call context
+
+        Returns:
+            CallTrace the manager fills in while the call runs
+        """
+        context = context or {}
+        interaction = (context.get("interaction")
+                       or detect_interaction_type((system_prompt or "") + prompt)
+                       or "other")
+        return CallTrace(self, interaction, mode, model, int(context.get("attempt") or 0))
+
+    def finish(self, trace: CallTrace, error: Optional[BaseException] = None) -> None:
+        """Record a finished call in the totals and the JSONL trace"""
+        latency = time.monotonic() - trace.started
+        status = call_status(error)
+        # Coalesced calls share another call's response and never reach the provider
+        coalesced = status == "ok" and trace.attempts == 0
+        cost = estimate_cost(trace.model, trace.input_tokens, trace.output_tokens,
+                             trace.cache_read_tokens, trace.cache_creation_tokens)
+
+        stats = self._stats(trace.interaction)
+        stats.calls[status] = stats.calls.get(status, 0) + 1
+        stats.latency.observe(latency)
+        if trace.ttfb is not None:
+            stats.ttfb.observe(trace.ttfb)
+        if trace.queue_wait is not None:
+            stats.queue_wait.observe(trace.queue_wait)
+        stats.attempts += trace.attempts
+        stats.retries += trace.retries > 0
+        stats.coalesced += coalesced
+        stats.input_tokens += trace.input_tokens
+        stats.output_tokens += trace.output_tokens
+        stats.cache_read_tokens += trace.cache_read_tokens
+        stats.cache_creation_tokens += trace.cache_creation_tokens
+        stats.cost += cost or 0.0
+
+        self._write({
+            "event": "llm_call",
+            "timestamp": datetime.now().isoformat(),
+            "interaction": trace.interaction,
+            "mode": trace.mode,
+            "model": trace.model,
+            "status": status,
+            "error": f"{type(error).__name__}: {error}" if error is not None and status != "cancelled" else None,
+            "queue_wait_s": round(trace.queue_wait, 4) if trace.queue_wait is not None else None,
+            "ttfb_s": round(trace.ttfb, 4) if trace.ttfb is not None else None,
+            "latency_s": round(latency, 4),
+            "input_tokens": trace.input_tokens,
+            "output_tokens": trace.output_tokens,
+            "cache_read_input_tokens": trace.cache_read_tokens,
+            "cache_creation_input_tokens": trace.cache_creation_tokens,
+            "attempts": trace.attempts,
+            "retries": trace.retries,
+            "coalesced": coalesced,
+            "cost_usd": round(cost, 6) if cost is not None else None,
+        })
+
+    def record_cache_lookup(self, prompt: str, hit: bool, interaction: Optional[str] = None) -> None:
+        """
+        Record an LLM response cache lookup
+
+        Args:
+            prompt: Prompt the cache was queried with (used to detect the interaction type)
+            hit: Whether a cached response was found
+            interaction: Interaction type, if known
+        """
+        interaction = interaction or detect_interaction_type(prompt) or "other"
+        stats = self._stats(interaction)
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+        self._write({
+            "event": "cache_lookup",
+            "timestamp": datetime.now().isoformat(),
+            "interaction": interaction,
+            "hit": hit,
+        })
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-interaction totals for logging"""
+        return {
+            "wall_time_s": round(time.monotonic() - self.started, 3),
+            "interactions": {name: stats.snapshot() for name, stats in sorted(self.interactions.items())},
+        }
+
+    def prometheus_text(self) -> str:
+        """Per-interaction totals in the Prometheus text exposition format"""
+        lines: List[str] = []
+
+        def metric(name: str, metric_type: str, help_text: str, samples: List[Tuple[Dict[str, str], float]]) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        def histogram(name: str, help_text: str, attribute: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for interaction, stats in sorted(self.interactions.items()):
+                snapshot = getattr(stats, attribute).snapshot()
+                for bound, count in snapshot["buckets"].items():
+                    lines.append(f'{name}_bucket{{interaction="{interaction}",le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{interaction="{interaction}"}} {snapshot["sum"]}')
+                lines.append(f'{name}_count{{interaction="{interaction}"}} {snapshot["count"]}')
+
+        interactions = sorted(self.interactions.items())
+        metric("llm_calls_total", "counter", "LLM calls by interaction type and outcome",
+               [({"interaction": name, "status": status}, count)
+                for name, stats in interactions for status, count in sorted(stats.calls.items())])
+        histogram("llm_call_latency_seconds", "Total call latency including queueing and hedges", "latency")
+        histogram("llm_time_to_first_byte_seconds", "Time from sending a request to its first response bytes", "ttfb")
+        histogram("llm_queue_wait_seconds", "Time spent waiting for the rate limiter", "queue_wait")
+        metric("llm_attempts_total", "counter", "Requests sent to the provider, including hedges",
+               [({"interaction": name}, stats.attempts) for name, stats in interactions])
+        metric("llm_retries_total", "counter", "Calls that were retries of an earlier failed attempt",
+               [({"interaction": name}, stats.retries) for name, stats in interactions])
+        metric("llm_coalesced_calls_total", "counter", "Calls answered by an identical in-flight request",
+               [({"interaction": name}, stats.coalesced) for name, stats in interactions])
+        metric("llm_tokens_total", "counter", "Tokens by direction",
+               [({"interaction": name, "direction": direction}, value)
+                for name, stats in interactions
+                for direction, value in (("input", stats.input_tokens), ("output", stats.output_tokens),
+                                         ("cache_read", stats.cache_read_tokens),
+                                         ("cache_creation", stats.cache_creation_tokens))])
+        metric("llm_cost_dollars_total", "counter", "Estimated cost in USD",
+               [({"interaction": name}, round(stats.cost, 6)) for name, stats in interactions])
+        metric("llm_cache_lookups_total", "counter", "LLM response cache lookups",
+               [({"interaction": name, "result": result}, value)
+                for name, stats in interactions
+                for result, value in (("hit", stats.cache_hits), ("miss", stats.cache_misses))])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: Path) -> None:
+        """Write the Prometheus text summary (and flush the JSONL trace)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        if self._trace_file is not None:
+            self._trace_file.flush()
+
+    def print_summary(self) -> None:
+        """Print where the run's LLM time and money went, per interaction type"""
+        for name, stats in sorted(self.interactions.items()):
+            snapshot = stats.snapshot()
+            latency = snapshot["latency"]
+            cache = f", cache hit {snapshot['cache_hit_rate']:.0%}" if snapshot["cache_hit_rate"] is not None else ""
+            percentiles = (f"latency p50 {latency['p50']:.1f}s p95 {latency['p95']:.1f}s"
+                           if latency["count"] else "no calls")
+            print(f"   {name}: {snapshot['total_calls']} calls ({snapshot['retries']} retries{cache}) | "
+                  f"{percentiles}, queued {snapshot['queue_wait']['sum']:.1f}s total | "
+                  f"{snapshot['input_tokens']} in / {snapshot['output_tokens']} out tokens | "
+                  f"${snapshot['cost_usd']:.2f}")
+
+    def close(self) -> None:
+        """Close the JSONL trace"""
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
@@ -5,11 +5,32 @@ Provides:
 - LLM model initialization and management
 - Safe async API calls with error handling
 - Token usage tracking
+- Adaptive rate limits driven by 429s and rate-limit headers
+- Offline Message Batches execution for bulk jobs
+- Prompt-prefix caching of static instruction blocks
+- Single-flight coalescing of identical in-flight requests
+- Per-call deadlines, p95 hedging and latency histograms
+- Per-call telemetry by interaction type (see llm_telemetry)
+- Optional routing across several providers (see llm_router)
+- Offline replay/synthetic backends for benchmarking (see mock_llm)
 """
 
-from typing import Dict, Any, Optional
+import asyncio
+import copy
+import time
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional, Union
 from langchain_anthropic import ChatAnthropic
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 from .rate_limiter import RateLimiter
+from .rate_limit_registry import get_shared_rate_limiter
+from .adaptive_rate_control import AdaptiveRateController, get_response_headers, is_rate_limit_error
+from .streaming_json import IncrementalJSONValidator, StreamValidationError
+from .batch_utils import MessageBatchBackend
+from .single_flight import SingleFlight, request_key
+from .latency_control import LatencyController, mark_request_sent
+from .llm_telemetry import CallTrace, LLMTelemetry
+from .llm_router import LLMRouter, create_llm_router
 
 
 class LLMManager:
@@ -19,7 +40,12 @@ class LLMManager:
                  model_name: str = "claude-sonnet-4-20250514",
                  temperature: float = 0.15,
                  max_tokens: int = 4096,
-                 rate_limiter: Optional[RateLimiter] = None):
+                 rate_limiter: Optional[RateLimiter] = None,
+                 adaptive_rate_control: bool = True,
+                 coalesce_requests: bool = True,
+                 call_timeout: Optional[float] = None,
+                 hedge_percentile: Optional[float] = None,
+                 telemetry: Optional[LLMTelemetry] = None):
         """
         Initialize LLM manager
         
@@ -28,11 +54,22 @@ class LLMManager:
             temperature: Model temperature setting
             max_tokens: Maximum tokens per response
             rate_limiter: Optional rate limiter instance
+            adaptive_rate_control: Tune rate limits from 429s and provider headers
+            coalesce_requests: Let identical concurrent calls share one in-flight request
+            call_timeout: Per-call deadline in seconds (None: wait indefinitely)
+            hedge_percentile: Fire a duplicate request once a call is slower than this
+                latency quantile (e.g. 0.95) and keep whichever returns first (None: no hedging)
+            telemetry: Per-call telemetry sink, may be shared with other managers (default: a private one)
         """
         self.model_name = model_name
         self.temperature = temperature
         self.max_tokens = max_tokens
-        self.rate_limiter = rate_limiter or RateLimiter(model_max_tokens=max_tokens)
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter(model_name, model_max_tokens=max_tokens)
+        self.rate_controller = AdaptiveRateController(self.rate_limiter) if adaptive_rate_control else None
+        self.prompt_cache_stats = {"cache_read_input_tokens": 0, "cache_creation_input_tokens": 0, "uncached_input_tokens": 0}
+        self.single_flight = SingleFlight() if coalesce_requests else None
+        self.latency_control = LatencyController(self.rate_limiter, call_timeout, hedge_percentile)
+        self.telemetry = telemetry or LLMTelemetry()
         self.llm = self._initialize_llm()
     
     def _initialize_llm(self) -> ChatAnthropic:
@@ -43,56 +80,303 @@ class LLMManager:
             max_tokens=self.max_tokens,
         )
     
-    async def safe_call(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+    def _build_messages(self, prompt: str, system_prompt: Optional[str]) -> Union[str, List[BaseMessage]]:
+        """Build the model input, marking the static system prefix as cacheable"""
+        if not system_prompt:
+            return prompt
+        return [
+            SystemMessage(content=[{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]),
+            HumanMessage(content=prompt)
+        ]
+    
+    def _charged_input_tokens(self, usage: Dict[str, Any], default: int) -> int:
+        """Input tokens that count against the ITPM limit (cache reads do not) and record cache stats"""
+        input_tokens = usage.get('input_tokens')
+        if not input_tokens:
+            return default
+        details = usage.get('input_token_details') or {}
+        cache_read = details.get('cache_read') or 0
+        cache_creation = details.get('cache_creation') or 0
+        self.prompt_cache_stats["cache_read_input_tokens"] += cache_read
+        self.prompt_cache_stats["cache_creation_input_tokens"] += cache_creation
+        self.prompt_cache_stats["uncached_input_tokens"] += input_tokens - cache_read - cache_creation
+        return max(1, input_tokens - cache_read)
+    
+    @staticmethod
+    def _record_usage(trace: CallTrace, usage: Dict[str, Any], estimated_input_tokens: int, output_tokens: int) -> None:
+        """Add one attempt's token usage (with prompt-cache details) to its call trace"""
+        details = usage.get('input_token_details') or {}
+        trace.record_usage(usage.get('input_tokens') or estimated_input_tokens, output_tokens,
+                           details.get('cache_read') or 0, details.get('cache_creation') or 0)
+    
+    def _request_key(self, prompt: str, system_prompt: Optional[str], mode: str) -> str:
+        """In-flight key: identical prompt and model settings produce identical requests"""
+        return request_key(prompt, system_prompt, mode=mode, model=self.model_name,
+                           temperature=self.temperature, max_tokens=self.max_tokens)
+    
+    async def safe_call(self, prompt: str, context: Optional[Dict[str, Any]] = None,
+                        estimated_input_tokens: Optional[int] = None,
+                        system_prompt: Optional[str] = None) -> str:
         """
         Safe async LLM call with rate limiting and error handling
         
+        Identical calls already in flight are coalesced: the duplicate awaits
+        the first call's result instead of spending quota. Calls are bounded by
+        the per-call deadline and hedged when slower than the hedge percentile.
+        
         Args:
-            prompt: The prompt to send to LLM
-            context: Optional context for logging/caching
+            prompt: The prompt to send to LLM (user message; the variable part when system_prompt is set)
+            context: Optional context for logging/caching; {"interaction": ..., "attempt": ...} labels the call's telemetry
+            estimated_input_tokens: Precomputed estimate (e.g. from CompiledPrompt); skips tokenizing the prompt
+            system_prompt: Optional static instruction prefix, sent as a cacheable system message
         
         Returns:
             LLM response text
         """
-        estimated_input_tokens = self.rate_limiter.estimate_tokens(prompt)
+        if estimated_input_tokens is None:
+            estimated_input_tokens = self.rate_limiter.estimate_tokens((system_prompt or "") + prompt)
         
-        try:
-            # Acquire rate limit permission
-            await self.rate_limiter.acquire(estimated_input_tokens)
+        with self.telemetry.track(prompt, system_prompt, "call", self.model_name, context) as trace:
+            async def call() -> str:
+                return await self.latency_control.run(
+                    lambda: self._call(prompt, estimated_input_tokens, system_prompt, trace),
+                    estimated_input_tokens=estimated_input_tokens
+                )
             
+            if self.single_flight is None:
+                return await call()
+            return await self.single_flight.run(self._request_key(prompt, system_prompt, "call"), call)
+    
+    async def _call(self, prompt: str, estimated_input_tokens: int, system_prompt: Optional[str],
+                    trace: CallTrace) -> str:
+        """Make one rate-limited API call"""
+        # Acquire rate limit permission
+        queued_at = time.monotonic()
+        reservation = await self.rate_limiter.acquire(estimated_input_tokens)
+        sent_at = trace.request_sent(queued_at)
+        mark_request_sent()
+        
+        try:
             # Make async LLM call
-            response = await self.llm.ainvoke(prompt)
+            response = await self.llm.ainvoke(self._build_messages(prompt, system_prompt))
+            trace.first_byte(sent_at)
             response_text = response.content.strip()
             
             # Update rate limiter with actual usage if available
-            actual_input_tokens = getattr(response, 'usage_metadata', {}).get('input_tokens', estimated_input_tokens)
-            actual_output_tokens = getattr(response, 'usage_metadata', {}).get('output_tokens', len(response_text) // 4)
+            usage = getattr(response, 'usage_metadata', None) or {}
+            actual_input_tokens = self._charged_input_tokens(usage, estimated_input_tokens)
+            actual_output_tokens = usage.get('output_tokens', len(response_text) // 4)
+            self._record_usage(trace, usage, estimated_input_tokens, actual_output_tokens)
             
-            self.rate_limiter.release(actual_input_tokens, actual_output_tokens)
+            self.rate_limiter.release(reservation, actual_input_tokens, actual_output_tokens)
+            if self.rate_controller:
+                self.rate_controller.record_success(get_response_headers(response))
             
             return response_text
             
+        except asyncio.CancelledError:
+            # Deadline passed or a hedge won: free the slot, the request still counts in the window
+            self.rate_limiter.release(reservation)
+            raise
         except Exception as e:
-            self.rate_limiter.release()
+            self.rate_limiter.release(reservation)
+            if self.rate_controller and is_rate_limit_error(e):
+                self.rate_controller.record_rate_limited(get_response_headers(e))
             print(f"❌ LLM call failed: {e}")
             raise
+    
+    async def safe_stream_call(self, prompt: str, validator: IncrementalJSONValidator,
+                               context: Optional[Dict[str, Any]] = None,
+                               estimated_input_tokens: Optional[int] = None,
+                               system_prompt: Optional[str] = None) -> str:
+        """
+        Streaming LLM call that validates output incrementally and aborts early
+        
+        Identical streaming calls already in flight are coalesced; a duplicate
+        runs the shared response through its own validator. Deadlines and
+        hedging apply as in safe_call; a hedge streams into a copy of the validator.
+        
+        Args:
+            prompt: The prompt to send to LLM (user message; the variable part when system_prompt is set)
+            validator: Incremental validator fed with each streamed chunk
+            context: Optional context for logging/caching; {"interaction": ..., "attempt": ...} labels the call's telemetry
+            estimated_input_tokens: Optional precomputed input token estimate
+            system_prompt: Optional static instruction prefix, sent as a cacheable system message
+        
+        Returns:
+            LLM response text
+        
+        Raises:
+            StreamValidationError: Output became invalid; the request was cancelled
+        """
+        if estimated_input_tokens is None:
+            estimated_input_tokens = self.rate_limiter.estimate_tokens((system_prompt or "") + prompt)
+        
+        issued = []
+        
+        with self.telemetry.track(prompt, system_prompt, "stream", self.model_name, context) as trace:
+            async def call() -> str:
+                issued.append(True)
+                hedge_validator = copy.deepcopy(validator)  # Copied before the first chunk is fed
+                return await self.latency_control.run(
+                    lambda: self._stream_call(prompt, validator, estimated_input_tokens, system_prompt, trace),
+                    hedge_call=lambda: self._stream_call(prompt, hedge_validator, estimated_input_tokens,
+                                                         system_prompt, trace),
+                    estimated_input_tokens=estimated_input_tokens
+                )
+            
+            if self.single_flight is None:
+                return await call()
+            response_text = await self.single_flight.run(self._request_key(prompt, system_prompt, "stream"), call)
+            if not issued:
+                validator.feed(response_text)
+            return response_text
+    
+    async def _stream_call(self, prompt: str, validator: IncrementalJSONValidator,
+                           estimated_input_tokens: int, system_prompt: Optional[str],
+                           trace: CallTrace) -> str:
+        """Make one rate-limited streaming API call"""
+        queued_at = time.monotonic()
+        reservation = await self.rate_limiter.acquire(estimated_input_tokens)
+        sent_at = trace.request_sent(queued_at)
+        mark_request_sent()
+        
+        stream = None
+        try:
+            text_parts = []
+            input_usage: Dict[str, Any] = {}
+            actual_output_tokens = 0
+            stream = self.llm.astream(self._build_messages(prompt, system_prompt))
+            async for chunk in stream:
+                usage = getattr(chunk, 'usage_metadata', None) or {}
+                if usage.get('input_tokens'):
+                    # Input usage (with cache details) arrives once, in the message_start chunk
+                    input_usage = usage
+                actual_output_tokens += usage.get('output_tokens', 0)
+                
+                text = chunk_text(chunk.content)
+                if text:
+                    trace.first_byte(sent_at)
+                    text_parts.append(text)
+                    validator.feed(text)
+            
+            response_text = "".join(text_parts).strip()
+            actual_output_tokens = actual_output_tokens or len(response_text) // 4
+            self._record_usage(trace, input_usage, estimated_input_tokens, actual_output_tokens)
+            self.rate_limiter.release(reservation,
+                                      self._charged_input_tokens(input_usage, estimated_input_tokens),
+                                      actual_output_tokens)
+            if self.rate_controller:
+                self.rate_controller.record_success()
+            
+            return response_text
+        
+        except StreamValidationError as e:
+            # Cancelled on purpose: charge what was actually generated
+            partial_output_tokens = self.rate_limiter.estimate_tokens(e.partial_text)
+            trace.record_usage(estimated_input_tokens, partial_output_tokens)
+            self.rate_limiter.release(reservation, estimated_input_tokens, partial_output_tokens)
+            print(f"⚠️ Streaming response aborted: {e.reason}")
+            raise
+        except asyncio.CancelledError:
+            self.rate_limiter.release(reservation)
+            raise
+        except Exception as e:
+            self.rate_limiter.release(reservation)
+            if self.rate_controller and is_rate_limit_error(e):
+                self.rate_controller.record_rate_limited(get_response_headers(e))
+            print(f"❌ LLM streaming call failed: {e}")
+            raise
+        finally:
+            if stream is not None:
+                # Closing the generator cancels the underlying HTTP stream
+                await stream.aclose()
+    
+    async def batch_call(self, prompts: Dict[str, str], state_dir: Path,
+                         on_result: Optional[Callable[[str, str], None]] = None,
+                         **backend_kwargs) -> Dict[str, Optional[str]]:
+        """
+        Run many prompts as one offline Message Batches job
+        
+        Batch requests are not charged against the per-minute limits, so the
+        rate limiter is bypassed. Job state lives in `state_dir`; calling again
+        with the same prompts after a restart resumes the submitted job.
+        
+        Args:
+            prompts: custom_id -> prompt
+            state_dir: Directory for persisted job state
+            on_result: Optional callback(custom_id, response_text) per succeeded request
+            **backend_kwargs: Extra MessageBatchBackend options (poll_interval, base_url, ...)
+        
+        Returns:
+            custom_id -> response text, or None for failed requests
+        """
+        backend = MessageBatchBackend(self.model_name, self.temperature, self.max_tokens,
+                                      state_dir, **backend_kwargs)
+        return await backend.run(prompts, on_result)
+
+
+def chunk_text(content: Any) -> str:
+    """Extract text from a streamed message chunk (plain string or list of content blocks)"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(
+            block.get("text", "") if isinstance(block, dict) else str(block)
+            for block in content
+        )
+    return ""
 
 
 # Global LLM manager instance
-_global_llm_manager: Optional[LLMManager] = None
+_global_llm_manager: Optional[Union[LLMManager, LLMRouter]] = None
 
 
 def initialize_global_llm(model_name: str = "claude-sonnet-4-20250514",
                          temperature: float = 0.15,
                          max_tokens: int = 4096,
-                         rate_limiter: Optional[RateLimiter] = None) -> LLMManager:
-    """Initialize global LLM manager"""
+                         rate_limiter: Optional[RateLimiter] = None,
+                         adaptive_rate_control: bool = True,
+                         coalesce_requests: bool = True,
+                         call_timeout: Optional[float] = None,
+                         hedge_percentile: Optional[float] = None,
+                         providers: Optional[List[str]] = None,
+                         backend: str = "live",
+                         mock_options: Optional[Dict[str, Any]] = None,
+                         trace_path: Optional[Path] = None) -> Union[LLMManager, LLMRouter]:
+    """
+    Initialize global LLM manager
+    
+    With `providers` (e.g. ["anthropic", "openrouter"]) the global manager is an
+    LLMRouter that spreads calls across those providers and fails over between them.
+    With backend "replay" or "synthetic" no provider is called at all: a
+    MockLLMManager answers from recorded responses or generated ones, configured
+    by `mock_options` (see MockLLMManager).
+    Every call is traced by one shared LLMTelemetry (`.telemetry` on the returned
+    manager); with `trace_path` each call is also appended there as JSONL.
+    """
     global _global_llm_manager
-    _global_llm_manager = LLMManager(model_name, temperature, max_tokens, rate_limiter)
+    telemetry = LLMTelemetry(trace_path)
+    if backend != "live":
+        from .mock_llm import MockLLMManager
+        mock_options = dict(mock_options or {})
+        if rate_limiter is not None:
+            # Keep the script's concurrency but not its (shared) token budget
+            mock_options.setdefault("max_concurrent_requests", rate_limiter.max_concurrent_requests)
+        _global_llm_manager = MockLLMManager(backend, model_name, temperature, max_tokens,
+                                             coalesce_requests=coalesce_requests, call_timeout=call_timeout,
+                                             hedge_percentile=hedge_percentile, telemetry=telemetry, **mock_options)
+    elif providers:
+        _global_llm_manager = create_llm_router(providers, model_name, temperature, max_tokens, rate_limiter,
+                                                adaptive_rate_control, coalesce_requests, call_timeout,
+                                                hedge_percentile, telemetry)
+    else:
+        _global_llm_manager = LLMManager(model_name, temperature, max_tokens, rate_limiter, adaptive_rate_control,
+                                         coalesce_requests, call_timeout, hedge_percentile, telemetry)
     return _global_llm_manager
 
 
-def get_global_llm() -> LLMManager:
+def get_global_llm() -> Union[LLMManager, LLMRouter]:
     """Get global LLM manager, initializing if needed"""
     global _global_llm_manager
     if _global_llm_manager is None:
@@ -100,16 +384,44 @@ def get_global_llm() -> LLMManager:
     return _global_llm_manager
 
 
-async def safe_llm_call(prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+async def safe_llm_call(prompt: str, context: Optional[Dict[str, Any]] = None,
+                        estimated_input_tokens: Optional[int] = None,
+                        system_prompt: Optional[str] = None) -> str:
     """
     Convenient function for safe LLM calls using global manager
     
     Args:
         prompt: The prompt to send to LLM
-        context: Optional context for logging/caching
+        context: Optional context for logging/caching; {"interaction": ..., "attempt": ...} labels the call's telemetry
+        estimated_input_tokens: Optional precomputed input token estimate
+        system_prompt: Optional static instruction prefix, sent as a cacheable system message
     
     Returns:
         LLM response text
     """
     llm_manager = get_global_llm()
-    return await llm_manager.safe_call(prompt, context) 
\ No newline at end of file
+    return await llm_manager.safe_call(prompt, context, estimated_input_tokens, system_prompt)
+
+
+async def safe_llm_stream_call(prompt: str, validator: IncrementalJSONValidator,
+                               context: Optional[Dict[str, Any]] = None,
+                               estimated_input_tokens: Optional[int] = None,
+                               system_prompt: Optional[str] = None) -> str:
+    """
+    Convenient function for streaming, incrementally validated LLM calls using global manager
+    
+    Args:
+        prompt: The prompt to send to LLM
+        validator: Incremental validator; the call aborts as soon as it rejects the output
+        context: Optional context for logging/caching; {"interaction": ..., "attempt": ...} labels the call's telemetry
+        estimated_input_tokens: Optional precomputed input token estimate
+        system_prompt: Optional static instruction prefix, sent as a cacheable system message
+    
+    Returns:
+        LLM response text
+    
+    Raises:
+        StreamValidationError: Output became invalid and the request was cancelled
+    """
+    llm_manager = get_global_llm()
+    return await llm_manager.safe_stream_call(prompt, validator, context, estimated_input_tokens, system_prompt) 
\ No newline at end of file
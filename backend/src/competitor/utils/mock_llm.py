@@ -0,0 +1,455 @@
+"""
+Deterministic mock LLM backend for offline pipeline runs and benchmarks.
+
+MockLLMManager is an LLMManager whose chat model never touches the network,
+so rate limiting, coalescing, streaming validation and deadlines run exactly
+as in a live run. Two modes:
+- replay: answer from recorded LLMCache entries, segment_products cache files
+  and llm_log input/response dumps, matched on the exact prompt text
+- synthetic: generate schema-valid responses for each pipeline prompt
+  (extraction, categorize, consolidate, final_assign, taxonomy, refine)
+
+Latency and injected failures are drawn from a RNG seeded by the prompt, so
+the same run produces the same timings and failures every time.
+
+Usage:
+    LLM_BACKEND=synthetic MOCK_LLM_LATENCY=0.2 python3 process_reviews.py
+    LLM_BACKEND=replay python3 categorize_review_aspects.py
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sqlite3
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+from .cache_utils import CACHE_DB_FILENAME, get_sqlite_cache_store
+from .llm_utils import LLMManager
+from .llm_telemetry import LLMTelemetry, detect_interaction_type
+from .prompt_utils import count_tokens
+from .rate_limiter import RateLimiter
+
+
+MOCK_MODES = ("replay", "synthetic")
+
+
+class MockLLMError(Exception):
+    """Injected provider failure; carries a status code like the SDK errors"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Mock LLM error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class ReplayMissError(LookupError):
+    """No recorded response for a prompt in strict replay mode"""
+
+
+# === REPLAY ===
+
+def _modified_at(path: Path) -> str:
+    """File modification time as an ISO timestamp, comparable with cache timestamps"""
+    return datetime.fromtimestamp(path.stat().st_mtime).isoformat()
+
+
+class ReplayIndex:
+    """Recorded prompt -> response pairs loaded from cache and log directories"""
+
+    def __init__(self, directories: Iterable[Path] = ()):
+        """
+        Initialize index
+
+        Args:
+            directories: Directories scanned recursively for recorded responses
+        """
+        self.responses: Dict[str, str] = {}
+        self._recorded_at: Dict[str, str] = {}
+        for directory in directories:
+            self.add_directory(Path(directory))
+
+    @staticmethod
+    def key(prompt: str) -> str:
+        """Index key of a prompt (whitespace at the ends is ignored)"""
+        return hashlib.sha256(prompt.strip().encode('utf-8')).hexdigest()
+
+    def add(self, prompt: str, response: str, recorded_at: str = "") -> None:
+        """Record one prompt/response pair; the most recent recording of a prompt wins"""
+        key = self.key(prompt)
+        if key in self.responses and recorded_at < self._recorded_at[key]:
+            return
+        self.responses[key] = response
+        self._recorded_at[key] = recorded_at
+
+    def add_directory(self, directory: Path) -> int:
+        """
+        Load every recorded pair under a directory
+
+        Understands LLMCache files ({"data": {"prompt", "response"}}) and
+        SQLite cache stores holding the same entries, the segment_products cache files ({"prompt", "response"}) and llm_log
+        dumps (<name>_input.txt next to <name>_response.txt).
+
+        Returns:
+            Number of pairs added
+        """
+        if not directory.exists():
+            return 0
+
+        before = len(self.responses)
+        for path in directory.rglob("*.json"):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if not isinstance(data, dict):
+                continue
+            record = data.get("data") if isinstance(data.get("data"), dict) else data
+            if isinstance(record.get("prompt"), str) and isinstance(record.get("response"), str):
+                self.add(record["prompt"], record["response"], str(data.get("timestamp") or _modified_at(path)))
+
+        for db_path in directory.rglob(CACHE_DB_FILENAME):
+            try:
+                entries = list(get_sqlite_cache_store(db_path).iter_entries("llm"))
+            except sqlite3.Error:
+                continue
+            for _, _, entry in entries:
+                record = entry.get("data")
+                if isinstance(record, dict) and isinstance(record.get("prompt"), str) \
+                        and isinstance(record.get("response"), str):
+                    self.add(record["prompt"], record["response"], str(entry.get("timestamp", "")))
+
+        for input_path in directory.rglob("*_input.txt"):
+            response_path = input_path.with_name(input_path.name[:-len("_input.txt")] + "_response.txt")
+            if response_path.exists():
+                self.add(input_path.read_text(encoding='utf-8'), response_path.read_text(encoding='utf-8'),
+                         _modified_at(response_path))
+
+        return len(self.responses) - before
+
+    def lookup(self, prompt: str) -> Optional[str]:
+        """Recorded response for a prompt, or None"""
+        return self.responses.get(self.key(prompt))
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+
+# === SYNTHETIC RESPONSES ===
+
+def _bracket_ids(text: str) -> List[str]:
+    """IDs of "[<ID>] <text>" input lines, in order, without duplicates"""
+    return list(dict.fromkeys(re.findall(r'^\[([^\]]+)\]\s', text, re.MULTILINE)))
+
+
+def _split(items: List[Any], parts: int) -> List[List[Any]]:
+    """Split items round robin into at most `parts` non-empty groups"""
+    groups = [items[i::parts] for i in range(parts)]
+    return [group for group in groups if group]
+
+
+def _category_count(item_count: int) -> int:
+    return max(1, min(5, item_count // 5))
+
+
+def synthesize_extraction(text: str) -> str:
+    """Review hierarchy (phy/perf/use) citing the review IDs of the "<ID>#<review>" input lines"""
+    review_ids = list(dict.fromkeys(int(match) for match in re.findall(r'^(\d+)#', text, re.MULTILINE)))
+    positive, negative = review_ids[::2], review_ids[1::2]
+
+    def by_sentiment(make_leaf: Callable[[List[int]], Any]) -> Dict[str, Any]:
+        sentiments = {}
+        if positive:
+            sentiments["+"] = make_leaf(positive)
+        if negative:
+            sentiments["-"] = make_leaf(negative)
+        return sentiments
+
+    if not review_ids:
+        return json.dumps({"phy": {}, "perf": {}, "use": {}})
+
+    # Reasons cite the physical aspect with the same review IDs, so sentiments stay consistent
+    return json.dumps({
+        "phy": {"Housing": {"A@Sturdy housing material": by_sentiment(lambda ids: ids)}},
+        "perf": {"Durability": {"a@Holds up under daily use": by_sentiment(lambda ids: {"A": ids})}},
+        "use": {"Home wiring": by_sentiment(lambda ids: {"a": ids})},
+    }, indent=2)
+
+
+def synthesize_categorize(text: str) -> str:
+    """Category definitions for the aspects after **INPUT:**, with a few ids OUT_OF_SCOPE"""
+    input_start = text.find("**INPUT:**")
+    aspect_ids = _bracket_ids(text[input_start:] if input_start >= 0 else text)
+    result = {
+        f"Synthetic Category {i + 1}": {"definition": f"Aspects grouped for offline benchmarking, e.g. group {i + 1}"}
+        for i in range(_category_count(len(aspect_ids)))
+    }
+    result["OUT_OF_SCOPE"] = {
+        "definition": "Aspects that are too generic to categorize, e.g. vague praise",
+        "ids": aspect_ids[::10],
+    }
+    return json.dumps(result, indent=2)
+
+
+def synthesize_consolidate(text: str) -> str:
+    """Consolidation pairing A_i with B_i; every A_*/B_* id appears exactly once"""
+    a_ids = list(dict.fromkeys(re.findall(r'"(A_\d+)"', text)))
+    b_ids = list(dict.fromkeys(re.findall(r'"(B_\d+)"', text)))
+    result = {}
+    for i in range(max(len(a_ids), len(b_ids))):
+        ids = ([a_ids[i]] if i < len(a_ids) else []) + ([b_ids[i]] if i < len(b_ids) else [])
+        result[f"Consolidated Category {i + 1}"] = {
+            "definition": f"Merged category for offline benchmarking, e.g. group {i + 1}",
+            "ids": ids,
+        }
+    return json.dumps(result, indent=2)
+
+
+def synthesize_final_assign(text: str) -> str:
+    """Map every aspect after **INPUT:** to one of the listed categories"""
+    categories_start = text.find("**AVAILABLE CATEGORIES:**")
+    input_start = text.find("**INPUT:**")
+    category_ids = []
+    if 0 <= categories_start < input_start:
+        for line in text[categories_start:input_start].splitlines():
+            line = line.strip()
+            if not line or line.startswith("**"):
+                continue
+            match = re.match(r'^\[([^\]]+)\]', line)
+            category_ids.append(match.group(1) if match else line.split(":", 1)[0].strip())
+    category_ids = list(dict.fromkeys(category_ids)) or ["OUT_OF_SCOPE"]
+
+    aspect_ids = _bracket_ids(text[input_start:] if input_start >= 0 else text)
+    return json.dumps({aspect_id: category_ids[i % len(category_ids)] for i, aspect_id in enumerate(aspect_ids)},
+                      indent=2)
+
+
+def synthesize_taxonomy(text: str) -> str:
+    """Product subcategories covering every "[<ID>] <title>" product exactly once"""
+    product_ids = [int(product_id) for product_id in _bracket_ids(text) if product_id.isdigit()]
+    result = {}
+    for i, ids in enumerate(_split(product_ids, _category_count(len(product_ids)))):
+        result[f"Synthetic Subcategory {i + 1}"] = {
+            "definition": f"Products grouped for offline benchmarking, e.g. subtype {i + 1}",
+            "ids": ids,
+        }
+    return json.dumps(result, indent=2)
+
+
+def synthesize_refine(text: str) -> str:
+    """No reassignments"""
+    return "{}"
+
+
+# Responder per interaction type (see llm_telemetry.INTERACTION_MARKERS)
+SYNTHETIC_RESPONDERS: Dict[str, Callable[[str], str]] = {
+    "extraction": synthesize_extraction,
+    "categorize": synthesize_categorize,
+    "consolidate": synthesize_consolidate,
+    "final_assign": synthesize_final_assign,
+    "taxonomy": synthesize_taxonomy,
+    "refine": synthesize_refine,
+}
+
+
+def synthesize_response(text: str) -> str:
+    """Schema-valid response for a pipeline prompt ("{}" for unrecognized prompts)"""
+    responder = SYNTHETIC_RESPONDERS.get(detect_interaction_type(text))
+    return responder(text) if responder else "{}"
+
+
+# === MOCK MODEL ===
+
+class MockChatModel:
+    """Stand-in for ChatAnthropic answering from replayed or synthetic responses"""
+
+    def __init__(self,
+                 mode: str = "synthetic",
+                 replay_index: Optional[ReplayIndex] = None,
+                 replay_fallback: bool = True,
+                 latency_seconds: float = 0.5,
+                 latency_jitter: float = 0.5,
+                 failure_rate: float = 0.0,
+                 seed: int = 0,
+                 stream_chunk_chars: int = 64):
+        """
+        Initialize mock model
+
+        Args:
+            mode: "replay" or "synthetic"
+            replay_index: Recorded responses (replay mode)
+            replay_fallback: Synthesize a response on a replay miss instead of raising ReplayMissError
+            latency_seconds: Mean simulated latency per call
+            latency_jitter: Latency varies uniformly within +/- this fraction of the mean
+            failure_rate: Share of calls that fail with an injected 529 overloaded error
+            seed: Seed mixed into every per-call RNG
+            stream_chunk_chars: Characters per streamed chunk
+        """
+        if mode not in MOCK_MODES:
+            raise ValueError(f"Unknown mock LLM mode: {mode}")
+        self.mode = mode
+        self.replay_index = replay_index or ReplayIndex()
+        self.replay_fallback = replay_fallback
+        self.latency_seconds = latency_seconds
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.stream_chunk_chars = stream_chunk_chars
+        self._occurrences: Dict[str, int] = defaultdict(int)
+        self.stats = {
+            "calls": 0,
+            "replayed": 0,
+            "replay_misses": 0,
+            "synthesized": 0,
+            "failures_injected": 0,
+        }
+
+    @staticmethod
+    def _prompt_text(messages: Union[str, List[BaseMessage]]) -> str:
+        """Concatenate the text of the model input (system prefix + user prompt)"""
+        if isinstance(messages, str):
+            return messages
+        parts = []
+        for message in messages:
+            content = message.content
+            if isinstance(content, str):
+                parts.append(content)
+            else:
+                parts.extend(block.get("text", "") for block in content if isinstance(block, dict))
+        return "".join(parts)
+
+    def _rng(self, text: str) -> random.Random:
+        """RNG for the n-th call with this prompt, independent of call ordering"""
+        key = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        occurrence = self._occurrences[key]
+        self._occurrences[key] += 1
+        return random.Random(f"{self.seed}:{key}:{occurrence}")
+
+    async def _respond(self, messages: Union[str, List[BaseMessage]]) -> Tuple[str, str]:
+        """Wait the simulated latency, then return (prompt text, response text) or raise an injected failure"""
+        self.stats["calls"] += 1
+        text = self._prompt_text(messages)
+        rng = self._rng(text)
+        await asyncio.sleep(max(0.0, self.latency_seconds * (1 + self.latency_jitter * (2 * rng.random() - 1))))
+
+        if rng.random() < self.failure_rate:
+            self.stats["failures_injected"] += 1
+            raise MockLLMError(529, "Overloaded (injected failure)")
+
+        if self.mode == "replay":
+            response = self.replay_index.lookup(text)
+            if response is not None:
+                self.stats["replayed"] += 1
+                return text, response
+            self.stats["replay_misses"] += 1
+            if not self.replay_fallback:
+                raise ReplayMissError("No recorded response for prompt")
+
+        self.stats["synthesized"] += 1
+        return text, synthesize_response(text)
+
+    @staticmethod
+    def _usage(text: str, response: str) -> Dict[str, int]:
+        input_tokens, output_tokens = count_tokens(text), count_tokens(response)
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens}
+
+    async def ainvoke(self, messages: Union[str, List[BaseMessage]]) -> AIMessage:
+        """Answer like ChatAnthropic.ainvoke"""
+        text, response = await self._respond(messages)
+        return AIMessage(content=response, usage_metadata=self._usage(text, response))
+
+    async def astream(self, messages: Union[str, List[BaseMessage]]) -> AsyncIterator[AIMessageChunk]:
+        """Answer like ChatAnthropic.astream; usage arrives with the last chunk"""
+        text, response = await self._respond(messages)
+        for start in range(0, len(response), self.stream_chunk_chars):
+            yield AIMessageChunk(content=response[start:start + self.stream_chunk_chars])
+        yield AIMessageChunk(content="", usage_metadata=self._usage(text, response))
+
+
+class MockLLMManager(LLMManager):
+    """LLMManager backed by MockChatModel for offline runs"""
+
+    def __init__(self,
+                 mode: str = "synthetic",
+                 model_name: str = "claude-sonnet-4-20250514",
+                 temperature: float = 0.15,
+                 max_tokens: int = 4096,
+                 rate_limiter: Optional[RateLimiter] = None,
+                 max_concurrent_requests: int = 20,
+                 replay_dirs: Iterable[Path] = (),
+                 replay_fallback: bool = True,
+                 latency_seconds: float = 0.5,
+                 latency_jitter: float = 0.5,
+                 failure_rate: float = 0.0,
+                 seed: int = 0,
+                 coalesce_requests: bool = True,
+                 call_timeout: Optional[float] = None,
+                 hedge_percentile: Optional[float] = None,
+                 telemetry: Optional[LLMTelemetry] = None):
+        """
+        Initialize mock manager
+
+        Args:
+            mode: "replay" or "synthetic"
+            model_name: Model name (only used for cache keys and logs)
+            temperature: Model temperature setting
+            max_tokens: Maximum tokens per response
+            rate_limiter: Optional limiter; by default a private one limited only by concurrency,
+                so offline runs never spend the host-wide shared budget
+            max_concurrent_requests: Concurrency of the private limiter
+            replay_dirs: Directories with recorded responses (replay mode)
+            replay_fallback: Synthesize a response on a replay miss instead of failing
+            latency_seconds: Mean simulated latency per call
+            latency_jitter: Latency varies uniformly within +/- this fraction of the mean
+            failure_rate: Share of calls failing with an injected 529 error
+            seed: Seed for the deterministic per-call RNG
+            coalesce_requests: Let identical concurrent calls share one in-flight request
+            call_timeout: Per-call deadline in seconds
+            hedge_percentile: Hedge calls slower than this latency quantile
+            telemetry: Per-call telemetry sink (default: a private one)
+        """
+        replay_index = ReplayIndex(replay_dirs) if mode == "replay" else None
+        self.mock = MockChatModel(mode, replay_index, replay_fallback, latency_seconds, latency_jitter,
+                                  failure_rate, seed)
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(
+                max_requests_per_minute=10**9,
+                max_input_tokens_per_minute=10**12,
+                max_output_tokens_per_minute=10**12,
+                max_concurrent_requests=max_concurrent_requests,
+                model_max_tokens=max_tokens
+            )
+        super().__init__(model_name, temperature, max_tokens, rate_limiter, adaptive_rate_control=False,
+                         coalesce_requests=coalesce_requests, call_timeout=call_timeout,
+                         hedge_percentile=hedge_percentile, telemetry=telemetry)
+        if replay_index is not None:
+            print(f"🧪 Replay LLM backend loaded {len(replay_index)} recorded responses")
+        else:
+            print(f"🧪 Synthetic LLM backend: {latency_seconds}s latency, {failure_rate:.0%} injected failures")
+
+    def _initialize_llm(self) -> MockChatModel:
+        """Use the mock model instead of ChatAnthropic"""
+        return self.mock
+
+    async def batch_call(self, prompts: Dict[str, str], state_dir: Path,
+                         on_result: Optional[Callable[[str, str], None]] = None,
+                         **backend_kwargs) -> Dict[str, Optional[str]]:
+        """Answer a batch job with concurrent mock calls (no job state is written)"""
+        async def one(custom_id: str, prompt: str) -> Optional[str]:
+            try:
+                response_text = await self.safe_call(prompt)
+            except Exception:
+                return None
+            if on_result:
+                on_result(custom_id, response_text)
+            return response_text
+
+        responses = await asyncio.gather(*(one(custom_id, prompt) for custom_id, prompt in prompts.items()))
+        return dict(zip(prompts, responses))
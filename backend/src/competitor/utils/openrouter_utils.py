@@ -15,9 +15,31 @@ OpenRouter LLM utilities - 与现有LLM接口完全兼容的OpenRouter实现
 import os
 import asyncio
 import aiohttp
+import copy
 import json
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional, Tuple
 from .rate_limiter import RateLimiter
+from .rate_limit_registry import get_shared_rate_limiter
+from .adaptive_rate_control import AdaptiveRateController, is_rate_limit_error
+from .streaming_json import IncrementalJSONValidator, StreamValidationError
+from .single_flight import SingleFlight, request_key
+from .latency_control import LatencyController, mark_request_sent
+from .llm_telemetry import CallTrace, LLMTelemetry
+
+
+OPENROUTER_CHAT_COMPLETIONS_URL = "https://openrouter.ai/api/v1/chat/completions"
+# 未设置call_timeout时，单次HTTP请求的总超时 = request_timeout × 该系数
+TOTAL_TIMEOUT_FACTOR = 10
+
+
+class OpenRouterAPIError(Exception):
+    """OpenRouter返回非200状态码时抛出，保留状态码和响应头供速率控制使用"""
+    
+    def __init__(self, status_code: int, error_text: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(f"OpenRouter API错误 {status_code}: {error_text}")
+        self.status_code = status_code
+        self.headers = headers or {}
 
 
 class OpenRouterManager:
@@ -27,7 +49,19 @@ class OpenRouterManager:
                  model_name: str = "anthropic/claude-3.5-sonnet",
                  temperature: float = 0.15,
                  max_tokens: int = 4096,
-                 rate_limiter: Optional[RateLimiter] = None):
+                 rate_limiter: Optional[RateLimiter] = None,
+                 adaptive_rate_control: bool = True,
+                 base_url: Optional[str] = None,
+                 api_key: Optional[str] = None,
+                 connection_pool_size: Optional[int] = None,
+                 dns_cache_ttl: int = 300,
+                 keepalive_timeout: float = 30.0,
+                 request_timeout: float = 60.0,
+                 coalesce_requests: bool = True,
+                 call_timeout: Optional[float] = None,
+                 hedge_percentile: Optional[float] = None,
+                 telemetry: Optional[LLMTelemetry] = None,
+                 total_timeout: Optional[float] = None):
         """
         初始化OpenRouter管理器
         
@@ -36,85 +70,330 @@ class OpenRouterManager:
             temperature: 温度设置
             max_tokens: 最大token数
             rate_limiter: 可选的速率限制器
+            adaptive_rate_control: 根据429和速率限制响应头自动调整限额
+            base_url: 可选的API地址（默认OPENROUTER_BASE_URL环境变量或官方地址，可指向本地测试服务）
+            api_key: 可选的API密钥（默认读取OPENROUTER_API_KEY环境变量）
+            connection_pool_size: 连接池大小（默认与速率限制器的最大并发数一致）
+            dns_cache_ttl: DNS缓存时间（秒）
+            keepalive_timeout: 空闲连接保持时间（秒）
+            request_timeout: 读取超时（秒）：连接上无数据到达的最长时间，长时间流式输出不受影响
+            coalesce_requests: 合并并发中的相同请求，重复调用等待第一个请求的结果
+            call_timeout: 单次调用的整体截止时间（秒，None表示不限）
+            hedge_percentile: 调用耗时超过该延迟分位数（如0.95）时发出一个对冲请求，取先返回者（None表示不对冲）
+            telemetry: 逐次调用的遥测记录（可与其他管理器共享，默认新建一个）
+            total_timeout: 单次HTTP请求的总超时（秒）：防止服务端缓慢滴漏数据无限占用请求；
+                           默认取call_timeout，未设置时为request_timeout × TOTAL_TIMEOUT_FACTOR
         """
         self.model_name = model_name
         self.temperature = temperature
         self.max_tokens = max_tokens
-        self.rate_limiter = rate_limiter or RateLimiter(model_max_tokens=max_tokens)
+        self.rate_limiter = rate_limiter or get_shared_rate_limiter(model_name, model_max_tokens=max_tokens)
+        self.rate_controller = AdaptiveRateController(self.rate_limiter) if adaptive_rate_control else None
+        self.single_flight = SingleFlight() if coalesce_requests else None
+        self.latency_control = LatencyController(self.rate_limiter, call_timeout, hedge_percentile)
+        self.telemetry = telemetry or LLMTelemetry()
         
         # OpenRouter API配置
-        self.api_key = os.getenv("OPENROUTER_API_KEY")
+        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
         if not self.api_key:
             raise ValueError("OPENROUTER_API_KEY环境变量未设置")
         
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.base_url = base_url or os.getenv("OPENROUTER_BASE_URL", OPENROUTER_CHAT_COMPLETIONS_URL)
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "HTTP-Referer": "https://github.com/leviton-switch-demo",  # 可选：用于analytics
             "X-Title": "Leviton Switch Competitor Analysis",  # 可选：用于analytics
             "Content-Type": "application/json"
         }
+        
+        # 长连接会话：由管理器持有，所有请求复用连接池（首次调用时在当前事件循环中创建）
+        if connection_pool_size is None:
+            connection_pool_size = self.rate_limiter.max_concurrent_requests
+            if self.rate_controller:
+                connection_pool_size = max(connection_pool_size, self.rate_controller.max_concurrent_requests)
+        self.connection_pool_size = connection_pool_size
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.total_timeout = total_timeout or call_timeout or request_timeout * TOTAL_TIMEOUT_FACTOR
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取长连接会话；会话已关闭或事件循环已更换时重新创建"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_pool_size,
+                limit_per_host=self.connection_pool_size,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=self.headers,
+                # 读取超时只管两次数据之间的间隔；总超时兜底，即使未设置call_timeout也不会被滴漏数据无限占用
+                timeout=aiohttp.ClientTimeout(total=self.total_timeout, sock_read=self.request_timeout)
+            )
+            self._session_loop = loop
+        return self._session
     
-    async def safe_call(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+    async def _post_chat_completion(self, payload: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        通过长连接会话发送chat completions请求
+        
+        Returns:
+            (响应JSON, 响应头)
+        """
+        session = self._get_session()
+        async with session.post(self.base_url, json=payload) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                raise OpenRouterAPIError(response.status, error_text, dict(response.headers))
+            
+            return await response.json(), dict(response.headers)
+    
+    async def close(self) -> None:
+        """关闭长连接会话，释放连接池"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+    
+    async def __aenter__(self) -> "OpenRouterManager":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+    
+    def _build_messages(self, prompt: str, system_prompt: Optional[str]) -> List[Dict[str, Any]]:
+        """构建消息列表；静态系统前缀标记为可缓存（cache_control 会透传给Anthropic）"""
+        messages = []
+        if system_prompt:
+            messages.append({
+                "role": "system",
+                "content": [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+            })
+        messages.append({"role": "user", "content": prompt})
+        return messages
+    
+    def _charged_input_tokens(self, usage: Dict[str, Any], default: int) -> int:
+        """计入ITPM限额的输入token（缓存命中部分不计入）"""
+        prompt_tokens = usage.get("prompt_tokens")
+        if not prompt_tokens:
+            return default
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        return max(1, prompt_tokens - cached_tokens)
+    
+    @staticmethod
+    def _record_usage(trace: CallTrace, usage: Dict[str, Any], estimated_input_tokens: int, output_tokens: int) -> None:
+        """把一次请求的token用量（含缓存命中）计入调用追踪"""
+        cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        trace.record_usage(usage.get("prompt_tokens") or estimated_input_tokens, output_tokens, cached_tokens)
+    
+    def _request_key(self, prompt: str, system_prompt: Optional[str], mode: str) -> str:
+        """进行中请求的键：提示和模型设置完全相同即为相同请求"""
+        return request_key(prompt, system_prompt, mode=mode, model=self.model_name,
+                           temperature=self.temperature, max_tokens=self.max_tokens)
+    
+    async def safe_call(self, prompt: str, context: Optional[Dict[str, Any]] = None,
+                        estimated_input_tokens: Optional[int] = None,
+                        system_prompt: Optional[str] = None) -> str:
         """
         安全的异步LLM调用，与现有接口完全兼容
+        相同的并发请求会被合并，只发送一次；受单次截止时间和对冲策略控制
         
         Args:
-            prompt: 发送给LLM的提示
-            context: 可选的上下文信息
+            prompt: 发送给LLM的提示（设置system_prompt时为可变部分）
+            context: 可选的上下文信息；{"interaction": ..., "attempt": ...} 用于标注遥测
+            estimated_input_tokens: 预先计算的输入token估计（如CompiledPrompt），跳过重复分词
+            system_prompt: 可选的静态指令前缀，作为可缓存的系统消息发送
         
         Returns:
             LLM响应文本
         """
-        estimated_input_tokens = self.rate_limiter.estimate_tokens(prompt)
+        if estimated_input_tokens is None:
+            estimated_input_tokens = self.rate_limiter.estimate_tokens((system_prompt or "") + prompt)
         
-        try:
-            # 获取速率限制许可
-            await self.rate_limiter.acquire(estimated_input_tokens)
+        with self.telemetry.track(prompt, system_prompt, "call", self.model_name, context) as trace:
+            async def call() -> str:
+                return await self.latency_control.run(
+                    lambda: self._call(prompt, estimated_input_tokens, system_prompt, trace),
+                    estimated_input_tokens=estimated_input_tokens
+                )
             
+            if self.single_flight is None:
+                return await call()
+            return await self.single_flight.run(self._request_key(prompt, system_prompt, "call"), call)
+    
+    async def _call(self, prompt: str, estimated_input_tokens: int, system_prompt: Optional[str],
+                    trace: CallTrace) -> str:
+        """发起一次受速率限制的API调用"""
+        # 获取速率限制许可（排队时间计入遥测）
+        queued_at = time.monotonic()
+        reservation = await self.rate_limiter.acquire(estimated_input_tokens)
+        sent_at = trace.request_sent(queued_at)
+        mark_request_sent()
+        
+        try:
             # 准备OpenRouter API请求
             payload = {
                 "model": self.model_name,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
+                "messages": self._build_messages(prompt, system_prompt),
                 "temperature": self.temperature,
                 "max_tokens": self.max_tokens,
                 "stream": False
             }
             
-            # 发送异步请求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    headers=self.headers,
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=60)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"OpenRouter API错误 {response.status}: {error_text}")
-                    
-                    result = await response.json()
+            # 发送异步请求（复用长连接）
+            result, response_headers = await self._post_chat_completion(payload)
+            trace.first_byte(sent_at)
             
             # 提取响应内容
             response_text = result["choices"][0]["message"]["content"].strip()
             
             # 更新速率限制器的实际使用量
-            actual_input_tokens = result.get("usage", {}).get("prompt_tokens", estimated_input_tokens)
+            actual_input_tokens = self._charged_input_tokens(result.get("usage") or {}, estimated_input_tokens)
             actual_output_tokens = result.get("usage", {}).get("completion_tokens", len(response_text) // 4)
+            self._record_usage(trace, result.get("usage") or {}, estimated_input_tokens, actual_output_tokens)
             
-            self.rate_limiter.release(actual_input_tokens, actual_output_tokens)
+            self.rate_limiter.release(reservation, actual_input_tokens, actual_output_tokens)
+            if self.rate_controller:
+                self.rate_controller.record_success(response_headers)
             
             return response_text
             
+        except asyncio.CancelledError:
+            # 超过截止时间或对冲请求先返回：释放并发槽位
+            self.rate_limiter.release(reservation)
+            raise
         except Exception as e:
-            self.rate_limiter.release()
+            self.rate_limiter.release(reservation)
+            if self.rate_controller and is_rate_limit_error(e):
+                self.rate_controller.record_rate_limited(getattr(e, "headers", None))
             print(f"❌ OpenRouter LLM调用失败: {e}")
             raise
+    
+    async def safe_stream_call(self, prompt: str, validator: IncrementalJSONValidator,
+                               context: Optional[Dict[str, Any]] = None,
+                               estimated_input_tokens: Optional[int] = None,
+                               system_prompt: Optional[str] = None) -> str:
+        """
+        流式LLM调用：逐块增量校验JSON，输出结构无效时立即中止请求
+        
+        Args:
+            prompt: 发送给LLM的提示（设置system_prompt时为可变部分）
+            validator: 增量校验器，每收到一块文本就喂入
+            context: 可选的上下文信息；{"interaction": ..., "attempt": ...} 用于标注遥测
+            estimated_input_tokens: 预先计算的输入token估计
+            system_prompt: 可选的静态指令前缀，作为可缓存的系统消息发送
+        
+        Returns:
+            LLM响应文本
+        
+        Raises:
+            StreamValidationError: 输出无效，请求已被取消
+        """
+        if estimated_input_tokens is None:
+            estimated_input_tokens = self.rate_limiter.estimate_tokens((system_prompt or "") + prompt)
+        
+        issued = []
+        
+        with self.telemetry.track(prompt, system_prompt, "stream", self.model_name, context) as trace:
+            async def call() -> str:
+                issued.append(True)
+                hedge_validator = copy.deepcopy(validator)  # 在喂入第一块之前复制，供对冲请求使用
+                return await self.latency_control.run(
+                    lambda: self._stream_call(prompt, validator, estimated_input_tokens, system_prompt, trace),
+                    hedge_call=lambda: self._stream_call(prompt, hedge_validator, estimated_input_tokens,
+                                                         system_prompt, trace),
+                    estimated_input_tokens=estimated_input_tokens
+                )
+            
+            if self.single_flight is None:
+                return await call()
+            response_text = await self.single_flight.run(self._request_key(prompt, system_prompt, "stream"), call)
+            if not issued:
+                # 合并的重复请求：用自己的校验器校验共享的响应
+                validator.feed(response_text)
+            return response_text
+    
+    async def _stream_call(self, prompt: str, validator: IncrementalJSONValidator,
+                           estimated_input_tokens: int, system_prompt: Optional[str],
+                           trace: CallTrace) -> str:
+        """发起一次受速率限制的流式API调用"""
+        queued_at = time.monotonic()
+        reservation = await self.rate_limiter.acquire(estimated_input_tokens)
+        sent_at = trace.request_sent(queued_at)
+        mark_request_sent()
+        
+        try:
+            payload = {
+                "model": self.model_name,
+                "messages": self._build_messages(prompt, system_prompt),
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "stream": True,
+                "stream_options": {"include_usage": True}
+            }
+            
+            text_parts = []
+            usage = {}
+            session = self._get_session()
+            async with session.post(self.base_url, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise OpenRouterAPIError(response.status, error_text, dict(response.headers))
+                response_headers = dict(response.headers)
+                
+                try:
+                    # SSE格式：每行 "data: {...}"，以 "data: [DONE]" 结束；其他行（注释/空行）忽略
+                    async for raw_line in response.content:
+                        line = raw_line.decode("utf-8").strip()
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            break
+                        
+                        event = json.loads(data)
+                        usage = event.get("usage") or usage
+                        choices = event.get("choices") or []
+                        text = (choices[0].get("delta") or {}).get("content") if choices else None
+                        if text:
+                            trace.first_byte(sent_at)
+                            text_parts.append(text)
+                            validator.feed(text)
+                except StreamValidationError:
+                    # 关闭连接，让服务端停止生成
+                    response.close()
+                    raise
+            
+            response_text = "".join(text_parts).strip()
+            actual_output_tokens = usage.get("completion_tokens", len(response_text) // 4)
+            self._record_usage(trace, usage, estimated_input_tokens, actual_output_tokens)
+            self.rate_limiter.release(reservation, self._charged_input_tokens(usage, estimated_input_tokens),
+                                      actual_output_tokens)
+            if self.rate_controller:
+                self.rate_controller.record_success(response_headers)
+            
+            return response_text
+        
+        except StreamValidationError as e:
+            partial_output_tokens = self.rate_limiter.estimate_tokens(e.partial_text)
+            trace.record_usage(estimated_input_tokens, partial_output_tokens)
+            self.rate_limiter.release(reservation, estimated_input_tokens, partial_output_tokens)
+            print(f"⚠️ OpenRouter流式响应已中止: {e.reason}")
+            raise
+        except asyncio.CancelledError:
+            self.rate_limiter.release(reservation)
+            raise
+        except Exception as e:
+            self.rate_limiter.release(reservation)
+            if self.rate_controller and is_rate_limit_error(e):
+                self.rate_controller.record_rate_limited(getattr(e, "headers", None))
+            print(f"❌ OpenRouter流式调用失败: {e}")
+            raise
 
 
 class OpenRouterResponse:
@@ -202,9 +481,23 @@ class CompatibleLLMManager:
             self.manager = LLMManager(model_name, temperature, max_tokens, rate_limiter)
             self.is_openrouter = False
     
-    async def safe_call(self, prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+    async def safe_call(self, prompt: str, context: Optional[Dict[str, Any]] = None,
+                        estimated_input_tokens: Optional[int] = None,
+                        system_prompt: Optional[str] = None) -> str:
         """统一的安全调用接口"""
-        return await self.manager.safe_call(prompt, context)
+        return await self.manager.safe_call(prompt, context, estimated_input_tokens, system_prompt)
+    
+    async def safe_stream_call(self, prompt: str, validator: IncrementalJSONValidator,
+                               context: Optional[Dict[str, Any]] = None,
+                               estimated_input_tokens: Optional[int] = None,
+                               system_prompt: Optional[str] = None) -> str:
+        """统一的流式校验调用接口"""
+        return await self.manager.safe_stream_call(prompt, validator, context, estimated_input_tokens, system_prompt)
+    
+    async def close(self) -> None:
+        """关闭底层管理器持有的连接"""
+        if self.is_openrouter:
+            await self.manager.close()
     
     @property
     def llm(self):
@@ -214,6 +507,21 @@ class CompatibleLLMManager:
         else:
             return self.manager.llm
 
+    @property
+    def single_flight(self):
+        """底层管理器的相同请求合并器（未启用合并时为None）"""
+        return self.manager.single_flight
+
+    @property
+    def latency_control(self):
+        """底层管理器的延迟控制（截止时间、对冲与延迟直方图）"""
+        return self.manager.latency_control
+
+    @property
+    def telemetry(self):
+        """底层管理器的逐次调用遥测"""
+        return self.manager.telemetry
+
 
 # === 全局管理器替换函数 ===
 
@@ -227,13 +535,21 @@ def create_compatible_llm_manager(model_name: str = "claude-sonnet-4-20250514",
 
 # === 便捷的切换函数 ===
 
-async def safe_llm_call_openrouter(prompt: str, context: Optional[Dict[str, Any]] = None) -> str:
+_openrouter_call_manager: Optional[CompatibleLLMManager] = None
+
+
+async def safe_llm_call_openrouter(prompt: str, context: Optional[Dict[str, Any]] = None,
+                                   estimated_input_tokens: Optional[int] = None,
+                                   system_prompt: Optional[str] = None) -> str:
     """
     使用OpenRouter的安全LLM调用
-    这是一个独立的函数，可以直接替换原有的safe_llm_call
+    这是一个独立的函数，可以直接替换原有的safe_llm_call（参数相同）
+    复用同一个管理器，使所有调用共享长连接会话
     """
-    manager = CompatibleLLMManager()
-    return await manager.safe_call(prompt, context)
+    global _openrouter_call_manager
+    if _openrouter_call_manager is None:
+        _openrouter_call_manager = CompatibleLLMManager()
+    return await _openrouter_call_manager.safe_call(prompt, context, estimated_input_tokens, system_prompt)
 
 
 # === 模型选择指南 ===
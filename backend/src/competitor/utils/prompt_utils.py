@@ -5,11 +5,148 @@ Provides:
 - Prompt file loading with error handling
 - Template substitution
 - Prompt validation
+- Compiled templates with pre-tokenized static segments for cheap token estimates
 """
 
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from string import Formatter
+from typing import Dict, Any, Optional, List, Tuple
 import re
+import tiktoken
+
+
+PLACEHOLDER_PATTERN = re.compile(r'\{\{(\w+)\}\}')
+
+_tokenizer = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with the same tokenizer the rate limiter uses
+    
+    Args:
+        text: Text to count
+        
+    Returns:
+        Token count (len // 4 fallback when tiktoken is unavailable)
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            _tokenizer = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _tokenizer = False
+    if _tokenizer:
+        return len(_tokenizer.encode(text))
+    return len(text) // 4
+
+
+class CompiledPrompt:
+    """Prompt template split once into static and variable segments"""
+    
+    def __init__(self, template: str, style: str = "placeholder"):
+        """
+        Compile a template
+        
+        Args:
+            template: Template text
+            style: "placeholder" for {{VARIABLE}} templates (substitute_template),
+                   "format" for str.format templates with {variable} fields
+        """
+        self.template = template
+        self.style = style
+        # Each segment is (static_text, variable_name or None, format_spec, conversion)
+        self.segments: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+        
+        if style == "placeholder":
+            position = 0
+            for match in PLACEHOLDER_PATTERN.finditer(template):
+                self.segments.append((template[position:match.start()], match.group(1), "", None))
+                position = match.end()
+            self.segments.append((template[position:], None, "", None))
+        elif style == "format":
+            for literal, field_name, format_spec, conversion in Formatter().parse(template):
+                self.segments.append((literal, field_name, format_spec or "", conversion))
+        else:
+            raise ValueError(f"Unknown template style: {style}")
+        
+        self.variables = [name for _, name, _, _ in self.segments if name is not None]
+        # Token counts are summed per segment; BPE merges across segment
+        # boundaries make this an estimate within a few tokens of the full count
+        self.static_tokens = sum(count_tokens(text) for text, _, _, _ in self.segments if text)
+    
+    def _render_value(self, name: str, substitutions: Dict[str, Any], format_spec: str,
+                      conversion: Optional[str]) -> str:
+        """Render one variable segment"""
+        if self.style == "placeholder":
+            # Unknown placeholders are left in place, matching substitute_template
+            if name not in substitutions:
+                return f"{{{{{name}}}}}"
+            return str(substitutions[name])
+        
+        formatter = Formatter()
+        value = formatter.convert_field(substitutions[name], conversion)
+        return formatter.format_field(value, format_spec)
+    
+    def render_with_estimate(self, substitutions: Dict[str, Any]) -> Tuple[str, int]:
+        """
+        Render the prompt and estimate its tokens, tokenizing only substituted values
+        
+        Args:
+            substitutions: Dictionary of variable->value mappings
+            
+        Returns:
+            Tuple of (prompt text, estimated input tokens)
+        """
+        parts = []
+        variable_tokens = 0
+        for text, name, format_spec, conversion in self.segments:
+            parts.append(text)
+            if name is not None:
+                value = self._render_value(name, substitutions, format_spec, conversion)
+                parts.append(value)
+                variable_tokens += count_tokens(value)
+        return "".join(parts), self.static_tokens + variable_tokens
+    
+    def render_parts(self, substitutions: Dict[str, Any], boundary: str = "INPUT") -> Tuple[str, str, int]:
+        """
+        Render the prompt split at a variable, for prompt-prefix caching
+        
+        Everything before the first occurrence of `boundary` (the instruction
+        block) forms the static prefix sent as a cacheable system message; the
+        boundary value and everything after it form the variable user message.
+        prefix + suffix equals render(substitutions).
+        
+        Args:
+            substitutions: Dictionary of variable->value mappings
+            boundary: Variable that starts the per-call payload (e.g. "INPUT")
+        
+        Returns:
+            Tuple of (prefix text, suffix text, estimated input tokens)
+        """
+        if boundary not in self.variables:
+            raise ValueError(f"Template has no '{boundary}' variable to split at")
+        
+        prefix_parts, suffix_parts = [], []
+        parts = prefix_parts
+        variable_tokens = 0
+        for text, name, format_spec, conversion in self.segments:
+            parts.append(text)
+            if name is not None:
+                if name == boundary:
+                    parts = suffix_parts
+                value = self._render_value(name, substitutions, format_spec, conversion)
+                parts.append(value)
+                variable_tokens += count_tokens(value)
+        return "".join(prefix_parts), "".join(suffix_parts), self.static_tokens + variable_tokens
+    
+    def render(self, substitutions: Dict[str, Any]) -> str:
+        """Render the prompt with substitutions applied"""
+        return self.render_with_estimate(substitutions)[0]
+    
+    def estimate_tokens(self, substitutions: Dict[str, Any]) -> int:
+        """Estimate prompt tokens without tokenizing the static template text"""
+        return self.render_with_estimate(substitutions)[1]
 
 
 class PromptManager:
@@ -26,6 +163,7 @@ class PromptManager:
         self.prompt_dir = prompt_dir
         self.subdirectory = subdirectory
         self.loaded_prompts: Dict[str, str] = {}
+        self.compiled_prompts: Dict[Tuple[str, str], CompiledPrompt] = {}
     
     def get_prompt_path(self, filename: str) -> Path:
         """Get full path to prompt file"""
@@ -81,6 +219,35 @@ class PromptManager:
             result = result.replace(placeholder, str(value))
         return result
     
+    def compile_template(self, template: str, style: str = "placeholder") -> CompiledPrompt:
+        """
+        Compile a template once, caching the token counts of its static segments
+        
+        Args:
+            template: Template string
+            style: "placeholder" ({{variable}}) or "format" (str.format fields)
+            
+        Returns:
+            Compiled prompt
+        """
+        key = (template, style)
+        if key not in self.compiled_prompts:
+            self.compiled_prompts[key] = CompiledPrompt(template, style)
+        return self.compiled_prompts[key]
+    
+    def compile_prompt(self, filename: str, style: str = "placeholder") -> CompiledPrompt:
+        """
+        Load a prompt file and compile it
+        
+        Args:
+            filename: Name of the prompt file
+            style: "placeholder" ({{variable}}) or "format" (str.format fields)
+            
+        Returns:
+            Compiled prompt
+        """
+        return self.compile_template(self.load_prompt(filename), style)
+    
     def extract_template_variables(self, template: str) -> List[str]:
         """
         Extract template variable names from prompt template
@@ -149,6 +316,24 @@ def load_prompt(filename: str, prompt_dir: Path, subdirectory: str = "") -> str:
     return manager.load_prompt(filename)
 
 
+def compile_prompt(filename: str, prompt_dir: Path, subdirectory: str = "",
+                   style: str = "placeholder") -> CompiledPrompt:
+    """
+    Load and compile a single prompt file
+    
+    Args:
+        filename: Name of the prompt file
+        prompt_dir: Base directory for prompt files
+        subdirectory: Optional subdirectory
+        style: "placeholder" ({{variable}}) or "format" (str.format fields)
+        
+    Returns:
+        Compiled prompt
+    """
+    manager = PromptManager(prompt_dir, subdirectory)
+    return manager.compile_prompt(filename, style)
+
+
 def build_prompt_with_substitutions(filename: str, prompt_dir: Path, 
                                    substitutions: Dict[str, str],
                                    subdirectory: str = "") -> str:
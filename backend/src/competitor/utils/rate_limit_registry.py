@@ -0,0 +1,316 @@
+"""
+Host-wide shared rate limit budgets for LLM API calls.
+
+Every script on a host (process_reviews.py, categorize_review_aspects.py,
+segment_products.py, util/gpts.py, ...) draws from the same per-model
+request/input/output token budget, so running them side by side no longer
+overruns the account quota.
+
+Provides:
+- SharedRateLimitStore: SQLite (WAL) window of reservations shared by all processes
+- SharedRateLimiter: RateLimiter that reserves in the shared store before granting
+- get_shared_rate_limiter: per-model registry so each process uses one limiter per model
+
+Concurrency (max_concurrent_requests) stays a per-process limit; the request
+and token windows, as well as retry-after pauses, are host-wide.
+
+All SQLite work runs on the store's own thread: a database locked by another
+process delays the reservation that waits for it, never the event loop and
+the other calls in flight on it.
+
+Environment:
+    LLM_RATE_LIMIT_DB: path of the shared SQLite file (default: system temp dir)
+    LLM_SHARED_RATE_LIMITS: set to "false" to fall back to per-process limiters
+"""
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .rate_limiter import RateLimiter, Reservation, seconds_until_capacity
+
+
+DEFAULT_RATE_LIMIT_DB = Path(tempfile.gettempdir()) / "leviton_switch_llm_rate_limits.sqlite3"
+
+
+class SharedRateLimitStore:
+    """SQLite-backed sliding window shared by every process on the host"""
+
+    def __init__(self, db_path: Path):
+        """
+        Initialize shared store
+
+        Args:
+            db_path: SQLite database file, created if missing
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # Every statement runs on this one thread, so waiting on another process's lock never blocks a loop
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit-store")
+        # Autocommit mode; reservations use explicit BEGIN IMMEDIATE transactions
+        self.connection = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                budget TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                requests INTEGER NOT NULL,
+                input_tokens INTEGER NOT NULL,
+                output_tokens INTEGER NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS usage_budget_time ON usage (budget, timestamp)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS pauses (
+                budget TEXT PRIMARY KEY,
+                paused_until REAL NOT NULL
+            )
+        """)
+
+    async def run(self, method: Callable[..., Any], *args) -> Any:
+        """Run a store method on the store thread and await its result"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, method, *args)
+
+    def submit(self, method: Callable[..., Any], *args) -> None:
+        """Queue a store method on the store thread without waiting for it (usage updates, pauses)"""
+        self.executor.submit(method, *args).add_done_callback(_report_store_error)
+
+    def try_reserve(self, budget: str, input_tokens: int, output_tokens: int,
+                    limits: Tuple[int, int, int], window_seconds: float) -> Tuple[Optional[int], float]:
+        """
+        Atomically reserve one request in the shared window if it fits
+
+        Args:
+            budget: Budget name (model name)
+            input_tokens: Estimated input tokens for the request
+            output_tokens: Estimated output tokens for the request
+            limits: (requests, input_tokens, output_tokens) allowed per window
+            window_seconds: Length of the sliding window
+
+        Returns:
+            (reservation_id, 0.0) when granted, (None, seconds_to_wait) otherwise
+        """
+        now = time.time()
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute("DELETE FROM usage WHERE budget = ? AND timestamp <= ?",
+                           (budget, now - window_seconds))
+
+            row = cursor.execute("SELECT paused_until FROM pauses WHERE budget = ?", (budget,)).fetchone()
+            if row and row[0] > now:
+                cursor.execute("COMMIT")
+                return None, row[0] - now
+
+            usage = cursor.execute(
+                "SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(input_tokens), 0), COALESCE(SUM(output_tokens), 0) "
+                "FROM usage WHERE budget = ?", (budget,)
+            ).fetchone()
+            needed = (1, input_tokens, output_tokens)
+
+            if all(used + need <= limit for used, need, limit in zip(usage, needed, limits)):
+                cursor.execute(
+                    "INSERT INTO usage (budget, timestamp, requests, input_tokens, output_tokens) VALUES (?, ?, 1, ?, ?)",
+                    (budget, now, input_tokens, output_tokens)
+                )
+                reservation_id = cursor.lastrowid
+                cursor.execute("COMMIT")
+                return reservation_id, 0.0
+
+            entries = cursor.execute(
+                "SELECT timestamp, requests, input_tokens, output_tokens FROM usage "
+                "WHERE budget = ? ORDER BY timestamp", (budget,)
+            ).fetchall()
+            cursor.execute("COMMIT")
+            return None, seconds_until_capacity(entries, usage, needed, limits, window_seconds, now)
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def update_usage(self, reservation_id: int, input_tokens: Optional[int], output_tokens: Optional[int]) -> None:
+        """Replace a reservation's estimates with actual token counts"""
+        if input_tokens:
+            self.connection.execute("UPDATE usage SET input_tokens = ? WHERE id = ?", (input_tokens, reservation_id))
+        if output_tokens:
+            self.connection.execute("UPDATE usage SET output_tokens = ? WHERE id = ?", (output_tokens, reservation_id))
+
+    def pause(self, budget: str, seconds: float) -> None:
+        """Block new reservations on a budget for every process (provider retry-after)"""
+        paused_until = time.time() + seconds
+        self.connection.execute(
+            "INSERT INTO pauses (budget, paused_until) VALUES (?, ?) "
+            "ON CONFLICT(budget) DO UPDATE SET paused_until = MAX(paused_until, excluded.paused_until)",
+            (budget, paused_until)
+        )
+
+    def get_usage(self, budget: str, window_seconds: float = 60.0) -> Dict[str, int]:
+        """Current host-wide usage of a budget inside the window"""
+        requests, input_tokens, output_tokens = self.connection.execute(
+            "SELECT COALESCE(SUM(requests), 0), COALESCE(SUM(input_tokens), 0), COALESCE(SUM(output_tokens), 0) "
+            "FROM usage WHERE budget = ? AND timestamp > ?", (budget, time.time() - window_seconds)
+        ).fetchone()
+        return {"requests": requests, "input_tokens": input_tokens, "output_tokens": output_tokens}
+
+
+def _report_store_error(future: Future) -> None:
+    error = future.exception()
+    if error is not None:
+        print(f"⚠️ Shared rate limit store update failed: {error}")
+
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter whose request and token windows are shared host-wide through a SharedRateLimitStore"""
+
+    def __init__(self, budget_name: str, store: SharedRateLimitStore, **limiter_kwargs):
+        """
+        Initialize shared rate limiter
+
+        Args:
+            budget_name: Shared budget to draw from (model name)
+            store: Host-wide store holding the shared window
+            **limiter_kwargs: RateLimiter limits (per-window budgets and per-process concurrency)
+        """
+        super().__init__(**limiter_kwargs)
+        self.budget_name = budget_name
+        self.store = store
+        # Earliest monotonic time the shared store can grant the next request
+        self._shared_wait_until = 0.0
+
+    def _seconds_until_available(self, input_tokens: int, output_tokens: int, now: float) -> float:
+        """Local estimate, extended by the last wait reported by the shared store"""
+        local_wait = super()._seconds_until_available(input_tokens, output_tokens, now)
+        return max(local_wait, self._shared_wait_until - now)
+
+    async def acquire(self, estimated_input_tokens: int, estimated_output_tokens: Optional[int] = None) -> Reservation:
+        """
+        Acquire locally, then reserve the same request in the shared store
+
+        Args:
+            estimated_input_tokens: Estimated input tokens of the request
+            estimated_output_tokens: Estimated output tokens (default: half of model_max_tokens)
+
+        Returns:
+            Reservation carrying the shared row id, to pass to release()
+        """
+        reservation = await super().acquire(estimated_input_tokens, estimated_output_tokens)
+        limits = (self.max_requests_per_minute, self.max_input_tokens_per_minute, self.max_output_tokens_per_minute)
+        try:
+            while True:
+                shared_id, wait = await self.store.run(
+                    self.store.try_reserve, self.budget_name,
+                    reservation.input_tokens, reservation.output_tokens, limits, self.window_seconds
+                )
+                if shared_id is not None:
+                    reservation.shared_id = shared_id
+                    return reservation
+                # Hold back later local grants too while the host-wide budget is exhausted
+                self._shared_wait_until = max(self._shared_wait_until, time.monotonic() + wait)
+                await asyncio.sleep(max(wait, 0.01))
+        except BaseException:
+            super().release(reservation)
+            raise
+
+    def release(self, reservation: Optional[Reservation],
+                actual_input_tokens: Optional[int] = None, actual_output_tokens: Optional[int] = None):
+        """Record the request's actual usage host-wide (on the store thread), then release locally"""
+        if (reservation is not None and reservation.shared_id is not None
+                and (actual_input_tokens or actual_output_tokens)):
+            self.store.submit(self.store.update_usage, reservation.shared_id, actual_input_tokens, actual_output_tokens)
+        super().release(reservation, actual_input_tokens, actual_output_tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Pause this budget for every process on the host"""
+        if seconds > 0:
+            self.store.submit(self.store.pause, self.budget_name, seconds)
+        super().pause(seconds)
+
+
+# Per-process registries
+_stores: Dict[str, SharedRateLimitStore] = {}
+# Limiters per event loop (model -> limiter). Keyed by the loop itself, so an id() recycled by a
+# new loop can never return a limiter bound to a dead one; the limiter's asyncio primitives may
+# reference their loop, which keeps the weak key alive, so entries of closed loops are also dropped
+_loop_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, RateLimiter]]" = \
+    weakref.WeakKeyDictionary()
+_unbound_limiters: Dict[str, RateLimiter] = {}  # Requested outside a running loop
+
+
+def shared_rate_limits_enabled() -> bool:
+    """Check whether host-wide shared budgets are enabled"""
+    return os.getenv("LLM_SHARED_RATE_LIMITS", "true").lower() in ("true", "1", "yes")
+
+
+def get_rate_limit_store(db_path: Optional[Path] = None) -> SharedRateLimitStore:
+    """Get the process-wide store for a database path"""
+    db_path = Path(db_path or os.getenv("LLM_RATE_LIMIT_DB") or DEFAULT_RATE_LIMIT_DB)
+    key = str(db_path.resolve())
+    if key not in _stores:
+        _stores[key] = SharedRateLimitStore(db_path)
+    return _stores[key]
+
+
+def get_shared_rate_limiter(model_name: str,
+                            max_requests_per_minute: int = 1900,
+                            max_input_tokens_per_minute: int = 75000,
+                            max_output_tokens_per_minute: int = 30000,
+                            max_concurrent_requests: int = 20,
+                            model_max_tokens: int = 4096,
+                            db_path: Optional[Path] = None) -> RateLimiter:
+    """
+    Get the rate limiter for a model, shared by every caller in this process
+    and drawing from the host-wide budget for that model.
+
+    The first call for a model fixes its limits; later calls return the same
+    instance. Limiters are bound to the event loop they are first requested in
+    (or to no loop at import time), because asyncio primitives cannot move
+    between loops - scripts that call asyncio.run repeatedly get one limiter
+    per loop, all drawing from the same shared store. Limiters of closed
+    loops are dropped.
+
+    Args:
+        model_name: Model name, used as the shared budget name
+        max_requests_per_minute: Maximum requests per minute
+        max_input_tokens_per_minute: Maximum input tokens per minute
+        max_output_tokens_per_minute: Maximum output tokens per minute
+        max_concurrent_requests: Maximum concurrent requests in this process
+        model_max_tokens: Maximum tokens per model call
+        db_path: Optional shared store location
+
+    Returns:
+        Rate limiter for the model
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        limiters = _unbound_limiters
+    else:
+        for closed_loop in [other for other in _loop_limiters.keys() if other.is_closed()]:
+            del _loop_limiters[closed_loop]
+        limiters = _loop_limiters.setdefault(loop, {})
+
+    if model_name in limiters:
+        return limiters[model_name]
+
+    limiter_kwargs = dict(
+        max_requests_per_minute=max_requests_per_minute,
+        max_input_tokens_per_minute=max_input_tokens_per_minute,
+        max_output_tokens_per_minute=max_output_tokens_per_minute,
+        max_concurrent_requests=max_concurrent_requests,
+        model_max_tokens=model_max_tokens
+    )
+    if shared_rate_limits_enabled():
+        limiter = SharedRateLimiter(model_name, get_rate_limit_store(db_path), **limiter_kwargs)
+    else:
+        limiter = RateLimiter(**limiter_kwargs)
+
+    limiters[model_name] = limiter
+    return limiter
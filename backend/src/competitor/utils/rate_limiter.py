@@ -6,13 +6,78 @@ Provides token-aware rate limiting for Claude API calls with:
 - Input/output token limiting
 - Concurrent request limiting
 - Token estimation
+
+RateLimiter is event driven: usage inside the sliding window is kept as
+running counters, blocked callers wait in a FIFO queue, and a single timer
+wakes the queue exactly when the oldest window entries expire.
+
+acquire() returns a Reservation handle for the granted request; passing it
+back to release() corrects that request's own window entry with the actual
+token usage, however many calls are in flight.
 """
 
 import asyncio
 import time
 import tiktoken
 from collections import deque
-from typing import Optional
+from typing import Deque, Iterable, Optional, Tuple
+
+
+def seconds_until_capacity(entries: Iterable[Tuple[float, int, int, int]],
+                           usage: Tuple[int, int, int],
+                           needed: Tuple[int, int, int],
+                           limits: Tuple[int, int, int],
+                           window_seconds: float,
+                           now: float) -> float:
+    """
+    Compute how long until a request fits under request/input/output limits.
+    
+    Walks the window entries from the oldest and returns the moment enough
+    of them have expired to cover the excess on every limit.
+    
+    Args:
+        entries: Window entries (timestamp, requests, input_tokens, output_tokens), oldest first
+        usage: Current (requests, input_tokens, output_tokens) inside the window
+        needed: (requests, input_tokens, output_tokens) the new request needs
+        limits: (requests, input_tokens, output_tokens) allowed per window
+        window_seconds: Length of the sliding window
+        now: Current time on the same clock as the entry timestamps
+    
+    Returns:
+        Seconds to wait, 0.0 if the request fits now
+    """
+    excess = [used + need - limit for used, need, limit in zip(usage, needed, limits)]
+    if all(value <= 0 for value in excess):
+        return 0.0
+    
+    for timestamp, requests, input_tokens, output_tokens in entries:
+        excess[0] -= requests
+        excess[1] -= input_tokens
+        excess[2] -= output_tokens
+        if all(value <= 0 for value in excess):
+            return max(0.0, timestamp + window_seconds - now)
+    
+    return window_seconds
+
+
+class Reservation:
+    """Window entry of one granted request, returned by acquire() and handed back to release()"""
+    
+    __slots__ = ("timestamp", "requests", "input_tokens", "output_tokens", "expired", "shared_id")
+    
+    def __init__(self, timestamp: float, input_tokens: int, output_tokens: int):
+        self.timestamp = timestamp
+        self.requests = 1
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        # Set once the entry has left the window; later corrections no longer touch the counters
+        self.expired = False
+        # Row id in a host-wide store (SharedRateLimiter)
+        self.shared_id: Optional[int] = None
+    
+    def __iter__(self):
+        """Unpack as (timestamp, requests, input_tokens, output_tokens) like other window entries"""
+        return iter((self.timestamp, self.requests, self.input_tokens, self.output_tokens))
 
 
 class RateLimiter:
@@ -23,7 +88,8 @@ class RateLimiter:
                  max_input_tokens_per_minute: int = 75000,
                  max_output_tokens_per_minute: int = 30000,
                  max_concurrent_requests: int = 20,
-                 model_max_tokens: int = 4096):
+                 model_max_tokens: int = 4096,
+                 window_seconds: float = 60.0):
         """
         Initialize rate limiter with Claude Sonnet 4 defaults
         
@@ -33,17 +99,31 @@ class RateLimiter:
             max_output_tokens_per_minute: Maximum output tokens per minute
             max_concurrent_requests: Maximum concurrent requests
             model_max_tokens: Maximum tokens per model call
+            window_seconds: Length of the sliding rate limit window
         """
         self.max_requests_per_minute = max_requests_per_minute
         self.max_input_tokens_per_minute = max_input_tokens_per_minute
         self.max_output_tokens_per_minute = max_output_tokens_per_minute
         self.max_concurrent_requests = max_concurrent_requests
         self.model_max_tokens = model_max_tokens
+        self.window_seconds = window_seconds
+        
+        # Sliding window of granted requests, oldest first
+        self.window: Deque[Reservation] = deque()
+        self.requests_in_window = 0
+        self.input_tokens_in_window = 0
+        self.output_tokens_in_window = 0
+        
+        # FIFO queue of callers blocked on rate limits: (future resolving to the Reservation, input_tokens, output_tokens)
+        self.waiters: Deque[Tuple[asyncio.Future, int, int]] = deque()
+        self._wakeup_handle: Optional[asyncio.TimerHandle] = None
+        
+        # No new requests are granted before this monotonic time (provider retry-after)
+        self.paused_until = 0.0
         
-        self.request_times = deque()
-        self.input_token_times = deque()
-        self.output_token_times = deque()
         self.semaphore = asyncio.Semaphore(max_concurrent_requests)
+        # Concurrency slots still to be retired after a shrink, absorbed as in-flight calls release
+        self._pending_slot_removals = 0
         
         try:
             self.tokenizer = tiktoken.get_encoding("cl100k_base")
@@ -58,72 +138,234 @@ class RateLimiter:
             # Fallback: roughly 4 characters per token
             return len(text) // 4
     
-    def _clean_old_entries(self, deque_obj: deque, window_seconds: int = 60):
-        """Remove entries older than window_seconds"""
-        current_time = time.time()
-        while deque_obj and deque_obj[0][0] < current_time - window_seconds:
-            deque_obj.popleft()
+    def _expire_old_entries(self, now: float) -> None:
+        """Drop window entries older than window_seconds and update the running counters"""
+        cutoff = now - self.window_seconds
+        while self.window and self.window[0].timestamp <= cutoff:
+            entry = self.window.popleft()
+            entry.expired = True
+            self.requests_in_window -= entry.requests
+            self.input_tokens_in_window -= entry.input_tokens
+            self.output_tokens_in_window -= entry.output_tokens
+    
+    def _clamp_to_limits(self, input_tokens: int, output_tokens: int) -> Tuple[int, int]:
+        """Cap a single request at the per-window limits so oversized requests can still run alone"""
+        return (min(input_tokens, self.max_input_tokens_per_minute),
+                min(output_tokens, self.max_output_tokens_per_minute))
+    
+    def _seconds_until_available(self, input_tokens: int, output_tokens: int, now: float) -> float:
+        """
+        Compute how long until a request of the given size fits in the window.
+        
+        An active pause pushes the answer out to the end of the pause.
+        """
+        paused = max(0.0, self.paused_until - now)
+        wait = seconds_until_capacity(
+            self.window,
+            (self.requests_in_window, self.input_tokens_in_window, self.output_tokens_in_window),
+            (1, input_tokens, output_tokens),
+            (self.max_requests_per_minute, self.max_input_tokens_per_minute, self.max_output_tokens_per_minute),
+            self.window_seconds,
+            now
+        )
+        return max(paused, wait)
+    
+    def _try_reserve(self, input_tokens: int, output_tokens: int, now: float) -> Optional[Reservation]:
+        """Record the request in the window if it fits under every limit, None if it does not"""
+        if self._seconds_until_available(input_tokens, output_tokens, now) > 0:
+            return None
+        
+        reservation = Reservation(now, input_tokens, output_tokens)
+        self.window.append(reservation)
+        self.requests_in_window += 1
+        self.input_tokens_in_window += input_tokens
+        self.output_tokens_in_window += output_tokens
+        return reservation
+    
+    def _dispatch(self) -> None:
+        """Grant queued waiters in FIFO order, then arm a timer for the next one"""
+        self._wakeup_handle = None
+        now = time.monotonic()
+        self._expire_old_entries(now)
+        
+        while self.waiters:
+            future, input_tokens, output_tokens = self.waiters[0]
+            if future.done():
+                # Cancelled while waiting
+                self.waiters.popleft()
+                continue
+            reservation = self._try_reserve(input_tokens, output_tokens, now)
+            if reservation is None:
+                break
+            self.waiters.popleft()
+            future.set_result(reservation)
+        
+        self._schedule_wakeup(now)
+    
+    def _schedule_wakeup(self, now: float) -> None:
+        """Arm a single timer that fires when the head waiter's capacity frees up"""
+        if self._wakeup_handle is not None:
+            self._wakeup_handle.cancel()
+            self._wakeup_handle = None
+        
+        if not self.waiters:
+            return
+        
+        _, input_tokens, output_tokens = self.waiters[0]
+        delay = self._seconds_until_available(input_tokens, output_tokens, now)
+        loop = asyncio.get_running_loop()
+        self._wakeup_handle = loop.call_later(delay, self._dispatch)
+    
+    def has_capacity(self, estimated_input_tokens: int, estimated_output_tokens: Optional[int] = None) -> bool:
+        """
+        Check whether a request would be granted right now without queueing
+        
+        Used for optional extra requests (hedges) that should only spend spare budget.
+        """
+        if estimated_output_tokens is None:
+            estimated_output_tokens = self.model_max_tokens // 2
+        if self.waiters or self.semaphore.locked():
+            return False
+        now = time.monotonic()
+        self._expire_old_entries(now)
+        input_tokens, output_tokens = self._clamp_to_limits(estimated_input_tokens, estimated_output_tokens)
+        return self._seconds_until_available(input_tokens, output_tokens, now) <= 0
     
-    def _get_current_usage(self, deque_obj: deque, window_seconds: int = 60) -> int:
-        """Get current usage count within window"""
-        self._clean_old_entries(deque_obj, window_seconds)
-        return sum(entry[1] for entry in deque_obj)
+    def estimated_wait(self, estimated_input_tokens: int, estimated_output_tokens: Optional[int] = None) -> float:
+        """
+        Estimate how long a new request would wait for window budget
+        
+        Queued callers are charged the same size as the new request, so a long
+        queue reads as a long wait. Used to compare remaining quota across providers.
+        """
+        if estimated_output_tokens is None:
+            estimated_output_tokens = self.model_max_tokens // 2
+        now = time.monotonic()
+        self._expire_old_entries(now)
+        input_tokens, output_tokens = self._clamp_to_limits(estimated_input_tokens, estimated_output_tokens)
+        queued = len(self.waiters) + 1
+        return self._seconds_until_available(min(input_tokens * queued, self.max_input_tokens_per_minute),
+                                             min(output_tokens * queued, self.max_output_tokens_per_minute),
+                                             now)
     
-    async def acquire(self, estimated_input_tokens: int, estimated_output_tokens: Optional[int] = None) -> None:
-        """Acquire rate limit permission before making request"""
+    async def acquire(self, estimated_input_tokens: int, estimated_output_tokens: Optional[int] = None) -> Reservation:
+        """
+        Acquire rate limit permission before making request
+        
+        Args:
+            estimated_input_tokens: Estimated input tokens of the request
+            estimated_output_tokens: Estimated output tokens (default: half of model_max_tokens)
+        
+        Returns:
+            Reservation to pass to release() when the request is done
+        """
         if estimated_output_tokens is None:
             estimated_output_tokens = self.model_max_tokens // 2  # Conservative estimate
         
+        input_tokens, output_tokens = self._clamp_to_limits(estimated_input_tokens, estimated_output_tokens)
+        
         # First acquire semaphore for concurrency control
         await self.semaphore.acquire()
         
-        # Then check rate limits in a loop
-        while True:
-            current_time = time.time()
-            
-            # Check current usage within the rate limit window
-            current_requests = self._get_current_usage(self.request_times)
-            current_input_tokens = self._get_current_usage(self.input_token_times)
-            current_output_tokens = self._get_current_usage(self.output_token_times)
-            
-            # Calculate remaining capacity
-            requests_remaining = self.max_requests_per_minute - current_requests
-            input_tokens_remaining = self.max_input_tokens_per_minute - current_input_tokens
-            output_tokens_remaining = self.max_output_tokens_per_minute - current_output_tokens
-            
-            # Check if we can make the request without exceeding any limit
-            can_request = (
-                requests_remaining >= 1 and
-                input_tokens_remaining >= estimated_input_tokens and
-                output_tokens_remaining >= estimated_output_tokens
-            )
-            
-            if can_request:
-                # Record the request immediately to prevent race conditions
-                self.request_times.append((current_time, 1))
-                self.input_token_times.append((current_time, estimated_input_tokens))
-                self.output_token_times.append((current_time, estimated_output_tokens))
-                break
-            else:
-                # Calculate wait time based on most constraining limit
-                request_wait = 60.0 / self.max_requests_per_minute if requests_remaining < 1 else 0
-                token_wait = 2.0 if (input_tokens_remaining < estimated_input_tokens or 
-                                   output_tokens_remaining < estimated_output_tokens) else 0
-                wait_time = max(request_wait, token_wait, 1.0)  # Minimum 1 second
-                await asyncio.sleep(wait_time)
-    
-    def release(self, actual_input_tokens: Optional[int] = None, actual_output_tokens: Optional[int] = None):
-        """Release semaphore and optionally update token counts"""
-        self.semaphore.release()
-        
-        # Update with actual token counts if available
-        if actual_input_tokens is not None or actual_output_tokens is not None:
-            current_time = time.time()
-            # Update the most recent entry with actual values
-            if actual_input_tokens and self.input_token_times:
-                self.input_token_times[-1] = (current_time, actual_input_tokens)
-            if actual_output_tokens and self.output_token_times:
-                self.output_token_times[-1] = (current_time, actual_output_tokens)
+        now = time.monotonic()
+        self._expire_old_entries(now)
+        
+        # Fast path: nobody queued ahead of us and the window has room
+        if not self.waiters:
+            reservation = self._try_reserve(input_tokens, output_tokens, now)
+            if reservation is not None:
+                return reservation
+        
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append((future, input_tokens, output_tokens))
+        if len(self.waiters) == 1:
+            self._schedule_wakeup(now)
+        
+        try:
+            return await future
+        except asyncio.CancelledError:
+            self._release_slot()
+            if self.waiters:
+                self._dispatch()
+            raise
+    
+    def release(self, reservation: Optional[Reservation],
+                actual_input_tokens: Optional[int] = None, actual_output_tokens: Optional[int] = None):
+        """
+        Release semaphore and optionally correct the request's token counts
+        
+        Args:
+            reservation: Reservation returned by acquire() for this request
+            actual_input_tokens: Actual input tokens, replaces the estimate if given
+            actual_output_tokens: Actual output tokens, replaces the estimate if given
+        """
+        self._release_slot()
+        
+        # The entry keeps its grant time, so the window stays ordered; once it has
+        # expired its tokens no longer count and there is nothing to correct
+        if reservation is not None and not reservation.expired and (actual_input_tokens or actual_output_tokens):
+            new_input_tokens = actual_input_tokens or reservation.input_tokens
+            new_output_tokens = actual_output_tokens or reservation.output_tokens
+            self.input_tokens_in_window += new_input_tokens - reservation.input_tokens
+            self.output_tokens_in_window += new_output_tokens - reservation.output_tokens
+            reservation.input_tokens = new_input_tokens
+            reservation.output_tokens = new_output_tokens
+        
+        # Actual usage may be lower than the estimate, so queued callers might fit now
+        if self.waiters:
+            self._dispatch()
+    
+    def _release_slot(self) -> None:
+        """Return a concurrency slot, retiring it instead if the limit was lowered"""
+        if self._pending_slot_removals:
+            self._pending_slot_removals -= 1
+        else:
+            self.semaphore.release()
+    
+    def set_limits(self,
+                   max_requests_per_minute: Optional[int] = None,
+                   max_input_tokens_per_minute: Optional[int] = None,
+                   max_output_tokens_per_minute: Optional[int] = None,
+                   max_concurrent_requests: Optional[int] = None) -> None:
+        """
+        Adjust limits at runtime. Queued callers are re-evaluated immediately.
+        
+        Lowering max_concurrent_requests does not interrupt in-flight calls;
+        the surplus slots are retired as those calls release.
+        """
+        if max_requests_per_minute is not None:
+            self.max_requests_per_minute = max(1, int(max_requests_per_minute))
+        if max_input_tokens_per_minute is not None:
+            self.max_input_tokens_per_minute = max(1, int(max_input_tokens_per_minute))
+        if max_output_tokens_per_minute is not None:
+            self.max_output_tokens_per_minute = max(1, int(max_output_tokens_per_minute))
+        if max_concurrent_requests is not None:
+            self._resize_concurrency(max(1, int(max_concurrent_requests)))
+        
+        if self.waiters:
+            self._dispatch()
+    
+    def _resize_concurrency(self, new_limit: int) -> None:
+        """Grow or shrink the concurrency semaphore to new_limit slots"""
+        delta = new_limit - self.max_concurrent_requests
+        self.max_concurrent_requests = new_limit
+        
+        if delta > 0:
+            # Cancel outstanding retirements first, then open new slots
+            absorbed = min(delta, self._pending_slot_removals)
+            self._pending_slot_removals -= absorbed
+            for _ in range(delta - absorbed):
+                self.semaphore.release()
+        elif delta < 0:
+            self._pending_slot_removals += -delta
+    
+    def pause(self, seconds: float) -> None:
+        """Stop granting new requests for the given number of seconds (e.g. provider retry-after)"""
+        if seconds <= 0:
+            return
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        if self.waiters:
+            self._dispatch()
 
 
 class SimpleRateLimiter:
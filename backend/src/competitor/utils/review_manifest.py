@@ -0,0 +1,258 @@
+"""
+Manifest of scraped review files.
+
+Finding the review files of an ASIN used to mean listing the review
+directory and prefix-matching every file name, once per ASIN. ReviewManifest
+keeps one JSON index next to the review files instead:
+
+    {"version": 2,
+     "asins": {asin: {"files": {filename: {"scrape_date", "review_count",
+                                           "earliest_review_date", "latest_review_date",
+                                           "earliest_reviews_fetched",
+                                           "fetched_all_available_reviews", "max_pages_requested",
+                                           "content_sha256", "size"}},
+                      "summary": {...}}}}
+
+The per-ASIN summary folds the file entries into what the scraper's skip
+decision needs (latest scrape date, review date span, whether the earliest
+or all available reviews were already fetched), so planning a scrape reads
+one small record per ASIN instead of parsing every historical file.
+
+- the scraper calls record() right after writing a review file
+- every change rewrites the manifest atomically (temp file + rename), so a
+  reader never sees a half-written index
+- on first use in a process the directory is listed once: files the manifest
+  does not know yet (older scrapes, copied-in files, a concurrent scraper
+  whose update was overwritten) are indexed and entries of deleted files are
+  dropped
+
+Usage:
+    manifest = get_review_manifest(review_dir)
+    manifest.get_files(asin)
+    manifest.get_summary(asin)
+    manifest.record(filepath, content)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .date_utils import parse_review_date
+from .write_behind import atomic_write_text
+
+MANIFEST_FILENAME = "review_manifest.json"
+MANIFEST_VERSION = 2
+REVIEW_FILE_SUFFIX = "_reviews.json"
+
+
+def get_asin_from_filename(filename: str) -> str:
+    """ASIN of a review file named {asin}_{date}[_{time}]_reviews.json"""
+    return filename.split('_')[0]
+
+
+def describe_review_file(content: str) -> Dict[str, Any]:
+    """
+    Build the manifest entry of a review file
+
+    Args:
+        content: Full JSON text of the review file
+
+    Returns:
+        Manifest entry (scrape date and flags, review count, review date span, content hash, size)
+    """
+    encoded = content.encode('utf-8')
+    data = json.loads(content)
+    scrape_metadata = data.get('scrape_metadata', {})
+    reviews = data.get('reviews_data', {}).get('reviews', [])
+    review_dates = [parsed for parsed in (parse_review_date(review.get('date', '')) for review in reviews) if parsed]
+
+    return {
+        "scrape_date": scrape_metadata.get('scrape_date'),
+        "review_count": len(reviews),
+        "earliest_review_date": min(review_dates).date().isoformat() if review_dates else None,
+        "latest_review_date": max(review_dates).date().isoformat() if review_dates else None,
+        "earliest_reviews_fetched": scrape_metadata.get('earliest_reviews_fetched', False),
+        "fetched_all_available_reviews": scrape_metadata.get('fetched_all_available_reviews', False),
+        "max_pages_requested": scrape_metadata.get('max_pages_requested', 0),
+        "content_sha256": hashlib.sha256(encoded).hexdigest(),
+        "size": len(encoded)
+    }
+
+
+def summarize_review_files(entries: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Fold the file entries of one ASIN into its scrape summary
+
+    Args:
+        entries: Manifest entries keyed by file name
+
+    Returns:
+        Summary with file and review counts, latest scrape date, review date span,
+        whether any scrape fetched the earliest reviews, and the max-pages settings
+        with which a scrape fetched all available reviews
+    """
+    scrape_dates = [entry["scrape_date"] for entry in entries.values() if entry.get("scrape_date")]
+    earliest_dates = [entry["earliest_review_date"] for entry in entries.values() if entry.get("earliest_review_date")]
+    latest_dates = [entry["latest_review_date"] for entry in entries.values() if entry.get("latest_review_date")]
+
+    return {
+        "file_count": len(entries),
+        "review_count": sum(entry.get("review_count", 0) for entry in entries.values()),
+        "latest_scrape_date": max(scrape_dates) if scrape_dates else None,
+        "earliest_review_date": min(earliest_dates) if earliest_dates else None,
+        "latest_review_date": max(latest_dates) if latest_dates else None,
+        "earliest_reviews_fetched": any(entry.get("earliest_reviews_fetched") for entry in entries.values()),
+        "fetched_all_available_reviews_max_pages": sorted({
+            entry.get("max_pages_requested", 0) for entry in entries.values()
+            if entry.get("fetched_all_available_reviews")
+        })
+    }
+
+
+class ReviewManifest:
+    """Per-ASIN index of the review files in one directory"""
+
+    def __init__(self, review_dir: Path, sync: bool = True):
+        """
+        Load the manifest of a review directory
+
+        Args:
+            review_dir: Directory holding the {asin}_..._reviews.json files
+            sync: Reconcile the manifest with the directory listing right away
+        """
+        self.review_dir = Path(review_dir)
+        self.path = self.review_dir / MANIFEST_FILENAME
+        self._lock = threading.Lock()
+        self.asins: Dict[str, Dict[str, Any]] = self._load()
+        if sync:
+            self.sync()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Unreadable review manifest {self.path}, rebuilding: {e}")
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("asins", {})
+
+    def _set_entry(self, name: str, entry: Optional[Dict[str, Any]]) -> None:
+        """Add, replace or (entry None) remove a file entry and refresh its ASIN's summary; caller holds the lock"""
+        asin = get_asin_from_filename(name)
+        files = self.asins.setdefault(asin, {"files": {}})["files"]
+        if entry is None:
+            files.pop(name, None)
+        else:
+            files[name] = entry
+        if files:
+            self.asins[asin]["summary"] = summarize_review_files(files)
+        else:
+            del self.asins[asin]
+
+    def save(self) -> None:
+        """Atomically rewrite the manifest file"""
+        with self._lock:
+            text = json.dumps({"version": MANIFEST_VERSION, "asins": self.asins}, indent=1, sort_keys=True)
+        atomic_write_text(self.path, text)
+
+    # === UPDATES ===
+
+    def sync(self) -> int:
+        """
+        Index review files missing from the manifest and drop entries of deleted files
+
+        Returns:
+            Number of entries added or removed
+        """
+        if not self.review_dir.exists():
+            return 0
+
+        on_disk = {name for name in os.listdir(self.review_dir) if name.endswith(REVIEW_FILE_SUFFIX)}
+        known = {name for record in self.asins.values() for name in record["files"]}
+
+        with self._lock:
+            for name in known - on_disk:
+                self._set_entry(name, None)
+
+        added = 0
+        for name in sorted(on_disk - known):
+            try:
+                content = (self.review_dir / name).read_text(encoding='utf-8')
+                entry = describe_review_file(content)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Skipping unreadable review file {name}: {e}")
+                continue
+            with self._lock:
+                self._set_entry(name, entry)
+            added += 1
+
+        changed = added + len(known - on_disk)
+        if changed or not self.path.exists():
+            self.save()
+        if added:
+            print(f"📇 Indexed {added} review files in {self.path.name}")
+        return changed
+
+    def record(self, filepath: Path, content: str) -> Dict[str, Any]:
+        """
+        Add or replace the entry of a review file that was just written
+
+        Args:
+            filepath: Review file path (inside the manifest's directory)
+            content: JSON text that was written to the file
+
+        Returns:
+            The new manifest entry
+        """
+        name = Path(filepath).name
+        entry = describe_review_file(content)
+        with self._lock:
+            self._set_entry(name, entry)
+        self.save()
+        return entry
+
+    # === LOOKUPS ===
+
+    def get_entries(self, asin: str) -> Dict[str, Dict[str, Any]]:
+        """Manifest entries of an ASIN's review files, keyed by file name"""
+        return dict(self.asins.get(asin, {}).get("files", {}))
+
+    def get_summary(self, asin: str) -> Optional[Dict[str, Any]]:
+        """Scrape summary of an ASIN (see summarize_review_files), None if it has no review files"""
+        record = self.asins.get(asin)
+        return dict(record["summary"]) if record else None
+
+    def get_files(self, asin: str) -> List[Path]:
+        """Review files of an ASIN, oldest scrape first"""
+        entries = self.asins.get(asin, {}).get("files", {})
+        names = sorted(entries, key=lambda name: (entries[name].get("scrape_date") or "", name))
+        return [self.review_dir / name for name in names]
+
+    def latest_file(self, asin: str) -> Optional[Path]:
+        """Most recently scraped review file of an ASIN"""
+        files = self.get_files(asin)
+        return files[-1] if files else None
+
+    def all_files(self) -> List[Path]:
+        """Review files of all ASINs, grouped by ASIN and oldest scrape first"""
+        return [path for asin in sorted(self.asins) for path in self.get_files(asin)]
+
+
+_manifests: Dict[Path, ReviewManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_review_manifest(review_dir: Path) -> ReviewManifest:
+    """Process-wide manifest of a review directory, synced with the directory on first use"""
+    key = Path(review_dir).resolve()
+    with _manifests_lock:
+        if key not in _manifests:
+            _manifests[key] = ReviewManifest(key)
+        return _manifests[key]
@@ -0,0 +1,249 @@
+"""
+Canonical per-ASIN review store for incremental scraping.
+
+Snapshot scraping writes a new timestamped {asin}_..._reviews.json per run,
+so overlapping reviews are stored (and later sent to the LLM) again and
+again. ReviewStore keeps one file per ASIN instead, {asin}_reviews.json in
+its own directory, in the same reviews_data layout as a snapshot file:
+
+- reviews are deduplicated by review ID (content hash when the ID is missing)
+- new reviews are appended, so a review keeps its position and the
+  positional review ids of earlier analyses stay valid
+- store_metadata records a high-water mark (newest review seen) and when and
+  how the store was last refreshed
+- a store is seeded from the ASIN's existing snapshot files, so the first
+  incremental refresh already stops at known reviews
+- files are replaced atomically (temp file + rename)
+
+Usage:
+    store = ReviewStore(store_dir)
+    new_reviews, reached_known = store.split_new_reviews(asin, fetched_reviews)
+    store.merge(asin, new_reviews, scrape_info)
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .date_utils import parse_review_date
+from .write_behind import atomic_write_text
+
+STORE_FILE_SUFFIX = "_reviews.json"
+
+
+def get_review_key(review: Dict[str, Any]) -> str:
+    """Deduplication key of a review: its reviewId, or a hash of date, title and text"""
+    review_id = review.get("reviewId")
+    if review_id:
+        return str(review_id)
+    content = "\x1f".join(str(review.get(field, "")) for field in ("date", "title", "text"))
+    return "sha1:" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+
+def get_high_water_mark(reviews: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Newest review of a fetch (reviews sorted by recent, newest first)
+
+    Args:
+        reviews: Reviews in the order the API returned them
+
+    Returns:
+        Review key and date of the newest review, None if there are no reviews
+    """
+    dated = [(parse_review_date(review.get("date", "")), index) for index, review in enumerate(reviews)]
+    dated = [(date, index) for date, index in dated if date]
+    if dated:
+        newest = reviews[max(dated, key=lambda item: (item[0], -item[1]))[1]]
+    elif reviews:
+        newest = reviews[0]
+    else:
+        return None
+    return {"review_id": get_review_key(newest), "review_date": newest.get("date", "")}
+
+
+class ReviewStore:
+    """One deduplicated review file per ASIN"""
+
+    def __init__(self, store_dir: Path):
+        """
+        Initialize store
+
+        Args:
+            store_dir: Directory holding the per-ASIN store files (created on first write)
+        """
+        self.store_dir = Path(store_dir)
+        self._known_keys: Dict[str, set] = {}
+
+    def path(self, asin: str) -> Path:
+        """Store file of an ASIN"""
+        return self.store_dir / f"{asin}{STORE_FILE_SUFFIX}"
+
+    def exists(self, asin: str) -> bool:
+        return self.path(asin).exists()
+
+    def list_asins(self) -> List[str]:
+        """ASINs with a store file"""
+        if not self.store_dir.exists():
+            return []
+        return sorted(name[:-len(STORE_FILE_SUFFIX)] for name in os.listdir(self.store_dir)
+                      if name.endswith(STORE_FILE_SUFFIX))
+
+    def load(self, asin: str) -> Optional[Dict[str, Any]]:
+        """Stored data of an ASIN, None if it has no store file yet"""
+        try:
+            with open(self.path(asin), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        self._known_keys[asin] = {get_review_key(review) for review in data["reviews_data"]["reviews"]}
+        return data
+
+    def _save(self, asin: str, data: Dict[str, Any]) -> None:
+        atomic_write_text(self.path(asin), json.dumps(data, indent=2, ensure_ascii=False))
+
+    # === INCREMENTAL UPDATES ===
+
+    def seed(self, asin: str, snapshot_files: List[Path]) -> Optional[Dict[str, Any]]:
+        """
+        Create an ASIN's store from its snapshot review files
+
+        Args:
+            asin: Amazon ASIN
+            snapshot_files: Snapshot files, oldest scrape first
+
+        Returns:
+            The new store data, None if no snapshot file could be read
+        """
+        data = None
+        for snapshot_file in snapshot_files:
+            try:
+                with open(snapshot_file, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Skipping unreadable snapshot {snapshot_file} while seeding {asin}: {e}")
+                continue
+            metadata = snapshot.get("scrape_metadata", {})
+            reviews = snapshot.get("reviews_data", {}).get("reviews", [])
+            data = self._merge(asin, data, self.split_new_reviews(asin, reviews)[0], {
+                "scrape_date": metadata.get("scrape_date") or datetime.now().isoformat(),
+                "high_water_mark": get_high_water_mark(reviews),
+                "pages_fetched": metadata.get("max_pages_reached", 0),
+                "max_pages_requested": metadata.get("max_pages_requested", 0),
+                "earliest_reviews_fetched": metadata.get("earliest_reviews_fetched", False),
+                "seeded_from": Path(snapshot_file).name
+            })
+        if data is not None:
+            self._save(asin, data)
+        return data
+
+    def split_new_reviews(self, asin: str, reviews: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Separate fetched reviews the store does not have yet
+
+        Args:
+            asin: Amazon ASIN (its store must have been loaded or seeded)
+            reviews: Fetched reviews, newest first
+
+        Returns:
+            (new reviews in fetch order, whether the fetch reached a review the store already has)
+        """
+        known = self._known_keys.setdefault(asin, set())
+        new_reviews = []
+        seen = set()
+        reached_known = False
+        for review in reviews:
+            key = get_review_key(review)
+            if key in known:
+                reached_known = True
+            elif key not in seen:
+                seen.add(key)
+                new_reviews.append(review)
+        return new_reviews, reached_known
+
+    def merge(self, asin: str, new_reviews: List[Dict[str, Any]], scrape_info: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Append new reviews to an ASIN's store and record the refresh
+
+        Args:
+            asin: Amazon ASIN
+            new_reviews: Reviews from split_new_reviews
+            scrape_info: scrape_date, high_water_mark, pages_fetched, max_pages_requested,
+                earliest_reviews_fetched of this refresh
+
+        Returns:
+            Updated store data
+        """
+        data = self._merge(asin, self.load(asin), new_reviews, scrape_info)
+        self._save(asin, data)
+        return data
+
+    def _merge(self, asin: str, data: Optional[Dict[str, Any]], new_reviews: List[Dict[str, Any]],
+               scrape_info: Dict[str, Any]) -> Dict[str, Any]:
+        if data is None:
+            data = {
+                "store_metadata": {
+                    "asin": asin,
+                    "source": "amazon_axesso_apify_api",
+                    "created": scrape_info["scrape_date"],
+                    "scrape_count": 0,
+                    "high_water_mark": None,
+                    "earliest_reviews_fetched": False
+                },
+                "reviews_data": {"reviews": [], "total_reviews": 0}
+            }
+
+        reviews = data["reviews_data"]["reviews"]
+        reviews.extend(new_reviews)
+        data["reviews_data"]["total_reviews"] = len(reviews)
+        self._known_keys.setdefault(asin, set()).update(get_review_key(review) for review in new_reviews)
+
+        metadata = data["store_metadata"]
+        metadata["updated"] = scrape_info["scrape_date"]
+        metadata["scrape_count"] += 1
+        metadata["earliest_reviews_fetched"] = (metadata["earliest_reviews_fetched"]
+                                                or scrape_info.get("earliest_reviews_fetched", False))
+        high_water_mark = scrape_info.get("high_water_mark")
+        current = metadata.get("high_water_mark")
+        if high_water_mark and (not current or _is_newer(high_water_mark, current)):
+            metadata["high_water_mark"] = {**high_water_mark, "scrape_date": scrape_info["scrape_date"]}
+        metadata["last_scrape"] = {
+            key: scrape_info.get(key) for key in ("scrape_date", "pages_fetched", "max_pages_requested", "seeded_from")
+            if scrape_info.get(key) is not None
+        }
+        metadata["last_scrape"]["new_reviews"] = len(new_reviews)
+        return data
+
+
+def _is_newer(candidate: Dict[str, Any], current: Dict[str, Any]) -> bool:
+    candidate_date = parse_review_date(candidate.get("review_date", ""))
+    current_date = parse_review_date(current.get("review_date", ""))
+    if candidate_date and current_date:
+        return candidate_date >= current_date
+    return candidate_date is not None or current_date is None
+
+
+def select_review_file(asin: str, manifest, store: ReviewStore) -> Optional[Path]:
+    """
+    File to analyze for an ASIN: its canonical store when there is one, else its latest snapshot
+
+    Args:
+        asin: Amazon ASIN
+        manifest: ReviewManifest of the snapshot directory
+        store: ReviewStore
+
+    Returns:
+        Review file path, None if the ASIN has no reviews
+    """
+    if store.exists(asin):
+        return store.path(asin)
+    return manifest.latest_file(asin)
+
+
+def select_review_files(manifest, store: ReviewStore) -> List[Path]:
+    """One review file per ASIN (see select_review_file), ordered by ASIN"""
+    stored = set(store.list_asins())
+    asins = sorted(stored | set(manifest.asins))
+    return [store.path(asin) if asin in stored else manifest.latest_file(asin) for asin in asins]
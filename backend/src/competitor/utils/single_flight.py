@@ -0,0 +1,92 @@
+"""
+Single-flight coalescing of identical in-flight LLM requests.
+
+LLMCache is only consulted before a call, so concurrent tasks that build the
+same prompt at the same moment would each pay for it. SingleFlight keeps a map
+of in-flight requests keyed by the request's cache key: the first caller makes
+the API call, later identical callers await its result instead.
+
+Provides:
+- SingleFlight: in-flight request map with coalescing counters
+- request_key: cache key for a prompt and the model settings that shape the response
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+def request_key(prompt: str, system_prompt: Optional[str] = None, **settings: Any) -> str:
+    """
+    Build the in-flight key for a request
+
+    Args:
+        prompt: User prompt
+        system_prompt: Optional system prefix
+        **settings: Model settings that change the response (model, temperature, max_tokens, mode)
+
+    Returns:
+        Hex digest identifying byte-identical requests
+    """
+    cache_input = f"{system_prompt or ''}|||{prompt}|||{json.dumps(settings, sort_keys=True)}"
+    return hashlib.sha256(cache_input.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight future"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "calls": 0,
+            "coalesced": 0,
+        }
+
+    @property
+    def in_flight(self) -> int:
+        """Number of distinct requests currently in flight"""
+        return len(self._in_flight)
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run `call` unless an identical request is already in flight
+
+        Args:
+            key: Request key (see request_key)
+            call: Zero-argument coroutine function making the actual request
+
+        Returns:
+            Result of the first caller's request; its exception is re-raised for every waiter
+        """
+        self.stats["calls"] += 1
+
+        while key in self._in_flight:
+            future = self._in_flight[key]
+            self.stats["coalesced"] += 1
+            try:
+                # shield: a cancelled waiter must not cancel the shared request
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The first caller was cancelled - issue the request ourselves
+                self.stats["coalesced"] -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an exception nobody waited for is not logged as unhandled
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._in_flight.pop(key, None)
@@ -0,0 +1,307 @@
+"""
+Incremental JSON validation for streamed LLM responses.
+
+Provides:
+- IncrementalJSONValidator: character-level JSON scanner fed chunk by chunk
+- StreamValidationError: raised as soon as the output is structurally invalid
+
+Subclasses override check_key/check_value/check_container to enforce a
+response schema (e.g. only known review IDs) while the response streams, so
+the request can be cancelled long before max_tokens is reached.
+
+The validator picks the same object extract_json_from_response parses: an
+object in a ```json (or bare ```) fence wins over a '{' in the prose before
+it, so braces in leading text such as "keys use the {PID}@{DETAIL} form" do
+not abort a valid fenced response.
+"""
+
+import re
+from typing import Any, List, Optional, Union
+
+
+PathItem = Union[str, int]
+
+_WHITESPACE = " \t\r\n"
+_LITERALS = {"true": True, "false": False, "null": None}
+# Text allowed between an opening ``` and the '{' of a fenced object (as in extract_json_from_response)
+_FENCE_PREFIX = re.compile(r"(?:json)?\s*")
+
+
+class StreamValidationError(Exception):
+    """Streamed output is invalid; carries the reason and the text received so far"""
+
+    def __init__(self, reason: str, partial_text: str = ""):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial_text = partial_text
+
+
+class IncrementalJSONValidator:
+    """Validate a JSON object incrementally as text chunks arrive"""
+
+    def __init__(self, max_depth: Optional[int] = None):
+        """
+        Initialize validator
+
+        Args:
+            max_depth: Optional maximum nesting depth of containers (top-level object is depth 1)
+        """
+        self.max_depth = max_depth
+        self._text = ""
+        self._pos = 0  # Next character of _text to scan
+
+        # Outside of an object: backticks in a row, and text since the last ``` fence (None: no fence open)
+        self._backticks = 0
+        self._fence_text: Optional[str] = None
+
+        # Current candidate object: where its '{' is, whether it sits in a fence, and whether it is
+        # still tentative (an unfenced '{' that may turn out to be prose, until its first key parses)
+        self.started = False
+        self.complete = False
+        self.fenced = False
+        self.tentative = False
+        self.start_pos = 0  # Index in text of the current object's '{'
+
+        # Container stack: each entry is [kind, state, key_or_index]
+        #   objects: state in key, colon, value, comma
+        #   arrays:  state in first_value, value, comma
+        self.stack: List[list] = []
+        self.in_string = False
+        self.escape = False
+        self.string_buffer: List[str] = []
+        self.string_is_key = False
+        self.scalar_buffer: List[str] = []
+
+    # === Schema hooks (override in subclasses) ===
+
+    def check_key(self, path: List[PathItem], key: str) -> Optional[str]:
+        """Return an error message if `key` is not allowed in the object at `path`"""
+        return None
+
+    def check_value(self, path: List[PathItem], value: Any) -> Optional[str]:
+        """Return an error message if scalar `value` is not allowed at `path`"""
+        return None
+
+    def check_container(self, path: List[PathItem], kind: str) -> Optional[str]:
+        """Return an error message if a container ('{' or '[') is not allowed at `path`"""
+        return None
+
+    # === Scanner ===
+
+    @property
+    def text(self) -> str:
+        """All text fed so far"""
+        return self._text
+
+    def _path(self) -> List[PathItem]:
+        """Key/index path of the value currently being parsed"""
+        return [entry[2] for entry in self.stack]
+
+    def _fail(self, reason: str) -> None:
+        raise StreamValidationError(reason, self.text)
+
+    def _check(self, error: Optional[str]) -> None:
+        if error:
+            self._fail(error)
+
+    def _expecting_value(self) -> bool:
+        if not self.stack:
+            return False
+        kind, state, _ = self.stack[-1]
+        return state == "value" or (kind == "[" and state == "first_value")
+
+    def _value_done(self) -> None:
+        """Advance the parent container after a complete value"""
+        if not self.stack:
+            self.complete = True
+            return
+        self.stack[-1][1] = "comma"
+
+    def _open_container(self, kind: str) -> None:
+        if self.stack and not self._expecting_value():
+            self._fail(f"Unexpected '{kind}' at {self._path()}")
+
+        path = self._path()
+        self._check(self.check_container(path, kind))
+        if self.max_depth is not None and len(self.stack) >= self.max_depth:
+            self._fail(f"Nesting deeper than {self.max_depth} levels at {path}")
+
+        if kind == "{":
+            self.stack.append(["{", "key", None])
+        else:
+            self.stack.append(["[", "first_value", 0])
+
+    def _close_container(self, char: str) -> None:
+        if not self.stack:
+            self._fail(f"Unexpected '{char}' outside of JSON object")
+        kind, state, _ = self.stack[-1]
+
+        # An object may close after a value, or while still empty; a key slot of "" means a trailing comma
+        if kind == "{" and char == "}" and (state == "comma" or (state == "key" and self.stack[-1][2] is None)):
+            self.stack.pop()
+            self._value_done()
+        elif kind == "[" and char == "]" and state in ("first_value", "comma"):
+            self.stack.pop()
+            self._value_done()
+        else:
+            self._fail(f"Mismatched '{char}' at {self._path()}")
+
+    def _finish_string(self) -> None:
+        value = "".join(self.string_buffer)
+        self.string_buffer = []
+        self.in_string = False
+
+        if self.string_is_key:
+            self._check(self.check_key(self._path()[:-1], value))
+            self.stack[-1][2] = value
+            self.stack[-1][1] = "colon"
+        else:
+            self._check(self.check_value(self._path(), value))
+            self._value_done()
+
+    def _finish_scalar(self) -> None:
+        token = "".join(self.scalar_buffer)
+        self.scalar_buffer = []
+
+        if token in _LITERALS:
+            value = _LITERALS[token]
+        else:
+            try:
+                value = float(token) if any(c in token for c in ".eE") else int(token)
+            except ValueError:
+                self._fail(f"Invalid literal '{token}' at {self._path()}")
+
+        self._check(self.check_value(self._path(), value))
+        self._value_done()
+
+    def _feed_char(self, char: str) -> None:
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+                self.string_buffer.append(char)
+            elif char == "\\":
+                self.escape = True
+            elif char == '"':
+                self._finish_string()
+            else:
+                self.string_buffer.append(char)
+            return
+
+        if self.scalar_buffer:
+            if char.isalnum() or char in "+-.":
+                self.scalar_buffer.append(char)
+                return
+            self._finish_scalar()
+
+        if char in _WHITESPACE:
+            return
+
+        if char in "{[":
+            self._open_container(char)
+        elif char in "}]":
+            self._close_container(char)
+        elif char == '"':
+            if self.stack and self.stack[-1][0] == "{" and self.stack[-1][1] == "key":
+                self.string_is_key = True
+            elif self._expecting_value():
+                self.string_is_key = False
+            else:
+                self._fail(f"Unexpected string at {self._path()}")
+            self.in_string = True
+        elif char == ":":
+            if not (self.stack and self.stack[-1][0] == "{" and self.stack[-1][1] == "colon"):
+                self._fail(f"Unexpected ':' at {self._path()}")
+            self.stack[-1][1] = "value"
+        elif char == ",":
+            if not (self.stack and self.stack[-1][1] == "comma"):
+                self._fail(f"Unexpected ',' at {self._path()}")
+            if self.stack[-1][0] == "{":
+                self.stack[-1][1] = "key"
+                self.stack[-1][2] = ""
+            else:
+                self.stack[-1][1] = "value"
+                self.stack[-1][2] += 1
+        elif char.isalnum() or char == "-":
+            if not self._expecting_value():
+                self._fail(f"Unexpected '{char}' at {self._path()}")
+            self.scalar_buffer.append(char)
+        else:
+            self._fail(f"Unexpected '{char}' at {self._path()}")
+
+    def _reset_object(self) -> None:
+        """Drop the current candidate object and its scanner state"""
+        self.started = False
+        self.complete = False
+        self.fenced = False
+        self.tentative = False
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.string_buffer = []
+        self.scalar_buffer = []
+
+    def _scan_outside(self, char: str, pos: int) -> None:
+        """Track ``` fences in text outside of an object and start an object at '{'"""
+        if char == "`":
+            self._backticks += 1
+            if self._backticks == 3:
+                self._backticks = 0
+                self._fence_text = ""
+            return
+        self._backticks = 0
+
+        if char != "{":
+            if self._fence_text is not None:
+                self._fence_text += char
+            return
+
+        fenced = self._fence_text is not None and _FENCE_PREFIX.fullmatch(self._fence_text) is not None
+        self._fence_text = None
+        if self.complete:
+            # An unfenced object was already parsed, but extract_json_from_response prefers a fenced one
+            if not fenced or self.fenced:
+                return
+            self._reset_object()
+
+        self.started = True
+        self.fenced = fenced
+        self.tentative = not fenced
+        self.start_pos = pos
+        self._feed_char(char)
+
+    def feed(self, chunk: str) -> None:
+        """
+        Feed the next chunk of streamed text
+
+        Text outside the object is ignored, like extract_json_from_response
+        does: leading prose, the ```json fence and anything after the object.
+
+        Raises:
+            StreamValidationError: If the output is structurally invalid or fails a schema hook
+        """
+        self._text += chunk
+        while self._pos < len(self._text):
+            pos = self._pos
+            char = self._text[pos]
+            self._pos += 1
+
+            if self.complete and self.fenced:
+                return
+            if not self.started or self.complete:
+                self._scan_outside(char, pos)
+                continue
+
+            try:
+                self._feed_char(char)
+            except StreamValidationError:
+                if not self.tentative:
+                    raise
+                # The '{' was prose: rescan from the character after it
+                self._reset_object()
+                self._pos = self.start_pos + 1
+                continue
+
+            # The first key (or an empty object) makes an unfenced object the response
+            if self.tentative and (self.complete or (len(self.stack) == 1 and self.stack[0][1] != "key")):
+                self.tentative = False
+
@@ -0,0 +1,255 @@
+"""
+Write-behind persistence for cache entries, LLM logs and result files.
+
+Writing JSON and cache entries inside the coroutines that also drive the
+concurrent LLM calls stalls the event loop on disk IO. WriteBehindWriter
+moves that work to one background thread:
+- data is snapshotted when queued (pickled, a small fraction of the cost of
+  JSON encoding), so callers may keep changing their objects; JSON encoding,
+  compression and IO all happen on the writer thread
+- a bounded backlog: threads block when the writer falls far behind, while
+  callers on an event loop never block and go over the bound instead
+- SQLite cache entries queued together are written in one transaction
+- files are written to a temp file, fsynced and renamed into place, so a
+  crash leaves either the previous file or the complete new one, never a
+  truncated file
+- flush() waits until everything queued so far is on disk; the process-wide
+  writer also flushes at interpreter exit
+
+Usage:
+    writer = get_write_behind_writer()
+    writer.write_json(path, data)
+    ...
+    writer.flush()
+"""
+
+import asyncio
+import atexit
+import json
+import os
+import pickle
+import queue
+import tempfile
+import threading
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+
+# Read once at import; os.umask can only be queried by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def snapshot(data: Any) -> bytes:
+    """Copy of data that later changes to it do not affect; restore() rebuilds it"""
+    return pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+
+
+def restore(data_snapshot: bytes) -> Any:
+    """Fresh copy of the data a snapshot() was taken of"""
+    return pickle.loads(data_snapshot)
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def atomic_write_text(path: Path, text: str, fsync: bool = True) -> None:
+    """
+    Replace a file's content atomically
+
+    Args:
+        path: Destination file (its directory is created if missing)
+        text: Full new content
+        fsync: Flush the temp file to disk before the rename, so the rename never exposes unwritten data
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        # mkstemp creates the file owner-only; keep the mode a plain open() would give
+        os.chmod(temp_path, 0o666 & ~_UMASK)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class WriteBehindWriter:
+    """Background thread that persists queued writes in batches"""
+
+    _STOP = object()
+
+    def __init__(self, max_pending: int = 1000, batch_size: int = 100, fsync: bool = True):
+        """
+        Initialize writer and start its thread
+
+        Args:
+            max_pending: Backlog bound; further writes from threads block until the writer catches up
+            batch_size: Most queued writes handled per batch
+            fsync: fsync files before renaming them into place
+        """
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.stats = {"writes": 0, "batches": 0, "errors": 0, "over_bound": 0}
+        # Unbounded queue; the bound is enforced with slots, so event loop callers can skip it
+        self._queue: "queue.Queue" = queue.Queue()
+        self._slots = threading.Semaphore(max_pending)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    # === QUEUEING ===
+
+    def write_text(self, path: Path, text: str, on_done: Optional[Callable[[], None]] = None) -> None:
+        """
+        Queue an atomic write of a text file
+
+        Args:
+            path: Destination file
+            text: Full new content
+            on_done: Called on the writer thread once the write is handled, whether it succeeded or failed
+        """
+        self._put(("file", Path(path), lambda: text, on_done))
+
+    def write_json(self, path: Path, data: Any, indent: Optional[int] = 2,
+                   on_done: Optional[Callable[[], None]] = None) -> None:
+        """Queue an atomic write of a JSON file; data is snapshotted now, so later changes to it are not written"""
+        self.write_json_snapshot(path, snapshot(data), indent, on_done)
+
+    def write_json_snapshot(self, path: Path, data_snapshot: bytes, indent: Optional[int] = 2,
+                            on_done: Optional[Callable[[], None]] = None) -> None:
+        """Queue an atomic write of a JSON file from a snapshot() of its data, encoded on the writer thread"""
+        self._put(("file", Path(path),
+                   lambda: json.dumps(restore(data_snapshot), indent=indent, ensure_ascii=False), on_done))
+
+    def put_cache_entry(self, store: Any, cache_type: str, key: str, entry_snapshot: bytes,
+                        on_done: Optional[Callable[[], None]] = None) -> None:
+        """
+        Queue an insert into a SQLiteCacheStore; entries queued together share one transaction
+
+        Args:
+            store: Destination store
+            cache_type: Cache type of the entry
+            key: Cache key
+            entry_snapshot: snapshot() of the entry, encoded for the store on the writer thread
+            on_done: Called on the writer thread once the entry is handled, whether it was stored or failed
+        """
+        self._put(("cache", (store, cache_type), lambda: store.encode_row(key, restore(entry_snapshot)), on_done))
+
+    def _put(self, item) -> None:
+        if self._closed:
+            raise RuntimeError("WriteBehindWriter is closed")
+        # Blocking on the bound would stall every coroutine of an event loop, so loop callers go over it
+        has_slot = self._slots.acquire(blocking=not _on_event_loop())
+        if not has_slot:
+            self.stats["over_bound"] += 1
+        self._queue.put(item + (has_slot,))
+
+    # === FLUSHING ===
+
+    def flush(self) -> None:
+        """Block until every write queued so far has been persisted (or has failed)"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Flush and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    # === WRITER THREAD ===
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = any(item is self._STOP for item in batch)
+            items = [item for item in batch if item is not self._STOP]
+            try:
+                self._write_batch(items)
+            finally:
+                for item in items:
+                    if item[-1]:
+                        self._slots.release()
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, items) -> None:
+        cache_entries = defaultdict(list)
+        for kind, target, payload, on_done, _ in items:
+            if kind == "file":
+                self._write(f"{target}", lambda: atomic_write_text(target, payload(), self.fsync), [on_done])
+                continue
+            # Encode each entry on its own, so one that cannot be encoded does not fail the whole transaction
+            try:
+                cache_entries[target].append((payload(), on_done))
+            except Exception as e:
+                self._failed(f"{target[0].db_path} ({target[1]} entry)", e)
+                self._done([on_done])
+
+        for (store, cache_type), entries in cache_entries.items():
+            self._write(f"{store.db_path} ({len(entries)} {cache_type} entries)",
+                        lambda: store.put_rows(cache_type, [row for row, _ in entries]),
+                        [on_done for _, on_done in entries])
+        self.stats["batches"] += 1
+
+    def _write(self, description: str, write: Callable[[], Any], callbacks) -> None:
+        try:
+            write()
+            self.stats["writes"] += len(callbacks)
+        except Exception as e:
+            self._failed(description, e)
+        finally:
+            # After failures too: callers drop their pending copy instead of serving data that never landed
+            self._done(callbacks)
+
+    def _failed(self, description: str, error: Exception) -> None:
+        self.stats["errors"] += 1
+        print(f"❌ Write-behind failed for {description}: {error}")
+
+    @staticmethod
+    def _done(callbacks) -> None:
+        for on_done in callbacks:
+            if on_done is None:
+                continue
+            try:
+                on_done()
+            except Exception as e:
+                print(f"❌ Write-behind callback failed: {e}")
+
+
+_writer: Optional[WriteBehindWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_write_behind_writer() -> WriteBehindWriter:
+    """Process-wide writer, flushed and stopped at interpreter exit"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteBehindWriter()
+            atexit.register(_writer.close)
+        return _writer
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Regression check for write-behind persistence
+
+Queued data is a snapshot, flush() waits for everything queued so far,
+failed writes still run their callbacks (so LLMCache drops its pending
+entry), and callers on an event loop never block on the backlog bound.
+
+Usage:
+    python3 write_behind_test.py
+"""
+
+import asyncio
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from utils.cache_utils import LLMCache, get_sqlite_cache_store
+from utils.write_behind import WriteBehindWriter, snapshot
+
+
+class BlockedStore:
+    """Cache store stand-in whose writes wait until released"""
+
+    db_path = "blocked store"
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.rows = []
+
+    def encode_row(self, key, cache_data):
+        self.released.wait()
+        return key, "", b"{}"
+
+    def put_rows(self, cache_type, rows):
+        self.rows.extend(rows)
+
+
+def run_checks(tmp: Path):
+    checks = []
+    writer = WriteBehindWriter(fsync=False)
+
+    data = {"items": [1, 2]}
+    done = []
+    writer.write_json(tmp / "result.json", data, on_done=lambda: done.append("result"))
+    data["items"].append(3)
+    writer.flush()
+    written = json.loads((tmp / "result.json").read_text(encoding="utf-8"))
+    checks.append(("queued data is a snapshot and flush waits for it", written == {"items": [1, 2]} and
+                   done == ["result"]))
+    checks.append(("write_json keeps the indented layout", (tmp / "result.json").read_text().startswith('{\n  "items"')))
+
+    (tmp / "blocked.json").mkdir()  # A directory cannot be replaced by a file
+    writer.write_json(tmp / "blocked.json", {"a": 1}, on_done=lambda: done.append("failed"))
+    writer.write_json(tmp / "after.json", {"b": 2})
+    writer.flush()
+    checks.append(("a failed write still runs its callback and later writes go on",
+                   done[-1] == "failed" and writer.stats["errors"] == 1 and (tmp / "after.json").exists()))
+
+    # LLMCache: pending entries serve lookups until written, and are dropped when the write fails
+    for backend in ("json", "sqlite"):
+        cache = LLMCache(tmp / backend, backend=backend, writer=writer)
+        response = {"text": "answer"}
+        cache.save_to_cache("key", response)
+        response["text"] = "changed"
+        pending_hit = cache.load_from_cache("key") == {"text": "answer"}
+        writer.flush()
+        checks.append((f"{backend} cache entry is served while pending and read back once written",
+                       pending_hit and not cache._pending and cache.load_from_cache("key") == {"text": "answer"}))
+
+    cache = LLMCache(tmp / "failing", writer=writer)
+    (tmp / "failing" / cache.get_cache_filename("key")).mkdir()
+    cache.save_to_cache("key", {"text": "lost"})
+    writer.flush()
+    checks.append(("a failed cache write drops the pending entry", not cache._pending))
+
+    # Entries queued together land in one store transaction
+    store = get_sqlite_cache_store(tmp / "batched" / "cache.sqlite3")
+    batch_writer = WriteBehindWriter(fsync=False)
+    for index in range(20):
+        batch_writer.put_cache_entry(store, "llm", f"key{index}", snapshot({"data": index, "timestamp": "t"}))
+    batch_writer.flush()
+    checks.append(("queued cache entries are stored in batches",
+                   all(store.get("llm", f"key{index}")["data"] == index for index in range(20)) and
+                   batch_writer.stats["batches"] < 20))
+    batch_writer.close()
+
+    # Back-pressure: threads wait for the writer, event loop callers never do
+    blocked = BlockedStore()
+    bounded = WriteBehindWriter(max_pending=2, fsync=False)
+    for index in range(2):
+        bounded.put_cache_entry(blocked, "llm", f"key{index}", snapshot({}))
+
+    async def enqueue_on_loop():
+        for index in range(2, 6):
+            bounded.put_cache_entry(blocked, "llm", f"key{index}", snapshot({}))
+
+    asyncio.run(asyncio.wait_for(enqueue_on_loop(), timeout=1.0))
+    checks.append(("event loop callers go over the bound instead of blocking", bounded.stats["over_bound"] == 4))
+
+    thread = threading.Thread(target=bounded.put_cache_entry, args=(blocked, "llm", "key6", snapshot({})))
+    thread.start()
+    thread.join(timeout=0.2)
+    thread_waited = thread.is_alive()
+    blocked.released.set()
+    thread.join(timeout=5)
+    bounded.flush()
+    checks.append(("threads wait for a free slot", thread_waited and not thread.is_alive() and len(blocked.rows) == 7))
+    bounded.close()
+
+    writer.close()
+    try:
+        writer.write_text(tmp / "closed.txt", "late")
+        checks.append(("a closed writer rejects writes", False))
+    except RuntimeError:
+        checks.append(("a closed writer rejects writes", True))
+    return checks
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        checks = run_checks(Path(tmp))
+    failures = 0
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+    if failures:
+        raise SystemExit(f"{failures} write-behind checks failed")
+    print("\nAll write-behind checks passed")
+
+
+if __name__ == "__main__":
+    main()
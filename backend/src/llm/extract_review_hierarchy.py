@@ -6,7 +6,7 @@ import datetime
 import pandas as pd
 import random
 random.seed(0)
-from src.util.gpts import claude
+from src.util.gpts import aclaude
 from src.util.run_gpt_reviews import get_prompt_from_path, run_with_prompted_inputs
 
 SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -141,8 +141,8 @@ if __name__ == '__main__':
     input_df['prompted_input'] = input_df.apply(lambda x: prompt_template.replace('{{INPUT}}', x['input']), axis=1)
 
     model_name="claude-3-5-sonnet-20240620"
-    model = partial(claude, model=model_name)
+    model = partial(aclaude, model=model_name)
     output_folder = os.path.join(OUTPUT_ROOT_DIR, out_folder_name)
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
-    infos = run_with_prompted_inputs(input_df, 'prompted_input', model,idxs=run_indexes, batch_size=5, save_every=25, out_folder=output_folder, output_prefix=f"{prompt_file}_{model_name}")
\ No newline at end of file
+    infos = run_with_prompted_inputs(input_df, 'prompted_input', model,idxs=run_indexes, batch_size=5, out_folder=output_folder, output_prefix=f"{prompt_file}_{model_name}")
\ No newline at end of file
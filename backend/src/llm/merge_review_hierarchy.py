@@ -22,7 +22,7 @@ from nltk.corpus import stopwords
 stop_words = set(stopwords.words('english'))
 stop_words.remove('not')
 
-from src.util.gpts import claude
+from src.util.gpts import aclaude
 from src.util.run_gpt_reviews import (
     get_prompt_from_path,
     parse_label,
@@ -715,7 +715,7 @@ def clean_up_dict_by_path_stems(in_dict, extract_english=False):
     return cleaned_dict
 
 model_name="claude-3-5-sonnet-20241022"
-model = partial(claude, model=model_name)
+model = partial(aclaude, model=model_name)
 if __name__ == '__main__':
     df = pd.read_excel("/Users/maoc/MIT Dropbox/Chengfeng Mao/JMP/UX168 data and code/tmp/smart_switches/multiple_review_hierarchy-MRO_v4_claude-3-5-sonnet-20240620_0-224.xlsx")
     df['json_response'] = df.response.apply(parse_label)
@@ -4,16 +4,124 @@ import aiolimiter
 
 import asyncio
 import anthropic
-from typing import Any, List, Dict, Union
+import random
+from typing import Any, List, Dict, Optional, Tuple, Union
 from tqdm.asyncio import tqdm_asyncio
 import time
+import weakref
 import dotenv
 from anthropic import AsyncAnthropic
+from src.competitor.utils.rate_limit_registry import get_shared_rate_limiter
+from src.competitor.utils.adaptive_rate_control import get_response_headers, is_rate_limit_error, parse_retry_after
 
 dotenv.load_dotenv()
 
 openai.api_key = os.environ["OPENAI_API_KEY"]
-OPENAI_CLIENT = openai.AsyncOpenAI()
+# Retries are handled by _call_with_backoff, not by the SDK
+OPENAI_CLIENT = openai.AsyncOpenAI(max_retries=0)
+
+# Retry policy: full-jitter exponential backoff, at least as long as any retry-after
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_MAX_SECONDS = 60.0
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# One request-per-minute limiter per (model, rpm), shared by every batch of a run
+_request_limiters: Dict[Tuple[str, int], aiolimiter.AsyncLimiter] = {}
+
+# One Anthropic client per event loop for single-prompt calls, so its connection pool is reused
+_anthropic_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAnthropic]" = weakref.WeakKeyDictionary()
+
+
+class LLMRequestError(Exception):
+    """A request failed with a fatal error or ran out of retries"""
+
+    def __init__(self, model: str, attempts: int, error: BaseException):
+        super().__init__(f"{model} request failed after {attempts} attempt(s): {type(error).__name__}: {error}")
+        self.model = model
+        self.attempts = attempts
+        self.error = error
+
+
+def get_request_limiter(model: str, requests_per_minute: int) -> aiolimiter.AsyncLimiter:
+    """Request limiter shared by all calls for a model, so separate batches draw from one budget"""
+    key = (model, requests_per_minute)
+    if key not in _request_limiters:
+        _request_limiters[key] = aiolimiter.AsyncLimiter(requests_per_minute)
+    return _request_limiters[key]
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """Connection problems, timeouts, throttling and server errors are retryable; other 4xx are fatal"""
+    if isinstance(error, (anthropic.APIConnectionError, openai.APIConnectionError)):
+        return True  # Includes request timeouts
+    status_code = getattr(error, "status_code", None)
+    return status_code is not None and (status_code in RETRYABLE_STATUS_CODES or status_code >= 500)
+
+
+def backoff_seconds(trial: int, retry_after: Optional[float] = None) -> float:
+    """Full-jitter exponential backoff for the given retry, never shorter than retry-after"""
+    if retry_after is not None:
+        # Jitter on top of retry-after keeps callers from retrying in lockstep
+        return retry_after + random.uniform(0, BACKOFF_BASE_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** trial))
+
+
+async def _call_with_backoff(create, model: str, estimated_input_tokens: int, max_tokens: int,
+                             limiter: aiolimiter.AsyncLimiter, usage_tokens) -> Any:
+    """
+    Run one chat request with retries
+
+    Every attempt takes a slot from the shared request limiter and the host-wide
+    token budget. Retryable errors back off with jitter; a 429 with retry-after
+    also pauses the shared budget, so every caller of the model waits it out.
+
+    Args:
+        create: Zero-argument coroutine function sending the request
+        model: Model name (shared budget name)
+        estimated_input_tokens: Input token estimate for the budget
+        max_tokens: Maximum output tokens per call
+        limiter: Shared request-per-minute limiter
+        usage_tokens: Function response -> (input_tokens, output_tokens) or None
+
+    Returns:
+        SDK response
+
+    Raises:
+        LLMRequestError: Fatal error, or still failing after MAX_ATTEMPTS
+    """
+    # Host-wide per-model budget shared with the competitor scripts
+    rate_limiter = get_shared_rate_limiter(model, model_max_tokens=max_tokens)
+    for trial in range(MAX_ATTEMPTS):
+        await limiter.acquire()  # Request-rate bucket only; it drains over time, nothing to give back
+        reservation = await rate_limiter.acquire(estimated_input_tokens)
+        usage = None
+        try:
+            response = await create()
+            usage = usage_tokens(response)
+        except Exception as e:
+            error = e
+        else:
+            return response
+        finally:
+            # Also on cancellation, which would otherwise leak the concurrency slot and the reserved tokens
+            if usage is not None:
+                rate_limiter.release(reservation, *usage)
+            else:
+                rate_limiter.release(reservation)
+
+        if not is_retryable_error(error):
+            raise LLMRequestError(model, trial + 1, error) from error
+        if trial == MAX_ATTEMPTS - 1:
+            raise LLMRequestError(model, MAX_ATTEMPTS, error) from error
+
+        retry_after = parse_retry_after(get_response_headers(error))
+        if retry_after is not None and is_rate_limit_error(error):
+            rate_limiter.pause(retry_after)
+        delay = backoff_seconds(trial, retry_after)
+        print(f"{model} attempt {trial + 1}/{MAX_ATTEMPTS} failed ({type(error).__name__}: {error}); "
+              f"retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
 
 async def _throttled_anthropic_chat_completion_acreate(
     client,   
@@ -23,39 +131,22 @@ async def _throttled_anthropic_chat_completion_acreate(
     max_tokens: int,    
     top_p: float,    
     stop: Union[str, List[str]],    
-    limiter: aiolimiter.AsyncLimiter, ) -> Dict[str, Any]:      
+    limiter: aiolimiter.AsyncLimiter, ) -> Any:      
     
-    async with limiter:
-        trial = 0
-        while trial < 5:
-            rate_limit = False
-            try:                
-                return await client.messages.create(                    
-                    model=model,                    
-                    messages=messages,                    
-                    temperature=temperature,                    
-                    max_tokens=max_tokens,                    
-                    top_p=top_p
-                    # response_format={"type": "json_object"}              
-                )
-            except anthropic.APIConnectionError as e:
-                print("The server could not be reached")
-                print(e.__cause__)  # an underlying Exception, likely raised within httpx.
-            except anthropic.RateLimitError:
-                print("A 429 status code was received; we should back off a bit.")
-                rate_limit = True
-            except anthropic.APIStatusError as e:
-                print("Another non-200-range status code was received")
-                print(e.status_code)
-                print(e.response)
-            trial += 1
-            print("Retrying")
-            if rate_limit:
-                await asyncio.sleep(60)
-            else:
-                await asyncio.sleep(5)
-            print("Start trial ", trial)
-        return {"message": {"content": ""}} 
+    estimated_input_tokens = get_shared_rate_limiter(model, model_max_tokens=max_tokens).estimate_tokens(
+        "".join(str(m["content"]) for m in messages))
+    return await _call_with_backoff(
+        lambda: client.messages.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p
+            # response_format={"type": "json_object"}
+        ),
+        model, estimated_input_tokens, max_tokens, limiter,
+        lambda response: (response.usage.input_tokens, response.usage.output_tokens)
+    )
 
 
 async def generate_from_anthropic_chat_completion(
@@ -67,8 +158,8 @@ async def generate_from_anthropic_chat_completion(
     stop: Union[str, List[str]],
     requests_per_minute: int = 300,
 ) -> List[str]:
-    client = AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY")).with_options(max_retries=1)
-    limiter = aiolimiter.AsyncLimiter(requests_per_minute)
+    client = AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY")).with_options(max_retries=0)
+    limiter = get_request_limiter(model, requests_per_minute)
     async_responses = [
         _throttled_anthropic_chat_completion_acreate(
             client=client,
@@ -86,6 +177,34 @@ async def generate_from_anthropic_chat_completion(
     # return [x["choices"][0]["message"]["content"] for x in responses]
     return responses
 
+async def aclaude(prompt: str, model="claude-3-haiku-20240307", temperature=0, max_tokens=4096,
+                  requests_per_minute: int = 300) -> str:
+    """
+    Answer a single prompt; the per-request counterpart of claude() for callers that keep their own requests in flight
+
+    Args:
+        prompt: User message
+        model: Anthropic model name
+        requests_per_minute: Budget shared with every other call for this model
+
+    Returns:
+        The response text
+    """
+    loop = asyncio.get_running_loop()
+    if loop not in _anthropic_clients:
+        _anthropic_clients[loop] = AsyncAnthropic(api_key=os.environ.get("ANTHROPIC_API_KEY")).with_options(max_retries=0)
+    response = await _throttled_anthropic_chat_completion_acreate(
+        client=_anthropic_clients[loop],
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=temperature,
+        max_tokens=max_tokens,
+        top_p=1,
+        stop=None,
+        limiter=get_request_limiter(model, requests_per_minute),
+    )
+    return response.content[0].text
+
 async def _throttled_openai_chat_completion_acreate(
     client: openai.AsyncOpenAI,   
     model: str,    
@@ -94,25 +213,26 @@ async def _throttled_openai_chat_completion_acreate(
     max_tokens: int,    
     top_p: float,    
     stop: Union[str, List[str]],    
-    limiter: aiolimiter.AsyncLimiter, ) -> Dict[str, Any]:      
+    limiter: aiolimiter.AsyncLimiter, ) -> Any:      
     
-    async with limiter:
-        trial = 0
-        while trial < 5:
-            try:                
-                return await client.chat.completions.create(                    
-                    model=model,                    
-                    messages=messages,                    
-                    temperature=temperature,                    
-                    max_tokens=max_tokens,                    
-                    top_p=top_p
-                    # response_format={"type": "json_object"}              
-                )
-            except Exception as e:
-                print(e)
-                await asyncio.sleep(30*(trial+2))
-            trial += 1
-        return {"choices": [{"message": {"content": ""}}]}  
+    estimated_input_tokens = get_shared_rate_limiter(model, model_max_tokens=max_tokens).estimate_tokens(
+        "".join(str(m["content"]) for m in messages))
+
+    def usage_tokens(response):
+        usage = getattr(response, "usage", None)
+        return (usage.prompt_tokens, usage.completion_tokens) if usage is not None else None
+
+    return await _call_with_backoff(
+        lambda: client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p
+            # response_format={"type": "json_object"}
+        ),
+        model, estimated_input_tokens, max_tokens, limiter, usage_tokens
+    )
 
 
 async def generate_from_openai_chat_completion(
@@ -130,7 +250,7 @@ async def generate_from_openai_chat_completion(
         raise ValueError(
             "OPENAI_API_KEY environment variable must be set when using OpenAI API."
         )
-    limiter = aiolimiter.AsyncLimiter(requests_per_minute)
+    limiter = get_request_limiter(model, requests_per_minute)
     
     async_responses = [
         _throttled_openai_chat_completion_acreate(
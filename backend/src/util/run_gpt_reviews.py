@@ -3,9 +3,11 @@
 
 
 import argparse
+import asyncio
+import hashlib
+import inspect
 import os
 import time
-from collections import defaultdict
 from functools import partial
 import json
 from tqdm import tqdm
@@ -38,80 +40,160 @@ def parse_label(x):
     except:
         return None
 
-def run(out_df, task_col, idxs, gpts, output_prefix, promptpath='', out_folder='tmp'):
+class PromptCheckpoint:
+    """
+    Append-only JSONL record of completed prompts, one line per response
+
+    Lines are keyed by a hash of the prompt text, so a restarted run skips every
+    prompt that was already paid for, whatever batch or index it came from.
+    """
+
+    def __init__(self, path, resume=True):
+        self.path = path
+        self.responses = {}
+        if resume and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fin:
+                for line in fin:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # A line cut short by a crash
+                    self.responses[record['key']] = record['response']
+        self._fout = open(path, "a" if resume else "w", encoding="utf-8")
+
+    @staticmethod
+    def key(prompt):
+        return hashlib.sha1(prompt.strip().encode("utf-8")).hexdigest()
+
+    def get(self, prompt):
+        return self.responses.get(self.key(prompt))
+
+    def append(self, idx, prompt, response):
+        key = self.key(prompt)
+        self.responses[key] = response
+        self._fout.write(json.dumps({'idx': idx, 'key': key, 'response': response}, ensure_ascii=False) + "\n")
+        self._fout.flush()
+
+    def close(self):
+        self._fout.close()
+
+
+def get_checkpoint_path(out_folder, output_prefix):
+    return os.path.join(out_folder, f"{output_prefix}.checkpoint.jsonl")
+
+
+def run(out_df, task_col, idxs, gpts, output_prefix, promptpath='', out_folder='tmp', resume=True):
     prompt = get_prompt_from_path(promptpath)
-    return run_with_single_prompt(out_df, task_col, idxs, gpts, output_prefix, f"{output_prefix}_{promptpath}", prompt, out_folder)
+    return run_with_single_prompt(out_df, task_col, idxs, gpts, f"{output_prefix}_{promptpath}", prompt, out_folder, resume)
 
-def run_with_single_prompt(out_df, task_col, idxs, gpts, output_prefix, prompt, out_folder='tmp'):
-    out_df = out_df.iloc[idxs]
+def run_with_single_prompt(out_df, task_col, idxs, gpts, output_prefix, prompt, out_folder='tmp', resume=True):
+    out_df = out_df.iloc[idxs].copy()
     questions = out_df[task_col].tolist()
     prompted_inputs = [prompt + question + "\n" for question in questions]
-    infos = {}
-    i_range = list(range(0, len(prompted_inputs), 50))
-    for i in i_range:
-        trial = 0
-        while trial < 3:
-            try:
-                raw_responses = gpts(prompted_inputs[i:i+50])
-                break
-            except Exception as e:
-                print(e)
-                time.sleep(60)
-            trial += 1
-        for j in range(len(raw_responses)):
-            infos[idxs[i+j]] = {'input': prompted_inputs[i+j], 'answer': raw_responses[j]}        
-        # create a dictionary that returns 'NotFound' when a key is not found
-        review_to_info = defaultdict(lambda: {'answer':'[]'})
-        for info in infos.values():
-            review_to_info[info['input'].strip()] = info
-        if (i > 0 and i%200 == 0) or i == i_range[-1]:
-            out_df['label'] = out_df[task_col].apply(lambda x: review_to_info[x.strip()]['answer'])
-            out_filename = f"{output_prefix}_{idxs[0]}-{idxs[i+len(raw_responses)-1]}.xlsx"
-            out_path = os.path.join(out_folder, out_filename)
-            out_df.to_excel(out_path, index=False)
+    checkpoint = PromptCheckpoint(get_checkpoint_path(out_folder, output_prefix), resume=resume)
+    todo = [j for j, prompted_input in enumerate(prompted_inputs) if checkpoint.get(prompted_input) is None]
+    if len(todo) < len(prompted_inputs):
+        print(f"Resuming from {checkpoint.path}: {len(prompted_inputs) - len(todo)} of {len(prompted_inputs)} prompts already done")
+    try:
+        for i in range(0, len(todo), 50):
+            batch = todo[i:i+50]
+            trial = 0
+            while trial < 3:
+                try:
+                    raw_responses = gpts([prompted_inputs[j] for j in batch])
+                    break
+                except Exception as e:
+                    print(e)
+                    trial += 1
+                    if trial == 3:
+                        # Never fall through with the previous batch's responses
+                        raise
+                    time.sleep(60)
+            for j, raw_response in zip(batch, raw_responses):
+                checkpoint.append(idxs[j], prompted_inputs[j], raw_response)
+    finally:
+        checkpoint.close()
+    infos = {idxs[j]: {'input': prompted_inputs[j], 'answer': checkpoint.get(prompted_inputs[j])} for j in range(len(idxs))}
+    if len(idxs) > 0:
+        out_df['label'] = [info['answer'] for info in infos.values()]
+        out_path = os.path.join(out_folder, f"{output_prefix}_{idxs[0]}-{idxs[-1]}.xlsx")
+        out_df.to_excel(out_path, index=False)
     return infos
 
 
-def run_with_prompted_inputs(out_df, input_col, model, output_prefix, idxs=None, out_folder='tmp', batch_size=15, save_every=50):
+def run_with_prompted_inputs(out_df, input_col, model, output_prefix, idxs=None, out_folder='tmp', batch_size=15, resume=True):
+    """
+    Run every prompt in out_df[input_col] through model, keeping batch_size requests in flight
+
+    A finished request immediately frees its slot for the next prompt, so one slow
+    response never holds up the rest. Responses are stored by row, so the output is
+    in input order regardless of completion order.
+
+    Each response is appended to a JSONL checkpoint as it arrives; with resume, prompts
+    already in the checkpoint are not sent again. The xlsx is written once at the end.
+
+    Args:
+        out_df: Frame holding the prompts
+        input_col: Column with the prompted inputs
+        model: Async function prompt -> response text, e.g. partial(aclaude, model=...)
+        output_prefix: Prefix of the checkpoint and xlsx written to out_folder
+        idxs: Rows of out_df to run (default: all)
+        batch_size: Number of requests kept in flight
+        resume: Reuse responses from an existing checkpoint instead of starting over
+
+    Returns:
+        The selected rows of out_df with a 'response' column
+    """
+    if not inspect.iscoroutinefunction(model):
+        raise TypeError("model must be an async function prompt -> response text, e.g. partial(aclaude, model=...)")
     if idxs is None:
         idxs = list(range(len(out_df)))
     out_df = out_df.iloc[idxs].copy().reset_index(drop=True)
     prompted_inputs = out_df[input_col].tolist()
-    infos = []
-    i_range = list(range(0, len(prompted_inputs), batch_size))
-    
-    # Add outer progress bar
-    pbar = tqdm(i_range, desc=">>>> Processing batches", position=0, leave=True)
-    
-    for i in pbar:
-        trial = 0
-        while trial < 3:
+    checkpoint = PromptCheckpoint(get_checkpoint_path(out_folder, output_prefix), resume=resume)
+    try:
+        asyncio.run(_run_prompts_continuously(prompted_inputs, model, idxs, checkpoint, batch_size))
+    finally:
+        checkpoint.close()
+    out_df.loc[:, 'response'] = [checkpoint.get(prompted_input) for prompted_input in prompted_inputs]
+    if len(idxs) > 0:
+        out_path = os.path.join(out_folder, f"{output_prefix}_{idxs[0]}-{idxs[-1]}.xlsx")
+        out_df.to_excel(out_path, index=False)
+    return out_df
+
+
+async def _run_prompts_continuously(prompted_inputs, model, idxs, checkpoint, concurrency):
+    queue = asyncio.Queue()
+    for i, prompted_input in enumerate(prompted_inputs):
+        if checkpoint.get(prompted_input) is None:
+            queue.put_nowait(i)
+    if queue.qsize() < len(prompted_inputs):
+        print(f"Resuming from {checkpoint.path}: {len(prompted_inputs) - queue.qsize()} of {len(prompted_inputs)} prompts already done")
+    failures = []
+    pbar = tqdm(total=len(prompted_inputs), initial=len(prompted_inputs) - queue.qsize(), desc=">>>> Processing prompts", position=0, leave=True)
+
+    async def worker():
+        # Stop taking new prompts after a failure; requests already in flight still finish
+        while not failures:
+            try:
+                i = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
             try:
-                # The inner progress bar is handled by tqdm_asyncio in gpts.py
-                raw_responses = model(prompted_inputs[i:i+batch_size])
-                break
+                # Each request already retries with backoff in gpts.py
+                response = await model(prompted_inputs[i])
             except Exception as e:
                 print(e)
-                time.sleep(60)
-            trial += 1
-            
-        for j in range(len(raw_responses)):
-            infos.append({'input': prompted_inputs[i+j], 'response': raw_responses[j]})
-        
-        review_to_info = defaultdict(lambda: {'response':''})
-        for info in infos:
-            review_to_info[info['input'].strip()] = info
-            
-        if (i > 0 and i % save_every == 0) or i == i_range[-1]:
-            out_df.loc[:, 'response'] = out_df[input_col].apply(lambda x: review_to_info[x.strip()]['response'])
-            out_filename = f"{output_prefix}_{idxs[0]}-{idxs[i+len(raw_responses)-1]}.xlsx"
-            out_path = os.path.join(out_folder, out_filename)
-            out_df.to_excel(out_path, index=False)
-            
-        pbar.set_postfix({'last_batch': i+batch_size})
-        time.sleep(2)
-        
-    return out_df
+                failures.append(e)
+                return
+            checkpoint.append(idxs[i], prompted_inputs[i], response)
+            pbar.update(1)
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, queue.qsize()))))
+    pbar.close()
+    if failures:
+        # Everything that did finish is in the checkpoint; rerun to resume
+        raise failures[0]
 
 
 def parse_args():
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Regression check for resumable prompt runs
+
+Every response is appended to the JSONL checkpoint as it arrives; a rerun
+after a failure or crash must only send the prompts the checkpoint lacks,
+and still return every response in input order.
+
+Usage (from backend/):
+    python3 -m src.util.run_gpt_reviews_test
+"""
+
+import os
+import tempfile
+
+import pandas as pd
+
+os.environ.setdefault("OPENAI_API_KEY", "unused")  # gpts.py reads it at import; no request is sent
+
+from src.util.run_gpt_reviews import (PromptCheckpoint, get_checkpoint_path, run_with_prompted_inputs,
+                                      run_with_single_prompt)
+
+
+def stub_model(sent, fail_on=None):
+    """Async model that records the prompts it is sent in `sent` and fails on `fail_on`"""
+    async def model(prompt):
+        sent.append(prompt)
+        if prompt == fail_on:
+            raise RuntimeError("provider failed")
+        return f"answer to {prompt}"
+    return model
+
+
+def run_checks(out_folder):
+    checks = []
+
+    path = os.path.join(out_folder, "direct.checkpoint.jsonl")
+    checkpoint = PromptCheckpoint(path)
+    checkpoint.append(0, "first prompt", "first answer")
+    checkpoint.append(1, "second prompt\n", "second answer")
+    checkpoint.close()
+    with open(path, "a", encoding="utf-8") as fout:
+        fout.write('{"idx": 2, "key": "cut sh')  # A crash in the middle of a line
+    resumed = PromptCheckpoint(path)
+    resumed.close()
+    checks.append(("a reopened checkpoint returns the recorded responses and skips a torn line",
+                   resumed.get("first prompt") == "first answer" and resumed.get("second prompt") == "second answer" and
+                   len(resumed.responses) == 2))
+    restarted = PromptCheckpoint(path, resume=False)
+    restarted.close()
+    checks.append(("resume=False starts over", restarted.get("first prompt") is None and os.path.getsize(path) == 0))
+
+    frame = pd.DataFrame({"prompt": [f"prompt {i}" for i in range(6)]})
+    try:
+        run_with_prompted_inputs(frame, "prompt", stub_model([], fail_on="prompt 3"), "continuous",
+                                 out_folder=out_folder, batch_size=1)
+        checks.append(("a failed run raises", False))
+    except RuntimeError:
+        checks.append(("a failed run raises", True))
+    done = PromptCheckpoint(get_checkpoint_path(out_folder, "continuous"))
+    done.close()
+    checks.append(("responses before the failure are checkpointed", len(done.responses) == 3 and
+                   done.get("prompt 3") is None))
+
+    sent = []
+    result = run_with_prompted_inputs(frame, "prompt", stub_model(sent), "continuous",
+                                      out_folder=out_folder, batch_size=4)
+    checks.append(("the rerun only sends the missing prompts", sorted(sent) == ["prompt 3", "prompt 4", "prompt 5"]))
+    checks.append(("the rerun returns every response in input order",
+                   result["response"].tolist() == [f"answer to prompt {i}" for i in range(6)]))
+
+    sent = []
+
+    def gpts_stub(prompts):
+        sent.extend(prompts)
+        return [f"label for {prompt.strip()}" for prompt in prompts]
+
+    questions = pd.DataFrame({"question": ["q0", "q1", "q2"]})
+    run_with_single_prompt(questions, "question", [0, 1], gpts_stub, "single", "Q: ", out_folder=out_folder)
+    infos = run_with_single_prompt(questions, "question", [0, 1, 2], gpts_stub, "single", "Q: ", out_folder=out_folder)
+    checks.append(("run_with_single_prompt resumes from its checkpoint",
+                   sent == ["Q: q0\n", "Q: q1\n", "Q: q2\n"] and
+                   [info["answer"] for info in infos.values()] == ["label for Q: q0", "label for Q: q1", "label for Q: q2"]))
+    return checks
+
+
+def main():
+    with tempfile.TemporaryDirectory() as out_folder:
+        checks = run_checks(out_folder)
+    failures = 0
+    for name, ok in checks:
+        print(f"{'✅' if ok else '❌'} {name}")
+        failures += not ok
+    if failures:
+        raise SystemExit(f"{failures} checkpoint checks failed")
+    print("\nAll checkpoint checks passed")
+
+
+if __name__ == "__main__":
+    main()